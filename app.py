@@ -1,11 +1,8 @@
-try:
-    import tushare as ts
-    TUSHARE_AVAILABLE = True
-    print("Tushare库已成功导入")
-except ImportError:
-    ts = None
-    TUSHARE_AVAILABLE = False
-    print("警告：Tushare库未安装，部分数据功能将不可用")
+# 数据源库（tushare/akshare）导入耗时数秒，只检查是否安装，第一次使用时才导入
+from lazy_imports import lazy_import, LazyObject, module_installed
+
+ts = lazy_import('tushare')
+TUSHARE_AVAILABLE = ts is not None
 
 from flask import Flask, jsonify, request, render_template
 from flask_cors import CORS
@@ -14,6 +11,7 @@ import numpy as np
 from datetime import datetime, timedelta
 import socket
 import os
+import re
 import json
 import threading
 import time
@@ -24,29 +22,17 @@ from collections import deque
 try:
     from kline_api import kline_api
     KLINE_API_AVAILABLE = True
-    print("K线API模块已成功导入")
 except ImportError as e:
     kline_api = None
     KLINE_API_AVAILABLE = False
     print(f"警告：K线API模块导入失败: {e}")
 
-# 导入独立的资金流向处理器
-try:
-    from moneyflow_handler import MoneyflowHandler
-    MONEYFLOW_HANDLER_AVAILABLE = True
-    print("独立资金流向处理器已成功导入")
-except ImportError as e:
-    MoneyflowHandler = None
-    MONEYFLOW_HANDLER_AVAILABLE = False
-    print(f"警告：独立资金流向处理器导入失败: {e}")
-
 app = Flask(__name__)
 CORS(app)
 
-# 注册K线API蓝图
+# 注册K线API蓝图（Flask要求在处理第一个请求前注册，注册本身很快）
 if KLINE_API_AVAILABLE and kline_api:
     app.register_blueprint(kline_api)
-    print("K线API蓝图已注册")
 
 # Tushare API频率限制器
 class TushareRateLimiter:
@@ -189,22 +175,32 @@ class AkShareRateLimiter:
 # akshare_rate_limiter = AkShareRateLimiter(max_requests_per_minute=10, min_interval=6)
 
 # Tushare配置
-if TUSHARE_AVAILABLE:
-    # 从环境变量获取Token，如果没有则使用默认值
-    tushare_token = os.environ.get('TUSHARE_TOKEN', '68a7f380e45182b216eb63a9666c277ee96e68e3754476976adc5019')
+# 从环境变量获取Token，如果没有则使用默认值
+tushare_token = os.environ.get('TUSHARE_TOKEN', '68a7f380e45182b216eb63a9666c277ee96e68e3754476976adc5019')
+
+
+def _create_tushare_client():
     ts.set_token(tushare_token)
-    pro = ts.pro_api()
+    client = ts.pro_api()
     print(f"Tushare Token已设置: {tushare_token[:20]}...")
-    
-    # 初始化独立的资金流向处理器
-    if MONEYFLOW_HANDLER_AVAILABLE:
-        moneyflow_handler = MoneyflowHandler(tushare_token)
-        print("独立资金流向处理器已初始化")
-    else:
-        moneyflow_handler = None
+    return client
+
+
+def _create_moneyflow_handler():
+    # moneyflow_handler 模块导入时会导入tushare，同样推迟到第一次使用
+    from moneyflow_handler import MoneyflowHandler
+    handler = MoneyflowHandler(tushare_token)
+    print("独立资金流向处理器已初始化")
+    return handler
+
+
+# Tushare客户端和独立资金流向处理器在第一次调用接口时创建
+pro = LazyObject(_create_tushare_client, 'tushare.pro_api') if TUSHARE_AVAILABLE else None
+if TUSHARE_AVAILABLE and module_installed('moneyflow_handler'):
+    moneyflow_handler = LazyObject(_create_moneyflow_handler, 'MoneyflowHandler')
 else:
-    pro = None
     moneyflow_handler = None
+MONEYFLOW_HANDLER_AVAILABLE = moneyflow_handler is not None
 
 # 包装tushare API调用的函数
 def safe_tushare_call(func, *args, **kwargs):
@@ -247,15 +243,9 @@ def safe_tushare_call(func, *args, **kwargs):
         # 其他类型的错误直接抛出
         raise e
 
-# AkShare相关导入和函数定义
-try:
-    import akshare as ak
-    AKSHARE_AVAILABLE = True
-    print("AkShare库已成功导入")
-except ImportError:
-    ak = None
-    AKSHARE_AVAILABLE = False
-    print("警告：AkShare库未安装，分时图功能将不可用")
+# AkShare相关导入和函数定义（akshare导入最慢，第一次调用接口时才导入）
+ak = lazy_import('akshare')
+AKSHARE_AVAILABLE = ak is not None
 
 def safe_akshare_call(func, cache_key, *args, max_retries=3, retry_delay=2, **kwargs):
     """安全的AkShare API调用，实现双数据源策略（新浪财经和东财）"""
@@ -411,7 +401,29 @@ def kill_process_on_port(port):
         return False
 
 # 导入优化的缓存管理器
-from cache_manager import cache_manager, load_cache_data, save_cache_data, get_cache_file_path
+from cache_manager import (cache_manager, load_cache_data, save_cache_data, get_cache_file_path, read_cache_file,
+                           write_cache_file, read_cache_file_shared)
+# 通用函数结果缓存（内存LRU + 分片文件）
+from utils.performance_utils import cached, get_global_cache_manager
+from watchlist_service import WatchlistService, build_watchlist_entry, VALID_PRIORITIES
+from filter_store import FilterResultStore, normalize_date
+from stock_screener import StockScreener, PRESETS, parse_condition
+from market_index import MarketStockIndex, DEFAULT_PAGE_SIZE
+from signal_index import SignalIndex, SIGNAL_FIELDS
+from indicator_engine import (compute_indicators, compute_indicators_cached, indicator_cache, clean_precision,
+                              nine_turn_records)
+from stock_data_service import data_service
+from bar_resampler import BarResampler, normalize_freq, CALENDAR_FREQS, MINUTE_FREQS
+from scheduler_lock import LeaderLock, DEFAULT_LOCK_FILE
+from job_control import JobControl
+from warmup import StartupWarmer
+
+# 进程内数据访问层（历史日线 + 指标引擎），kline_api蓝图和本文件的接口共用
+data_service.configure(pro, safe_tushare_call)
+
+# 多周期K线：周/月线由缓存日线合成，分钟线由本地分时文件合成
+bar_resampler = BarResampler(data_service, cache_manager.intraday_store)
+from backtest import run_backtest, MARKETS as BACKTEST_MARKETS, DEFAULT_HORIZONS as BACKTEST_HORIZONS
 
 def get_latest_cache_date(market):
     """获取缓存中最新的日期"""
@@ -885,123 +897,7 @@ def calculate_nine_turn(df):
     3. Countdown阶段：Setup完成后开始，标注1-13，可被新Setup中断
     4. Countdown不要求连续，只要满足条件就计数
     """
-    df = df.copy()
-    df['nine_turn_up'] = 0
-    df['nine_turn_down'] = 0
-    df['countdown_up'] = 0  # 卖出Countdown（K线上方）
-    df['countdown_down'] = 0  # 买入Countdown（K线下方）
-    
-    # Setup阶段 - 卖出Setup（看涨转跌）
-    up_count = 0
-    up_positions = []  # 记录满足条件的位置
-    up_setup_complete_pos = -1  # Setup完成的位置
-    
-    for i in range(4, len(df)):  # 从第5个数据开始，因为需要比较4天前的数据
-        # 当日收盘价 > 4个交易日前的收盘价
-        if df.iloc[i]['close'] > df.iloc[i-4]['close']:
-            up_count += 1
-            up_positions.append(i)
-            
-            # 当达到3个时开始显示序列号（比同花顺早3天）
-            if up_count >= 3:
-                for j, pos in enumerate(up_positions):
-                    if j < 9:  # 最多显示9个
-                        df.iloc[pos, df.columns.get_loc('nine_turn_up')] = j + 1  # pos是位置，j+1是序列值
-            
-            # 如果达到9个，记录Setup完成位置并停止计数
-            if up_count >= 9:
-                up_setup_complete_pos = i
-                up_count = 0
-                up_positions = []
-        else:
-            # 如果中断，清除所有标记
-            for pos in up_positions:
-                df.iloc[pos, df.columns.get_loc('nine_turn_up')] = 0
-            up_count = 0
-            up_positions = []
-    
-    # Setup阶段 - 买入Setup（看跌转涨）
-    down_count = 0
-    down_positions = []  # 记录满足条件的位置
-    down_setup_complete_pos = -1  # Setup完成的位置
-    
-    for i in range(4, len(df)):  # 从第5个数据开始，因为需要比较4天前的数据
-        # 当日收盘价 < 4个交易日前的收盘价
-        if df.iloc[i]['close'] < df.iloc[i-4]['close']:
-            down_count += 1
-            down_positions.append(i)
-            
-            # 当达到3个时开始显示序列号（比同花顺早3天）
-            if down_count >= 3:
-                for j, pos in enumerate(down_positions):
-                    if j < 9:  # 最多显示9个
-                        df.iloc[pos, df.columns.get_loc('nine_turn_down')] = j + 1  # pos是位置，j+1是序列值
-            
-            # 如果达到9个，记录Setup完成位置并停止计数
-            if down_count >= 9:
-                down_setup_complete_pos = i
-                down_count = 0
-                down_positions = []
-        else:
-            # 如果中断，清除所有标记
-            for pos in down_positions:
-                df.iloc[pos, df.columns.get_loc('nine_turn_down')] = 0
-            down_count = 0
-            down_positions = []
-    
-    # Countdown阶段 - 卖出Countdown（上涨Setup完成后）
-    if up_setup_complete_pos >= 0:
-        sell_countdown = 0
-        sell_countdown_completed = False  # 添加完成标志
-        
-        for i in range(max(up_setup_complete_pos + 1, 2), len(df)):
-            # 检查是否有相反方向的Setup出现（下跌Setup），如果有则重置Countdown
-            if df.iloc[i]['nine_turn_down'] > 0:
-                sell_countdown = 0
-                sell_countdown_completed = False  # 相反Setup出现时重置完成标志
-                continue
-            
-            # 如果Countdown已完成（达到13），则停止计算
-            if sell_countdown_completed:
-                continue
-                
-            # 卖出Countdown条件：收盘价 >= 2天前最高价
-            if df.iloc[i]['close'] >= df.iloc[i-2]['high']:
-                sell_countdown += 1
-                if sell_countdown <= 13:  # 显示1-13
-                    df.iloc[i, df.columns.get_loc('countdown_up')] = sell_countdown  # 1, 2, 3, ..., 13
-                
-                # 达到13后标记为完成，停止计算
-                if sell_countdown >= 13:
-                    sell_countdown_completed = True
-    
-    # Countdown阶段 - 买入Countdown（下跌Setup完成后）
-    if down_setup_complete_pos >= 0:
-        buy_countdown = 0
-        buy_countdown_completed = False  # 添加完成标志
-        
-        for i in range(max(down_setup_complete_pos + 1, 2), len(df)):
-            # 检查是否有相反方向的Setup出现（上涨Setup），如果有则重置Countdown
-            if df.iloc[i]['nine_turn_up'] > 0:
-                buy_countdown = 0
-                buy_countdown_completed = False  # 相反Setup出现时重置完成标志
-                continue
-            
-            # 如果Countdown已完成（达到13），则停止计算
-            if buy_countdown_completed:
-                continue
-                
-            # 买入Countdown条件：收盘价 <= 2天前最低价
-            if df.iloc[i]['close'] <= df.iloc[i-2]['low']:
-                buy_countdown += 1
-                if buy_countdown <= 13:  # 显示1-13
-                    df.iloc[i, df.columns.get_loc('countdown_down')] = buy_countdown  # 1, 2, 3, ..., 13
-                
-                # 达到13后标记为完成，停止计算
-                if buy_countdown >= 13:
-                    buy_countdown_completed = True
-    
-    return df
+    return compute_indicators(df, ['nine_turn'])
 
 def calculate_boll(df, period=20, std_dev=2):
     """
@@ -1010,27 +906,7 @@ def calculate_boll(df, period=20, std_dev=2):
     - period: 移动平均周期，默认20天
     - std_dev: 标准差倍数，默认2倍
     """
-    df = df.copy()
-    
-    # 计算中轨（移动平均线）- 从第一根K线开始显示
-    df['boll_mid'] = df['close'].rolling(window=period, min_periods=1).mean()
-    
-    # 计算标准差 - 从第一根K线开始显示
-    df['boll_std'] = df['close'].rolling(window=period, min_periods=1).std()
-    
-    # 计算上轨和下轨
-    df['boll_upper'] = df['boll_mid'] + (df['boll_std'] * std_dev)
-    df['boll_lower'] = df['boll_mid'] - (df['boll_std'] * std_dev)
-    
-    # 应用精度修复，避免显示包含"999"的浮点数
-    df['boll_mid'] = df['boll_mid'].apply(lambda x: clean_float_precision(x, 4))
-    df['boll_upper'] = df['boll_upper'].apply(lambda x: clean_float_precision(x, 4))
-    df['boll_lower'] = df['boll_lower'].apply(lambda x: clean_float_precision(x, 4))
-    
-    # 对于前期数据不足的情况，保持为NaN，后续会被前端正确处理
-    # 不填充NaN值，让前端图表自动处理空值
-    
-    return df
+    return compute_indicators(df, ['boll'], {'boll': {'period': period, 'std_dev': std_dev}})
 
 
 def calculate_macd(df, fast_period=12, slow_period=26, signal_period=9):
@@ -1041,27 +917,8 @@ def calculate_macd(df, fast_period=12, slow_period=26, signal_period=9):
     - slow_period: 慢速EMA周期，默认26天
     - signal_period: 信号线EMA周期，默认9天
     """
-    df = df.copy()
-    
-    # 计算快速和慢速EMA
-    df['ema_fast'] = df['close'].ewm(span=fast_period, min_periods=1).mean()
-    df['ema_slow'] = df['close'].ewm(span=slow_period, min_periods=1).mean()
-    
-    # 计算MACD线（DIF）
-    df['macd_dif'] = df['ema_fast'] - df['ema_slow']
-    
-    # 计算信号线（DEA）
-    df['macd_dea'] = df['macd_dif'].ewm(span=signal_period, min_periods=1).mean()
-    
-    # 计算MACD柱状图（MACD）
-    df['macd_histogram'] = (df['macd_dif'] - df['macd_dea']) * 2
-    
-    # 应用精度修复，避免显示包含"999"的浮点数
-    df['macd_dif'] = df['macd_dif'].apply(lambda x: clean_float_precision(x, 4))
-    df['macd_dea'] = df['macd_dea'].apply(lambda x: clean_float_precision(x, 4))
-    df['macd_histogram'] = df['macd_histogram'].apply(lambda x: clean_float_precision(x, 4))
-    
-    return df
+    return compute_indicators(df, ['macd'], {'macd': {
+        'fast_period': fast_period, 'slow_period': slow_period, 'signal_period': signal_period}})
 
 
 def calculate_kdj(df, k_period=9, d_period=3, j_period=3):
@@ -1072,30 +929,8 @@ def calculate_kdj(df, k_period=9, d_period=3, j_period=3):
     - d_period: D值平滑周期，默认3天
     - j_period: J值计算周期，默认3天
     """
-    df = df.copy()
-    
-    # 计算最高价和最低价的滚动窗口
-    df['highest_high'] = df['high'].rolling(window=k_period, min_periods=1).max()
-    df['lowest_low'] = df['low'].rolling(window=k_period, min_periods=1).min()
-    
-    # 计算RSV（未成熟随机值）
-    df['rsv'] = ((df['close'] - df['lowest_low']) / (df['highest_high'] - df['lowest_low']) * 100).fillna(50)
-    
-    # 计算K值（使用简单移动平均代替指数移动平均以简化计算）
-    df['kdj_k'] = df['rsv'].rolling(window=d_period, min_periods=1).mean()
-    
-    # 计算D值
-    df['kdj_d'] = df['kdj_k'].rolling(window=d_period, min_periods=1).mean()
-    
-    # 计算J值
-    df['kdj_j'] = 3 * df['kdj_k'] - 2 * df['kdj_d']
-    
-    # 应用精度修复，避免显示包含"999"的浮点数
-    df['kdj_k'] = df['kdj_k'].apply(lambda x: clean_float_precision(x, 4))
-    df['kdj_d'] = df['kdj_d'].apply(lambda x: clean_float_precision(x, 4))
-    df['kdj_j'] = df['kdj_j'].apply(lambda x: clean_float_precision(x, 4))
-    
-    return df
+    return compute_indicators(df, ['kdj'], {'kdj': {
+        'k_period': k_period, 'd_period': d_period, 'j_period': j_period}})
 
 
 def calculate_rsi(df, period=14):
@@ -1104,32 +939,7 @@ def calculate_rsi(df, period=14):
     参数:
     - period: RSI计算周期，默认14天
     """
-    df = df.copy()
-    
-    # 计算价格变化
-    df['price_change'] = df['close'].diff()
-    
-    # 分离上涨和下跌
-    df['gain'] = df['price_change'].where(df['price_change'] > 0, 0)
-    df['loss'] = -df['price_change'].where(df['price_change'] < 0, 0)
-    
-    # 计算平均收益和平均损失（使用简单移动平均）
-    df['avg_gain'] = df['gain'].rolling(window=period, min_periods=1).mean()
-    df['avg_loss'] = df['loss'].rolling(window=period, min_periods=1).mean()
-    
-    # 计算相对强度RS
-    df['rs'] = df['avg_gain'] / (df['avg_loss'] + 1e-10)  # 避免除零
-    
-    # 计算RSI
-    df['rsi'] = 100 - (100 / (1 + df['rs']))
-    
-    # 处理第一行的NaN值
-    df['rsi'] = df['rsi'].fillna(50)
-    
-    # 应用精度修复，避免显示包含"999"的浮点数
-    df['rsi'] = df['rsi'].apply(lambda x: clean_float_precision(x, 4))
-    
-    return df
+    return compute_indicators(df, ['rsi'], {'rsi': {'period': period}})
 
 
 def calculate_ema15(df, period=15):
@@ -1138,46 +948,10 @@ def calculate_ema15(df, period=15):
     参数:
     - period: EMA周期，默认15天
     """
-    df = df.copy()
-    
-    try:
-        # 检查数据完整性
-        if 'close' not in df.columns:
-            print("[EMA15] 错误：数据中没有close列")
-            df['ema15'] = None
-            return df
-        
-        # 检查close列是否有有效数据
-        valid_close_count = df['close'].notna().sum()
-        print(f"[EMA15] 有效收盘价数据数量: {valid_close_count}/{len(df)}")
-        
-        if valid_close_count == 0:
-            print("[EMA15] 错误：没有有效的收盘价数据")
-            df['ema15'] = None
-            return df
-        
-        # 计算EMA15
-        df['ema15'] = df['close'].ewm(span=period, min_periods=1).mean()
-        
-        # 检查计算结果
-        valid_ema15_count = df['ema15'].notna().sum()
-        print(f"[EMA15] 计算完成，有效EMA15数据数量: {valid_ema15_count}/{len(df)}")
-        
-        # 应用精度修复，避免显示包含"999"的浮点数
-        df['ema15'] = df['ema15'].apply(lambda x: clean_float_precision(x, 4))
-        
-        # 再次检查精度修复后的结果
-        final_valid_count = df['ema15'].notna().sum()
-        print(f"[EMA15] 精度修复后，有效EMA15数据数量: {final_valid_count}/{len(df)}")
-        
-        if final_valid_count > 0:
-            print(f"[EMA15] EMA15值范围: {df['ema15'].min():.4f} - {df['ema15'].max():.4f}")
-        
-    except Exception as e:
-        print(f"[EMA15] 计算失败: {e}")
-        df['ema15'] = None
-    
-    return df
+    if 'close' not in df.columns:
+        print("[EMA15] 错误：数据中没有close列")
+        return df.assign(ema15=None)
+    return compute_indicators(df, ['ema15'], {'ema15': {'period': period}})
 
 
 
@@ -1426,24 +1200,24 @@ def load_indices_cache():
     try:
         cache_file = os.path.join('cache', 'indices_cache.json')
         if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                
-                # 检查缓存是否是当天的数据
-                cache_date = cached_data.get('cache_date', '')
-                current_date = datetime.now().strftime('%Y-%m-%d')
-                
-                # 如果是周末，不使用当天的缓存，需要重新获取最新交易日数据
-                now = datetime.now()
-                if now.weekday() >= 5:  # 周六或周日
-                    print(f"当前是周末，不使用缓存数据，需要重新获取最新交易日数据")
-                    return None
-                
-                # 工作日时检查缓存日期
-                if cache_date == current_date:
-                    return cached_data
-                else:
-                    print(f"指数缓存数据过期: 缓存日期={cache_date}, 当前日期={current_date}")
+            # 文件未变化时复用已解析的对象（只读）
+            cached_data = read_cache_file_shared(cache_file)
+            
+            # 检查缓存是否是当天的数据
+            cache_date = cached_data.get('cache_date', '')
+            current_date = datetime.now().strftime('%Y-%m-%d')
+            
+            # 如果是周末，不使用当天的缓存，需要重新获取最新交易日数据
+            now = datetime.now()
+            if now.weekday() >= 5:  # 周六或周日
+                print(f"当前是周末，不使用缓存数据，需要重新获取最新交易日数据")
+                return None
+            
+            # 工作日时检查缓存日期
+            if cache_date == current_date:
+                return cached_data
+            else:
+                print(f"指数缓存数据过期: 缓存日期={cache_date}, 当前日期={current_date}")
         return None
     except Exception as e:
         print(f"加载指数缓存失败: {e}")
@@ -1464,8 +1238,7 @@ def save_indices_cache(data, fetch_time):
             'cache_time': datetime.now().strftime('%H:%M:%S')
         }
         
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        write_cache_file(cache_file, cache_data)
         
         print(f"指数数据已保存到缓存: {cache_file}")
         return True
@@ -1478,27 +1251,27 @@ def load_all_indices_cache():
     try:
         cache_file = os.path.join('cache', 'all_indices_cache.json')
         if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                
-                # 检查缓存是否是当天的数据
-                cache_date = cached_data.get('cache_date', '')
-                current_date = datetime.now().strftime('%Y-%m-%d')
-                
-                # 如果是周末或非交易时间，返回最近的缓存数据
-                now = datetime.now()
-                if now.weekday() >= 5:  # 周六或周日
-                    print(f"当前是周末，返回最近的所有指数缓存数据: 缓存日期={cache_date}")
-                    return cached_data
-                
-                # 工作日时检查缓存日期
-                if cache_date == current_date:
-                    return cached_data
-                else:
-                    print(f"所有指数缓存数据过期: 缓存日期={cache_date}, 当前日期={current_date}")
-                    # 在非交易时间，仍然返回缓存数据而不是None
-                    print(f"非交易时间，返回缓存数据: 缓存日期={cache_date}")
-                    return cached_data
+            # 文件未变化时复用已解析的对象（只读）
+            cached_data = read_cache_file_shared(cache_file)
+            
+            # 检查缓存是否是当天的数据
+            cache_date = cached_data.get('cache_date', '')
+            current_date = datetime.now().strftime('%Y-%m-%d')
+            
+            # 如果是周末或非交易时间，返回最近的缓存数据
+            now = datetime.now()
+            if now.weekday() >= 5:  # 周六或周日
+                print(f"当前是周末，返回最近的所有指数缓存数据: 缓存日期={cache_date}")
+                return cached_data
+            
+            # 工作日时检查缓存日期
+            if cache_date == current_date:
+                return cached_data
+            else:
+                print(f"所有指数缓存数据过期: 缓存日期={cache_date}, 当前日期={current_date}")
+                # 在非交易时间，仍然返回缓存数据而不是None
+                print(f"非交易时间，返回缓存数据: 缓存日期={cache_date}")
+                return cached_data
         return None
     except Exception as e:
         print(f"加载所有指数缓存失败: {e}")
@@ -1520,8 +1293,7 @@ def save_all_indices_cache(data):
             'count': len(data)
         }
         
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        write_cache_file(cache_file, cache_data)
         
         print(f"所有指数数据已保存到缓存: {cache_file}, 共{len(data)}条")
         return True
@@ -1694,8 +1466,9 @@ def get_indices_from_akshare_realtime(indices):
         print("[AKShare] 所有数据源都失败，未获取到任何实时指数数据")
         return None
 
+@cached(ttl=60)
 def get_indices_from_tushare(indices):
-    """使用Tushare获取指数数据"""
+    """使用Tushare获取指数数据（结果缓存60秒，失败返回None时不缓存）"""
     if not TUSHARE_AVAILABLE:
         print("[Tushare] Tushare不可用，跳过Tushare获取")
         return None
@@ -2200,26 +1973,9 @@ def get_stock_data(stock_code):
             except:
                 continue
         
-        # 计算九转序列
-        daily_data = calculate_nine_turn(daily_data)
-        
-        # 计算BOLL指标
-        daily_data = calculate_boll(daily_data)
-        
-        # 计算EMA15指标
-        daily_data = calculate_ema15(daily_data)
-        
-        # 计算MACD指标
-        daily_data = calculate_macd(daily_data)
-        
-        # 计算KDJ指标
-        daily_data = calculate_kdj(daily_data)
-        
-        # 计算RSI指标
-        daily_data = calculate_rsi(daily_data)
-        
-        # 计算EMA15指标
-        daily_data = calculate_ema15(daily_data)
+        # 一次计算九转序列、BOLL、EMA15、MACD、KDJ、RSI
+        # 同一只股票、同一根最新K线的指标结果直接取缓存
+        daily_data = compute_indicators_cached(daily_data, ts_code, ['nine_turn', 'boll', 'ema15', 'macd', 'kdj', 'rsi'])
         
         # 确保所有数值字段不为None（除了BOLL指标）
         numeric_columns = ['open', 'high', 'low', 'close', 'vol', 'amount', 'nine_turn_up', 'nine_turn_down']
@@ -2375,7 +2131,12 @@ def get_stock_data(stock_code):
         ohlc_columns = ['open', 'high', 'low', 'close', 'pre_close']
         for col in ohlc_columns:
             if col in clean_daily_data.columns:
-                clean_daily_data[col] = clean_daily_data[col].apply(lambda x: clean_float_precision(x, 4) if x is not None and not pd.isna(x) else x)
+                values = pd.to_numeric(clean_daily_data[col], errors='coerce')
+                cleaned = pd.Series(clean_precision(values, 4), index=values.index)
+                # 缺失值保持为None
+                if values.isna().any():
+                    cleaned = cleaned.astype(object).where(values.notna(), None)
+                clean_daily_data[col] = cleaned
         
         # 保留原始索引信息，确保九转序列显示在正确位置
         # 重置索引并将原索引作为data_index字段保存
@@ -3143,6 +2904,158 @@ def get_realtime_stock_data(stock_code):
         print(f"[实时数据] 获取失败: {e}")
         return jsonify({'error': f'获取实时数据失败: {str(e)}'}), 500
 
+# 每日指标中并入最后交易日表格的字段（daily_basic 也有close列，不能整表合并）
+LAST_TRADING_DAY_BASIC_FIELDS = ['turnover_rate', 'turnover_rate_f', 'volume_ratio', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm',
+                                 'dv_ratio', 'dv_ttm', 'total_share', 'float_share', 'free_share', 'total_mv', 'circ_mv']
+# 已收盘且数据完整的交易日表格不会再变化，按交易日期缓存
+LAST_TRADING_DAY_TABLE_TTL = 7 * 24 * 3600
+# 日线行数至少达到上市股票数的这个比例才视为已完整发布（停牌股票没有日线）
+LAST_TRADING_DAY_MIN_COVERAGE = 0.9
+# 交易日已过去时，缺少每日指标的行数不超过这个比例仍可缓存
+LAST_TRADING_DAY_MAX_MISSING_BASIC = 0.02
+
+def build_last_trading_day_records(merged_data, stock_basic, after_close):
+    """
+    把日线+每日指标转换为实时交易数据格式（按列向量化计算）
+    
+    Args:
+        merged_data: 日线与每日指标按 ts_code 合并后的DataFrame
+        stock_basic: 股票基本信息（ts_code, name）
+        after_close: 是否处于工作日收盘后（15:00-18:00），close为空时按最高/最低/开盘价估算收盘价
+    
+    Returns:
+        (list, int): 数据列表, close为空的行数
+    """
+    def column(name):
+        if name in merged_data.columns:
+            return pd.to_numeric(merged_data[name], errors='coerce').to_numpy(dtype=np.float64)
+        return np.full(len(merged_data), np.nan)
+    
+    close_raw, pre_close_raw = column('close'), column('pre_close')
+    high, low, open_ = column('high'), column('low'), column('open')
+    has_close = ~np.isnan(close_raw)
+    has_pre_close = ~np.isnan(pre_close_raw)
+    pre_close_or_zero = np.where(has_pre_close, pre_close_raw, 0.0)
+    
+    if after_close:
+        # 收盘后时间段close为空：优先级 (high + low) / 2 -> open -> pre_close
+        estimated = np.where((high > 0) & (low > 0), (high + low) / 2,
+                             np.where(open_ > 0, open_, pre_close_or_zero))
+        close_price = np.where(has_close, close_raw, estimated)
+        pre_close = np.where(has_pre_close, pre_close_raw, close_price)
+    else:
+        # 非收盘后时间段close为空：使用pre_close作为最新价，涨跌幅为0
+        close_price = np.where(has_close, close_raw, pre_close_or_zero)
+        pre_close = np.where(has_close & has_pre_close, pre_close_raw, close_price)
+    
+    positive = pre_close > 0
+    safe_pre_close = np.where(positive, pre_close, 1.0)
+    pct_chg = np.where(positive, (close_price - pre_close) / safe_pre_close * 100, 0.0)
+    change = np.where(positive, close_price - pre_close, 0.0)
+    amplitude = np.where(positive & ~np.isnan(high) & ~np.isnan(low), (high - low) / safe_pre_close * 100, 0.0)
+    
+    ts_codes = merged_data['ts_code'].astype(str)
+    names = stock_basic.drop_duplicates('ts_code').set_index('ts_code')['name']
+    stock_names = ts_codes.map(names).fillna(ts_codes)
+    
+    def filled(name):
+        return np.nan_to_num(column(name), nan=0.0).tolist()
+    
+    rows = zip(
+        range(1, len(merged_data) + 1), ts_codes.str.split('.').str[0].tolist(), stock_names.tolist(),
+        close_price.tolist(), pct_chg.tolist(), change.tolist(), filled('vol'), filled('amount'), amplitude.tolist(),
+        filled('high'), filled('low'), filled('open'), pre_close.tolist(), filled('volume_ratio'),
+        filled('turnover_rate'), filled('pe_ttm'), filled('pb'), filled('total_mv'), filled('circ_mv')
+    )
+    keys = ['序号', '代码', '名称', '最新价', '涨跌幅', '涨跌额', '成交量', '成交额', '振幅', '最高', '最低', '今开',
+            '昨收', '量比', '换手率', '市盈率-动态', '市净率', '总市值', '流通市值']
+    data_list = [{
+        **dict(zip(keys, row)),
+        '涨速': 0.0,  # 收盘数据无涨速
+        '5分钟涨跌': 0.0,  # 收盘数据无5分钟涨跌
+        '60日涨跌幅': 0.0,  # 需要额外计算，暂时设为0
+        '年初至今涨跌幅': 0.0  # 需要额外计算，暂时设为0
+    } for row in rows]
+    return data_list, int((~has_close).sum())
+
+def load_last_trading_day_table(trade_date):
+    """
+    获取某个交易日的表格数据
+    
+    Returns:
+        dict: {'trade_date', 'data', 'missing_close', 'missing_basic', 'listed_count'}，
+              出错时为 {'error', 'message', 'status'}
+              missing_basic 为没有并入每日指标的行数（daily_basic 晚于 daily 发布，期间换手率、量比、市值等为0）
+    """
+    # 获取股票基本信息列表
+    stock_basic = safe_tushare_call(pro.stock_basic, exchange='', list_status='L', fields='ts_code,symbol,name,area,industry,list_date')
+    if stock_basic.empty:
+        print("[最后交易日数据] 无法获取股票基本信息")
+        return {'error': '无法获取股票基本信息', 'message': '数据源暂时不可用', 'status': 503}
+    
+    # 获取最后交易日的日线数据
+    daily_data = safe_tushare_call(pro.daily, trade_date=trade_date)
+    if daily_data.empty:
+        print(f"[最后交易日数据] {trade_date}无日线数据，尝试获取前一个交易日数据")
+        # 如果当天没有数据，尝试前一个交易日
+        prev_date = (datetime.strptime(trade_date, '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
+        daily_data = safe_tushare_call(pro.daily, trade_date=prev_date)
+        if daily_data.empty:
+            return {'error': f'无法获取{trade_date}的交易数据', 'message': '最后交易日数据不可用', 'status': 404}
+        trade_date = prev_date
+        print(f"[最后交易日数据] 使用前一个交易日数据: {trade_date}")
+    
+    # 获取每日指标数据并合并
+    daily_basic = safe_tushare_call(pro.daily_basic, trade_date=trade_date)
+    print(f"[最后交易日数据] 获取到{len(daily_data)}条日线数据，{len(daily_basic)}条每日指标数据")
+    if not daily_basic.empty:
+        basic_fields = ['ts_code'] + [col for col in LAST_TRADING_DAY_BASIC_FIELDS if col in daily_basic.columns]
+        merged_data = daily_data.merge(daily_basic[basic_fields].drop_duplicates('ts_code'), on='ts_code', how='left')
+        missing_basic = int((~daily_data['ts_code'].isin(daily_basic['ts_code'])).sum())
+    else:
+        merged_data = daily_data
+        missing_basic = len(daily_data)
+    
+    now = datetime.now()
+    afternoon_end = datetime.strptime('15:00', '%H:%M').time()
+    evening_cutoff = datetime.strptime('18:00', '%H:%M').time()
+    after_close = now.weekday() < 5 and afternoon_end < now.time() <= evening_cutoff
+    data_list, missing_close = build_last_trading_day_records(merged_data.reset_index(drop=True), stock_basic, after_close)
+    if missing_close:
+        print(f"[最后交易日数据] {missing_close}只股票close字段为空，"
+              f"{'按(high+low)/2、open、pre_close估算收盘价' if after_close else '使用pre_close作为最新价'}")
+    if missing_basic:
+        print(f"[最后交易日数据] {missing_basic}只股票没有每日指标数据（可能尚未发布）")
+    return {'trade_date': trade_date, 'data': data_list, 'missing_close': missing_close,
+            'missing_basic': missing_basic, 'basic_count': len(daily_basic), 'listed_count': len(stock_basic)}
+
+def is_last_trading_day_table_final(table, trade_date):
+    """
+    表格是否已是该交易日的最终数据（可以长期缓存）
+    
+    - 是该交易日本身的数据（不是退回的前一交易日），收盘价完整
+    - 日线行数达到上市股票数的 LAST_TRADING_DAY_MIN_COVERAGE（daily 可能只发布了一部分）
+    - 每日指标已全部并入；交易日已经过去（当天晚上的发布都已完成）时允许个别股票
+      （不超过 LAST_TRADING_DAY_MAX_MISSING_BASIC）缺少每日指标
+    - 每日指标整体为空（尚未发布、调用失败或被限流）时一律不缓存
+    """
+    if 'error' in table or table['trade_date'] != trade_date or table['missing_close'] or not table['data']:
+        return False
+    if len(table['data']) < table['listed_count'] * LAST_TRADING_DAY_MIN_COVERAGE:
+        return False
+    if not table['basic_count']:
+        return False
+    if not table['missing_basic']:
+        return True
+    return (trade_date < datetime.now().strftime('%Y%m%d') and
+            table['missing_basic'] <= len(table['data']) * LAST_TRADING_DAY_MAX_MISSING_BASIC)
+
+def get_last_trading_day_table(trade_date):
+    """按交易日期缓存的表格数据：只缓存该交易日已完整发布的最终数据，退回前一交易日或数据不完整时不缓存"""
+    return get_global_cache_manager().get_or_set(
+        f'last_trading_day_table:{trade_date}', lambda: load_last_trading_day_table(trade_date),
+        LAST_TRADING_DAY_TABLE_TTL, cache_if=lambda table: is_last_trading_day_table_final(table, trade_date))
+
 def get_last_trading_day_data():
     """
     获取最后交易日的收盘数据，用于非交易时间显示
@@ -3155,141 +3068,17 @@ def get_last_trading_day_data():
         last_trading_date = get_latest_trading_day()
         print(f"[最后交易日数据] 动态获取的最后交易日: {last_trading_date}")
         
-        # 获取股票基本信息列表
-        stock_basic = safe_tushare_call(pro.stock_basic, exchange='', list_status='L', fields='ts_code,symbol,name,area,industry,list_date')
-        
-        if stock_basic.empty:
-            print("[最后交易日数据] 无法获取股票基本信息")
+        table = get_last_trading_day_table(last_trading_date)
+        if 'error' in table:
             return jsonify({
                 'success': False,
-                'error': '无法获取股票基本信息',
+                'error': table['error'],
                 'data': [],
-                'message': '数据源暂时不可用'
-            }), 503
-        
-        # 获取最后交易日的日线数据
-        daily_data = safe_tushare_call(pro.daily, trade_date=last_trading_date)
-        
-        if daily_data.empty:
-            print(f"[最后交易日数据] {last_trading_date}无日线数据，尝试获取前一个交易日数据")
-            # 如果当天没有数据，尝试前一个交易日
-            prev_date = (datetime.strptime(last_trading_date, '%Y%m%d') - timedelta(days=1)).strftime('%Y%m%d')
-            daily_data = safe_tushare_call(pro.daily, trade_date=prev_date)
-            if not daily_data.empty:
-                last_trading_date = prev_date
-                print(f"[最后交易日数据] 使用前一个交易日数据: {last_trading_date}")
-            else:
-                return jsonify({
-                    'success': False,
-                    'error': f'无法获取{last_trading_date}的交易数据',
-                    'data': [],
-                    'message': '最后交易日数据不可用'
-                }), 404
-        
-        # 获取每日指标数据
-        daily_basic = safe_tushare_call(pro.daily_basic, trade_date=last_trading_date)
-        
-        print(f"[最后交易日数据] 获取到{len(daily_data)}条日线数据，{len(daily_basic)}条每日指标数据")
-        
-        # 合并数据
-        if not daily_basic.empty:
-            merged_data = daily_data.merge(daily_basic, on=['ts_code', 'trade_date'], how='left')
-        else:
-            merged_data = daily_data.copy()
-            # 添加缺失的每日指标字段
-            for col in ['turnover_rate', 'turnover_rate_f', 'volume_ratio', 'pe', 'pe_ttm', 'pb', 'ps', 'ps_ttm', 'dv_ratio', 'dv_ttm', 'total_share', 'float_share', 'free_share', 'total_mv', 'circ_mv']:
-                if col not in merged_data.columns:
-                    merged_data[col] = None
-        
-        # 转换为实时交易数据格式
-        data_list = []
-        for idx, row in merged_data.iterrows():
-            try:
-                # 获取股票名称
-                stock_info = stock_basic[stock_basic['ts_code'] == row['ts_code']]
-                stock_name = stock_info['name'].iloc[0] if not stock_info.empty else row['ts_code']
-                
-                # 计算涨跌幅和涨跌额
-                close_raw = row.get('close')
-                pre_close_raw = row.get('pre_close')
-                
-                # 检查当前时间是否在收盘后的时间段（15:00-18:00）
-                now = datetime.now()
-                current_time = now.time()
-                afternoon_end = datetime.strptime('15:00', '%H:%M').time()
-                evening_cutoff = datetime.strptime('18:00', '%H:%M').time()
-                is_after_close = afternoon_end < current_time <= evening_cutoff
-                is_weekday = now.weekday() < 5
-                
-                # 如果close字段为空，说明可能是非交易日或数据问题
-                if pd.notna(close_raw) and close_raw is not None:
-                    close_price = float(close_raw)
-                    pre_close = float(pre_close_raw) if pd.notna(pre_close_raw) and pre_close_raw is not None else close_price
-                else:
-                    # close字段为空的处理策略
-                    if is_weekday and is_after_close:
-                        # 收盘后时间段：尝试使用更合理的收盘价估算
-                        # 优先级：(high + low) / 2 -> open -> pre_close
-                        high_raw = row.get('high')
-                        low_raw = row.get('low') 
-                        open_raw = row.get('open')
-                        
-                        if (pd.notna(high_raw) and high_raw is not None and high_raw > 0 and 
-                            pd.notna(low_raw) and low_raw is not None and low_raw > 0):
-                            # 使用最高价和最低价的平均值作为收盘价的估算
-                            close_price = (float(high_raw) + float(low_raw)) / 2
-                            print(f"[收盘后数据] 股票 {row['ts_code']} close字段为空，使用(high+low)/2作为收盘价: {close_price} (high:{high_raw}, low:{low_raw})")
-                        elif pd.notna(open_raw) and open_raw is not None and open_raw > 0:
-                            close_price = float(open_raw)
-                            print(f"[收盘后数据] 股票 {row['ts_code']} close字段为空，使用open作为收盘价: {close_price}")
-                        else:
-                            close_price = float(pre_close_raw) if pd.notna(pre_close_raw) and pre_close_raw is not None else 0.0
-                            print(f"[收盘后数据] 股票 {row['ts_code']} 所有价格字段都为空，使用pre_close: {close_price}")
-                        
-                        pre_close = float(pre_close_raw) if pd.notna(pre_close_raw) and pre_close_raw is not None else close_price
-                    else:
-                        # 非收盘后时间段：使用pre_close作为最新价
-                        close_price = float(pre_close_raw) if pd.notna(pre_close_raw) and pre_close_raw is not None else 0.0
-                        pre_close = close_price  # 在这种情况下，涨跌幅为0
-                
-                if pre_close > 0:
-                    pct_chg = ((close_price - pre_close) / pre_close) * 100
-                    change = close_price - pre_close
-                else:
-                    pct_chg = 0.0
-                    change = 0.0
-                
-                # 构造实时交易数据格式
-                data_item = {
-                    '序号': idx + 1,
-                    '代码': row['ts_code'].split('.')[0],  # 去掉后缀
-                    '名称': stock_name,
-                    '最新价': close_price,
-                    '涨跌幅': pct_chg,
-                    '涨跌额': change,
-                    '成交量': float(row.get('vol', 0)) if pd.notna(row.get('vol')) else 0.0,
-                    '成交额': float(row.get('amount', 0)) if pd.notna(row.get('amount')) else 0.0,
-                    '振幅': float(row.get('high', 0) - row.get('low', 0)) / pre_close * 100 if pre_close > 0 and pd.notna(row.get('high')) and pd.notna(row.get('low')) else 0.0,
-                    '最高': float(row.get('high', 0)) if pd.notna(row.get('high')) else 0.0,
-                    '最低': float(row.get('low', 0)) if pd.notna(row.get('low')) else 0.0,
-                    '今开': float(row.get('open', 0)) if pd.notna(row.get('open')) else 0.0,
-                    '昨收': pre_close,
-                    '量比': float(row.get('volume_ratio', 0)) if pd.notna(row.get('volume_ratio')) else 0.0,
-                    '换手率': float(row.get('turnover_rate', 0)) if pd.notna(row.get('turnover_rate')) else 0.0,
-                    '市盈率-动态': float(row.get('pe_ttm', 0)) if pd.notna(row.get('pe_ttm')) else 0.0,
-                    '市净率': float(row.get('pb', 0)) if pd.notna(row.get('pb')) else 0.0,
-                    '总市值': float(row.get('total_mv', 0)) if pd.notna(row.get('total_mv')) else 0.0,
-                    '流通市值': float(row.get('circ_mv', 0)) if pd.notna(row.get('circ_mv')) else 0.0,
-                    '涨速': 0.0,  # 收盘数据无涨速
-                    '5分钟涨跌': 0.0,  # 收盘数据无5分钟涨跌
-                    '60日涨跌幅': 0.0,  # 需要额外计算，暂时设为0
-                    '年初至今涨跌幅': 0.0  # 需要额外计算，暂时设为0
-                }
-                data_list.append(data_item)
-            except Exception as e:
-                print(f"[最后交易日数据] 处理数据行失败: {e}")
-                continue
+                'message': table['message']
+            }), table['status']
         
+        data_list = table['data']
+        last_trading_date = table['trade_date']
         if not data_list:
             return jsonify({
                 'success': False,
@@ -3335,8 +3124,7 @@ def save_realtime_data_cache(data):
             'cache_time': datetime.now().strftime('%H:%M:%S')
         }
         
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
+        write_cache_file(cache_file, cache_data)
         
         print(f"[实时交易数据缓存] 已保存{len(data)}条数据到缓存")
         
@@ -3348,11 +3136,10 @@ def load_realtime_data_cache():
     try:
         cache_file = os.path.join('cache', 'realtime_trading_data_cache.json')
         if os.path.exists(cache_file):
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cached_data = json.load(f)
-                
-                print(f"[实时交易数据缓存] 找到缓存数据，缓存时间: {cached_data.get('fetch_time', '未知')}")
-                return cached_data
+            cached_data = read_cache_file(cache_file)
+            
+            print(f"[实时交易数据缓存] 找到缓存数据，缓存时间: {cached_data.get('fetch_time', '未知')}")
+            return cached_data
         
         print("[实时交易数据缓存] 未找到缓存文件")
         return None
@@ -3437,8 +3224,7 @@ def update_realtime_trading_cache_for_stock(stock_code, realtime_data_source):
             os.makedirs(cache_dir)
         
         cache_file = os.path.join(cache_dir, 'realtime_trading_data_cache.json')
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cached_data, f, ensure_ascii=False, indent=2)
+        write_cache_file(cache_file, cached_data)
         
         print(f"[更新缓存] ✅ 成功更新股票{stock_code}的实时交易数据缓存，最新价: {updated_stock_item['最新价']}")
         
@@ -3524,13 +3310,17 @@ def get_realtime_task_status():
         JSON: 任务状态信息，包含运行状态、最后更新时间、成功/失败次数等
     """
     try:
-        global realtime_task_status
+        # worker模式下实时任务在独立任务进程中运行，状态来自其心跳
+        if SCHEDULER_MODE == 'worker':
+            task_status = job_control.worker_state().get('realtime_task_status', {})
+        else:
+            task_status = realtime_task_status
         
         # 计算任务运行时长
         runtime_info = "未知"
-        if realtime_task_status.get('start_time'):
+        if task_status.get('start_time'):
             try:
-                start_time = datetime.strptime(realtime_task_status['start_time'], '%Y-%m-%d %H:%M:%S')
+                start_time = datetime.strptime(task_status['start_time'], '%Y-%m-%d %H:%M:%S')
                 runtime_seconds = (datetime.now() - start_time).total_seconds()
                 hours = int(runtime_seconds // 3600)
                 minutes = int((runtime_seconds % 3600) // 60)
@@ -3540,9 +3330,9 @@ def get_realtime_task_status():
         
         # 计算数据新鲜度
         data_freshness = "未知"
-        if realtime_task_status.get('last_update'):
+        if task_status.get('last_update'):
             try:
-                last_update = datetime.strptime(realtime_task_status['last_update'], '%Y-%m-%d %H:%M:%S')
+                last_update = datetime.strptime(task_status['last_update'], '%Y-%m-%d %H:%M:%S')
                 age_seconds = (datetime.now() - last_update).total_seconds()
                 if age_seconds < 60:
                     data_freshness = f"{int(age_seconds)}秒前"
@@ -3576,12 +3366,12 @@ def get_realtime_task_status():
         return jsonify({
             'success': True,
             'task_status': {
-                'is_running': realtime_task_status.get('is_running', False),
-                'start_time': realtime_task_status.get('start_time', '未知'),
-                'last_update': realtime_task_status.get('last_update', '未知'),
-                'success_count': realtime_task_status.get('success_count', 0),
-                'error_count': realtime_task_status.get('error_count', 0),
-                'last_error': realtime_task_status.get('last_error', '无'),
+                'is_running': task_status.get('is_running', False),
+                'start_time': task_status.get('start_time', '未知'),
+                'last_update': task_status.get('last_update', '未知'),
+                'success_count': task_status.get('success_count', 0),
+                'error_count': task_status.get('error_count', 0),
+                'last_error': task_status.get('last_error', '无'),
                 'runtime': runtime_info,
                 'data_freshness': data_freshness
             },
@@ -3949,8 +3739,13 @@ def get_stock_moneyflow_v2(stock_code):
         else:
             ts_code = stock_code
         
-        # 使用独立的资金流向处理器获取数据
-        result = moneyflow_handler.get_moneyflow_data(
+        # 使用独立的资金流向处理器获取数据（第一次使用时才导入，导入失败视为不可用）
+        try:
+            get_moneyflow_data = moneyflow_handler.get_moneyflow_data
+        except ImportError as e:
+            print(f"[资金流向V2] 独立资金流向处理器导入失败: {e}")
+            return jsonify({'error': '独立资金流向处理器不可用'}), 503
+        result = get_moneyflow_data(
             ts_code=ts_code,
             trade_date=trade_date,
             start_date=start_date,
@@ -3969,6 +3764,64 @@ def get_stock_moneyflow_v2(stock_code):
         return jsonify({'error': f'获取资金流向数据失败: {str(e)}'}), 500
 
 
+@cached(ttl=300)
+def build_daily_history_payload(ts_code, days=500, start_date=None, end_date=None):
+    """
+    获取历史日线并计算BOLL/EMA15，返回接口数据（不含fetch_time）
+    结果按参数缓存5分钟；股票不存在或无数据时抛出LookupError（不缓存）
+    """
+    # 验证股票代码是否存在
+    basic_info = data_service.stock_basic(ts_code)
+    
+    # 获取历史日线并计算BOLL和EMA15指标
+    if start_date and end_date:
+        daily_data = data_service.daily_with_indicators(ts_code, ['boll', 'ema15'],
+                                                        start_date=start_date, end_date=end_date)
+    else:
+        daily_data = data_service.daily_with_indicators(ts_code, ['boll', 'ema15'], days=days)
+    
+    # 转换为JSON格式，保持Tushare官方文档的字段格式，并添加BOLL和EMA15指标
+    data_list = []
+    for _, row in daily_data.iterrows():
+        data_list.append({
+            'ts_code': row['ts_code'],
+            'trade_date': row['trade_date'],
+            'open': float(row['open']) if pd.notna(row['open']) else None,
+            'high': float(row['high']) if pd.notna(row['high']) else None,
+            'low': float(row['low']) if pd.notna(row['low']) else None,
+            'close': float(row['close']) if pd.notna(row['close']) else None,
+            'pre_close': float(row['pre_close']) if pd.notna(row['pre_close']) else None,
+            'change': float(row['change']) if pd.notna(row['change']) else None,
+            'pct_chg': float(row['pct_chg']) if pd.notna(row['pct_chg']) else None,
+            'vol': float(row['vol']) if pd.notna(row['vol']) else None,
+            'amount': float(row['amount']) if pd.notna(row['amount']) else None,
+            # 添加BOLL指标数据
+            'boll_upper': float(row['boll_upper']) if pd.notna(row['boll_upper']) else None,
+            'boll_mid': float(row['boll_mid']) if pd.notna(row['boll_mid']) else None,
+            'boll_lower': float(row['boll_lower']) if pd.notna(row['boll_lower']) else None,
+            # 添加EMA15指标数据
+            'ema15': float(row['ema15']) if pd.notna(row['ema15']) else None
+        })
+    
+    # 获取股票基本信息
+    stock_name = basic_info.get('name') or ts_code
+    
+    print(f"[历史日线] 成功获取{ts_code}({stock_name})的{len(data_list)}条历史日线数据")
+    
+    return {
+        'success': True,
+        'data': data_list,
+        'stock_info': {
+            'ts_code': ts_code,
+            'name': stock_name,
+            'total_records': len(data_list),
+            'date_range': {
+                'start': data_list[0]['trade_date'] if data_list else None,
+                'end': data_list[-1]['trade_date'] if data_list else None
+            }
+        }
+    }
+
 @app.route('/api/stock/<stock_code>/daily_history')
 def get_stock_daily_history(stock_code):
     """
@@ -4005,77 +3858,101 @@ def get_stock_daily_history(stock_code):
         
         print(f"[历史日线] 获取{ts_code}的历史日线数据，天数: {days}")
         
-        # 验证股票代码是否存在
-        basic_info = safe_tushare_call(pro.stock_basic, ts_code=ts_code)
-        if basic_info.empty:
-            return jsonify({'error': '股票代码不存在'}), 404
-        
-        # 使用TushareDataFetcher获取历史日线数据
-        from tushare_data_fetcher import TushareDataFetcher
-        fetcher = TushareDataFetcher(pro_api=pro)
-        
-        if start_date and end_date:
-            daily_data = fetcher.get_daily_data(ts_code, start_date=start_date, end_date=end_date)
-        else:
-            daily_data = fetcher.get_daily_data(ts_code, days=days)
-        
-        if daily_data.empty:
-            return jsonify({'error': '无法获取历史日线数据'}), 404
-        
-        # 计算BOLL指标
-        daily_data = calculate_boll(daily_data)
-        
-        # 计算EMA15指标
-        daily_data = calculate_ema15(daily_data)
-        
-        # 转换为JSON格式，保持Tushare官方文档的字段格式，并添加BOLL和EMA15指标
-        data_list = []
-        for _, row in daily_data.iterrows():
-            data_list.append({
-                'ts_code': row['ts_code'],
-                'trade_date': row['trade_date'],
-                'open': float(row['open']) if pd.notna(row['open']) else None,
-                'high': float(row['high']) if pd.notna(row['high']) else None,
-                'low': float(row['low']) if pd.notna(row['low']) else None,
-                'close': float(row['close']) if pd.notna(row['close']) else None,
-                'pre_close': float(row['pre_close']) if pd.notna(row['pre_close']) else None,
-                'change': float(row['change']) if pd.notna(row['change']) else None,
-                'pct_chg': float(row['pct_chg']) if pd.notna(row['pct_chg']) else None,
-                'vol': float(row['vol']) if pd.notna(row['vol']) else None,
-                'amount': float(row['amount']) if pd.notna(row['amount']) else None,
-                # 添加BOLL指标数据
-                'boll_upper': float(row['boll_upper']) if pd.notna(row['boll_upper']) else None,
-                'boll_mid': float(row['boll_mid']) if pd.notna(row['boll_mid']) else None,
-                'boll_lower': float(row['boll_lower']) if pd.notna(row['boll_lower']) else None,
-                # 添加EMA15指标数据
-                'ema15': float(row['ema15']) if pd.notna(row['ema15']) else None
-            })
-        
-        # 获取股票基本信息
-        stock_name = basic_info.iloc[0]['name'] if not basic_info.empty else stock_code
-        
-        print(f"[历史日线] 成功获取{ts_code}({stock_name})的{len(data_list)}条历史日线数据")
+        try:
+            payload = build_daily_history_payload(ts_code, days, start_date, end_date)
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
         
-        return jsonify({
-            'success': True,
-            'data': data_list,
-            'stock_info': {
-                'ts_code': ts_code,
-                'name': stock_name,
-                'total_records': len(data_list),
-                'date_range': {
-                    'start': data_list[0]['trade_date'] if data_list else None,
-                    'end': data_list[-1]['trade_date'] if data_list else None
-                }
-            },
-            'fetch_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+        return jsonify(dict(payload, fetch_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
         
     except Exception as e:
         print(f"[历史日线] 获取失败: {e}")
         return jsonify({'error': f'获取历史日线数据失败: {str(e)}'}), 500
 
 
+@cached(ttl=300)
+def build_nine_turn_payload(ts_code, freq='daily', days=200, start_date=None, end_date=None):
+    """
+    获取K线并计算神奇九转，返回接口数据（不含fetch_time）
+    结果按参数缓存5分钟；股票不存在时抛出LookupError（不缓存）
+    """
+    freq = normalize_freq(freq)
+    
+    # 验证股票代码是否存在
+    basic_info = data_service.stock_basic(ts_code)
+    
+    # 获取K线数据用于计算神奇九转，多取30根K线确保九转计算的准确性
+    # 日/周/月线共用同一份缓存日线，分钟线来自本地分时文件，切换周期不会额外请求接口
+    if start_date and end_date:
+        # 使用指定的日期范围，扩展开始日期以获取足够的数据进行计算
+        # （分钟线多取两周的分时文件，60分钟线也有30根以上）
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
+        lead_days = 14 if freq in MINUTE_FREQS else 30 * CALENDAR_FREQS[freq][1]
+        extended_start = start_date_obj - timedelta(days=lead_days)
+        kline_data = bar_resampler.bars(ts_code, freq,
+                                        start_date=extended_start.strftime('%Y%m%d'),
+                                        end_date=end_date_obj.strftime('%Y%m%d'))
+    else:
+        kline_data = bar_resampler.bars(ts_code, freq, count=days + 30)
+    
+    if kline_data.empty:
+        return {
+            'success': True,
+            'data': [],
+            'message': '该股票暂无本地分时数据' if freq in MINUTE_FREQS else '该股票暂无K线数据',
+            'stock_info': {
+                'ts_code': ts_code,
+                'name': basic_info.get('name') or ts_code,
+                'freq': freq
+            }
+        }
+    
+    # 计算神奇九转指标（K线已按时间升序）
+    nine_turn_results = nine_turn_records(kline_data, freq=freq)
+    
+    # 如果指定了日期范围，过滤结果（分钟线的trade_date带有时间，只比较日期部分）
+    if start_date and end_date:
+        start_filter = start_date.replace('-', '')
+        end_filter = end_date.replace('-', '')
+        nine_turn_results = [r for r in nine_turn_results 
+                           if start_filter <= r['trade_date'].replace('-', '')[:8] <= end_filter]
+    else:
+        # 只返回最近指定天数的数据
+        nine_turn_results = nine_turn_results[-days:] if len(nine_turn_results) > days else nine_turn_results
+    
+    # 获取股票基本信息
+    stock_name = basic_info.get('name') or ts_code
+    
+    # 统计九转信号 - 统计所有有信号的点（不只是第9天）
+    buy_signals = len([d for d in nine_turn_results if d['buy_signal'] > 0])
+    sell_signals = len([d for d in nine_turn_results if d['sell_signal'] > 0])
+    
+    # 统计完整的九转序列（第9天）
+    complete_buy_turns = len([d for d in nine_turn_results if d['buy_signal'] == 9])
+    complete_sell_turns = len([d for d in nine_turn_results if d['sell_signal'] == 9])
+    
+    print(f"[神奇九转] 成功计算{ts_code}({stock_name})的{len(nine_turn_results)}条神奇九转数据，买入信号: {buy_signals}个(完整序列{complete_buy_turns}个)，卖出信号: {sell_signals}个(完整序列{complete_sell_turns}个)")
+    
+    return {
+        'success': True,
+        'data': nine_turn_results,
+        'stock_info': {
+            'ts_code': ts_code,
+            'name': stock_name,
+            'freq': freq,
+            'total_records': len(nine_turn_results),
+            'buy_signals': buy_signals,
+            'sell_signals': sell_signals,
+            'complete_buy_turns': complete_buy_turns,
+            'complete_sell_turns': complete_sell_turns,
+            'date_range': {
+                'start': nine_turn_results[0]['trade_date'] if nine_turn_results else None,
+                'end': nine_turn_results[-1]['trade_date'] if nine_turn_results else None
+            }
+        }
+    }
+
 @app.route('/api/stock/<stock_code>/nine_turn')
 def get_stock_nine_turn(stock_code):
     """
@@ -4086,8 +3963,8 @@ def get_stock_nine_turn(stock_code):
         stock_code: 股票代码，如 000001 或 000001.SZ
         
     Query Parameters:
-        freq: 频率(日daily,分钟60min)，默认daily
-        days: 获取天数，默认200天
+        freq: 周期(daily/weekly/monthly/60min/30min/15min)，默认daily
+        days: 返回的K线数，默认200
         start_date: 开始日期 YYYY-MM-DD
         end_date: 结束日期 YYYY-MM-DD
         
@@ -4107,104 +3984,29 @@ def get_stock_nine_turn(stock_code):
             ts_code = stock_code
         
         # 获取参数
-        freq = request.args.get('freq', 'daily')  # 默认日线
+        try:
+            freq = normalize_freq(request.args.get('freq', 'daily'))  # 默认日线
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         days = request.args.get('days', 200, type=int)
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
         print(f"[神奇九转] 获取{ts_code}的神奇九转数据，频率: {freq}，天数: {days}")
         
-        # 验证股票代码是否存在
-        basic_info = safe_tushare_call(pro.stock_basic, ts_code=ts_code)
-        if basic_info.empty:
-            return jsonify({'error': '股票代码不存在'}), 404
-        
-        # 获取K线数据用于计算神奇九转
-        # 需要更多数据来确保九转计算的准确性
-        extended_days = days + 30  # 额外获取30天数据
-        
         if start_date and end_date:
-            # 使用指定的日期范围
             try:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d')
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d')
-                # 扩展开始日期以获取足够的数据进行计算
-                extended_start = start_date_obj - timedelta(days=30)
-                kline_data = safe_tushare_call(pro.daily, 
-                                             ts_code=ts_code, 
-                                             start_date=extended_start.strftime('%Y%m%d'),
-                                             end_date=end_date_obj.strftime('%Y%m%d'))
+                datetime.strptime(start_date, '%Y-%m-%d')
+                datetime.strptime(end_date, '%Y-%m-%d')
             except ValueError:
                 return jsonify({'error': '日期格式错误，请使用YYYY-MM-DD格式'}), 400
-        else:
-            # 使用默认天数
-            end_date_obj = datetime.now()
-            start_date_obj = end_date_obj - timedelta(days=extended_days)
-            kline_data = safe_tushare_call(pro.daily, 
-                                         ts_code=ts_code, 
-                                         start_date=start_date_obj.strftime('%Y%m%d'),
-                                         end_date=end_date_obj.strftime('%Y%m%d'))
-        
-        if kline_data.empty:
-            return jsonify({
-                'success': True,
-                'data': [],
-                'message': '该股票暂无K线数据',
-                'stock_info': {
-                    'ts_code': ts_code,
-                    'name': basic_info.iloc[0]['name'] if not basic_info.empty else stock_code,
-                    'freq': freq
-                }
-            })
         
-        # 按交易日期排序（从早到晚）
-        kline_data = kline_data.sort_values('trade_date')
+        try:
+            payload = build_nine_turn_payload(ts_code, freq, days, start_date, end_date)
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
         
-        # 计算神奇九转指标
-        nine_turn_results = calculate_nine_turn_indicator(kline_data)
-        
-        # 如果指定了日期范围，过滤结果
-        if start_date and end_date:
-            start_filter = start_date.replace('-', '')
-            end_filter = end_date.replace('-', '')
-            nine_turn_results = [r for r in nine_turn_results 
-                               if start_filter <= r['trade_date'].replace('-', '') <= end_filter]
-        else:
-            # 只返回最近指定天数的数据
-            nine_turn_results = nine_turn_results[-days:] if len(nine_turn_results) > days else nine_turn_results
-        
-        # 获取股票基本信息
-        stock_name = basic_info.iloc[0]['name'] if not basic_info.empty else stock_code
-        
-        # 统计九转信号 - 统计所有有信号的点（不只是第9天）
-        buy_signals = len([d for d in nine_turn_results if d['buy_signal'] > 0])
-        sell_signals = len([d for d in nine_turn_results if d['sell_signal'] > 0])
-        
-        # 统计完整的九转序列（第9天）
-        complete_buy_turns = len([d for d in nine_turn_results if d['buy_signal'] == 9])
-        complete_sell_turns = len([d for d in nine_turn_results if d['sell_signal'] == 9])
-        
-        print(f"[神奇九转] 成功计算{ts_code}({stock_name})的{len(nine_turn_results)}条神奇九转数据，买入信号: {buy_signals}个(完整序列{complete_buy_turns}个)，卖出信号: {sell_signals}个(完整序列{complete_sell_turns}个)")
-        
-        return jsonify({
-            'success': True,
-            'data': nine_turn_results,
-            'stock_info': {
-                'ts_code': ts_code,
-                'name': stock_name,
-                'freq': freq,
-                'total_records': len(nine_turn_results),
-                'buy_signals': buy_signals,
-                'sell_signals': sell_signals,
-                'complete_buy_turns': complete_buy_turns,
-                'complete_sell_turns': complete_sell_turns,
-                'date_range': {
-                    'start': nine_turn_results[0]['trade_date'] if nine_turn_results else None,
-                    'end': nine_turn_results[-1]['trade_date'] if nine_turn_results else None
-                }
-            },
-            'fetch_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        })
+        return jsonify(dict(payload, fetch_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
         
     except Exception as e:
         print(f"[神奇九转] 获取失败: {e}")
@@ -4213,111 +4015,22 @@ def get_stock_nine_turn(stock_code):
 
 def calculate_nine_turn_indicator(kline_data):
     """
-    计算神奇九转指标 - 完整序列显示版本
+    计算神奇九转指标 - 逐K线序列版本
     
-    神奇九转算法：
+    与 calculate_nine_turn 使用同一套计算（indicator_engine.nine_turn_arrays），
+    详情页K线上的九转标记与本接口的信号一致：
     1. 卖出序列（上九转）：连续N天收盘价高于4天前的收盘价，显示1-9序列
     2. 买入序列（下九转）：连续N天收盘价低于4天前的收盘价，显示1-9序列
     3. 当连续第3天达到条件时开始显示前面的1、2、3
-    4. 如果序列中断，重新开始计数
+    4. 未满9天就中断的序列清除，重新开始计数
     
     Args:
-        kline_data: K线数据DataFrame，包含trade_date, open, high, low, close, vol, amount等字段
+        kline_data: K线数据DataFrame（按交易日期升序），包含ts_code, trade_date, open, high, low, close, vol, amount等字段
         
     Returns:
         list: 包含九转指标的数据列表
     """
-    results = []
-    data_list = kline_data.to_dict('records')
-    
-    # 跟踪序列状态
-    up_sequence_count = 0    # 卖出序列计数
-    down_sequence_count = 0  # 买入序列计数
-    
-    for i, row in enumerate(data_list):
-        # 基础数据
-        result = {
-            'ts_code': row['ts_code'],
-            'trade_date': row['trade_date'],
-            'freq': 'daily',
-            'open': float(row['open']) if pd.notna(row['open']) else None,
-            'high': float(row['high']) if pd.notna(row['high']) else None,
-            'low': float(row['low']) if pd.notna(row['low']) else None,
-            'close': float(row['close']) if pd.notna(row['close']) else None,
-            'vol': float(row['vol']) if pd.notna(row['vol']) else None,
-            'amount': float(row['amount']) if pd.notna(row['amount']) else None,
-            'buy_signal': 0,     # 买入信号数字 (1-9)
-            'sell_signal': 0,    # 卖出信号数字 (1-9)
-            'nine_up_turn': None,
-            'nine_down_turn': None
-        }
-        
-        # 需要至少4天前的数据才能计算
-        if i >= 4:
-            current_close = row['close']
-            four_days_ago_close = data_list[i - 4]['close']
-            
-            if pd.notna(current_close) and pd.notna(four_days_ago_close):
-                # 检查卖出序列（收盘价 > 4天前收盘价）
-                if current_close > four_days_ago_close:
-                    up_sequence_count += 1
-                    down_sequence_count = 0  # 重置买入序列
-                    
-                    # 从第3天开始显示序列
-                    if up_sequence_count >= 3:
-                        result['sell_signal'] = up_sequence_count
-                        
-                        # 回填前面的信号
-                        start_idx = max(0, len(results) - up_sequence_count + 1)
-                        for j in range(start_idx, len(results)):
-                            if results[j]['sell_signal'] == 0:
-                                seq_num = j - start_idx + 1
-                                if seq_num <= up_sequence_count:
-                                    results[j]['sell_signal'] = seq_num
-                    
-                    # 标记第9天的特殊信号并重置序列
-                    if up_sequence_count == 9:
-                        result['nine_up_turn'] = '+9'
-                        up_sequence_count = 0  # 完成一个完整序列后重置计数器
-                
-                # 检查买入序列（收盘价 < 4天前收盘价）
-                elif current_close < four_days_ago_close:
-                    down_sequence_count += 1
-                    up_sequence_count = 0  # 重置卖出序列
-                    
-                    # 从第3天开始显示序列
-                    if down_sequence_count >= 3:
-                        result['buy_signal'] = down_sequence_count
-                        
-                        # 回填前面的信号
-                        start_idx = max(0, len(results) - down_sequence_count + 1)
-                        for j in range(start_idx, len(results)):
-                            if results[j]['buy_signal'] == 0:
-                                seq_num = j - start_idx + 1
-                                if seq_num <= down_sequence_count:
-                                    results[j]['buy_signal'] = seq_num
-                    
-                    # 标记第9天的特殊信号并重置序列
-                    if down_sequence_count == 9:
-                        result['nine_down_turn'] = '-9'
-                        down_sequence_count = 0  # 完成一个完整序列后重置计数器
-                
-                else:
-                    # 序列中断，重置计数
-                    up_sequence_count = 0
-                    down_sequence_count = 0
-            else:
-                # 数据缺失，重置计数
-                up_sequence_count = 0
-                down_sequence_count = 0
-        
-        # 保持向后兼容的字段
-        result['up_count'] = float(up_sequence_count)
-        result['down_count'] = float(down_sequence_count)
-        
-        results.append(result)
-    
-    return results
+    return nine_turn_records(kline_data)
 
 
 # 获取真实的实时数据（交易时间内调用）
@@ -4361,7 +4074,12 @@ def get_update_progress(market):
 def get_stocks_by_market(market):
     try:
         page = int(request.args.get('page', 1))
-        per_page = 500  # 每页显示500行数据
+        per_page = DEFAULT_PAGE_SIZE  # 默认每页显示500行数据
+        # 服务端排序/筛选/游标分页，均未指定时保持原来的缓存顺序分页
+        sort = request.args.get('sort')
+        filters = request.args.getlist('filter')
+        cursor = request.args.get('cursor')
+        indexed_query = bool(sort or filters or cursor or 'page_size' in request.args)
         force_refresh = request.args.get('force_refresh', 'false').lower() == 'true'
         current_date = datetime.now().strftime('%Y%m%d')
         
@@ -4494,16 +4212,29 @@ def get_stocks_by_market(market):
             all_stocks_data = cache_data['stocks']
         
         # 分页处理
-        total = len(all_stocks_data)
-        start_idx = (page - 1) * per_page
-        end_idx = start_idx + per_page
-        page_stocks = all_stocks_data[start_idx:end_idx]
+        result = None
+        if indexed_query:
+            result = market_sort_index.query(market, sort=sort, filters=filters, page=page,
+                                             page_size=request.args.get('page_size', per_page),
+                                             cursor=cursor)
+        if result is not None:
+            page_stocks = result['stocks']
+            total = result['total']
+            per_page = result['page_size']
+            page = result['offset'] // per_page + 1
+        else:
+            total = len(all_stocks_data)
+            start_idx = (page - 1) * per_page
+            end_idx = start_idx + per_page
+            page_stocks = all_stocks_data[start_idx:end_idx]
         
         return jsonify({
             'stocks': page_stocks,
             'total': total,
             'pages': (total + per_page - 1) // per_page,
             'current_page': page,
+            'page_size': per_page,
+            'next_cursor': result['next_cursor'] if result is not None else None,
             'data_status': cache_data.get('data_status', 'complete') if cache_data else 'basic_only',
             'cache_info': {
                 'last_update': cache_data.get('last_update_date', current_date) if cache_data else current_date,
@@ -4512,6 +4243,8 @@ def get_stocks_by_market(market):
             }
         })
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         print(f"获取{market}市场数据失败: {e}")
         return jsonify({'error': str(e)}), 500
@@ -4943,8 +4676,7 @@ def auto_fetch_realtime_data():
                     os.makedirs(cache_dir)
                 cache_file = os.path.join(cache_dir, 'realtime_trading_data_cache.json')
                 try:
-                    with open(cache_file, 'w', encoding='utf-8') as f:
-                        json.dump(cache_data, f, ensure_ascii=False, indent=2)
+                    write_cache_file(cache_file, cache_data)
                     
                     realtime_task_status['last_update'] = now.strftime('%Y-%m-%d %H:%M:%S')
                     realtime_task_status['success_count'] += 1
@@ -4991,6 +4723,9 @@ def start_realtime_data_scheduler():
     realtime_thread.start()
     print("实时数据定时任务已启动：交易时间每10秒获取一次实时数据")
 
+# 分时缓存任务每攒够这么多只股票保存一次
+INTRADAY_CACHE_FLUSH_SIZE = 200
+
 def auto_cache_intraday_data():
     """自动缓存分时图数据 - 工作日下午3:05执行"""
     try:
@@ -5044,6 +4779,7 @@ def auto_cache_intraday_data():
         
         cached_count = 0
         failed_count = 0
+        pending_saves = []
         
         for batch_idx in range(total_batches):
             start_idx = batch_idx * batch_size
@@ -5138,15 +4874,15 @@ def auto_cache_intraday_data():
                             print(f"处理 {stock_code} 数据行失败: {e}")
                             continue
                     
-                    # 保存到缓存
+                    # 攒够一批再保存，列式文件的索引每批只发布一次
                     if result_data:
-                        cache_saved = cache_manager.save_intraday_data(stock_code, result_data)
-                        if cache_saved:
-                            cached_count += 1
-                            print(f"成功缓存 {stock_code} 的 {len(result_data)} 条分时数据")
-                        else:
-                            failed_count += 1
-                            print(f"保存 {stock_code} 缓存失败")
+                        pending_saves.append((stock_code, result_data))
+                        if len(pending_saves) >= INTRADAY_CACHE_FLUSH_SIZE:
+                            saved = cache_manager.save_intraday_batch(pending_saves)
+                            cached_count += saved
+                            failed_count += len(pending_saves) - saved
+                            print(f"成功缓存 {saved}/{len(pending_saves)} 只股票的分时数据")
+                            pending_saves = []
                     else:
                         failed_count += 1
                         print(f"{stock_code} 没有有效的分时数据")
@@ -5162,6 +4898,12 @@ def auto_cache_intraday_data():
                 print(f"批次 {batch_idx + 1} 完成，等待 {wait_time} 秒后处理下一批...")
                 time.sleep(wait_time)
         
+        if pending_saves:
+            saved = cache_manager.save_intraday_batch(pending_saves)
+            cached_count += saved
+            failed_count += len(pending_saves) - saved
+            print(f"成功缓存 {saved}/{len(pending_saves)} 只股票的分时数据")
+        
         print(f"分时图数据缓存完成！成功: {cached_count}, 失败: {failed_count}")
         
         # 清理过期的分时图缓存
@@ -5338,98 +5080,20 @@ def auto_filter_stocks():
         print(f"开始自动筛选股票 - {now.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # 从缓存中获取所有市场的股票数据
-        all_stocks = []
-        markets = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
-        
-        for market in markets:
-            try:
-                market_data = cache_manager.load_cache_data(market)
-                if market_data and 'stocks' in market_data:
-                    all_stocks.extend(market_data['stocks'])
-            except Exception as e:
-                print(f"获取市场 {market} 数据失败: {e}")
-                continue
+        stock_index = get_market_stock_index()
         
-        if not all_stocks:
+        if not stock_index:
             print("没有可用的股票数据进行筛选")
             return
         
-        # 筛选红 3-6 股票
-        # 注意：由于量比数据可能不准确或为0，调整筛选条件
-        red_filtered_stocks = []
-        for stock in all_stocks:
-            try:
-                turnover_rate = float(stock.get('turnover_rate', 0))
-                volume_ratio = float(stock.get('volume_ratio', 0))
-                nine_turn_up = int(stock.get('nine_turn_up', 0))
-                
-                # 筛选条件：换手率>1，九转买入红色3-6
-                # 如果量比数据可用且>0，则加入量比条件
-                volume_condition = True
-                if volume_ratio > 0:
-                    volume_condition = volume_ratio > 0.8  # 降低量比要求
-                
-                if (turnover_rate > 1 and  # 降低换手率要求
-                    volume_condition and 
-                    3 <= nine_turn_up <= 6):
-                    
-                    stock_copy = stock.copy()
-                    stock_copy['filter_date'] = now.strftime('%Y-%m-%d')
-                    stock_copy['filter_time'] = now.strftime('%H:%M:%S')
-                    red_filtered_stocks.append(stock_copy)
-                    
-            except (ValueError, TypeError):
-                continue
-        
-        # 筛选绿 9 股票
-        green_filtered_stocks = []
-        for stock in all_stocks:
-            try:
-                nine_turn_down = int(stock.get('nine_turn_down', 0))
-                
-                if nine_turn_down == 9:
-                    stock_copy = stock.copy()
-                    stock_copy['filter_date'] = now.strftime('%Y-%m-%d')
-                    stock_copy['filter_time'] = now.strftime('%H:%M:%S')
-                    green_filtered_stocks.append(stock_copy)
-                    
-            except (ValueError, TypeError):
-                continue
-        
-        # 排序
-        red_filtered_stocks.sort(key=lambda x: (x.get('nine_turn_up', 0), x.get('turnover_rate', 0)), reverse=True)
-        green_filtered_stocks.sort(key=lambda x: x.get('nine_turn_down', 0), reverse=True)
-        
-        # 保存筛选结果到文件
-        cache_dir = 'cache'
-        if not os.path.exists(cache_dir):
-            os.makedirs(cache_dir)
-        
-        # 保存红色筛选结果
-        red_filter_file = os.path.join(cache_dir, 'red_filter_results.json')
-        red_filter_data = {
-            'filter_time': now.isoformat(),
-            'filter_date': now.strftime('%Y-%m-%d'),
-            'total': len(red_filtered_stocks),
-            'stocks': red_filtered_stocks
-        }
-        
-        with open(red_filter_file, 'w', encoding='utf-8') as f:
-            json.dump(red_filter_data, f, ensure_ascii=False, indent=2)
-        
-        # 保存绿色筛选结果
-        green_filter_file = os.path.join(cache_dir, 'green_filter_results.json')
-        green_filter_data = {
-            'filter_time': now.isoformat(),
-            'filter_date': now.strftime('%Y-%m-%d'),
-            'total': len(green_filtered_stocks),
-            'stocks': green_filtered_stocks
-        }
+        # 筛选红 3-6 / 绿 9 股票，只保存代码、信号和排名
+        red_rows = filter_red_stocks()
+        green_rows = filter_green_stocks()
         
-        with open(green_filter_file, 'w', encoding='utf-8') as f:
-            json.dump(green_filter_data, f, ensure_ascii=False, indent=2)
+        red_filter_file = filter_store.save('red', red_rows, now)
+        green_filter_file = filter_store.save('green', green_rows, now)
         
-        print(f"自动筛选完成 - 红色筛选: {len(red_filtered_stocks)}只, 绿色筛选: {len(green_filtered_stocks)}只")
+        print(f"自动筛选完成 - 红色筛选: {len(red_rows)}只, 绿色筛选: {len(green_rows)}只")
         print(f"筛选结果已保存到: {red_filter_file} 和 {green_filter_file}")
         
     except Exception as e:
@@ -5632,6 +5296,7 @@ def auto_update_nine_turn_all_markets():
                         market_failed += 1
                         continue
                 
+                signal_index.update_market(market, stocks_list)
                 print(f"{market_names[market]}九转序列更新完成: 成功{market_updated}只, 失败{market_failed}只")
                 total_updated += market_updated
                 total_failed += market_failed
@@ -5731,6 +5396,7 @@ def manual_update_nine_turn_all_markets():
                         market_failed += 1
                         continue
                 
+                signal_index.update_market(market, stocks_list)
                 print(f"{market_names[market]}九转序列更新完成: 成功{market_updated}只, 失败{market_failed}只")
                 total_updated += market_updated
                 total_failed += market_failed
@@ -5898,11 +5564,20 @@ def monitor_data_freshness():
     except Exception as e:
         print(f"[数据监控] 监控任务执行失败: {e}")
 
+def run_startup_integrity_check(warmup_timeout=120):
+    """启动时的数据完整性检查，等启动预热完成后再执行，避免与预热和首批请求争用"""
+    if startup_warmer.progress()['started'] and not startup_warmer.wait(warmup_timeout):
+        print(f"[启动检查] 启动预热{warmup_timeout}秒内未完成，直接开始数据完整性检查")
+    check_data_integrity_on_startup()
+
 def start_scheduler():
     """启动定时调度器"""
+    # 本进程写入市场数据，由它保存信号索引文件
+    signal_index.persist = True
+    
     # 程序启动时立即执行数据完整性检查
     print("正在执行启动时数据完整性检查...")
-    threading.Thread(target=check_data_integrity_on_startup, daemon=True).start()
+    threading.Thread(target=run_startup_integrity_check, daemon=True).start()
     
     # 设置定时任务：工作日下午5点执行数据同步
     schedule.every().monday.at("17:00").do(auto_sync_all_markets)
@@ -5969,10 +5644,111 @@ def start_scheduler():
 
 # get_akshare_retry_status路由已删除，不再使用AkShare
 
+# 可手动触发的任务（名称 -> 函数），独立任务进程按名称执行
+SCHEDULER_JOBS = {
+    'sync': auto_sync_all_markets,
+    'moneyflow': auto_update_moneyflow_data,
+    'filter': auto_filter_stocks,
+    'nine_turn': manual_update_nine_turn_all_markets,  # 不受工作日限制的手动版本
+    'intraday_cache': auto_cache_intraday_data,
+    'intraday_realtime': auto_update_intraday_realtime,
+    'data_integrity': check_data_integrity_on_startup,
+    'monitor_freshness': monitor_data_freshness
+}
+
+# 定时任务运行方式: local（Web进程中由主节点运行）/ worker（由独立任务进程 worker.py 运行）
+SCHEDULER_MODE = os.environ.get('SCHEDULER_MODE', 'local').lower()
+job_control = JobControl()
+
+# 主节点进程检查其他进程转交的手动触发命令的间隔（秒）
+JOB_COMMAND_POLL_INTERVAL = 1
+
+def scheduler_enabled():
+    return os.environ.get('SCHEDULER_ENABLED', 'true').lower() != 'false'
+
+def dispatch_job(job, message):
+    """
+    手动触发任务：worker模式下提交给独立任务进程；local模式下由定时任务主节点执行，
+    本进程不是主节点时经 job_control 转交给主节点，避免与主节点上同一任务的定时运行并发。
+    未参与主节点选举（未调用create_app或关闭了定时任务）时在本进程后台线程中执行。
+    """
+    try:
+        if SCHEDULER_MODE == 'worker':
+            command_id = job_control.submit(job)
+            worker_alive = job_control.worker_alive()
+            return jsonify({
+                'status': 'success',
+                'message': message if worker_alive else f"{message}（任务进程未运行，启动后执行）",
+                'command_id': command_id,
+                'worker_alive': worker_alive
+            })
+        
+        if _app_initialized and scheduler_enabled() and not scheduler_lock.is_leader:
+            command_id = job_control.submit(job)
+            leader = scheduler_lock.holder()
+            return jsonify({
+                'status': 'success',
+                'message': f"{message}（已转交定时任务主节点 {leader} 执行）" if leader else f"{message}（主节点选出后执行）",
+                'command_id': command_id,
+                'leader': leader
+            })
+        
+        # 在后台线程中执行任务
+        threading.Thread(target=SCHEDULER_JOBS[job], daemon=True).start()
+        return jsonify({
+            'status': 'success',
+            'message': message
+        })
+    except Exception as e:
+        return jsonify({
+            'status': 'error',
+            'message': str(e)
+        }), 500
+
+def start_job_command_listener():
+    """主节点进程：执行其他Web进程经 job_control 转交的手动触发命令"""
+    def listen():
+        while True:
+            try:
+                for command in job_control.take():
+                    job = command.get('job')
+                    if job not in SCHEDULER_JOBS:
+                        print(f"[定时任务] 未知任务: {job}")
+                        continue
+                    print(f"[定时任务] 执行转交的手动触发任务: {job}")
+                    threading.Thread(target=SCHEDULER_JOBS[job], daemon=True).start()
+            except Exception as e:
+                print(f"[定时任务] 读取手动触发命令失败: {e}")
+            time.sleep(JOB_COMMAND_POLL_INTERVAL)
+    
+    threading.Thread(target=listen, daemon=True).start()
+
+def start_leader_tasks():
+    """成为主节点后：启动定时调度器，并接收其他进程转交的手动触发命令"""
+    start_scheduler()
+    start_job_command_listener()
+
 @app.route('/api/scheduler/status')
 def get_scheduler_status():
     """获取定时任务状态"""
     try:
+        if SCHEDULER_MODE == 'worker':
+            # 定时任务在独立任务进程中运行，状态来自其定期写出的心跳
+            state = job_control.worker_state()
+            return jsonify({
+                'status': 'running' if state['worker_alive'] else 'stopped',
+                'next_run': state.get('next_run'),
+                'total_jobs': state.get('total_jobs', 0),
+                'mode': SCHEDULER_MODE,
+                'worker': {
+                    'pid': state.get('pid'),
+                    'started': state.get('started'),
+                    'heartbeat_time': state.get('heartbeat_time'),
+                    'jobs': state.get('jobs', {})
+                },
+                'pending': job_control.pending()
+            })
+        
         jobs = schedule.jobs
         next_run_time = None
         
@@ -5985,7 +5761,12 @@ def get_scheduler_status():
         return jsonify({
             'status': 'running' if jobs else 'stopped',
             'next_run': next_run_time,
-            'total_jobs': len(jobs)
+            'total_jobs': len(jobs),
+            'mode': SCHEDULER_MODE,
+            # 多进程部署时只有主节点运行定时任务，其他进程的jobs为空
+            'is_leader': scheduler_lock.is_leader,
+            'leader': scheduler_lock.holder(),
+            'pid': os.getpid()
         })
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -5993,146 +5774,42 @@ def get_scheduler_status():
 @app.route('/api/scheduler/trigger', methods=['POST'])
 def trigger_auto_sync():
     """手动触发自动同步任务"""
-    try:
-        # 在后台线程中执行同步任务
-        sync_thread = threading.Thread(target=auto_sync_all_markets, daemon=True)
-        sync_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '手动同步任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('sync', '手动同步任务已启动')
 
 @app.route('/api/scheduler/trigger_moneyflow', methods=['POST'])
 def trigger_moneyflow_update():
     """手动触发资金流向数据更新任务"""
-    try:
-        # 在后台线程中执行资金流向数据更新任务
-        moneyflow_thread = threading.Thread(target=auto_update_moneyflow_data, daemon=True)
-        moneyflow_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '资金流向数据更新任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('moneyflow', '资金流向数据更新任务已启动')
 
 @app.route('/api/scheduler/trigger_filter', methods=['POST'])
 def trigger_auto_filter():
     """手动触发自动筛选任务"""
-    try:
-        # 在后台线程中执行筛选任务
-        filter_thread = threading.Thread(target=auto_filter_stocks, daemon=True)
-        filter_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '手动筛选任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('filter', '手动筛选任务已启动')
 
 @app.route('/api/scheduler/trigger_nine_turn', methods=['POST'])
 def trigger_nine_turn_update():
     """手动触发九转序列更新任务"""
-    try:
-        # 在后台线程中执行九转序列更新任务（使用不受工作日限制的手动版本）
-        nine_turn_thread = threading.Thread(target=manual_update_nine_turn_all_markets, daemon=True)
-        nine_turn_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '九转序列更新任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('nine_turn', '九转序列更新任务已启动')
 
 @app.route('/api/scheduler/trigger_intraday_cache', methods=['POST'])
 def trigger_intraday_cache():
     """手动触发分时图缓存任务"""
-    try:
-        # 在后台线程中执行分时图缓存任务
-        cache_thread = threading.Thread(target=auto_cache_intraday_data, daemon=True)
-        cache_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '分时图缓存任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('intraday_cache', '分时图缓存任务已启动')
 
 @app.route('/api/scheduler/trigger_intraday_realtime', methods=['POST'])
 def trigger_intraday_realtime():
     """手动触发分时图实时更新任务"""
-    try:
-        # 在后台线程中执行分时图实时更新任务
-        realtime_thread = threading.Thread(target=auto_update_intraday_realtime, daemon=True)
-        realtime_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '分时图实时更新任务已启动'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('intraday_realtime', '分时图实时更新任务已启动')
 
 @app.route('/api/scheduler/check_data_integrity', methods=['POST'])
 def trigger_data_integrity_check():
     """手动触发数据完整性检查"""
-    try:
-        # 在后台线程中执行数据完整性检查
-        integrity_thread = threading.Thread(target=check_data_integrity_on_startup, daemon=True)
-        integrity_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '数据完整性检查已启动，请查看控制台日志获取详细结果'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('data_integrity', '数据完整性检查已启动，请查看控制台日志获取详细结果')
 
 @app.route('/api/scheduler/monitor_freshness', methods=['POST'])
 def trigger_freshness_monitor():
     """手动触发数据新鲜度监控"""
-    try:
-        # 在后台线程中执行数据新鲜度监控
-        monitor_thread = threading.Thread(target=monitor_data_freshness, daemon=True)
-        monitor_thread.start()
-        
-        return jsonify({
-            'status': 'success',
-            'message': '数据新鲜度监控已启动，请查看控制台日志获取详细结果'
-        })
-    except Exception as e:
-        return jsonify({
-            'status': 'error',
-            'message': str(e)
-        }), 500
+    return dispatch_job('monitor_freshness', '数据新鲜度监控已启动，请查看控制台日志获取详细结果')
 
 @app.route('/api/update_all_data', methods=['POST'])
 def update_all_data():
@@ -6311,190 +5988,273 @@ def get_watchlist_file_path():
         os.makedirs(cache_dir)
     return os.path.join(cache_dir, 'watchlist.json')
 
+# 自选股常驻内存，修改合并后异步写盘
+watchlist_service = WatchlistService(get_watchlist_file_path())
+
 def load_watchlist():
-    """加载自选股数据"""
-    watchlist_file = get_watchlist_file_path()
-    if os.path.exists(watchlist_file):
-        try:
-            with open(watchlist_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    """加载自选股数据（内存中的副本）"""
+    return watchlist_service.list()
 
 def save_watchlist(watchlist_data):
-    """保存自选股数据"""
-    watchlist_file = get_watchlist_file_path()
+    """保存自选股数据（整体替换，稍后写盘）"""
+    watchlist_service.replace_all(watchlist_data)
+    return True
+
+# 多代码查询每批的股票数（45天日线 × 100只，不超过Tushare单次返回行数上限）
+WATCHLIST_BATCH_SIZE = 100
+# 当日 daily_basic 尚未发布时，按代码回看的自然日天数（覆盖长假）
+WATCHLIST_BASIC_LOOKBACK_DAYS = 15
+
+def get_stocks_from_cache(ts_codes):
+    """批量从缓存中查找股票数据，每个市场的缓存只加载、扫描一次"""
+    codes_by_market = {}
+    for ts_code in ts_codes:
+        if ts_code.endswith('.SH'):
+            market = 'kcb' if ts_code.startswith('688') else 'hu'
+        elif ts_code.endswith('.SZ'):
+            market = 'cyb' if ts_code.startswith('300') else 'zxb'
+        elif ts_code.endswith('.BJ'):
+            market = 'bj'
+        else:
+            continue
+        codes_by_market.setdefault(market, set()).add(ts_code)
+    
+    result = {}
+    for market, codes in codes_by_market.items():
+        cache_data = load_cache_data(market)
+        if cache_data and 'stocks' in cache_data:
+            for stock in cache_data['stocks']:
+                if stock.get('ts_code') in codes:
+                    result[stock['ts_code']] = stock
+    return result
+
+def fetch_tushare_by_codes(api_func, ts_codes, **kwargs):
+    """按多代码（逗号分隔）分批调用Tushare接口并合并结果"""
+    frames = []
+    for i in range(0, len(ts_codes), WATCHLIST_BATCH_SIZE):
+        chunk = ts_codes[i:i + WATCHLIST_BATCH_SIZE]
+        df = safe_tushare_call(api_func, ts_code=','.join(chunk), **kwargs)
+        if df is not None and not df.empty:
+            frames.append(df)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def fetch_moneyflow_by_date(trade_date, ts_codes):
+    """按交易日整体获取资金流向，返回 {ts_code: 净流入额(千万元)}
+    
+    moneyflow接口一次返回当日全部股票；缺失的股票再用moneyflow_dc补一次。
+    """
+    net_amounts = {}
+    wanted = set(ts_codes)
+    
+    moneyflow_data = safe_tushare_call(pro.moneyflow, trade_date=trade_date)
+    if moneyflow_data is not None and not moneyflow_data.empty and 'net_mf_amount' in moneyflow_data.columns:
+        rows = moneyflow_data[moneyflow_data['ts_code'].isin(wanted)]
+        values = pd.to_numeric(rows['net_mf_amount'], errors='coerce').fillna(0)
+        # 万元转换为千万元
+        net_amounts.update(zip(rows['ts_code'], (values / 1000).round(2)))
+    
+    missing = wanted - set(net_amounts)
+    if missing:
+        moneyflow_dc = safe_tushare_call(pro.moneyflow_dc, trade_date=trade_date)
+        if moneyflow_dc is not None and not moneyflow_dc.empty and 'net_amount' in moneyflow_dc.columns:
+            rows = moneyflow_dc[moneyflow_dc['ts_code'].isin(missing)]
+            values = pd.to_numeric(rows['net_amount'], errors='coerce').fillna(0)
+            net_amounts.update(zip(rows['ts_code'], (values / 1000).round(2)))
+    
+    return {ts_code: float(value) for ts_code, value in net_amounts.items()}
+
+def enrich_watchlist_stocks(stocks, full_refresh=False):
+    """
+    批量补充自选股行情数据（原地修改stocks）
+    
+    每类数据只查询一次：多代码日线（分批，兼作九转计算的K线）、按交易日的
+    daily_basic和资金流向、缺名称时的stock_basic，上游调用次数与自选股数量无关
+    （100只以内）。九转优先复用市场缓存中的值，否则用已取到的日线本地计算。
+    
+    Args:
+        stocks: 自选股记录列表
+        full_refresh: True时更新所有股票的全部字段（刷新接口），
+                      False时只补充缺失的字段（列表接口）
+    
+    Returns:
+        list: 处理失败的股票 [{'ts_code', 'name', 'error'}]
+    """
+    def safe_float(value, default=0.0):
+        try:
+            if value is None or pd.isna(value):
+                return default
+            return float(value)
+        except (ValueError, TypeError):
+            return default
+    
+    if not stocks:
+        return []
+    
+    if full_refresh:
+        targets = list(stocks)
+    else:
+        targets = [stock for stock in stocks if (
+            not stock.get('name') or
+            stock.get('latest_price', 0) == 0 or
+            stock.get('turnover_rate', 0) == 0 or
+            stock.get('volume_ratio', 0) == 0 or
+            stock.get('pe', 0) == 0
+        )]
+    if not targets:
+        return []
+    
+    ts_codes = [stock['ts_code'] for stock in targets]
+    cached_stocks = get_stocks_from_cache(ts_codes)
+    failed_stocks = []
+    
+    # 名称和行业：优先用缓存，其余一次查询
+    missing_names = [stock['ts_code'] for stock in targets
+                     if not stock.get('name') and not cached_stocks.get(stock['ts_code'], {}).get('name')]
+    basic_mapping = {}
+    if missing_names:
+        try:
+            basic_data = fetch_tushare_by_codes(pro.stock_basic, missing_names)
+            if not basic_data.empty:
+                basic_mapping = basic_data.set_index('ts_code').to_dict('index')
+        except Exception as e:
+            print(f"批量获取股票基本信息失败: {e}")
+    
+    # 最近45天日线：最新一行是行情，整段用于计算九转
+    end_date = datetime.now().strftime('%Y%m%d')
+    start_date = (datetime.now() - timedelta(days=45)).strftime('%Y%m%d')
     try:
-        with open(watchlist_file, 'w', encoding='utf-8') as f:
-            json.dump(watchlist_data, f, ensure_ascii=False, indent=2)
-        return True
-    except:
-        return False
+        daily_data = fetch_tushare_by_codes(pro.daily, ts_codes, start_date=start_date, end_date=end_date)
+    except Exception as e:
+        print(f"批量获取日线数据失败: {e}")
+        daily_data = pd.DataFrame()
+    
+    history_by_code = {}
+    latest_by_code = {}
+    if not daily_data.empty:
+        daily_data = daily_data.sort_values(['ts_code', 'trade_date'])
+        for ts_code, history in daily_data.groupby('ts_code', sort=False):
+            history_by_code[ts_code] = history.reset_index(drop=True)
+            latest_by_code[ts_code] = history.iloc[-1]
+        trade_date = daily_data['trade_date'].max()
+    else:
+        trade_date = get_latest_trading_day()
+    
+    # 基本面：按交易日一次获取全部股票
+    basic_by_code = {}
+    try:
+        daily_basic = safe_tushare_call(pro.daily_basic, trade_date=trade_date)
+        if daily_basic is not None and not daily_basic.empty:
+            daily_basic = daily_basic[daily_basic['ts_code'].isin(set(ts_codes))]
+            basic_by_code = daily_basic.set_index('ts_code').to_dict('index')
+    except Exception as e:
+        print(f"批量获取基本面数据失败: {e}")
+    
+    # daily_basic 比 daily 晚几个小时发布：当日没有数据的股票按代码取最近几天，保留每只股票最新的一行
+    missing_basic = [ts_code for ts_code in ts_codes if ts_code not in basic_by_code]
+    if missing_basic:
+        try:
+            basic_start = (datetime.strptime(trade_date, '%Y%m%d') - timedelta(days=WATCHLIST_BASIC_LOOKBACK_DAYS)).strftime('%Y%m%d')
+            recent_basic = fetch_tushare_by_codes(pro.daily_basic, missing_basic, start_date=basic_start, end_date=trade_date)
+            if not recent_basic.empty:
+                recent_basic = recent_basic.sort_values(['ts_code', 'trade_date']).drop_duplicates('ts_code', keep='last')
+                basic_by_code.update(recent_basic.set_index('ts_code').to_dict('index'))
+        except Exception as e:
+            print(f"按代码获取最近基本面数据失败: {e}")
+    
+    # 资金流向：缓存中有当日数据的直接使用，其余按交易日一次获取
+    net_mf_amounts = {}
+    need_moneyflow = []
+    for stock in targets:
+        ts_code = stock['ts_code']
+        if not full_refresh and stock.get('net_mf_amount', 0) != 0:
+            continue
+        cached_stock = cached_stocks.get(ts_code)
+        cache_date = cached_stock.get('cache_date') if cached_stock else None
+        if cache_date == trade_date and cached_stock.get('net_mf_amount') is not None:
+            net_mf_amounts[ts_code] = safe_float(cached_stock.get('net_mf_amount'))
+        else:
+            need_moneyflow.append(ts_code)
+    if need_moneyflow:
+        try:
+            net_mf_amounts.update(fetch_moneyflow_by_date(trade_date, need_moneyflow))
+        except Exception as e:
+            print(f"批量获取资金流向失败: {e}")
+    
+    for stock in targets:
+        ts_code = stock['ts_code']
+        try:
+            cached_stock = cached_stocks.get(ts_code) or {}
+            
+            if not stock.get('name'):
+                info = basic_mapping.get(ts_code) or cached_stock
+                stock['name'] = info.get('name') or ts_code[:6]  # 获取失败时使用股票代码作为名称
+                if not stock.get('industry') or stock.get('industry') == '-':
+                    stock['industry'] = info.get('industry') or '-'
+            
+            latest = latest_by_code.get(ts_code)
+            if latest is not None:
+                stock['latest_price'] = safe_float(latest['close'])
+                stock['pct_chg'] = safe_float(latest.get('pct_chg'))
+                stock['amount'] = safe_float(latest.get('amount'))
+                if full_refresh:
+                    stock['vol'] = safe_float(latest.get('vol'))
+            
+            basic = basic_by_code.get(ts_code)
+            if basic:
+                for field, column in (('turnover_rate', 'turnover_rate'), ('pe', 'pe_ttm'),
+                                      ('total_mv', 'total_mv'), ('volume_ratio', 'volume_ratio')):
+                    value = basic.get(column)
+                    if value is not None and not pd.isna(value):
+                        stock[field] = float(value)
+                if full_refresh:
+                    stock['circ_mv'] = safe_float(basic.get('circ_mv'))
+                    stock['pb'] = safe_float(basic.get('pb'))
+            
+            # 量比仍为0时使用缓存中的值
+            if stock.get('volume_ratio', 0) == 0 and cached_stock.get('volume_ratio', 0) > 0:
+                stock['volume_ratio'] = float(cached_stock['volume_ratio'])
+            
+            if ts_code in net_mf_amounts:
+                stock['net_mf_amount'] = net_mf_amounts[ts_code]
+            else:
+                stock.setdefault('net_mf_amount', 0)
+            
+            # 九转：刷新时用最新K线重新计算，否则优先使用缓存
+            if full_refresh or (stock.get('nine_turn_up', 0) == 0 and stock.get('nine_turn_down', 0) == 0):
+                cached_up = cached_stock.get('nine_turn_up', 0)
+                cached_down = cached_stock.get('nine_turn_down', 0)
+                history = history_by_code.get(ts_code)
+                if not full_refresh and (cached_up > 0 or cached_down > 0):
+                    stock['nine_turn_up'] = int(cached_up)
+                    stock['nine_turn_down'] = int(cached_down)
+                elif history is not None and len(history) >= 5:
+                    latest_nine_turn = calculate_nine_turn(history).iloc[-1]
+                    stock['nine_turn_up'] = max(int(latest_nine_turn['nine_turn_up']), 0)
+                    stock['nine_turn_down'] = max(int(latest_nine_turn['nine_turn_down']), 0)
+        
+        except Exception as e:
+            print(f"补充股票 {ts_code} 数据失败: {e}")
+            failed_stocks.append({
+                'ts_code': ts_code,
+                'name': stock.get('name', ''),
+                'error': str(e)
+            })
+    
+    print(f"批量补充自选股数据完成: {len(targets)}只股票，交易日 {trade_date}，失败 {len(failed_stocks)}只")
+    return failed_stocks
 
 @app.route('/api/watchlist')
 def get_watchlist():
     """获取自选股列表"""
     try:
         watchlist_data = load_watchlist()
+        snapshot = [dict(stock) for stock in watchlist_data]
         
-        # 为每只股票补充基本信息
-        for stock in watchlist_data:
-            ts_code = stock['ts_code']
-            
-            # 如果股票名称为空，尝试获取基本信息
-            if not stock.get('name') or stock.get('name') == '':
-                try:
-                    # 获取股票基本信息
-                    stock_basic = safe_tushare_call(pro.stock_basic, ts_code=ts_code)
-                    if not stock_basic.empty:
-                        stock['name'] = stock_basic.iloc[0]['name']
-                        stock['industry'] = stock_basic.iloc[0].get('industry', '-')
-                        print(f"补充股票基本信息: {ts_code} - {stock['name']}")
-                except Exception as e:
-                    print(f"获取股票 {ts_code} 基本信息失败: {e}")
-                    # 如果获取失败，设置默认值
-                    if not stock.get('name'):
-                        stock['name'] = ts_code[:6]  # 使用股票代码作为名称
-                    if not stock.get('industry'):
-                        stock['industry'] = '-'
-            
-            # 获取或更新股票的完整数据
-            need_update = (
-                stock.get('latest_price', 0) == 0 or 
-                stock.get('turnover_rate', 0) == 0 or 
-                stock.get('volume_ratio', 0) == 0 or 
-                stock.get('pe', 0) == 0
-            )
-            
-            if need_update:
-                try:
-                    # 获取最新交易数据
-                    latest_data = safe_tushare_call(pro.daily, ts_code=ts_code, limit=1)
-                    if not latest_data.empty:
-                        stock['latest_price'] = float(latest_data.iloc[0]['close'])
-                        stock['pct_chg'] = float(latest_data.iloc[0].get('pct_chg', 0))
-                        stock['amount'] = float(latest_data.iloc[0].get('amount', 0))
-                        
-                        # 获取量比数据（如果available）
-                        if 'vol_ratio' in latest_data.columns:
-                            stock['volume_ratio'] = float(latest_data.iloc[0].get('vol_ratio', 0))
-                        
-                        print(f"补充股票价格信息: {ts_code} - ¥{stock['latest_price']}")
-                    
-                    # 获取基本面数据（换手率、市盈率等）
-                    daily_basic = safe_tushare_call(pro.daily_basic, ts_code=ts_code, limit=1)
-                    if not daily_basic.empty:
-                        # 更新换手率
-                        if 'turnover_rate' in daily_basic.columns:
-                            turnover_rate = daily_basic.iloc[0]['turnover_rate']
-                            if turnover_rate is not None and not pd.isna(turnover_rate):
-                                stock['turnover_rate'] = float(turnover_rate)
-                        
-                        # 更新市盈率
-                        if 'pe_ttm' in daily_basic.columns:
-                            pe = daily_basic.iloc[0]['pe_ttm']
-                            if pe is not None and not pd.isna(pe):
-                                stock['pe'] = float(pe)
-                        
-                        # 更新市值
-                        if 'total_mv' in daily_basic.columns:
-                            total_mv = daily_basic.iloc[0]['total_mv']
-                            if total_mv is not None and not pd.isna(total_mv):
-                                stock['total_mv'] = float(total_mv)
-                        
-                        print(f"补充股票技术指标: {ts_code} - 换手率:{stock.get('turnover_rate', 0):.2f}%, PE:{stock.get('pe', 0):.2f}")
-                    
-                    # 如果量比还是0，尝试从实时数据获取
-                    if stock.get('volume_ratio', 0) == 0:
-                        try:
-                            # 尝试获取实时数据中的量比
-                            cached_stock = get_stock_from_cache(ts_code)
-                            if cached_stock and cached_stock.get('volume_ratio', 0) > 0:
-                                stock['volume_ratio'] = float(cached_stock['volume_ratio'])
-                                print(f"从缓存获取量比: {ts_code} - {stock['volume_ratio']:.2f}")
-                        except Exception as e:
-                            print(f"从缓存获取量比失败: {e}")
-                    
-                    # 获取净流入额数据
-                    if stock.get('net_mf_amount', 0) == 0:
-                        try:
-                            # 首先尝试从缓存获取
-                            cached_stock = get_stock_from_cache(ts_code)
-                            latest_trade_date = get_latest_trading_day()
-                            cache_date = cached_stock.get('cache_date') if cached_stock else None
-                            
-                            if (cache_date == latest_trade_date and 
-                                cached_stock and 
-                                cached_stock.get('net_mf_amount') is not None):
-                                stock['net_mf_amount'] = float(cached_stock.get('net_mf_amount', 0))
-                                print(f"从缓存获取净流入额: {ts_code} - {stock['net_mf_amount']:.2f}千万元")
-                            else:
-                                # 从API获取净流入额数据
-                                print(f"获取净流入额数据: {ts_code} - 交易日期: {latest_trade_date}")
-                                moneyflow_data = safe_tushare_call(pro.moneyflow, ts_code=ts_code, trade_date=latest_trade_date)
-                                
-                                if moneyflow_data is None or moneyflow_data.empty:
-                                    # 如果moneyflow没有数据，尝试moneyflow_dc接口
-                                    moneyflow_data = safe_tushare_call(pro.moneyflow_dc, ts_code=ts_code, trade_date=latest_trade_date)
-                                
-                                if moneyflow_data is not None and not moneyflow_data.empty:
-                                    # 检查是否是moneyflow_dc接口的数据（包含net_amount字段）
-                                    if 'net_amount' in moneyflow_data.columns:
-                                        try:
-                                            net_amount_wan = float(moneyflow_data.iloc[0]['net_amount']) if pd.notna(moneyflow_data.iloc[0]['net_amount']) else 0  # 万元
-                                            stock['net_mf_amount'] = round(net_amount_wan / 1000, 2)  # 转换为千万元
-                                        except (ValueError, TypeError):
-                                            stock['net_mf_amount'] = 0
-                                    # 检查是否是moneyflow接口的数据（包含net_mf_amount字段）
-                                    elif 'net_mf_amount' in moneyflow_data.columns:
-                                        try:
-                                            net_mf_amount_wan = float(moneyflow_data.iloc[0]['net_mf_amount']) if pd.notna(moneyflow_data.iloc[0]['net_mf_amount']) else 0  # 万元
-                                            stock['net_mf_amount'] = round(net_mf_amount_wan / 1000, 2)  # 转换为千万元
-                                        except (ValueError, TypeError):
-                                            stock['net_mf_amount'] = 0
-                                    
-                                    print(f"API获取净流入额: {ts_code} - {stock['net_mf_amount']:.2f}千万元")
-                                else:
-                                    stock['net_mf_amount'] = 0
-                        except Exception as e:
-                            print(f"获取净流入额失败: {e}")
-                            stock['net_mf_amount'] = 0
-                    
-                    # 获取九转数据
-                    if (stock.get('nine_turn_up', 0) == 0 and stock.get('nine_turn_down', 0) == 0):
-                        try:
-                            # 首先尝试从缓存获取
-                            cached_stock = get_stock_from_cache(ts_code)
-                            if (cached_stock and 
-                                (cached_stock.get('nine_turn_up', 0) > 0 or cached_stock.get('nine_turn_down', 0) > 0)):
-                                stock['nine_turn_up'] = int(cached_stock.get('nine_turn_up', 0))
-                                stock['nine_turn_down'] = int(cached_stock.get('nine_turn_down', 0))
-                                print(f"从缓存获取九转数据: {ts_code} - 上涨:{stock['nine_turn_up']}, 下跌:{stock['nine_turn_down']}")
-                            else:
-                                # 从API计算九转数据
-                                kline_data = safe_tushare_call(pro.daily, ts_code=ts_code, limit=30)  # 获取30天数据用于计算九转
-                                if kline_data is not None and not kline_data.empty:
-                                    # 计算九转序列
-                                    kline_with_nine_turn = calculate_nine_turn(kline_data)
-                                    if not kline_with_nine_turn.empty:
-                                        latest_nine_turn = kline_with_nine_turn.iloc[-1]
-                                        stock['nine_turn_up'] = int(latest_nine_turn['nine_turn_up']) if latest_nine_turn['nine_turn_up'] > 0 else 0
-                                        stock['nine_turn_down'] = int(latest_nine_turn['nine_turn_down']) if latest_nine_turn['nine_turn_down'] > 0 else 0
-                                        print(f"计算九转数据: {ts_code} - 上涨:{stock['nine_turn_up']}, 下跌:{stock['nine_turn_down']}")
-                                else:
-                                    stock['nine_turn_up'] = 0
-                                    stock['nine_turn_down'] = 0
-                        except Exception as e:
-                            print(f"获取九转数据失败: {e}")
-                            stock['nine_turn_up'] = 0
-                            stock['nine_turn_down'] = 0
-                    
-                except Exception as e:
-                    print(f"获取股票 {ts_code} 完整数据失败: {e}")
+        # 批量补充缺失的基本信息和行情数据
+        enrich_watchlist_stocks(watchlist_data)
         
-        # 保存更新后的数据
-        save_watchlist(watchlist_data)
+        # 保存补充的数据（只合并变化的字段，且只合并到仍在自选股中的股票）
+        watchlist_service.merge_changes(snapshot, watchlist_data)
         
         return jsonify({
             'success': True,
@@ -6517,46 +6277,17 @@ def add_to_watchlist():
                 'message': '缺少必要参数'
             }), 400
         
-        watchlist_data = load_watchlist()
-        
-        # 检查是否已存在
-        for stock in watchlist_data:
-            if stock['ts_code'] == data['ts_code']:
-                return jsonify({
-                    'success': False,
-                    'message': '该股票已在自选股中'
-                })
-        
-        # 添加新股票
-        new_stock = {
-            'ts_code': data['ts_code'],
-            'name': data.get('name', ''),
-            'latest_price': data.get('latest_price', 0),
-            'pct_chg': data.get('pct_chg', 0),
-            'industry': data.get('industry', '-'),
-            'volume_ratio': data.get('volume_ratio', 0),
-            'pe': data.get('pe', 0),
-            'amount': data.get('amount', 0),
-            'total_mv': data.get('total_mv', 0),
-            'nine_turn_up': data.get('nine_turn_up', 0),
-            'nine_turn_down': data.get('nine_turn_down', 0),
-            'priority': data.get('priority', 'green'),  # 默认绿色优先级
-            'note': data.get('note', ''),  # 默认备注为空
-            'add_time': data.get('add_time', datetime.now().isoformat())
-        }
-        
-        watchlist_data.append(new_stock)
-        
-        if save_watchlist(watchlist_data):
-            return jsonify({
-                'success': True,
-                'message': '添加成功'
-            })
-        else:
+        # 添加新股票（已存在时不重复添加）
+        if not watchlist_service.add(build_watchlist_entry(data)):
             return jsonify({
                 'success': False,
-                'message': '保存失败'
-            }), 500
+                'message': '该股票已在自选股中'
+            })
+        
+        return jsonify({
+            'success': True,
+            'message': '添加成功'
+        })
             
     except Exception as e:
         return jsonify({
@@ -6575,28 +6306,17 @@ def remove_from_watchlist():
                 'message': '缺少必要参数'
             }), 400
         
-        watchlist_data = load_watchlist()
-        original_length = len(watchlist_data)
-        
         # 移除指定股票
-        watchlist_data = [stock for stock in watchlist_data if stock['ts_code'] != data['ts_code']]
-        
-        if len(watchlist_data) == original_length:
+        if not watchlist_service.remove(data['ts_code']):
             return jsonify({
                 'success': False,
                 'message': '股票不在自选股中'
             })
         
-        if save_watchlist(watchlist_data):
-            return jsonify({
-                'success': True,
-                'message': '移除成功'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '保存失败'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': '移除成功'
+        })
             
     except Exception as e:
         return jsonify({
@@ -6608,16 +6328,11 @@ def remove_from_watchlist():
 def clear_watchlist():
     """清空自选股"""
     try:
-        if save_watchlist([]):
-            return jsonify({
-                'success': True,
-                'message': '清空成功'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '清空失败'
-            }), 500
+        watchlist_service.clear()
+        return jsonify({
+            'success': True,
+            'message': '清空成功'
+        })
             
     except Exception as e:
         return jsonify({
@@ -6637,39 +6352,23 @@ def update_watchlist_priority():
             }), 400
         
         # 验证优先级值
-        valid_priorities = ['purple', 'red', 'green', 'holding', 'sold']
-        if data['priority'] not in valid_priorities:
+        if data['priority'] not in VALID_PRIORITIES:
             return jsonify({
                 'success': False,
                 'message': '无效的优先级值'
             }), 400
         
-        watchlist_data = load_watchlist()
-        
         # 查找并更新股票优先级
-        stock_found = False
-        for stock in watchlist_data:
-            if stock['ts_code'] == data['ts_code']:
-                stock['priority'] = data['priority']
-                stock_found = True
-                break
-        
-        if not stock_found:
+        if not watchlist_service.update(data['ts_code'], {'priority': data['priority']}):
             return jsonify({
                 'success': False,
                 'message': '股票不在自选股中'
             })
         
-        if save_watchlist(watchlist_data):
-            return jsonify({
-                'success': True,
-                'message': '优先级更新成功'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '保存失败'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': '优先级更新成功'
+        })
             
     except Exception as e:
         return jsonify({
@@ -6690,33 +6389,20 @@ def update_watchlist_note():
         
         note = data.get('note', '').strip()
         
-        watchlist_data = load_watchlist()
-        
         # 查找并更新股票备注
-        stock_found = False
-        for stock in watchlist_data:
-            if stock['ts_code'] == data['ts_code']:
-                stock['note'] = note
-                stock['note_update_time'] = datetime.now().isoformat()
-                stock_found = True
-                break
-        
-        if not stock_found:
+        if not watchlist_service.update(data['ts_code'], {
+            'note': note,
+            'note_update_time': datetime.now().isoformat()
+        }):
             return jsonify({
                 'success': False,
                 'message': '股票不在自选股中'
             })
         
-        if save_watchlist(watchlist_data):
-            return jsonify({
-                'success': True,
-                'message': '备注更新成功'
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '保存失败'
-            }), 500
+        return jsonify({
+            'success': True,
+            'message': '备注更新成功'
+        })
             
     except Exception as e:
         return jsonify({
@@ -6735,18 +6421,16 @@ def check_watchlist_status():
                 'message': '缺少股票代码参数'
             }), 400
         
-        watchlist_data = load_watchlist()
-        
-        # 检查股票是否在自选股中
-        for stock in watchlist_data:
-            if stock['ts_code'] == ts_code:
-                return jsonify({
-                    'success': True,
-                    'in_watchlist': True,
-                    'priority': stock.get('priority', 'green'),
-                    'note': stock.get('note', ''),
-                    'add_time': stock.get('add_time', '')
-                })
+        # 按代码索引查找
+        stock = watchlist_service.get(ts_code)
+        if stock is not None:
+            return jsonify({
+                'success': True,
+                'in_watchlist': True,
+                'priority': stock.get('priority', 'green'),
+                'note': stock.get('note', ''),
+                'add_time': stock.get('add_time', '')
+            })
         
         return jsonify({
             'success': True,
@@ -6759,17 +6443,45 @@ def check_watchlist_status():
             'message': str(e)
         }), 500
 
+@app.route('/api/watchlist/bulk', methods=['POST'])
+def bulk_update_watchlist():
+    """批量增删改自选股，一次请求处理多只股票
+    
+    请求体: {"operations": [
+        {"action": "add", "ts_code": "000001.SZ", "name": "平安银行", ...},
+        {"action": "remove", "ts_code": "600000.SH"},
+        {"action": "update", "ts_code": "300750.SZ", "priority": "red", "note": "..."}
+    ]}
+    """
+    try:
+        data = request.get_json()
+        operations = data.get('operations') if data else None
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                'success': False,
+                'message': '缺少必要参数'
+            }), 400
+        
+        results = watchlist_service.apply_bulk(operations)
+        success_count = sum(1 for result in results if result['success'])
+        
+        return jsonify({
+            'success': True,
+            'message': f"成功处理 {success_count} 项，失败 {len(results) - success_count} 项",
+            'success_count': success_count,
+            'failed_count': len(results) - success_count,
+            'results': results
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'message': str(e)
+        }), 500
+
 @app.route('/api/watchlist/refresh', methods=['POST'])
 def refresh_watchlist():
     """刷新自选股数据，获取最新的换手率、市盈率和市值"""
-    def safe_float(value, default=0.0):
-        try:
-            if value is None or pd.isna(value):
-                return default
-            return float(value)
-        except (ValueError, TypeError):
-            return default
-    
     try:
         watchlist_data = load_watchlist()
         if not watchlist_data:
@@ -6777,205 +6489,53 @@ def refresh_watchlist():
                 'success': False,
                 'message': '自选股列表为空'
             })
+        snapshot = [dict(stock) for stock in watchlist_data]
         
-        updated_count = 0
-        failed_stocks = []
+        # 所有股票一起批量获取
+        failed_stocks = enrich_watchlist_stocks(watchlist_data, full_refresh=True)
+        failed_codes = {item['ts_code'] for item in failed_stocks}
         
+        refresh_time = datetime.now().isoformat()
         for stock in watchlist_data:
-            try:
-                ts_code = stock['ts_code']
-                print(f"正在更新自选股: {ts_code} {stock.get('name', '')}")
-                
-                # 获取最新的基本面数据
-                daily_basic = safe_tushare_call(pro.daily_basic, ts_code=ts_code, limit=1)
-                latest_data = safe_tushare_call(pro.daily, ts_code=ts_code, limit=1)
-                
-                if not daily_basic.empty:
-                    # 更新换手率
-                    if 'turnover_rate' in daily_basic.columns:
-                        turnover_rate = safe_float(daily_basic.iloc[0]['turnover_rate'])
-                        stock['turnover_rate'] = turnover_rate
-                    
-                    # 更新市盈率
-                    if 'pe_ttm' in daily_basic.columns:
-                        pe = safe_float(daily_basic.iloc[0]['pe_ttm'])
-                        stock['pe'] = pe
-                    
-                    # 更新市值
-                    if 'total_mv' in daily_basic.columns:
-                        total_mv = safe_float(daily_basic.iloc[0]['total_mv'])
-                        stock['total_mv'] = total_mv
-                    
-                    # 更新流通市值
-                    if 'circ_mv' in daily_basic.columns:
-                        circ_mv = safe_float(daily_basic.iloc[0]['circ_mv'])
-                        stock['circ_mv'] = circ_mv
-                    
-                    # 更新市净率
-                    if 'pb' in daily_basic.columns:
-                        pb = safe_float(daily_basic.iloc[0]['pb'])
-                        stock['pb'] = pb
-                
-                # 更新最新价格和成交额
-                if not latest_data.empty:
-                    stock['latest_price'] = safe_float(latest_data.iloc[0]['close'])
-                    stock['amount'] = safe_float(latest_data.iloc[0]['amount'])
-                    
-                    # 更新涨跌幅
-                    if 'pct_chg' in latest_data.columns:
-                        stock['pct_chg'] = safe_float(latest_data.iloc[0]['pct_chg'])
-                    
-                    # 更新量比
-                    if 'vol_ratio' in latest_data.columns:
-                        stock['volume_ratio'] = safe_float(latest_data.iloc[0]['vol_ratio'])
-                    
-                    # 更新成交量
-                    if 'vol' in latest_data.columns:
-                        stock['vol'] = safe_float(latest_data.iloc[0]['vol'])
-                
-                # 获取净流入额数据
-                net_mf_amount = 0
-                try:
-                    # 优先从缓存获取净流入数据
-                    cached_stock = get_stock_from_cache(ts_code)
-                    if cached_stock:
-                        current_date = datetime.now().strftime('%Y%m%d')
-                        cache_date = cached_stock.get('last_update', '')
-                        if cache_date == current_date and cached_stock.get('net_mf_amount') is not None:
-                            net_mf_amount = safe_float(cached_stock.get('net_mf_amount', 0))
-                            print(f"从缓存获取{ts_code}的净流入数据: {net_mf_amount}千万元")
-                        else:
-                            # 缓存中没有当天数据，通过API获取
-                            print(f"缓存中无当天净流入数据，正在通过API获取{ts_code}的资金流向数据...")
-                            
-                            # 尝试获取资金流向数据
-                            moneyflow_data = None
-                            try:
-                                # 优先尝试moneyflow接口
-                                moneyflow_data = safe_tushare_call(pro.moneyflow, ts_code=ts_code, limit=1)
-                                if moneyflow_data is None or moneyflow_data.empty:
-                                    # 如果moneyflow没有数据，尝试moneyflow_dc接口
-                                    moneyflow_data = safe_tushare_call(pro.moneyflow_dc, ts_code=ts_code, limit=1)
-                            except Exception as e:
-                                print(f"获取{ts_code}资金流向数据失败: {e}")
-                            
-                            if moneyflow_data is not None and not moneyflow_data.empty:
-                                # 检查是否是moneyflow_dc接口的数据（包含net_amount字段）
-                                if 'net_amount' in moneyflow_data.columns:
-                                    net_amount_wan = safe_float(moneyflow_data.iloc[0]['net_amount'])  # 万元
-                                    net_mf_amount = round(net_amount_wan / 1000, 2)  # 转换为千万元
-                                # 检查是否是moneyflow接口的数据（包含net_mf_amount字段）
-                                elif 'net_mf_amount' in moneyflow_data.columns:
-                                    net_mf_amount_wan = safe_float(moneyflow_data.iloc[0]['net_mf_amount'])  # 万元
-                                    net_mf_amount = round(net_mf_amount_wan / 1000, 2)  # 转换为千万元
-                                
-                                print(f"API获取{ts_code}净流入额: {net_mf_amount}千万元")
-                    else:
-                        # 没有缓存数据，直接通过API获取
-                        print(f"无缓存数据，正在通过API获取{ts_code}的资金流向数据...")
-                        
-                        # 尝试获取资金流向数据
-                        moneyflow_data = None
-                        try:
-                            # 优先尝试moneyflow接口
-                            moneyflow_data = safe_tushare_call(pro.moneyflow, ts_code=ts_code, limit=1)
-                            if moneyflow_data is None or moneyflow_data.empty:
-                                # 如果moneyflow没有数据，尝试moneyflow_dc接口
-                                moneyflow_data = safe_tushare_call(pro.moneyflow_dc, ts_code=ts_code, limit=1)
-                        except Exception as e:
-                            print(f"获取{ts_code}资金流向数据失败: {e}")
-                        
-                        if moneyflow_data is not None and not moneyflow_data.empty:
-                            # 检查是否是moneyflow_dc接口的数据（包含net_amount字段）
-                            if 'net_amount' in moneyflow_data.columns:
-                                net_amount_wan = safe_float(moneyflow_data.iloc[0]['net_amount'])  # 万元
-                                net_mf_amount = round(net_amount_wan / 1000, 2)  # 转换为千万元
-                            # 检查是否是moneyflow接口的数据（包含net_mf_amount字段）
-                            elif 'net_mf_amount' in moneyflow_data.columns:
-                                net_mf_amount_wan = safe_float(moneyflow_data.iloc[0]['net_mf_amount'])  # 万元
-                                net_mf_amount = round(net_mf_amount_wan / 1000, 2)  # 转换为千万元
-                            
-                            print(f"API获取{ts_code}净流入额: {net_mf_amount}千万元")
-                except Exception as e:
-                    print(f"获取股票 {ts_code} 净流入额失败: {e}")
-                    net_mf_amount = stock.get('net_mf_amount', 0)  # 保持原值或设为0
-                
-                stock['net_mf_amount'] = net_mf_amount
-                
-                # 计算九转序列（使用正确的算法）
-                nine_turn_up = 0
-                nine_turn_down = 0
-                try:
-                    # 获取最近30天的K线数据用于计算九转序列
-                    end_date = datetime.now().strftime('%Y%m%d')
-                    start_date = (datetime.now() - timedelta(days=45)).strftime('%Y%m%d')
-                    kline_data = safe_tushare_call(pro.daily, ts_code=ts_code, start_date=start_date, end_date=end_date)
-                    
-                    if not kline_data.empty and len(kline_data) >= 5:
-                        kline_data = kline_data.sort_values('trade_date')
-                        kline_with_nine_turn = calculate_nine_turn(kline_data)
-                        # 获取最新一天的九转序列数据
-                        latest_nine_turn = kline_with_nine_turn.iloc[-1]
-                        nine_turn_up = int(latest_nine_turn['nine_turn_up']) if latest_nine_turn['nine_turn_up'] > 0 else 0
-                        nine_turn_down = int(latest_nine_turn['nine_turn_down']) if latest_nine_turn['nine_turn_down'] > 0 else 0
-                except Exception as e:
-                    print(f"计算股票 {ts_code} 九转序列失败: {e}")
-                    # 如果计算失败，保持原值或设为0
-                    nine_turn_up = stock.get('nine_turn_up', 0)
-                    nine_turn_down = stock.get('nine_turn_down', 0)
-                
-                stock['nine_turn_up'] = nine_turn_up
-                stock['nine_turn_down'] = nine_turn_down
-                
-                # 如果备注包含日期信息，且九转数据有值，则更新备注
-                current_note = stock.get('note', '')
-                if current_note:
-                    # 提取日期部分（如"2日"）
-                    import re
-                    date_match = re.match(r'(\d+日)', current_note)
-                    if date_match and (nine_turn_up > 0 or nine_turn_down > 0):
-                        date_part = date_match.group(1)
-                        # 重新生成备注
-                        new_note = date_part
-                        if nine_turn_up > 0:
-                            new_note += f' 红{nine_turn_up}'
-                        if nine_turn_down > 0:
-                            new_note += f' 绿{nine_turn_down}'
-                        stock['note'] = new_note
-                        print(f"更新股票 {ts_code} 备注: {current_note} -> {new_note}")
-                
-                # 更新时间戳
-                stock['last_refresh'] = datetime.now().isoformat()
-                updated_count += 1
-                
-            except Exception as e:
-                error_msg = str(e)
-                print(f"更新股票 {ts_code} 失败: {error_msg}")
-                failed_stocks.append({
-                    'ts_code': ts_code,
-                    'name': stock.get('name', ''),
-                    'error': error_msg
-                })
+            if stock['ts_code'] in failed_codes:
                 continue
-        
-        # 保存更新后的数据
-        if save_watchlist(watchlist_data):
-            message = f"成功更新 {updated_count} 只股票"
-            if failed_stocks:
-                message += f"，{len(failed_stocks)} 只股票更新失败"
             
-            return jsonify({
-                'success': True,
-                'message': message,
-                'updated_count': updated_count,
-                'failed_count': len(failed_stocks),
-                'failed_stocks': failed_stocks
-            })
-        else:
-            return jsonify({
-                'success': False,
-                'message': '保存数据失败'
-            }), 500
+            # 如果备注包含日期信息，且九转数据有值，则更新备注
+            nine_turn_up = stock.get('nine_turn_up', 0)
+            nine_turn_down = stock.get('nine_turn_down', 0)
+            current_note = stock.get('note', '')
+            if current_note:
+                # 提取日期部分（如"2日"）
+                date_match = re.match(r'(\d+日)', current_note)
+                if date_match and (nine_turn_up > 0 or nine_turn_down > 0):
+                    # 重新生成备注
+                    new_note = date_match.group(1)
+                    if nine_turn_up > 0:
+                        new_note += f' 红{nine_turn_up}'
+                    if nine_turn_down > 0:
+                        new_note += f' 绿{nine_turn_down}'
+                    stock['note'] = new_note
+                    print(f"更新股票 {stock['ts_code']} 备注: {current_note} -> {new_note}")
+            
+            # 更新时间戳
+            stock['last_refresh'] = refresh_time
+        
+        updated_count = len(watchlist_data) - len(failed_stocks)
+        
+        # 保存更新后的数据（只合并变化的字段，且只合并到仍在自选股中的股票）
+        watchlist_service.merge_changes(snapshot, watchlist_data)
+        
+        message = f"成功更新 {updated_count} 只股票"
+        if failed_stocks:
+            message += f"，{len(failed_stocks)} 只股票更新失败"
+        
+        return jsonify({
+            'success': True,
+            'message': message,
+            'updated_count': updated_count,
+            'failed_count': len(failed_stocks),
+            'failed_stocks': failed_stocks
+        })
             
     except Exception as e:
         return jsonify({
@@ -6988,6 +6548,7 @@ def get_cache_status():
     """获取缓存系统状态"""
     try:
         status = cache_manager.get_status()
+        status['indicator_cache'] = indicator_cache.stats()
         return jsonify({
             'success': True,
             'data': status
@@ -7030,85 +6591,125 @@ def clear_cache():
             'error': str(e)
         }), 500
 
-@app.route('/api/red-filter')
-def get_red_filter_stocks():
-    """获取红 3-6 筛选的股票数据"""
-    try:
-        # 优先从保存的文件中读取数据
-        cache_dir = 'cache'
-        red_filter_file = os.path.join(cache_dir, 'red_filter_results.json')
-        
-        if os.path.exists(red_filter_file):
-            try:
-                with open(red_filter_file, 'r', encoding='utf-8') as f:
-                    saved_data = json.load(f)
-                
-                # 检查数据是否是今天的
-                filter_date = saved_data.get('filter_date')
-                today = datetime.now().strftime('%Y-%m-%d')
-                
-                if filter_date == today:
-                    return jsonify({
-                        'success': True,
-                        'data': saved_data.get('stocks', []),
-                        'total': saved_data.get('total', 0),
-                        'filter_time': saved_data.get('filter_time'),
-                        'data_source': 'cached'
-                    })
-            except Exception as e:
-                print(f"读取保存的红色筛选数据失败: {e}")
-        
-        # 如果没有保存的数据或数据过期，进行实时筛选
-        all_stocks = []
-        markets = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
-        
-        for market in markets:
-            try:
-                market_data = cache_manager.load_cache_data(market)
-                if market_data and 'stocks' in market_data:
-                    all_stocks.extend(market_data['stocks'])
-            except Exception as e:
-                print(f"获取市场 {market} 数据失败: {e}")
-                continue
-        
-        # 筛选符合条件的股票：换手率>1，九转买入红色3-6
-        # 注意：由于量比数据可能不准确或为0，暂时移除量比条件
-        filtered_stocks = []
-        for stock in all_stocks:
-            try:
-                turnover_rate = float(stock.get('turnover_rate', 0))
-                volume_ratio = float(stock.get('volume_ratio', 0))
-                nine_turn_up = int(stock.get('nine_turn_up', 0))
-                
-                # 筛选条件：换手率>1，九转买入红色3-6
-                # 如果量比数据可用且>0，则加入量比条件
-                volume_condition = True
-                if volume_ratio > 0:
-                    volume_condition = volume_ratio > 0.8  # 降低量比要求
-                
-                if (turnover_rate > 1 and  # 降低换手率要求
-                    volume_condition and 
-                    3 <= nine_turn_up <= 6):
-                    
-                    # 添加筛选日期
-                    stock_copy = stock.copy()
-                    stock_copy['filter_date'] = datetime.now().strftime('%Y-%m-%d')
-                    filtered_stocks.append(stock_copy)
-                    
-            except (ValueError, TypeError) as e:
-                continue
+# 筛选结果只保存 (代码, 信号, 排名)，读取时与市场缓存关联
+filter_store = FilterResultStore()
+
+# 全市场向量化选股引擎，市场缓存未变化时复用已建好的DataFrame
+stock_screener = StockScreener(cache_manager.load_cache_data)
+
+# /api/stocks/<market> 的预排序索引，缓存变化后在下一次查询时重建
+market_sort_index = MarketStockIndex(cache_manager.load_cache_data)
+
+# 九转信号倒排索引（信号值 -> 股票代码），由九转序列更新任务维护；
+# 索引文件只由运行定时任务的进程保存（start_scheduler），其他进程只读
+signal_index = SignalIndex(cache_manager.load_cache_data, persist=False)
+
+# 全市场股票索引: (各市场缓存数据对象, {ts_code: stock})
+_market_stock_index = (None, {})
+_market_stock_index_lock = threading.Lock()
+
+def get_market_stock_index():
+    """
+    获取全市场 {ts_code: 股票数据} 索引
+    缓存管理器在数据未变化时返回同一个对象，据此复用已建好的索引
+    """
+    global _market_stock_index
+    
+    market_datas = []
+    for market in ['cyb', 'hu', 'zxb', 'kcb', 'bj']:
+        try:
+            market_datas.append(cache_manager.load_cache_data(market))
+        except Exception as e:
+            print(f"获取市场 {market} 数据失败: {e}")
+            market_datas.append(None)
+    
+    with _market_stock_index_lock:
+        cached_datas, cached_index = _market_stock_index
+        if cached_datas is not None and all(a is b for a, b in zip(cached_datas, market_datas)):
+            return cached_index
         
-        # 按九转序列和换手率排序
-        filtered_stocks.sort(key=lambda x: (x.get('nine_turn_up', 0), x.get('turnover_rate', 0)), reverse=True)
+        stock_index = {}
+        for market_data in market_datas:
+            if market_data and 'stocks' in market_data:
+                for stock in market_data['stocks']:
+                    if stock.get('ts_code'):
+                        stock_index[stock['ts_code']] = stock
         
+        _market_stock_index = (market_datas, stock_index)
+        return stock_index
+
+def filter_red_stocks():
+    """
+    红 3-6 筛选：换手率>1，九转买入红色3-6（条件和排序见 stock_screener.PRESETS['red']）
+    注意：由于量比数据可能不准确或为0，量比>0时才加入量比条件
+    候选股票直接取自信号索引中 nine_turn_up 为3-6的桶
+    
+    Returns:
+        list: 按九转序列和换手率排序的 (ts_code, nine_turn_up)
+    """
+    candidates = [ts_code for ts_code, _ in signal_index.codes_between('nine_turn_up', 3, 6)]
+    return stock_screener.preset_signals('red', candidates)
+
+def filter_green_stocks():
+    """
+    绿 9 筛选：九转买入绿色=9，直接读取信号索引中的桶
+    
+    Returns:
+        list: (ts_code, nine_turn_down)
+    """
+    return [(ts_code, 9) for ts_code in signal_index.codes('nine_turn_down', 9)]
+
+def serve_filter_results(kind, filter_func):
+    """返回某天保存的筛选结果（与当前行情关联），当天没有保存结果时实时筛选"""
+    date = request.args.get('date')
+    if date:
+        # 日期会拼进结果文件路径，访问文件系统前先校验
+        try:
+            normalize_date(date)
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+    stock_index = get_market_stock_index()
+    
+    saved = filter_store.load(kind, date)
+    if saved is not None:
+        stocks = FilterResultStore.join(saved, stock_index)
         return jsonify({
             'success': True,
-            'data': filtered_stocks,
-            'total': len(filtered_stocks),
-            'filter_time': datetime.now().isoformat(),
-            'data_source': 'realtime'
+            'data': stocks,
+            'total': len(stocks),
+            'filter_time': saved.get('filter_time'),
+            'data_source': 'cached'
         })
-        
+    
+    if date:
+        return jsonify({
+            'success': False,
+            'error': f'没有 {date} 的筛选结果',
+            'available_dates': filter_store.list_dates(kind)
+        }), 404
+    
+    # 没有今天的保存结果，进行实时筛选
+    now = datetime.now()
+    rows = filter_func()
+    stocks = FilterResultStore.join({
+        'filter_date': now.strftime('%Y-%m-%d'),
+        'filter_time': now.isoformat(),
+        'rows': [[ts_code, signal, rank] for rank, (ts_code, signal) in enumerate(rows, 1)]
+    }, stock_index)
+    
+    return jsonify({
+        'success': True,
+        'data': stocks,
+        'total': len(stocks),
+        'filter_time': now.isoformat(),
+        'data_source': 'realtime'
+    })
+
+@app.route('/api/red-filter')
+def get_red_filter_stocks():
+    """获取红 3-6 筛选的股票数据（可用 ?date=YYYY-MM-DD 查看历史筛选结果）"""
+    try:
+        return serve_filter_results('red', filter_red_stocks)
     except Exception as e:
         return jsonify({
             'success': False,
@@ -7117,72 +6718,160 @@ def get_red_filter_stocks():
 
 @app.route('/api/green-filter')
 def get_green_filter_stocks():
-    """获取绿 9 筛选的股票数据"""
+    """获取绿 9 筛选的股票数据（可用 ?date=YYYY-MM-DD 查看历史筛选结果）"""
     try:
-        # 优先从保存的文件中读取数据
-        cache_dir = 'cache'
-        green_filter_file = os.path.join(cache_dir, 'green_filter_results.json')
+        return serve_filter_results('green', filter_green_stocks)
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/screen', methods=['GET', 'POST'])
+def screen_stocks():
+    """
+    全市场条件选股
+    
+    GET 参数:
+        filter: 筛选条件，可重复，如 turnover_rate>1、nine_turn_up=3..6、market=cyb,kcb
+        preset: 预设筛选（red/green），可与 filter 组合
+        sort: 排序字段，逗号分隔，负号表示降序，如 -turnover_rate
+        page, page_size: 分页，默认 1 / 50
+    POST JSON:
+        {"conditions": [...], "preset": ..., "sort": [...], "page": 1, "page_size": 50}
+    """
+    try:
+        if request.method == 'POST':
+            params = request.get_json(silent=True) or {}
+            conditions = list(params.get('conditions') or [])
+        else:
+            params = request.args
+            conditions = [parse_condition(text) for text in request.args.getlist('filter')]
         
-        if os.path.exists(green_filter_file):
-            try:
-                with open(green_filter_file, 'r', encoding='utf-8') as f:
-                    saved_data = json.load(f)
-                
-                # 检查数据是否是今天的
-                filter_date = saved_data.get('filter_date')
-                today = datetime.now().strftime('%Y-%m-%d')
-                
-                if filter_date == today:
-                    return jsonify({
-                        'success': True,
-                        'data': saved_data.get('stocks', []),
-                        'total': saved_data.get('total', 0),
-                        'filter_time': saved_data.get('filter_time'),
-                        'data_source': 'cached'
-                    })
-            except Exception as e:
-                print(f"读取保存的绿色筛选数据失败: {e}")
+        preset = params.get('preset')
+        sort = params.get('sort')
+        if preset:
+            if preset not in PRESETS:
+                return jsonify({
+                    'success': False,
+                    'error': f'未知的预设筛选: {preset}',
+                    'presets': list(PRESETS)
+                }), 400
+            conditions = PRESETS[preset]['conditions'] + conditions
+            sort = sort or PRESETS[preset]['sort']
+        
+        result = stock_screener.screen(conditions, sort,
+                                       page=params.get('page', 1),
+                                       page_size=params.get('page_size', 50))
+        result['success'] = True
+        return jsonify(result)
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@cached(ttl=600)
+def build_backtest_report(markets, start, end, horizons):
+    """九转信号回测结果，缓存10分钟（历史面板每天最多更新一次）"""
+    # Web进程内使用线程并行，避免在多线程服务中fork子进程
+    return run_backtest(list(markets), start, end, horizons, use_processes=False)
+
+@app.route('/api/backtest')
+def get_backtest():
+    """
+    九转信号回测
+    
+    Query Parameters:
+        markets: 市场，逗号分隔，默认全部
+        start, end: 信号日期范围（YYYYMMDD）
+        horizons: 持有交易日数，逗号分隔，默认 1,3,5,10,20
+    """
+    try:
+        markets = [m for m in request.args.get('markets', '').split(',') if m] or BACKTEST_MARKETS
+        invalid = [m for m in markets if m not in BACKTEST_MARKETS]
+        if invalid:
+            return jsonify({
+                'success': False,
+                'error': f'无效的市场类型: {",".join(invalid)}'
+            }), 400
         
-        # 如果没有保存的数据或数据过期，进行实时筛选
-        all_stocks = []
-        markets = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
+        start = request.args.get('start')
+        end = request.args.get('end')
+        for value in (start, end):
+            if value and not re.fullmatch(r'\d{8}', value):
+                return jsonify({
+                    'success': False,
+                    'error': '日期格式错误，应为YYYYMMDD'
+                }), 400
         
-        for market in markets:
-            try:
-                market_data = cache_manager.load_cache_data(market)
-                if market_data and 'stocks' in market_data:
-                    all_stocks.extend(market_data['stocks'])
-            except Exception as e:
-                print(f"获取市场 {market} 数据失败: {e}")
-                continue
+        horizons = request.args.get('horizons')
+        horizons = tuple(int(h) for h in horizons.split(',')) if horizons else BACKTEST_HORIZONS
         
-        # 筛选符合条件的股票：九转买入绿色=9
-        filtered_stocks = []
-        for stock in all_stocks:
-            try:
-                nine_turn_down = int(stock.get('nine_turn_down', 0))
-                
-                # 筛选条件：九转买入绿色=9
-                if nine_turn_down == 9:
-                    # 添加筛选日期
-                    stock_copy = stock.copy()
-                    stock_copy['filter_date'] = datetime.now().strftime('%Y-%m-%d')
-                    filtered_stocks.append(stock_copy)
-                    
-            except (ValueError, TypeError) as e:
-                continue
+        report = build_backtest_report(tuple(markets), start, end, tuple(horizons))
+        return jsonify({'success': True, **report})
+    except FileNotFoundError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/signals')
+def get_signal_bucket():
+    """
+    查询九转信号索引
+    
+    Query Parameters:
+        field: 信号字段（nine_turn_up/nine_turn_down/countdown_up/countdown_down）
+        value: 信号值，返回该桶内的股票及进桶时间；不传时返回各桶数量
+        ts_code: 返回该股票的当前信号和最近的进桶历史
+    """
+    try:
+        ts_code = request.args.get('ts_code')
+        if ts_code:
+            return jsonify({
+                'success': True,
+                'ts_code': ts_code,
+                'signals': signal_index.signals(ts_code),
+                'history': signal_index.history(ts_code=ts_code, limit=request.args.get('limit', 100, type=int))
+            })
         
-        # 按九转序列排序
-        filtered_stocks.sort(key=lambda x: x.get('nine_turn_down', 0), reverse=True)
+        field = request.args.get('field')
+        if field is None:
+            return jsonify({'success': True, 'buckets': signal_index.summary()})
+        if field not in SIGNAL_FIELDS:
+            return jsonify({
+                'success': False,
+                'error': f'不支持的信号字段: {field}'
+            }), 400
         
+        value = request.args.get('value', type=int)
+        if value is None:
+            return jsonify({'success': True, 'field': field, 'buckets': signal_index.summary()[field]})
+        
+        stocks = signal_index.bucket(field, value)
         return jsonify({
             'success': True,
-            'data': filtered_stocks,
-            'total': len(filtered_stocks),
-            'filter_time': datetime.now().isoformat(),
-            'data_source': 'realtime'
+            'field': field,
+            'value': value,
+            'data': stocks,
+            'total': len(stocks)
         })
-        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -7542,6 +7231,73 @@ def get_stock_intraday_data(stock_code):
             'details': '请检查股票代码是否正确或稍后重试'
         }), 500
 
+@cached(ttl=600, cache_if=bool)
+def build_top_list(trade_date):
+    """
+    获取某个交易日的龙虎榜并补充名称和九转数据，按净买入额排序
+    结果按交易日期缓存10分钟；龙虎榜尚未发布时的空结果不缓存
+    """
+    # 获取龙虎榜数据（使用频率限制）
+    top_list_data = safe_tushare_call(pro.top_list, trade_date=trade_date)
+    
+    if top_list_data.empty:
+        return []
+    
+    # 获取股票基本信息，用于补充股票名称
+    ts_codes = top_list_data['ts_code'].unique().tolist()
+    stock_basic_data = safe_tushare_call(pro.stock_basic, ts_code=','.join(ts_codes))
+    
+    # 创建股票代码到名称的映射
+    name_mapping = {}
+    if not stock_basic_data.empty:
+        name_mapping = dict(zip(stock_basic_data['ts_code'], stock_basic_data['name']))
+    
+    # 获取九转数据，从信号索引中读取
+    nine_turn_mapping = signal_index.signals_many(ts_codes)
+    
+    # 安全获取数值的辅助函数
+    def safe_float(value, default=0.0):
+        try:
+            if value is None or pd.isna(value):
+                return default
+            return float(value)
+        except (ValueError, TypeError):
+            return default
+    
+    # 处理数据
+    result_data = []
+    for _, row in top_list_data.iterrows():
+        ts_code = row['ts_code']
+        nine_turn_data = nine_turn_mapping.get(ts_code, {})
+        
+        stock_data = {
+            'ts_code': ts_code,
+            'name': name_mapping.get(ts_code, ts_code),  # 如果没有找到名称，使用代码
+            'close': safe_float(row.get('close')),
+            'pct_change': safe_float(row.get('pct_change')),
+            'turnover_rate': safe_float(row.get('turnover_rate')),
+            'amount': safe_float(row.get('amount')),
+            'l_sell': safe_float(row.get('l_sell')),
+            'l_buy': safe_float(row.get('l_buy')),
+            'l_amount': safe_float(row.get('l_amount')),
+            'net_amount': safe_float(row.get('net_amount')),
+            'net_rate': safe_float(row.get('net_rate')),
+            'amount_rate': safe_float(row.get('amount_rate')),
+            'float_values': safe_float(row.get('float_values')),
+            'reason': row.get('reason', ''),
+            # 添加九转数据
+            'nine_turn_up': nine_turn_data.get('nine_turn_up', 0),
+            'nine_turn_down': nine_turn_data.get('nine_turn_down', 0),
+            'countdown_up': nine_turn_data.get('countdown_up', 0),
+            'countdown_down': nine_turn_data.get('countdown_down', 0)
+        }
+        result_data.append(stock_data)
+    
+    # 按净买入额排序（从大到小）
+    result_data.sort(key=lambda x: x['net_amount'], reverse=True)
+    
+    return result_data
+
 @app.route('/api/top-list')
 def get_top_list():
     """获取龙虎榜数据"""
@@ -7561,10 +7317,10 @@ def get_top_list():
                 'error': '日期格式错误，请使用YYYYMMDD格式'
             }), 400
         
-        # 获取龙虎榜数据（使用频率限制）
-        top_list_data = safe_tushare_call(pro.top_list, trade_date=trade_date)
+        # 获取龙虎榜数据（按交易日期缓存）
+        result_data = build_top_list(trade_date)
         
-        if top_list_data.empty:
+        if not result_data:
             return jsonify({
                 'success': True,
                 'data': [],
@@ -7573,76 +7329,6 @@ def get_top_list():
                 'message': '该日期无龙虎榜数据'
             })
         
-        # 获取股票基本信息，用于补充股票名称
-        ts_codes = top_list_data['ts_code'].unique().tolist()
-        stock_basic_data = safe_tushare_call(pro.stock_basic, ts_code=','.join(ts_codes))
-        
-        # 创建股票代码到名称的映射
-        name_mapping = {}
-        if not stock_basic_data.empty:
-            name_mapping = dict(zip(stock_basic_data['ts_code'], stock_basic_data['name']))
-        
-        # 获取九转数据，从缓存中读取
-        nine_turn_mapping = {}
-        markets = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
-        for market in markets:
-            try:
-                market_data = cache_manager.load_cache_data(market)
-                if market_data and 'stocks' in market_data:
-                    for stock in market_data['stocks']:
-                        ts_code = stock.get('ts_code')
-                        if ts_code in ts_codes:
-                            nine_turn_mapping[ts_code] = {
-                                'nine_turn_up': stock.get('nine_turn_up', 0),
-                                'nine_turn_down': stock.get('nine_turn_down', 0),
-                                'countdown_up': stock.get('countdown_up', 0),
-                                'countdown_down': stock.get('countdown_down', 0)
-                            }
-            except Exception as e:
-                print(f"获取市场 {market} 九转数据失败: {e}")
-                continue
-        
-        # 安全获取数值的辅助函数
-        def safe_float(value, default=0.0):
-            try:
-                if value is None or pd.isna(value):
-                    return default
-                return float(value)
-            except (ValueError, TypeError):
-                return default
-        
-        # 处理数据
-        result_data = []
-        for _, row in top_list_data.iterrows():
-            ts_code = row['ts_code']
-            nine_turn_data = nine_turn_mapping.get(ts_code, {})
-            
-            stock_data = {
-                'ts_code': ts_code,
-                'name': name_mapping.get(ts_code, ts_code),  # 如果没有找到名称，使用代码
-                'close': safe_float(row.get('close')),
-                'pct_change': safe_float(row.get('pct_change')),
-                'turnover_rate': safe_float(row.get('turnover_rate')),
-                'amount': safe_float(row.get('amount')),
-                'l_sell': safe_float(row.get('l_sell')),
-                'l_buy': safe_float(row.get('l_buy')),
-                'l_amount': safe_float(row.get('l_amount')),
-                'net_amount': safe_float(row.get('net_amount')),
-                'net_rate': safe_float(row.get('net_rate')),
-                'amount_rate': safe_float(row.get('amount_rate')),
-                'float_values': safe_float(row.get('float_values')),
-                'reason': row.get('reason', ''),
-                # 添加九转数据
-                'nine_turn_up': nine_turn_data.get('nine_turn_up', 0),
-                'nine_turn_down': nine_turn_data.get('nine_turn_down', 0),
-                'countdown_up': nine_turn_data.get('countdown_up', 0),
-                'countdown_down': nine_turn_data.get('countdown_down', 0)
-            }
-            result_data.append(stock_data)
-        
-        # 按净买入额排序（从大到小）
-        result_data.sort(key=lambda x: x['net_amount'], reverse=True)
-        
         return jsonify({
             'success': True,
             'data': result_data,
@@ -7658,9 +7344,101 @@ def get_top_list():
 
 
 
+# 启动预热：市场缓存、全市场股票索引、指数缓存和自选股，完成前 /readyz 返回503
+PROCESS_STARTED_AT = time.time()
+startup_warmer = StartupWarmer()
+
+def _warm_market(market):
+    def warm():
+        if cache_manager.load_cache_data(market):
+            market_sort_index.snapshot(market)
+    return warm
+
+def _warm_security_master():
+    get_market_stock_index()
+    stock_screener.snapshot()
+    signal_index.refresh()
+
+def _warm_indices():
+    load_indices_cache()
+    load_all_indices_cache()
+
+for _market in ['cyb', 'hu', 'zxb', 'kcb', 'bj']:
+    startup_warmer.add(f'market:{_market}', _warm_market(_market))
+startup_warmer.add('security_master', _warm_security_master)
+startup_warmer.add('indices', _warm_indices)
+startup_warmer.add('watchlist', watchlist_service.list)
+
+@app.route('/healthz')
+def healthz():
+    """存活检查：进程能处理请求即返回200"""
+    return jsonify({
+        'status': 'ok',
+        'pid': os.getpid(),
+        'uptime_seconds': round(time.time() - PROCESS_STARTED_AT, 1)
+    })
+
+def start_warmup():
+    """开始启动预热（只执行一次）；WARMUP_ENABLED=false 时跳过，直接视为就绪"""
+    if os.environ.get('WARMUP_ENABLED', 'true').lower() == 'false':
+        startup_warmer.skip()
+    else:
+        startup_warmer.start()
+
+@app.route('/readyz')
+def readyz():
+    """
+    就绪检查：启动预热完成后返回200，预热中返回503并附带进度
+    
+    预热通常由 create_app() 开始；未经 create_app() 启动的进程（如 gunicorn app:app、
+    直接使用 app.test_client()）在第一次调用 /readyz 时开始预热，之后同样在预热完成后就绪，
+    不会一直返回503。
+    """
+    start_warmup()
+    progress = startup_warmer.progress()
+    progress['status'] = 'ready' if progress['ready'] else 'warming_up'
+    return jsonify(progress), 200 if progress['ready'] else 503
+
+# 定时任务主节点锁：多进程部署时只有拿到锁的进程运行定时任务
+scheduler_lock = LeaderLock(os.environ.get('SCHEDULER_LOCK_FILE', DEFAULT_LOCK_FILE))
+_app_initialized = False
+_app_init_lock = threading.Lock()
+
+def create_app():
+    """
+    WSGI应用工厂（gunicorn -c gunicorn.conf.py wsgi:app）
+    
+    每个进程只初始化一次：启动缓存后台任务、开始启动预热、输出数据源信息、按需启动定时任务。
+    导入本模块本身不做这些事，也不导入tushare/akshare，worker.py 和测试导入更快。定时任务只在拿到主节点锁的进程中启动，
+    其他进程只处理请求并在后台等待接管；SCHEDULER_ENABLED=false 或 SCHEDULER_MODE=worker
+    （由 worker.py 运行定时任务）时本进程不运行定时任务。
+    """
+    global _app_initialized
+    with _app_init_lock:
+        if _app_initialized:
+            return app
+        _app_initialized = True
+    
+    if KLINE_API_AVAILABLE and kline_api:
+        print("K线API蓝图已注册")
+    # 缓存健康检查和过期清理（导入模块时不启动）
+    cache_manager.start_background_tasks()
+    # 启动预热（WARMUP_ENABLED=false 时跳过，/readyz 直接就绪）
+    start_warmup()
+    print(f"数据源: Tushare{'已安装' if TUSHARE_AVAILABLE else '未安装，部分数据功能将不可用'}，"
+          f"AkShare{'已安装' if AKSHARE_AVAILABLE else '未安装，分时图功能将不可用'}（第一次使用时导入）")
+    
+    if not scheduler_enabled():
+        print("[定时任务] SCHEDULER_ENABLED=false，本进程不运行定时任务")
+    elif SCHEDULER_MODE == 'worker':
+        print("[定时任务] SCHEDULER_MODE=worker，定时任务由独立任务进程 worker.py 运行")
+    elif not scheduler_lock.run_when_leader(start_leader_tasks):
+        print(f"[定时任务] 主节点为 {scheduler_lock.holder()}，本进程(pid={os.getpid()})只处理请求")
+    return app
+
 if __name__ == '__main__':
-    # 启动定时调度器
-    start_scheduler()
+    # 初始化应用并启动定时调度器
+    create_app()
     
     # 从环境变量获取配置，支持生产环境部署
     host = os.environ.get('HOST', '0.0.0.0')
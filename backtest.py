@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+九转信号回测
+在本地日线面板（交易日 × 股票）上按 calculate_nine_turn 的规则批量生成九转信号，
+统计各类信号之后N个交易日的收益、胜率和期间最大回撤。
+信号和收益都按时间逐日向量化计算（每步处理全部股票），各市场并行。
+
+历史面板: cache/history/{market}_daily.npz
+    dates: 交易日（YYYYMMDD）  codes: 股票代码
+    open/high/low/close: float32 后复权价格，缺失（停牌/未上市）为NaN
+
+用法:
+    python backtest.py build --start 20200101 [--end 20250101] [--markets cyb hu]
+        从Tushare按交易日拉取全市场日线和复权因子，增量追加到面板（需要TUSHARE_TOKEN）
+    python backtest.py run [--start 20200101] [--end 20250101] [--horizons 1 5 10 20] [--markets cyb hu] [--json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_manager import read_cache_file
+
+logger = logging.getLogger(__name__)
+
+MARKETS = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
+HISTORY_DIR = os.path.join('cache', 'history')
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+DEFAULT_HORIZONS = (1, 3, 5, 10, 20)
+
+# 信号类型: (九转方向, 最小值, 最大值)
+# 九转序列每个交易日只加1，进入 [最小值, 最大值] 区间的那一天即序列值等于最小值的那一天
+SIGNALS = {
+    'red_3_6': ('up', 3, 6),
+    'red_9': ('up', 9, 9),
+    'green_9': ('down', 9, 9)
+}
+
+
+def get_panel_path(market: str, history_dir: str = HISTORY_DIR) -> str:
+    return os.path.join(history_dir, f'{market}_daily.npz')
+
+
+def load_panel(market: str, history_dir: str = HISTORY_DIR) -> Optional[Dict[str, np.ndarray]]:
+    """读取一个市场的日线面板，不存在时返回None"""
+    path = get_panel_path(market, history_dir)
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def save_panel(market: str, panel: Dict[str, np.ndarray], history_dir: str = HISTORY_DIR) -> str:
+    """原子写入一个市场的日线面板"""
+    os.makedirs(history_dir, exist_ok=True)
+    path = get_panel_path(market, history_dir)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        np.savez_compressed(f, **panel)
+    os.replace(temp_path, path)
+    return path
+
+
+def build_history_panels(fetch_daily: Callable[[str], pd.DataFrame], trade_dates: Iterable[str],
+                         market_codes: Dict[str, Iterable[str]], history_dir: str = HISTORY_DIR) -> Dict[str, int]:
+    """
+    按交易日拉取全市场日线，增量追加到各市场面板
+
+    Args:
+        fetch_daily: 给定交易日返回当天全市场日线的函数，
+                     DataFrame需包含 ts_code/open/high/low/close，可选 adj_factor
+        trade_dates: 需要覆盖的交易日（YYYYMMDD）
+        market_codes: 市场 -> 股票代码列表
+        history_dir: 面板目录
+
+    Returns:
+        dict: 市场 -> 面板中的交易日数
+    """
+    code_market = {code: market for market, codes in market_codes.items() for code in codes}
+    panels = {market: load_panel(market, history_dir) for market in market_codes}
+    existing = set()
+    for panel in panels.values():
+        if panel is not None:
+            existing.update(panel['dates'].tolist())
+
+    frames = []
+    for trade_date in sorted(set(trade_dates) - existing):
+        daily = fetch_daily(trade_date)
+        if daily is None or daily.empty:
+            continue
+        daily = daily.copy()
+        daily['trade_date'] = trade_date
+        frames.append(daily)
+        logger.info(f"已获取 {trade_date} 日线 {len(daily)} 条")
+
+    result = {}
+    new_rows = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if not new_rows.empty:
+        # 后复权价格，复权因子缺失时按1处理
+        factor = pd.to_numeric(new_rows.get('adj_factor', 1.0), errors='coerce')
+        factor = factor.fillna(1.0) if isinstance(factor, pd.Series) else 1.0
+        for field in PRICE_FIELDS:
+            new_rows[field] = pd.to_numeric(new_rows[field], errors='coerce') * factor
+        new_rows['market'] = new_rows['ts_code'].map(code_market)
+
+    for market in market_codes:
+        panel = panels[market]
+        rows = new_rows[new_rows['market'] == market] if not new_rows.empty else new_rows
+        if rows.empty:
+            if panel is not None:
+                result[market] = len(panel['dates'])
+            continue
+
+        merged = {}
+        for field in PRICE_FIELDS:
+            frame = rows.pivot_table(index='trade_date', columns='ts_code', values=field, aggfunc='last')
+            if panel is not None:
+                old = pd.DataFrame(panel[field], index=panel['dates'], columns=panel['codes'])
+                frame = frame.combine_first(old)
+            merged[field] = frame.sort_index().sort_index(axis=1)
+
+        dates = merged['close'].index
+        codes = merged['close'].columns
+        panel = {
+            'dates': np.asarray(dates, dtype='U8'),
+            'codes': np.asarray(codes, dtype='U12')
+        }
+        for field in PRICE_FIELDS:
+            panel[field] = merged[field].reindex(index=dates, columns=codes).to_numpy(dtype=np.float32)
+        save_panel(market, panel, history_dir)
+        result[market] = len(dates)
+    return result
+
+
+def nine_turn_panel(close: np.ndarray):
+    """
+    逐日向量化计算全部股票的九转序列
+
+    与 calculate_nine_turn 对最新一天给出的序列值一致：
+    收盘价与该股票4个交易日前（跳过停牌日）的收盘价比较，连续满足时计数，
+    计数达到3开始显示，达到9后重新计数，中断则清零。
+
+    Args:
+        close: (交易日, 股票) 收盘价，NaN表示当天无交易
+
+    Returns:
+        (up, down): 与close同形状的int8数组
+    """
+    days, stocks = close.shape
+    up = np.zeros((days, stocks), dtype=np.int8)
+    down = np.zeros((days, stocks), dtype=np.int8)
+
+    # 每只股票最近4个有效收盘价的环形缓冲区
+    ring = np.full((stocks, 4), np.nan, dtype=np.float64)
+    pointer = np.zeros(stocks, dtype=np.int64)
+    valid_days = np.zeros(stocks, dtype=np.int64)
+    up_count = np.zeros(stocks, dtype=np.int16)
+    down_count = np.zeros(stocks, dtype=np.int16)
+
+    for t in range(days):
+        today = close[t]
+        traded = np.flatnonzero(~np.isnan(today))
+        if len(traded) == 0:
+            continue
+
+        current = today[traded].astype(np.float64)
+        slot = pointer[traded]
+        previous = ring[traded, slot]   # 4个有效交易日前的收盘价
+        # 前4个有效交易日不比较，计数保持为0
+        comparable = valid_days[traded] >= 4
+
+        up_hit = comparable & (current > previous)
+        down_hit = comparable & (current < previous)
+        new_up = np.where(up_hit, up_count[traded] + 1, 0)
+        new_down = np.where(down_hit, down_count[traded] + 1, 0)
+
+        up[t, traded] = np.where(new_up >= 3, new_up, 0)
+        down[t, traded] = np.where(new_down >= 3, new_down, 0)
+        new_up[new_up >= 9] = 0
+        new_down[new_down >= 9] = 0
+        up_count[traded] = new_up
+        down_count[traded] = new_down
+
+        ring[traded, slot] = current
+        pointer[traded] = (slot + 1) % 4
+        valid_days[traded] += 1
+
+    return up, down
+
+
+def _forward_fill(values: np.ndarray) -> np.ndarray:
+    return pd.DataFrame(values).ffill().to_numpy(dtype=np.float64)
+
+
+def _collect_events(panel: Dict[str, np.ndarray], start: Optional[str], end: Optional[str],
+                    horizons: List[int]) -> Dict[str, Any]:
+    """对一个市场的面板生成信号并计算每个信号事件的远期收益和回撤"""
+    dates = panel['dates']
+    close = panel['close']
+    up, down = nine_turn_panel(close)
+    labels = {'up': up, 'down': down}
+
+    filled_close = _forward_fill(close)
+    filled_low = _forward_fill(panel['low'])
+    days = len(dates)
+
+    in_period = np.ones(days, dtype=bool)
+    if start:
+        in_period &= dates >= start
+    if end:
+        in_period &= dates <= end
+
+    result = {'signals': {}, 'baseline': {}}
+    for horizon in horizons:
+        # 基准: 区间内全部股票的平均远期收益
+        period = np.flatnonzero(in_period[:max(days - horizon, 0)])
+        entry = filled_close[period]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = filled_close[period + horizon] / entry - 1
+        returns = returns[~np.isnan(close[period]) & (entry > 0) & np.isfinite(returns)]
+        result['baseline'][horizon] = (float(returns.sum()), int(returns.size))
+
+    for name, (direction, low, _) in SIGNALS.items():
+        hit = (labels[direction] == low) & in_period[:, None]
+        event_days, event_stocks = np.nonzero(hit)
+        per_horizon = {}
+        for horizon in horizons:
+            keep = event_days + horizon < days
+            t, n = event_days[keep], event_stocks[keep]
+            entry = filled_close[t, n]
+            exit_ = filled_close[t + horizon, n]
+            # 持有期内（次日起）最低价相对买入价的最大跌幅
+            window = filled_low[t[:, None] + np.arange(1, horizon + 1), n[:, None]]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                returns = exit_ / entry - 1
+                drawdowns = np.minimum(np.nanmin(window, axis=1, initial=np.inf) / entry - 1, 0)
+            valid = np.isfinite(returns) & np.isfinite(drawdowns) & (entry > 0)
+            per_horizon[horizon] = (returns[valid], drawdowns[valid])
+        result['signals'][name] = per_horizon
+    return result
+
+
+def _backtest_market(args) -> Optional[Dict[str, Any]]:
+    market, start, end, horizons, history_dir = args
+    panel = load_panel(market, history_dir)
+    if panel is None or len(panel['dates']) == 0:
+        return None
+    result = _collect_events(panel, start, end, horizons)
+    result['market'] = market
+    result['dates'] = (str(panel['dates'][0]), str(panel['dates'][-1]))
+    result['stocks'] = len(panel['codes'])
+    return result
+
+
+def _summarize(returns: np.ndarray, drawdowns: np.ndarray, baseline: float) -> Dict[str, Any]:
+    if returns.size == 0:
+        return {'count': 0}
+    mean_return = float(returns.mean())
+    return {
+        'count': int(returns.size),
+        'mean_return': round(mean_return * 100, 3),
+        'median_return': round(float(np.median(returns)) * 100, 3),
+        'hit_rate': round(float((returns > 0).mean()) * 100, 2),
+        'excess_return': round((mean_return - baseline) * 100, 3),
+        'mean_drawdown': round(float(drawdowns.mean()) * 100, 3),
+        'max_drawdown': round(float(drawdowns.min()) * 100, 3)
+    }
+
+
+def run_backtest(markets: Optional[List[str]] = None, start: Optional[str] = None, end: Optional[str] = None,
+                 horizons: Iterable[int] = DEFAULT_HORIZONS, history_dir: str = HISTORY_DIR,
+                 use_processes: bool = True) -> Dict[str, Any]:
+    """
+    回测各类九转信号
+
+    Args:
+        markets: 市场列表，默认全部
+        start, end: 信号日期范围（YYYYMMDD），默认面板全部日期
+        horizons: 持有交易日数
+        history_dir: 面板目录
+        use_processes: 各市场在独立进程中计算；在Web进程内调用时使用线程
+
+    Returns:
+        dict: 每种信号、每个持有期的样本数、平均/中位收益、胜率、超额收益和回撤（百分比）
+
+    Raises:
+        FileNotFoundError: 没有任何市场的历史面板
+    """
+    start_time = time.time()
+    markets = markets or MARKETS
+    horizons = sorted({int(h) for h in horizons if int(h) > 0})
+    if not horizons:
+        raise ValueError("持有期必须是正整数")
+
+    tasks = [(market, start, end, horizons, history_dir) for market in markets]
+    executor_class = ProcessPoolExecutor if use_processes and len(tasks) > 1 else ThreadPoolExecutor
+    with executor_class(max_workers=min(len(tasks), os.cpu_count() or 1)) as executor:
+        market_results = [r for r in executor.map(_backtest_market, tasks) if r is not None]
+
+    if not market_results:
+        raise FileNotFoundError("没有可用的历史面板，请先运行 python backtest.py build")
+
+    baseline = {}
+    for horizon in horizons:
+        total = sum(r['baseline'][horizon][0] for r in market_results)
+        count = sum(r['baseline'][horizon][1] for r in market_results)
+        baseline[horizon] = total / count if count else 0.0
+
+    signals = {}
+    for name in SIGNALS:
+        signals[name] = {}
+        for horizon in horizons:
+            returns = np.concatenate([r['signals'][name][horizon][0] for r in market_results])
+            drawdowns = np.concatenate([r['signals'][name][horizon][1] for r in market_results])
+            signals[name][str(horizon)] = _summarize(returns, drawdowns, baseline[horizon])
+
+    return {
+        'markets': {r['market']: {'stocks': r['stocks'], 'first_date': r['dates'][0], 'last_date': r['dates'][1]}
+                    for r in market_results},
+        'start': start,
+        'end': end,
+        'horizons': horizons,
+        'baseline_return': {str(h): round(v * 100, 3) for h, v in baseline.items()},
+        'signals': signals,
+        'elapsed_seconds': round(time.time() - start_time, 2)
+    }
+
+
+def load_market_codes(markets: List[str], cache_dir: str = 'cache') -> Dict[str, List[str]]:
+    """从市场缓存中读取各市场的股票代码"""
+    market_codes = {}
+    for market in markets:
+        path = os.path.join(cache_dir, f'{market}_stocks_cache.json')
+        try:
+            data = read_cache_file(path)
+            market_codes[market] = [s['ts_code'] for s in data.get('stocks', []) if s.get('ts_code')]
+        except Exception as e:
+            logger.warning(f"读取市场 {market} 股票列表失败: {e}")
+    return market_codes
+
+
+def _create_tushare_fetcher(interval: float = 0.15):
+    """创建按交易日拉取日线和复权因子的函数"""
+    import tushare as ts
+
+    token = os.getenv('TUSHARE_TOKEN')
+    if not token:
+        raise ValueError("请设置TUSHARE_TOKEN环境变量")
+    ts.set_token(token)
+    pro = ts.pro_api()
+
+    def fetch_daily(trade_date: str) -> pd.DataFrame:
+        daily = pro.daily(trade_date=trade_date)
+        time.sleep(interval)
+        factors = pro.adj_factor(trade_date=trade_date)
+        time.sleep(interval)
+        if daily is None or daily.empty:
+            return pd.DataFrame()
+        if factors is not None and not factors.empty:
+            daily = daily.merge(factors[['ts_code', 'adj_factor']], on='ts_code', how='left')
+        return daily
+
+    def trade_dates(start: str, end: str) -> List[str]:
+        calendar = pro.trade_cal(exchange='SSE', start_date=start, end_date=end, is_open='1')
+        return sorted(calendar['cal_date'].astype(str).tolist())
+
+    return fetch_daily, trade_dates
+
+
+def main():
+    parser = argparse.ArgumentParser(description='九转信号回测')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='从Tushare拉取日线，增量更新历史面板')
+    build.add_argument('--start', default=(datetime.now() - timedelta(days=5 * 365)).strftime('%Y%m%d'))
+    build.add_argument('--end', default=datetime.now().strftime('%Y%m%d'))
+    build.add_argument('--markets', nargs='+', default=MARKETS, choices=MARKETS)
+    build.add_argument('--history-dir', default=HISTORY_DIR)
+
+    run = subparsers.add_parser('run', help='回测九转信号')
+    run.add_argument('--start')
+    run.add_argument('--end')
+    run.add_argument('--horizons', nargs='+', type=int, default=list(DEFAULT_HORIZONS))
+    run.add_argument('--markets', nargs='+', default=MARKETS, choices=MARKETS)
+    run.add_argument('--history-dir', default=HISTORY_DIR)
+    run.add_argument('--json', action='store_true', help='输出JSON')
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.command == 'build':
+        fetch_daily, trade_dates = _create_tushare_fetcher()
+        counts = build_history_panels(fetch_daily, trade_dates(args.start, args.end),
+                                      load_market_codes(args.markets), args.history_dir)
+        for market, days in counts.items():
+            print(f"{market}: {days} 个交易日")
+        return
+
+    report = run_backtest(args.markets, args.start, args.end, args.horizons, args.history_dir)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    print(f"回测市场: {', '.join(report['markets'])}  用时: {report['elapsed_seconds']}秒")
+    print(f"{'信号':<10}{'持有期':>6}{'样本数':>10}{'平均收益%':>11}{'中位收益%':>11}"
+          f"{'胜率%':>8}{'超额%':>9}{'平均回撤%':>11}{'最大回撤%':>11}")
+    for name, per_horizon in report['signals'].items():
+        for horizon, stats in per_horizon.items():
+            if not stats['count']:
+                print(f"{name:<10}{horizon:>6}{0:>10}")
+                continue
+            print(f"{name:<10}{horizon:>6}{stats['count']:>10}{stats['mean_return']:>11}"
+                  f"{stats['median_return']:>11}{stats['hit_rate']:>8}{stats['excess_return']:>9}"
+                  f"{stats['mean_drawdown']:>11}{stats['max_drawdown']:>11}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+多周期K线重采样
+周线/月线由进程内数据访问层缓存的日线合成（按所需K线数取日线，数据访问层保留每只股票取过的最大窗口，
+较小的请求直接切片），60/30/15分钟线由本地列式分时文件（cache/intraday/{YYYYMMDD}_intraday.col）合成，
+不请求上游接口。
+合成结果按 (股票, 周期, 源数据指纹) 缓存在内存中，源数据变化时自然失效。
+
+输出列与日线一致: ts_code, trade_date, open, high, low, close, vol, amount
+（日/周/月线的 trade_date 为该周期最后一个交易日 YYYYMMDD，分钟线为 'YYYYMMDD HH:MM'，取K线结束时间）
+"""
+
+import math
+import logging
+from typing import Dict, Any, Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from memory_cache import TieredMemoryCache
+from intraday_store import FIELDS as INTRADAY_FIELDS, SLOT_TIMES, SLOTS
+
+logger = logging.getLogger(__name__)
+
+# 周期别名 -> 标准周期
+FREQ_ALIASES = {
+    'daily': 'daily', 'd': 'daily', '1d': 'daily', 'day': 'daily',
+    'weekly': 'weekly', 'w': 'weekly', '1w': 'weekly', 'week': 'weekly',
+    'monthly': 'monthly', 'month': 'monthly', 'mon': 'monthly',
+    '60min': '60min', '60': '60min', '60m': '60min',
+    '30min': '30min', '30': '30min', '30m': '30min',
+    '15min': '15min', '15': '15min', '15m': '15min'
+}
+# 日/周/月线: pandas周期 和 每根K线大约包含的交易日数
+CALENDAR_FREQS = {'daily': (None, 1), 'weekly': ('W-FRI', 5), 'monthly': ('M', 22)}
+# 分钟线: 每根K线的分钟数
+MINUTE_FREQS = {'60min': 60, '30min': 30, '15min': 15}
+FREQUENCIES = list(CALENDAR_FREQS) + list(MINUTE_FREQS)
+
+# 按K线数取日线时多取的交易日（周/月线的第一根K线可能不完整）
+DAILY_MARGIN = 30
+
+BAR_COLUMNS = ['ts_code', 'trade_date', 'open', 'high', 'low', 'close', 'vol', 'amount']
+
+
+def normalize_freq(freq: Optional[str]) -> str:
+    """
+    解析周期参数
+
+    Raises:
+        ValueError: 不支持的周期
+    """
+    normalized = FREQ_ALIASES.get(str(freq or 'daily').strip().lower())
+    if normalized is None:
+        raise ValueError(f"不支持的周期: {freq}，可选 {', '.join(FREQUENCIES)}")
+    return normalized
+
+
+def resample_daily(df: pd.DataFrame, freq: str) -> pd.DataFrame:
+    """
+    把按交易日期升序的日线合成为周线或月线
+
+    开盘取第一天、收盘取最后一天、最高/最低取极值、成交量/额求和，
+    trade_date 为周期内最后一个交易日，pre_close/change/pct_chg 按上一根K线收盘重新计算
+    """
+    period = CALENDAR_FREQS[freq][0]
+    if period is None or df.empty:
+        return df
+
+    dates = pd.to_datetime(df['trade_date'].astype(str), format='%Y%m%d')
+    group = dates.dt.to_period(period).to_numpy()
+    # 相邻交易日所属周期变化处为新K线的起点
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ends = np.r_[starts[1:], len(df)] - 1
+
+    high = df['high'].to_numpy(dtype=np.float64)
+    low = df['low'].to_numpy(dtype=np.float64)
+    close = df['close'].to_numpy(dtype=np.float64)
+    bars = pd.DataFrame({
+        'ts_code': df['ts_code'].to_numpy()[ends],
+        'trade_date': df['trade_date'].to_numpy()[ends],
+        'open': df['open'].to_numpy(dtype=np.float64)[starts],
+        'high': np.fmax.reduceat(high, starts),
+        'low': np.fmin.reduceat(low, starts),
+        'close': close[ends],
+        'vol': np.add.reduceat(np.nan_to_num(df['vol'].to_numpy(dtype=np.float64)), starts),
+        'amount': np.add.reduceat(np.nan_to_num(df['amount'].to_numpy(dtype=np.float64)), starts)
+    })
+    pre_close = np.r_[np.nan, bars['close'].to_numpy()[:-1]]
+    if len(df) and 'pre_close' in df.columns:
+        pre_close[0] = df['pre_close'].to_numpy(dtype=np.float64)[0]
+    bars['pre_close'] = pre_close
+    bars['change'] = np.round(bars['close'] - pre_close, 4)
+    bars['pct_chg'] = np.round((bars['close'] / pre_close - 1) * 100, 4)
+    return bars
+
+
+def _minute_groups(minutes: int) -> Tuple[np.ndarray, List[str]]:
+    """
+    分钟槽位的分组起点和每组的结束时间
+    09:30集合竞价那一分钟并入第一根K线，上午和下午分别切分
+    """
+    starts = [0]
+    labels = []
+    for session_start, session_end in ((1, 121), (121, SLOTS)):
+        for start in range(session_start, session_end, minutes):
+            end = min(start + minutes, session_end) - 1
+            if start != 1:
+                starts.append(start)
+            labels.append(SLOT_TIMES[end])
+    return np.array(starts), labels
+
+
+def resample_minutes(day_arrays: List[Tuple[str, np.ndarray]], minutes: int, ts_code: str) -> pd.DataFrame:
+    """
+    把若干交易日的分时数组合成分钟K线
+
+    Args:
+        day_arrays: [(交易日 YYYYMMDD, (字段数, 241) 数组), ...]，按日期升序
+        minutes: 每根K线的分钟数
+    """
+    if not day_arrays:
+        return pd.DataFrame(columns=BAR_COLUMNS)
+
+    starts, labels = _minute_groups(minutes)
+    field = {name: i for i, name in enumerate(INTRADAY_FIELDS)}
+    # (天数, 字段数, 241) -> 按分组在槽位轴上归约
+    data = np.stack([arrays for _, arrays in day_arrays]).astype(np.float64)
+    price = data[:, field['price'], :]
+    valid = ~np.isnan(price)
+
+    slot = np.arange(SLOTS)
+    first = np.minimum.reduceat(np.where(valid, slot, SLOTS), starts, axis=1)
+    last = np.maximum.reduceat(np.where(valid, slot, -1), starts, axis=1)
+    has_data = last >= 0
+    rows = np.arange(len(day_arrays))[:, None]
+
+    open_ = data[:, field['open'], :][rows, np.minimum(first, SLOTS - 1)]
+    close = price[rows, np.maximum(last, 0)]
+    high = np.fmax.reduceat(np.where(valid, data[:, field['high'], :], np.nan), starts, axis=1)
+    low = np.fmin.reduceat(np.where(valid, data[:, field['low'], :], np.nan), starts, axis=1)
+    vol = np.add.reduceat(np.where(valid, data[:, field['volume'], :], 0.0), starts, axis=1)
+    amount = np.add.reduceat(np.where(valid, data[:, field['amount'], :], 0.0), starts, axis=1)
+
+    dates = np.array([date for date, _ in day_arrays], dtype=object)
+    trade_dates = (dates[:, None] + ' ' + np.array(labels, dtype=object)[None, :])
+
+    bars = pd.DataFrame({
+        'ts_code': ts_code,
+        'trade_date': trade_dates[has_data],
+        # 分时数据为float32存储，还原后保留4位小数
+        'open': np.round(open_[has_data], 4),
+        'high': np.round(high[has_data], 4),
+        'low': np.round(low[has_data], 4),
+        'close': np.round(close[has_data], 4),
+        'vol': np.round(vol[has_data], 4),
+        'amount': np.round(amount[has_data], 4)
+    })
+    return bars
+
+
+class BarResampler:
+    """按需合成多周期K线并缓存"""
+
+    NAMESPACE = 'bars'
+
+    def __init__(self, data_service, intraday_store=None, max_bytes: int = 32 * 1024 * 1024):
+        self.data_service = data_service
+        self.intraday_store = intraday_store
+        self.memory_cache = TieredMemoryCache(max_bytes=max_bytes, max_items=2000)
+
+    @staticmethod
+    def _daily_window(count: int, bar_days: int) -> int:
+        return count * bar_days + DAILY_MARGIN
+
+    @staticmethod
+    def _fingerprint(df: pd.DataFrame) -> tuple:
+        if df.empty:
+            return ()
+        return (str(df['trade_date'].iloc[0]), str(df['trade_date'].iloc[-1]), len(df),
+                float(df['close'].iloc[-1]))
+
+    def _cached(self, key: tuple, build) -> pd.DataFrame:
+        bars = self.memory_cache.get(self.NAMESPACE, key)
+        if bars is None:
+            bars = build()
+            self.memory_cache.put(self.NAMESPACE, key, bars, size=int(bars.memory_usage(deep=True).sum()))
+        return bars.copy()
+
+    def bars(self, ts_code: str, freq: str = 'daily', count: int = 200,
+             start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        获取某个周期的K线，按时间升序
+
+        Args:
+            count: 需要的K线数（未指定日期范围时使用）
+            start_date / end_date: 日期范围 YYYYMMDD（分钟线按此选择交易日的分时文件）
+        """
+        freq = normalize_freq(freq)
+        if freq in MINUTE_FREQS:
+            return self.minute_bars(ts_code, MINUTE_FREQS[freq], count, start_date, end_date)
+
+        if start_date and end_date:
+            daily = self.data_service.daily_history(ts_code, start_date=start_date, end_date=end_date)
+        else:
+            daily = self.data_service.daily_history(ts_code, days=self._daily_window(count, CALENDAR_FREQS[freq][1]))
+        if freq == 'daily':
+            return daily
+        return self._cached((ts_code, freq, self._fingerprint(daily)), lambda: resample_daily(daily, freq))
+
+    def _day_files(self, stock_code: str, days: int, start_date: Optional[str] = None,
+                   end_date: Optional[str] = None) -> List[Tuple[str, Any]]:
+        """
+        分时文件: [(交易日, 文件标识), ...]，按日期升序
+
+        指定日期范围时返回范围内的全部交易日，否则返回最近 days 个交易日
+        """
+        found = []
+        for path in reversed(self.intraday_store.list_day_files()):
+            date = path.name.split('_', 1)[0]
+            if end_date and date > end_date:
+                continue
+            if start_date and date < start_date:
+                break
+            # 索引每次发布都会换新文件，以它作为当日数据的版本
+            stamp = self.intraday_store.index_stamp(path)
+            if stamp is None:
+                continue
+            found.append((date, stamp))
+            if not start_date and len(found) >= days:
+                break
+        return list(reversed(found))
+
+    def minute_bars(self, ts_code: str, minutes: int, count: int = 200,
+                    start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """由本地分时文件合成分钟K线（指定日期范围时取范围内的交易日），没有本地分时数据时返回空表"""
+        if self.intraday_store is None:
+            return pd.DataFrame(columns=BAR_COLUMNS)
+
+        stock_code = ts_code.split('.')[0]
+        bars_per_day = math.ceil(120 / minutes) * 2
+        day_files = self._day_files(stock_code, math.ceil(count / bars_per_day) + 1, start_date, end_date)
+
+        def build():
+            day_arrays = []
+            for date, _ in day_files:
+                try:
+                    arrays = self.intraday_store.read_arrays(stock_code, date)
+                except Exception as e:
+                    logger.warning(f"读取分时数据失败 {stock_code} {date}: {e}")
+                    continue
+                if arrays is not None:
+                    day_arrays.append((date, arrays))
+            return resample_minutes(day_arrays, minutes, ts_code)
+
+        return self._cached((ts_code, f'{minutes}min', tuple(day_files)), build)
+
+    def clear(self):
+        self.memory_cache.clear(self.NAMESPACE)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.memory_cache.stats()
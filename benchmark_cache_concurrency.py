@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存并发读取基准测试
+在临时目录中构造市场缓存和分时缓存，比较多线程下
+"读取时加文件锁"（旧行为）与"无锁读取"的吞吐量，测试期间有一个写入线程持续保存。
+
+用法: python benchmark_cache_concurrency.py [每轮秒数] [股票数]
+"""
+
+import sys
+import os
+import time
+import random
+import tempfile
+import threading
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_manager import OptimizedCacheManager
+from intraday_store import SLOT_TIMES
+
+THREAD_COUNTS = [1, 4, 16, 64]
+
+
+def build_market_data(stock_count: int, seed: int = 0):
+    """构造模拟的市场缓存数据"""
+    rng = random.Random(seed)
+    stocks = [{
+        'ts_code': f'{300000 + i:06d}.SZ',
+        'name': f'股票{i}',
+        'latest_price': round(rng.uniform(5, 100), 2),
+        'turnover_rate': round(rng.uniform(0, 10), 4),
+        'nine_turn_up': rng.randint(0, 9),
+        'nine_turn_down': rng.randint(0, 9)
+    } for i in range(stock_count)]
+    return {'stocks': stocks, 'last_update_date': '20250101', 'total': stock_count}
+
+
+def build_intraday_data(seed: int):
+    """构造一只股票的模拟分时数据"""
+    rng = random.Random(seed)
+    points = []
+    for time_str in SLOT_TIMES:
+        price = round(rng.uniform(10, 20), 2)
+        points.append({
+            'time': time_str, 'price': price, 'open': price, 'high': price, 'low': price,
+            'volume': 100.0, 'amount': price * 10000, 'vwap': price, 'avg_price': price,
+            'cumulative_volume': 0.0, 'cumulative_amount': 0.0, 'total_shares': 0.0, 'total_turnover': 0.0
+        })
+    return points
+
+
+def run_round(thread_count: int, duration: float, read_func, write_func):
+    """运行一轮：thread_count个读线程 + 1个写线程，返回每秒读取次数"""
+    stop = threading.Event()
+    counts = [0] * thread_count
+    
+    def reader(slot):
+        while not stop.is_set():
+            read_func()
+            counts[slot] += 1
+    
+    def writer():
+        while not stop.is_set():
+            write_func()
+            time.sleep(0.05)
+    
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(thread_count)]
+    threads.append(threading.Thread(target=writer))
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    
+    return sum(counts) / duration
+
+
+def main():
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    stock_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        # max_memory_items=0：每次读取都走文件，测的是磁盘路径
+        manager = OptimizedCacheManager(cache_dir=tmp, max_memory_items=0)
+        market_data = build_market_data(stock_count)
+        manager.save_cache_data('cyb', dict(market_data))
+        
+        intraday_codes = [f'{300000 + i:06d}' for i in range(50)]
+        for i, code in enumerate(intraday_codes):
+            manager.save_intraday_data(code, build_intraday_data(i))
+        
+        cache_file = manager.get_cache_file_path('cyb')
+        counter = {'n': 0}
+        
+        def write_market():
+            counter['n'] += 1
+            data = build_market_data(stock_count, seed=counter['n'])
+            manager.save_cache_data('cyb', data)
+        
+        def write_intraday():
+            counter['n'] += 1
+            manager.save_intraday_data(random.choice(intraday_codes), build_intraday_data(counter['n']))
+        
+        def read_market_locked():
+            lock_fd = manager.lock_manager.acquire_lock(str(cache_file))
+            try:
+                manager._read_cache_file(cache_file)
+            finally:
+                manager.lock_manager.release_lock(lock_fd, str(cache_file))
+        
+        def read_market_lock_free():
+            manager.load_cache_data('cyb')
+        
+        def read_intraday_locked():
+            code = random.choice(intraday_codes)
+            day_file = str(manager.intraday_store.get_day_file_path()) if manager.intraday_store else code
+            lock_fd = manager.lock_manager.acquire_lock(day_file)
+            try:
+                manager.load_intraday_data(code)
+            finally:
+                manager.lock_manager.release_lock(lock_fd, day_file)
+        
+        def read_intraday_lock_free():
+            manager.load_intraday_data(random.choice(intraday_codes))
+        
+        cases = [
+            ('市场缓存 加锁读取', read_market_locked, write_market),
+            ('市场缓存 无锁读取', read_market_lock_free, write_market),
+            ('分时缓存 加锁读取', read_intraday_locked, write_intraday),
+            ('分时缓存 无锁读取', read_intraday_lock_free, write_intraday),
+        ]
+        
+        print("缓存并发读取基准测试")
+        print(f"股票数: {stock_count}, 每轮 {duration} 秒, 同时有1个写入线程每50ms保存一次")
+        print("=" * 64)
+        print(f"{'场景':<20}" + "".join(f"{f'{n}线程':>11}" for n in THREAD_COUNTS))
+        print("-" * 64)
+        
+        for name, read_func, write_func in cases:
+            rates = [run_round(n, duration, read_func, write_func) for n in THREAD_COUNTS]
+            print(f"{name:<20}" + "".join(f"{rate:>11.0f}" for rate in rates))
+        
+        print("-" * 64)
+        print("单位: 次读取/秒")
+
+
+if __name__ == '__main__':
+    main()
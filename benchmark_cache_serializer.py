@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存序列化格式基准测试
+对cache目录下的每个市场缓存文件，比较各序列化格式的保存耗时、加载耗时和文件大小
+
+用法: python benchmark_cache_serializer.py [缓存目录] [重复次数]
+"""
+
+import sys
+import os
+import time
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_manager import (
+    CacheSerializer, read_cache_file, write_cache_file,
+    MSGPACK_AVAILABLE, ORJSON_AVAILABLE, ZSTD_AVAILABLE
+)
+
+
+def legacy_json_dumps(data):
+    """旧版写法: json.dump(..., ensure_ascii=False, indent=2)"""
+    import json
+    return json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+
+
+def get_candidates():
+    """列出当前环境可用的序列化格式"""
+    candidates = [('json(indent=2, 旧版)', None), ('json', CacheSerializer('json'))]
+    codecs = ['json']
+    if ORJSON_AVAILABLE:
+        candidates.append(('orjson', CacheSerializer('orjson')))
+        codecs.append('orjson')
+    if MSGPACK_AVAILABLE:
+        candidates.append(('msgpack', CacheSerializer('msgpack')))
+        codecs.append('msgpack')
+    
+    for codec in codecs:
+        candidates.append((f'{codec}+zlib', CacheSerializer(codec, 'zlib')))
+        if ZSTD_AVAILABLE:
+            candidates.append((f'{codec}+zstd', CacheSerializer(codec, 'zstd')))
+    return candidates
+
+
+def benchmark_file(cache_file: Path, repeat: int, work_dir: Path):
+    """对单个缓存文件测试所有格式"""
+    data = read_cache_file(cache_file)
+    results = []
+    
+    for name, serializer in get_candidates():
+        target = work_dir / f'{cache_file.stem}.bench'
+        
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if serializer is None:
+                content = legacy_json_dumps(data)
+                with open(target, 'wb') as f:
+                    f.write(content)
+            else:
+                write_cache_file(target, data, serializer)
+        save_ms = (time.perf_counter() - start) / repeat * 1000
+        
+        start = time.perf_counter()
+        for _ in range(repeat):
+            loaded = read_cache_file(target)
+        load_ms = (time.perf_counter() - start) / repeat * 1000
+        
+        assert len(loaded.get('stocks', [])) == len(data.get('stocks', [])), f"{name} 往返结果不一致"
+        results.append((name, target.stat().st_size, save_ms, load_ms))
+        target.unlink()
+    
+    return results
+
+
+def main():
+    cache_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else Path('cache')
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    
+    market_files = sorted(cache_dir.glob('*_stocks_cache.json'))
+    if not market_files:
+        print(f"❌ 未找到市场缓存文件: {cache_dir}/*_stocks_cache.json")
+        return
+    
+    print("缓存序列化格式基准测试")
+    print(f"缓存目录: {cache_dir}, 重复次数: {repeat}")
+    print(f"可选依赖: orjson={ORJSON_AVAILABLE}, msgpack={MSGPACK_AVAILABLE}, zstd={ZSTD_AVAILABLE}")
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        for cache_file in market_files:
+            print("=" * 72)
+            print(f"{cache_file.name} (当前 {cache_file.stat().st_size / 1024:.1f} KB)")
+            print("-" * 72)
+            print(f"{'格式':<22}{'大小(KB)':>12}{'保存(ms)':>12}{'加载(ms)':>12}{'大小比':>10}")
+            
+            results = benchmark_file(cache_file, repeat, Path(tmp))
+            baseline_size = results[0][1]
+            for name, size, save_ms, load_ms in results:
+                print(f"{name:<22}{size / 1024:>12.1f}{save_ms:>12.2f}{load_ms:>12.2f}{size / baseline_size:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
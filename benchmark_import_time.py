@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时基准测试
+在独立子进程中多次执行 import app（以及 create_app()），统计耗时中位数，
+列出 -X importtime 中累计耗时最多的模块，并检查导入后没有加载 tushare/akshare。
+超过预算时以非0状态退出，可以放在部署前的检查中。
+
+用法: python benchmark_import_time.py [重复次数] [预算秒数]
+"""
+
+import os
+import sys
+import json
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# 导入后不应被加载的数据源库
+LAZY_MODULES = ['tushare', 'akshare', 'moneyflow_handler']
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+app.create_app()
+created = time.perf_counter() - start
+print(json.dumps({
+    'import': imported,
+    'create_app': created,
+    'loaded': [name for name in %r if name in sys.modules]
+}))
+''' % (LAZY_MODULES,)
+
+
+def run_probe(extra_args=()):
+    env = dict(os.environ, SCHEDULER_ENABLED='false')
+    result = subprocess.run([sys.executable, *extra_args, '-c', PROBE], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=120)
+    if result.returncode != 0:
+        raise RuntimeError(f"导入app失败:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_modules(importtime_output, top=15):
+    """解析 -X importtime 输出，按累计耗时排序的顶层模块"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, self_us, cumulative_us, name = [part.strip() for part in line.replace('import time:', '|').split('|')]
+        # 只看直接被app导入的模块（缩进最浅的两层）
+        depth = (len(line.split('|')[-1]) - len(line.split('|')[-1].lstrip())) // 2
+        if depth <= 1:
+            rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    budget = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+
+    samples = [run_probe()[0] for _ in range(repeat)]
+    import_times = [sample['import'] for sample in samples]
+    create_times = [sample['create_app'] for sample in samples]
+    loaded = samples[-1]['loaded']
+
+    print(f"import app:          中位数 {statistics.median(import_times) * 1000:8.1f} ms "
+          f"(最小 {min(import_times) * 1000:.1f} ms, 最大 {max(import_times) * 1000:.1f} ms)")
+    print(f"import + create_app: 中位数 {statistics.median(create_times) * 1000:8.1f} ms")
+    print(f"导入后已加载的数据源库: {', '.join(loaded) if loaded else '无'}")
+
+    _, importtime_output = run_probe(('-X', 'importtime'))
+    print("\n累计耗时最多的模块:")
+    for cumulative_us, name in slowest_modules(importtime_output):
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    if statistics.median(create_times) > budget:
+        failures.append(f"启动耗时 {statistics.median(create_times):.2f}s 超过预算 {budget:.2f}s")
+    if loaded:
+        failures.append(f"导入app时加载了应延迟导入的模块: {', '.join(loaded)}")
+    for failure in failures:
+        print(f"\n失败: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
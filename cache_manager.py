@@ -10,6 +10,11 @@
 5. 增量更新：只更新变化的数据
 6. 监控告警：缓存状态监控
 7. 数据生命周期：90天数据保留，120天自动清理
+8. 预写日志：每次保存只追加变更记录，定期压缩为基准快照
+9. 紧凑存储：可插拔序列化器（msgpack/orjson，可选zstd压缩），兼容读取旧版JSON
+10. 分时数据：按交易日的列式文件，mmap零解析读取
+11. 元数据索引：健康检查、过期清理和状态查询不再解析数据文件
+12. 内存预算：热数据内存层按字节预算限额，TinyLFU准入，避免偶发访问挤掉热点数据
 """
 
 import os
@@ -19,9 +24,9 @@ import threading
 import hashlib
 import shutil
 import logging
+import uuid
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, List
-from collections import OrderedDict
 # 处理fcntl库的兼容性问题（Windows系统不支持fcntl）
 try:
     import fcntl
@@ -29,10 +34,34 @@ try:
 except ImportError:
     FCNTL_AVAILABLE = False
     
+# 可选的紧凑序列化/压缩库，未安装时自动降级
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+import zlib
+
 import tempfile
 from dataclasses import dataclass, asdict
 from pathlib import Path
 
+from intraday_store import ColumnarIntradayStore, NUMPY_AVAILABLE
+from memory_cache import TieredMemoryCache
+
 # 配置日志
 logging.basicConfig(
     level=logging.INFO,
@@ -44,6 +73,162 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+class CacheSerializer:
+    """缓存文件序列化器
+
+    文件格式: 非JSON编码时以 b'TDCACHE1 <编码>[+<压缩>]\\n' 作为文件头，后接数据；
+    JSON编码直接写紧凑JSON（无文件头），读取时按是否有文件头自动识别，
+    因此旧版 indent=2 的JSON文件无需迁移即可读取。
+    """
+    
+    MAGIC = b'TDCACHE1 '
+    
+    def __init__(self, codec: str = 'json', compression: Optional[str] = None):
+        if codec == 'msgpack' and not MSGPACK_AVAILABLE:
+            raise ValueError("msgpack未安装")
+        if codec == 'orjson' and not ORJSON_AVAILABLE:
+            raise ValueError("orjson未安装")
+        if codec not in ('json', 'orjson', 'msgpack'):
+            raise ValueError(f"不支持的缓存编码: {codec}")
+        if compression == 'zstd' and not ZSTD_AVAILABLE:
+            raise ValueError("zstandard未安装")
+        if compression not in (None, 'zlib', 'zstd'):
+            raise ValueError(f"不支持的压缩方式: {compression}")
+        
+        self.codec = codec
+        self.compression = compression
+    
+    @property
+    def name(self) -> str:
+        return f"{self.codec}+{self.compression}" if self.compression else self.codec
+    
+    @staticmethod
+    def _default(obj):
+        """处理numpy标量等非原生类型"""
+        if hasattr(obj, 'item'):
+            return obj.item()
+        raise TypeError(f"无法序列化类型: {type(obj).__name__}")
+    
+    @staticmethod
+    def _encode(codec: str, data: Any) -> bytes:
+        if codec == 'msgpack':
+            return msgpack.packb(data, use_bin_type=True, default=CacheSerializer._default)
+        if codec == 'orjson':
+            return orjson.dumps(data, default=CacheSerializer._default,
+                                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'),
+                          default=CacheSerializer._default).encode('utf-8')
+    
+    @staticmethod
+    def _decode(codec: str, payload: bytes) -> Any:
+        if codec == 'msgpack':
+            if not MSGPACK_AVAILABLE:
+                raise ValueError("读取msgpack缓存需要安装msgpack")
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        if codec == 'orjson' and ORJSON_AVAILABLE:
+            return orjson.loads(payload)
+        # orjson写出的就是标准JSON，未安装orjson时用json读取
+        return json.loads(payload.decode('utf-8'))
+    
+    def dumps(self, data: Any) -> bytes:
+        """序列化为文件内容"""
+        payload = self._encode(self.codec, data)
+        if self.compression == 'zstd':
+            payload = zstandard.ZstdCompressor(level=3).compress(payload)
+        elif self.compression == 'zlib':
+            payload = zlib.compress(payload, 6)
+        
+        if self.codec == 'json' and not self.compression:
+            return payload
+        return self.MAGIC + self.name.encode('ascii') + b'\n' + payload
+    
+    @classmethod
+    def loads(cls, content: bytes) -> Any:
+        """反序列化文件内容，自动识别编码（包括旧版JSON）"""
+        if not content.startswith(cls.MAGIC):
+            return json.loads(content.decode('utf-8'))
+        
+        header_end = content.index(b'\n')
+        name = content[len(cls.MAGIC):header_end].decode('ascii')
+        payload = content[header_end + 1:]
+        codec, _, compression = name.partition('+')
+        
+        if compression == 'zstd':
+            if not ZSTD_AVAILABLE:
+                raise ValueError("读取zstd压缩缓存需要安装zstandard")
+            payload = zstandard.ZstdDecompressor().decompress(payload)
+        elif compression == 'zlib':
+            payload = zlib.decompress(payload)
+        
+        return cls._decode(codec, payload)
+
+
+def get_default_serializer() -> CacheSerializer:
+    """根据环境变量 CACHE_SERIALIZER / CACHE_COMPRESSION 选择序列化器
+
+    CACHE_SERIALIZER: auto(默认，msgpack > orjson > json) / msgpack / orjson / json
+    CACHE_COMPRESSION: none(默认) / zlib / zstd
+    """
+    codec = os.getenv('CACHE_SERIALIZER', 'auto').lower()
+    compression = os.getenv('CACHE_COMPRESSION', 'none').lower()
+    compression = None if compression in ('', 'none') else compression
+    
+    if codec == 'auto':
+        codec = 'msgpack' if MSGPACK_AVAILABLE else 'orjson' if ORJSON_AVAILABLE else 'json'
+    
+    try:
+        return CacheSerializer(codec, compression)
+    except ValueError as e:
+        logger.warning(f"缓存序列化配置不可用({e})，改用紧凑JSON")
+        return CacheSerializer('json')
+
+
+def read_cache_file(file_path) -> Any:
+    """读取缓存文件（自动识别二进制格式和旧版JSON）"""
+    with open(file_path, 'rb') as f:
+        return CacheSerializer.loads(f.read())
+
+
+_shared_file_cache: Dict[str, tuple] = {}
+_shared_file_cache_lock = threading.Lock()
+
+
+def read_cache_file_shared(file_path) -> Any:
+    """
+    读取缓存文件，文件未变化（修改时间和大小相同）时返回上次解析的同一个对象
+    返回值由所有调用方共享，只能读取不能修改
+    """
+    key = str(file_path)
+    stat = os.stat(key)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _shared_file_cache_lock:
+        cached = _shared_file_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+    data = read_cache_file(key)
+    with _shared_file_cache_lock:
+        _shared_file_cache[key] = (stamp, data)
+    return data
+
+
+def write_cache_file(file_path, data: Any, serializer: Optional[CacheSerializer] = None):
+    """原子写入缓存文件：先写临时文件再替换"""
+    file_path = Path(file_path)
+    content = (serializer or default_serializer).dumps(data)
+    
+    temp_path = file_path.with_name(file_path.name + '.tmp')
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        temp_path.replace(file_path)
+    except Exception:
+        if temp_path.exists():
+            temp_path.unlink()
+        raise
+
+
+default_serializer = get_default_serializer()
+
 @dataclass
 class CacheMetrics:
     """缓存性能指标"""
@@ -99,15 +284,17 @@ class FileLockManager:
             # 创建锁文件
             lock_fd = os.open(lock_file, os.O_CREAT | os.O_WRONLY | os.O_TRUNC)
             
-            # 尝试获取排他锁
+            # 尝试获取排他锁（退避等待：1ms起，最长100ms）
             start_time = time.time()
+            wait = 0.001
             while time.time() - start_time < self.lock_timeout:
                 try:
                     fcntl.flock(lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                    logger.info(f"成功获取文件锁: {file_path}")
+                    logger.debug(f"成功获取文件锁: {file_path}")
                     return lock_fd
                 except BlockingIOError:
-                    time.sleep(0.1)
+                    time.sleep(wait)
+                    wait = min(wait * 2, 0.1)
             
             # 超时未获取到锁
             os.close(lock_fd)
@@ -129,11 +316,8 @@ class FileLockManager:
                 fcntl.flock(lock_fd, fcntl.LOCK_UN)
                 os.close(lock_fd)
                 
-                # 删除锁文件
-                lock_file = f"{file_path}.lock"
-                if os.path.exists(lock_file):
-                    os.remove(lock_file)
-                    
+                # 保留锁文件：若在此删除，正在等待旧文件的写入者与新建锁文件的
+                # 写入者会各自持有一把锁
                 logger.debug(f"成功释放文件锁: {file_path}")
         except Exception as e:
             logger.error(f"释放文件锁失败: {file_path}, 错误: {e}")
@@ -238,9 +422,10 @@ class DataValidator:
     
     @staticmethod
     def calculate_checksum(data: Dict[str, Any]) -> str:
-        """计算数据校验和"""
+        """计算数据校验和（不包含_checksum字段本身）"""
         try:
-            json_str = json.dumps(data, sort_keys=True, ensure_ascii=False)
+            payload = {k: v for k, v in data.items() if k != '_checksum'}
+            json_str = json.dumps(payload, sort_keys=True, ensure_ascii=False)
             return hashlib.md5(json_str.encode('utf-8')).hexdigest()
         except Exception as e:
             logger.error(f"计算校验和失败: {e}")
@@ -252,20 +437,334 @@ class DataValidator:
         actual_checksum = DataValidator.calculate_checksum(data)
         return actual_checksum == expected_checksum
 
+class CacheJournal:
+    """缓存预写日志
+
+    基准快照（*.json）只在压缩时整体重写，两次压缩之间的每次保存
+    只向 *.json.journal 追加一行变更记录（按ts_code的新增/修改/删除）。
+    每条记录带有所属基准快照的 _base_id，基准快照被替换或删除后，
+    旧日志记录会被自动忽略。
+    """
+    
+    def __init__(self, max_records: int = 50, max_size_ratio: float = 0.5):
+        self.max_records = max_records          # 日志记录数达到该值时压缩
+        self.max_size_ratio = max_size_ratio    # 日志体积超过快照的该比例时压缩
+        self.record_counts = {}                 # 日志路径 -> 记录数
+        self.count_lock = threading.Lock()
+    
+    @staticmethod
+    def get_journal_path(file_path: Path) -> Path:
+        """获取日志文件路径"""
+        return file_path.with_suffix('.json.journal')
+    
+    @staticmethod
+    def build_record(old_data: Dict[str, Any], new_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """计算两个版本之间的变更记录，无法用增量表示时返回None"""
+        old_stocks = old_data.get('stocks')
+        new_stocks = new_data.get('stocks')
+        if not isinstance(old_stocks, list) or not isinstance(new_stocks, list):
+            return None
+        
+        old_map = {}
+        for stock in old_stocks:
+            if not isinstance(stock, dict) or 'ts_code' not in stock:
+                return None
+            old_map[stock['ts_code']] = stock
+        if len(old_map) != len(old_stocks):
+            return None
+        
+        new_codes = []
+        upsert = []
+        for stock in new_stocks:
+            if not isinstance(stock, dict) or 'ts_code' not in stock:
+                return None
+            new_codes.append(stock['ts_code'])
+            if old_map.get(stock['ts_code']) != stock:
+                upsert.append(stock)
+        
+        new_code_set = set(new_codes)
+        if len(new_code_set) != len(new_codes):
+            return None
+        
+        record = {
+            'time': time.time(),
+            'set': {k: v for k, v in new_data.items()
+                    if k != 'stocks' and not k.startswith('_') and old_data.get(k) != v},
+            'unset': [k for k in old_data
+                      if k != 'stocks' and not k.startswith('_') and k not in new_data],
+            'upsert': upsert,
+            'delete': [code for code in old_map if code not in new_code_set]
+        }
+        
+        # 回放时保留原顺序、新股票追加在末尾；顺序不一致时才记录完整顺序
+        replay_order = [stock['ts_code'] for stock in old_stocks if stock['ts_code'] in new_code_set]
+        replay_order += [code for code in new_codes if code not in old_map]
+        if replay_order != new_codes:
+            record['order'] = new_codes
+        
+        return record
+    
+    @staticmethod
+    def apply_record(data: Dict[str, Any], record: Dict[str, Any]) -> Dict[str, Any]:
+        """将一条变更记录应用到数据上，返回新数据"""
+        deleted = set(record.get('delete', []))
+        stocks = [stock for stock in data.get('stocks', []) if stock['ts_code'] not in deleted]
+        index = {stock['ts_code']: i for i, stock in enumerate(stocks)}
+        
+        for stock in record.get('upsert', []):
+            position = index.get(stock['ts_code'])
+            if position is None:
+                index[stock['ts_code']] = len(stocks)
+                stocks.append(stock)
+            else:
+                stocks[position] = stock
+        
+        if record.get('order'):
+            stock_map = {stock['ts_code']: stock for stock in stocks}
+            stocks = [stock_map[code] for code in record['order'] if code in stock_map]
+        
+        updated_data = {k: v for k, v in data.items() if k not in record.get('unset', [])}
+        updated_data.update(record.get('set', {}))
+        updated_data['stocks'] = stocks
+        updated_data['_save_time'] = record.get('time', updated_data.get('_save_time'))
+        return updated_data
+    
+    def read_records(self, file_path: Path, base_id: Optional[str]) -> tuple[List[Dict[str, Any]], bool]:
+        """读取属于指定基准快照的日志记录，返回(记录列表, 是否存在损坏的尾部)"""
+        journal_path = self.get_journal_path(file_path)
+        records = []
+        torn = False
+        
+        if not base_id or not journal_path.exists():
+            return records, torn
+        
+        # 按字节读取：半行记录可能断在多字节字符中间，按文本读取会在解码时整体失败
+        with open(journal_path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 追加过程中断导致的半行记录
+                    torn = True
+                    break
+                try:
+                    record = json.loads(line.decode('utf-8'))
+                except ValueError:
+                    torn = True
+                    break
+                if record.get('base') == base_id:
+                    records.append(record)
+        
+        return records, torn
+    
+    def needs_compaction(self, file_path: Path, pending_bytes: int = 0) -> bool:
+        """判断追加下一条记录前是否应先压缩"""
+        journal_path = self.get_journal_path(file_path)
+        with self.count_lock:
+            record_count = self.record_counts.get(str(journal_path))
+        
+        if record_count is None:
+            # 首次访问（例如进程重启后），统计一次现有行数
+            record_count = 0
+            if journal_path.exists():
+                with open(journal_path, 'rb') as f:
+                    record_count = sum(1 for _ in f)
+            with self.count_lock:
+                self.record_counts[str(journal_path)] = record_count
+        
+        if record_count >= self.max_records:
+            return True
+        
+        journal_size = journal_path.stat().st_size if journal_path.exists() else 0
+        base_size = file_path.stat().st_size if file_path.exists() else 0
+        return journal_size + pending_bytes > base_size * self.max_size_ratio
+    
+    def append(self, file_path: Path, line: str):
+        """追加一条已序列化的记录并刷盘"""
+        journal_path = self.get_journal_path(file_path)
+        self._truncate_torn_tail(journal_path)
+        with open(journal_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+        
+        with self.count_lock:
+            key = str(journal_path)
+            self.record_counts[key] = self.record_counts.get(key, 0) + 1
+    
+    @staticmethod
+    def _truncate_torn_tail(journal_path: Path):
+        """截掉上次中断留下的半行记录，避免新记录拼接在其后"""
+        if not journal_path.exists():
+            return
+        with open(journal_path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b'\n':
+                return
+            f.seek(0)
+            content = f.read()
+            f.truncate(content.rfind(b'\n') + 1)
+            logger.warning(f"截断缓存日志中未写完的记录: {journal_path}")
+    
+    @staticmethod
+    def serialize(base_id: str, record: Dict[str, Any]) -> str:
+        """序列化为单行日志"""
+        return json.dumps(dict(record, base=base_id), ensure_ascii=False, separators=(',', ':')) + '\n'
+    
+    def reset(self, file_path: Path):
+        """基准快照已重写，删除旧日志"""
+        journal_path = self.get_journal_path(file_path)
+        try:
+            journal_path.unlink()
+        except FileNotFoundError:
+            pass
+        with self.count_lock:
+            self.record_counts[str(journal_path)] = 0
+
+class CacheIndex:
+    """缓存元数据索引
+
+    记录每个缓存文件的类型、数据日期、大小、修改时间、校验和与最近校验时间。
+    由保存路径维护，健康检查、过期清理和状态查询只需读索引并stat文件，
+    不再解析数据文件；索引中没有或大小/修改时间对不上的文件（例如由其他
+    模块直接写入的文件）才会被解析校验一次。
+    """
+    
+    INDEX_NAME = '_cache_index.json'
+    
+    def __init__(self, cache_dir: Path, flush_interval: float = 5.0):
+        self.cache_dir = Path(cache_dir)
+        self.index_path = self.cache_dir / self.INDEX_NAME
+        self.flush_interval = flush_interval
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.lock = threading.RLock()
+        self.dirty = False
+        self.last_flush = 0.0
+        self._load()
+    
+    def _load(self):
+        """加载索引文件，不存在或损坏时从空索引开始（由健康检查补齐）"""
+        try:
+            index_data = read_cache_file(self.index_path)
+            self.entries = index_data.get('entries', {})
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"缓存索引损坏，将重新建立: {e}")
+    
+    def key_for(self, file_path) -> str:
+        """索引键：相对缓存目录的路径"""
+        return Path(os.path.relpath(file_path, self.cache_dir)).as_posix()
+    
+    @staticmethod
+    def kind_of(file_path) -> str:
+        """根据文件名判断缓存类型"""
+        path = Path(file_path)
+        if path.name.endswith('_stocks_cache.json'):
+            return 'market'
+        if path.parent.name == 'intraday':
+            return 'intraday'
+        return 'other'
+    
+    @staticmethod
+    def date_from_name(file_path) -> Optional[str]:
+        """从分时文件名中解析日期（_intraday之前的最后一段）"""
+        file_date = Path(file_path).name.split('_intraday')[0].split('_')[-1]
+        return file_date if len(file_date) == 8 and file_date.isdigit() else None
+    
+    def update(self, file_path, **meta):
+        """更新文件的元数据（同时记录当前大小和修改时间）"""
+        path = Path(file_path)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.remove(path)
+            return
+        
+        with self.lock:
+            key = self.key_for(path)
+            entry = dict(self.entries.get(key) or {'kind': self.kind_of(path)})
+            entry.update(meta)
+            entry['size'] = stat.st_size
+            entry['mtime'] = stat.st_mtime
+            # 元数据没有变化时不标记，索引文件只在有变化时写回
+            if self.entries.get(key) != entry:
+                self.entries[key] = entry
+                self.dirty = True
+        self.flush()
+    
+    def remove(self, file_path):
+        """删除文件的元数据"""
+        with self.lock:
+            if self.entries.pop(self.key_for(file_path), None) is not None:
+                self.dirty = True
+        self.flush()
+    
+    def get(self, file_path) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            entry = self.entries.get(self.key_for(file_path))
+            return dict(entry) if entry else None
+    
+    def items(self) -> List[tuple[Path, Dict[str, Any]]]:
+        """返回(文件路径, 元数据副本)列表"""
+        with self.lock:
+            return [(self.cache_dir / key, dict(entry)) for key, entry in self.entries.items()]
+    
+    def flush(self, force: bool = False):
+        """写回索引文件（默认最多每flush_interval秒一次）"""
+        with self.lock:
+            if not self.dirty or (not force and time.time() - self.last_flush < self.flush_interval):
+                return
+            snapshot = {'version': 1, 'update_time': time.time(), 'entries': self.entries}
+            try:
+                write_cache_file(self.index_path, snapshot, CacheSerializer('json'))
+                self.dirty = False
+                self.last_flush = time.time()
+            except Exception as e:
+                logger.error(f"保存缓存索引失败: {e}")
+    
+    def summary(self) -> Dict[str, Any]:
+        """按类型汇总文件数和大小"""
+        with self.lock:
+            by_kind = {}
+            for entry in self.entries.values():
+                stats = by_kind.setdefault(entry.get('kind', 'other'), {'file_count': 0, 'total_size': 0})
+                stats['file_count'] += 1
+                stats['total_size'] += entry.get('size', 0) + entry.get('journal_size', 0)
+            return {
+                'file_count': len(self.entries),
+                'total_size': sum(stats['total_size'] for stats in by_kind.values()),
+                'by_kind': by_kind,
+                'invalid_files': [key for key, entry in self.entries.items() if entry.get('valid') is False],
+                'last_flush': self.last_flush
+            }
+
 class OptimizedCacheManager:
     """优化的缓存管理器"""
     
-    def __init__(self, cache_dir: str = 'cache', max_memory_items: int = 100):
+    def __init__(self, cache_dir: str = 'cache', max_memory_items: int = 100,
+                 serializer: Optional[CacheSerializer] = None,
+                 max_memory_bytes: Optional[int] = None):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(exist_ok=True)
         
-        # 分层存储：内存缓存（热数据）
-        self.memory_cache = OrderedDict()
+        # 分层存储：内存缓存（热数据），按字节预算限额，条目数只作为上限
+        # 冷数据本身就在缓存文件中，这里不启用溢出层
+        if max_memory_bytes is None:
+            max_memory_bytes = int(os.getenv('CACHE_MEMORY_MB', '256')) * 1024 * 1024
+        self.memory_cache = TieredMemoryCache(max_bytes=max_memory_bytes, max_items=max_memory_items)
         self.max_memory_items = max_memory_items
         
         # 组件初始化
         self.lock_manager = FileLockManager()
         self.validator = DataValidator()
+        self.journal = CacheJournal()
+        self.serializer = serializer or default_serializer
+        self.index = CacheIndex(self.cache_dir)
+        
+        # 分时数据：按交易日的列式文件（需要numpy），否则退回每只股票一个文件
+        self.intraday_store = ColumnarIntradayStore(self.cache_dir / 'intraday') if NUMPY_AVAILABLE else None
         
         # 状态监控
         self.status = CacheStatus()
@@ -273,14 +772,25 @@ class OptimizedCacheManager:
         
         # 线程锁
         self.memory_lock = threading.RLock()
+        # 每个市场的写入版本号，防止无锁读者用旧数据覆盖内存缓存
+        self.write_versions = {}
+        # 每个市场内存缓存对应的文件状态，其他进程（任务进程、其他worker）写入后据此重新加载
+        self.file_stamps = {}
         
-        # 启动后台任务
-        self._start_background_tasks()
+        # 后台任务（健康检查、过期清理）由 start_background_tasks() 启动，
+        # 导入模块和测试中创建的实例不启动线程，也不写索引文件
+        self._background_started = False
+        self._background_lock = threading.Lock()
         
-        logger.info(f"缓存管理器初始化完成，缓存目录: {self.cache_dir}")
+        logger.info(f"缓存管理器初始化完成，缓存目录: {self.cache_dir}, 序列化格式: {self.serializer.name}")
     
-    def _start_background_tasks(self):
-        """启动后台任务"""
+    def start_background_tasks(self):
+        """启动后台任务（只执行一次），由 create_app() 和任务进程 worker.py 调用"""
+        with self._background_lock:
+            if self._background_started:
+                return
+            self._background_started = True
+        
         # 健康检查任务
         health_thread = threading.Thread(target=self._health_check_loop, daemon=True)
         health_thread.start()
@@ -327,27 +837,12 @@ class OptimizedCacheManager:
             if free_space_gb < 1.0:  # 少于1GB
                 errors.append(f"磁盘空间不足: {free_space_gb:.2f}GB")
             
-            # 检查缓存文件
-            cache_files = list(self.cache_dir.glob('*.json'))
-            corrupted_files = []
+            # 检查缓存文件：只stat，索引中已有且未变化的文件不再解析
+            self._sync_index()
+            summary = self.index.summary()
             
-            for cache_file in cache_files:
-                try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                    
-                    # 只对股票缓存文件进行结构验证，跳过watchlist.json等其他文件
-                    if cache_file.name.endswith('_stocks_cache.json'):
-                        is_valid, validation_errors = self.validator.validate_json_structure(data)
-                        if not is_valid:
-                            corrupted_files.append(str(cache_file))
-                    # 对于其他JSON文件（如watchlist.json），只要能正常解析JSON就认为是有效的
-                        
-                except Exception:
-                    corrupted_files.append(str(cache_file))
-            
-            if corrupted_files:
-                errors.append(f"发现损坏的缓存文件: {corrupted_files}")
+            if summary['invalid_files']:
+                errors.append(f"发现损坏的缓存文件: {summary['invalid_files']}")
             
             # 更新状态
             self.status.is_healthy = len(errors) == 0
@@ -355,9 +850,8 @@ class OptimizedCacheManager:
             self.status.last_check_time = time.time()
             
             # 更新指标
-            self.metrics.file_count = len(cache_files)
-            total_size = sum(f.stat().st_size for f in cache_files)
-            self.metrics.data_size = total_size
+            self.metrics.file_count = summary['file_count']
+            self.metrics.data_size = summary['total_size']
             
             if errors:
                 logger.warning(f"健康检查发现问题: {errors}")
@@ -369,50 +863,132 @@ class OptimizedCacheManager:
             self.status.is_healthy = False
             self.status.error_messages = [f"健康检查执行失败: {e}"]
     
+    def _list_cache_files(self) -> List[Path]:
+        """列出缓存目录中的数据文件（顶层JSON和分时文件）"""
+        files = [f for f in self.cache_dir.glob('*.json') if f.name != CacheIndex.INDEX_NAME]
+        intraday_dir = self.cache_dir / 'intraday'
+        if intraday_dir.exists():
+            files.extend(intraday_dir.glob('*_intraday.col'))
+            files.extend(intraday_dir.glob('*_intraday.json'))
+            # 旧版本遗留的完整备份，纳入索引以便按日期清理
+            files.extend(intraday_dir.glob('*_intraday.json.backup'))
+        return files
+    
+    def _sync_index(self):
+        """让索引与磁盘一致：删除已消失的文件，校验新增或被外部修改的文件"""
+        on_disk = {self.index.key_for(f): f for f in self._list_cache_files()}
+        
+        for file_path, entry in self.index.items():
+            if self.index.key_for(file_path) not in on_disk:
+                self.index.remove(file_path)
+        
+        for key, file_path in on_disk.items():
+            entry = self.index.get(file_path)
+            try:
+                stat = file_path.stat()
+            except FileNotFoundError:
+                continue
+            if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+                continue
+            self._validate_and_index(file_path)
+        
+        self.index.flush(force=True)
+    
+    def _validate_and_index(self, file_path: Path):
+        """解析校验一个文件并写入索引"""
+        kind = CacheIndex.kind_of(file_path)
+        
+        if kind == 'intraday':
+            # 分时文件按文件名中的日期管理，不解析内容
+            self.index.update(file_path, date=CacheIndex.date_from_name(file_path), valid=True)
+            return
+        
+        meta = {'last_validated': time.time()}
+        try:
+            if kind == 'market':
+                data = self._read_cache_file(file_path)
+                meta['valid'] = self.validator.validate_json_structure(data)[0]
+                meta['date'] = data.get('last_update_date')
+                meta['oldest_kline_date'] = self._oldest_kline_date(data.get('stocks'))
+                journal_path = self.journal.get_journal_path(file_path)
+                meta['journal_size'] = journal_path.stat().st_size if journal_path.exists() else 0
+            else:
+                # 其他JSON文件（如watchlist.json），只要能正常解析就认为是有效的
+                data = read_cache_file(file_path)
+                meta['valid'] = True
+                if isinstance(data, dict):
+                    meta['date'] = data.get('cache_date') or data.get('filter_date') or data.get('date')
+        except Exception as e:
+            logger.warning(f"缓存文件校验失败: {file_path}, 错误: {e}")
+            meta['valid'] = False
+        
+        self.index.update(file_path, **meta)
+    
+    @staticmethod
+    def _oldest_kline_date(stocks) -> Optional[str]:
+        """数据中最早的K线日期，没有K线数据时返回None"""
+        oldest = None
+        for stock in stocks or []:
+            if not isinstance(stock, dict):
+                continue
+            for kline in stock.get('kline_data') or []:
+                trade_date = kline.get('trade_date') if isinstance(kline, dict) else None
+                if trade_date and (oldest is None or trade_date < oldest):
+                    oldest = trade_date
+        return oldest
+    
     def _cleanup_old_data(self):
-        """清理过期数据"""
+        """清理过期数据：最早K线超过120天的文件才重写，重写时保留最近90天"""
         try:
             current_date = datetime.now()
             cutoff_date = current_date - timedelta(days=120)  # 120天前
             cutoff_str = cutoff_date.strftime('%Y%m%d')
+            keep_date = (current_date - timedelta(days=90)).strftime('%Y%m%d')
             
             cleaned_count = 0
             
-            for cache_file in self.cache_dir.glob('*.json'):
+            # 从索引中挑出需要清理的文件，其余文件不读取
+            for cache_file, entry in self.index.items():
+                oldest = entry.get('oldest_kline_date')
+                if entry.get('kind') != 'market' or not oldest or oldest >= cutoff_str:
+                    continue
+                
+                lock_fd = self.lock_manager.acquire_lock(str(cache_file))
+                if not lock_fd:
+                    logger.warning(f"无法获取文件锁，跳过清理: {cache_file}")
+                    continue
+                
                 try:
-                    # 跳过非股票缓存文件
-                    if not cache_file.name.endswith('_stocks_cache.json'):
-                        continue
-                        
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        data = json.load(f)
+                    data = self._read_cache_file(cache_file)
                     
                     if 'stocks' in data:
                         original_count = sum(len(stock.get('kline_data', [])) for stock in data['stocks'])
-                        data_modified = False
                         
-                        # 清理每只股票的历史数据
+                        # 只保留90天内的K线数据
                         for stock in data['stocks']:
                             if 'kline_data' in stock and stock['kline_data']:
-                                # 只保留90天内的K线数据
-                                keep_date = (current_date - timedelta(days=90)).strftime('%Y%m%d')
-                                original_kline_count = len(stock['kline_data'])
                                 stock['kline_data'] = [
                                     kline for kline in stock['kline_data']
                                     if kline.get('trade_date') and kline.get('trade_date') >= keep_date
                                 ]
-                                if len(stock['kline_data']) != original_kline_count:
-                                    data_modified = True
                         
-                        # 如果数据被修改，保存回文件
-                        if data_modified:
-                            new_count = sum(len(stock.get('kline_data', [])) for stock in data['stocks'])
-                            self._save_data_with_backup(cache_file, data)
-                            cleaned_count += 1
-                            logger.info(f"清理缓存文件 {cache_file}: {original_count} -> {new_count} 条K线数据")
+                        new_count = sum(len(stock.get('kline_data', [])) for stock in data['stocks'])
+                        self._save_data_with_backup(cache_file, data)
+                        
+                        # 内存中的旧版本作废
+                        market = self._market_from_path(cache_file)
+                        with self.memory_lock:
+                            self.write_versions[market] = self.write_versions.get(market, 0) + 1
+                            self.memory_cache.pop('market', market)
+                        
+                        cleaned_count += 1
+                        logger.info(f"清理缓存文件 {cache_file}: {original_count} -> {new_count} 条K线数据")
                     
                 except Exception as e:
                     logger.error(f"清理缓存文件失败 {cache_file}: {e}")
+                    
+                finally:
+                    self.lock_manager.release_lock(lock_fd, str(cache_file))
             
             if cleaned_count > 0:
                 logger.info(f"数据清理完成，处理了 {cleaned_count} 个缓存文件")
@@ -436,44 +1012,117 @@ class OptimizedCacheManager:
         today = datetime.now().strftime('%Y%m%d')
         return intraday_dir / f'{stock_code}_{today}_intraday.json'
     
-    def _save_data_with_backup(self, file_path: Path, data: Dict[str, Any]):
-        """带备份的数据保存"""
-        # 创建备份
-        if file_path.exists():
-            backup_path = file_path.with_suffix('.json.backup')
-            shutil.copy2(file_path, backup_path)
+    def _save_data_with_backup(self, file_path: Path, data: Dict[str, Any],
+                               previous_data: Optional[Dict[str, Any]] = None):
+        """保存数据：能增量表示时只追加日志记录，否则重写基准快照"""
+        base_id = previous_data.get('_base_id') if previous_data else None
+        
+        if base_id and file_path.exists():
+            record = self.journal.build_record(previous_data, data)
+            if record is not None:
+                line = self.journal.serialize(base_id, record)
+                if not self.journal.needs_compaction(file_path, len(line.encode('utf-8'))):
+                    self.journal.append(file_path, line)
+                    data.pop('_checksum', None)
+                    data['_base_id'] = base_id
+                    data['_save_time'] = record['time']
+                    
+                    # 基准快照未变，只更新索引中的日期、日志大小和最早K线日期
+                    previous_oldest = (self.index.get(file_path) or {}).get('oldest_kline_date')
+                    upsert_oldest = self._oldest_kline_date(record['upsert'])
+                    journal_path = self.journal.get_journal_path(file_path)
+                    self.index.update(
+                        file_path,
+                        date=data.get('last_update_date') or data.get('date'),
+                        journal_size=journal_path.stat().st_size,
+                        oldest_kline_date=min(filter(None, [previous_oldest, upsert_oldest]), default=None)
+                    )
+                    logger.debug(f"追加缓存日志: {file_path}, 变更 {len(record['upsert'])} 只, 删除 {len(record['delete'])} 只")
+                    return
+        
+        self._write_snapshot(file_path, data)
+    
+    def _write_snapshot(self, file_path: Path, data: Dict[str, Any]):
+        """原子写入基准快照并清空日志（即压缩）"""
+        data.pop('_checksum', None)
+        data['_base_id'] = uuid.uuid4().hex
+        data['_save_time'] = time.time()
         
         # 添加校验和
         data['_checksum'] = self.validator.calculate_checksum(data)
-        data['_save_time'] = time.time()
         
-        # 原子写入
-        temp_path = file_path.with_suffix('.json.tmp')
-        try:
-            with open(temp_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-            
-            # 原子替换
-            temp_path.replace(file_path)
-            logger.debug(f"成功保存缓存文件: {file_path}")
-            
-        except Exception as e:
-            if temp_path.exists():
-                temp_path.unlink()
-            raise e
+        # 原子写入（临时文件 + 替换）
+        write_cache_file(file_path, data, self.serializer)
+        logger.debug(f"成功保存缓存文件: {file_path} ({self.serializer.name})")
+        
+        # 新快照的_base_id已变化，旧日志不会再被回放，可以直接删除
+        self.journal.reset(file_path)
+        
+        # 旧版本每次保存生成的完整备份已由日志取代
+        legacy_backup = file_path.with_suffix('.json.backup')
+        if legacy_backup.exists():
+            legacy_backup.unlink()
+            logger.info(f"删除旧版完整备份文件: {legacy_backup}")
+        
+        # 刚写入的数据无需再次解析校验，直接记入索引
+        is_valid = True
+        if CacheIndex.kind_of(file_path) == 'market':
+            is_valid = self.validator.validate_json_structure(data)[0]
+        self.index.update(
+            file_path,
+            date=data.get('last_update_date') or data.get('date'),
+            checksum=data['_checksum'],
+            last_validated=time.time(),
+            valid=is_valid,
+            journal_size=0,
+            oldest_kline_date=self._oldest_kline_date(data.get('stocks'))
+        )
+    
+    def _read_cache_file(self, file_path: Path) -> Dict[str, Any]:
+        """读取基准快照并回放日志，返回最新数据"""
+        data = read_cache_file(file_path)
+        
+        # 校验和只覆盖基准快照（宽松模式）
+        if '_checksum' in data:
+            expected_checksum = data.pop('_checksum')
+            if not self.validator.verify_checksum(data, expected_checksum):
+                logger.warning(f"缓存数据校验和不匹配: {file_path}，可能是数据清理导致，继续使用")
+        
+        records, torn = self.journal.read_records(file_path, data.get('_base_id'))
+        if torn:
+            logger.warning(f"缓存日志尾部不完整，忽略未写完的记录: {self.journal.get_journal_path(file_path)}")
+        
+        for record in records:
+            data = self.journal.apply_record(data, record)
+        
+        return data
+    
+    def _file_stamp(self, cache_file: Path) -> tuple:
+        """缓存文件和日志文件的 (修改时间, 大小)，文件不存在时为None"""
+        stamps = []
+        for path in (cache_file, self.journal.get_journal_path(cache_file)):
+            try:
+                stat = path.stat()
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                stamps.append(None)
+        return tuple(stamps)
     
     def load_cache_data(self, market: str) -> Optional[Dict[str, Any]]:
         """加载缓存数据（带校验和恢复）"""
         cache_file = self.get_cache_file_path(market)
+        stamp = self._file_stamp(cache_file)
         
-        # 先检查内存缓存
-        with self.memory_lock:
-            if market in self.memory_cache:
-                # 移到最后（LRU）
-                self.memory_cache.move_to_end(market)
+        # 先检查内存缓存（文件被其他进程改写过时重新加载）
+        cached = self.memory_cache.get('market', market)
+        if cached is not None:
+            with self.memory_lock:
+                fresh = self.file_stamps.get(market) == stamp
+            if fresh:
                 self.metrics.hit_count += 1
                 logger.debug(f"内存缓存命中: {market}")
-                return self.memory_cache[market]
+                return cached
+            logger.info(f"缓存文件已被其他进程更新，重新加载: {market}")
         
         # 内存缓存未命中，从文件加载
         self.metrics.miss_count += 1
@@ -482,50 +1131,52 @@ class OptimizedCacheManager:
             logger.debug(f"缓存文件不存在: {cache_file}")
             return None
         
-        # 获取文件锁
-        lock_fd = self.lock_manager.acquire_lock(str(cache_file))
-        if not lock_fd:
-            logger.warning(f"无法获取文件锁: {cache_file}")
-            return None
+        # 读取不加文件锁：写入者通过临时文件+替换发布快照，日志只追加，
+        # 读者看到的总是某个完整版本
+        with self.memory_lock:
+            version = self.write_versions.get(market, 0)
         
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 读取基准快照并回放日志（含宽松模式的校验和验证）
+            data = self._read_cache_file(cache_file)
             
             # 数据校验
             is_valid, errors = self.validator.validate_json_structure(data)
             if not is_valid:
                 logger.error(f"缓存数据结构无效: {errors}")
-                self._attempt_recovery(cache_file)
+                self._recover_with_lock(cache_file)
                 return None
             
-            # 校验和验证（宽松模式）
-            if '_checksum' in data:
-                expected_checksum = data.pop('_checksum')
-                if not self.validator.verify_checksum(data, expected_checksum):
-                    logger.warning(f"缓存数据校验和不匹配: {cache_file}，可能是数据清理导致，继续使用")
-                    # 不立即恢复，先检查数据是否基本可用
-                    if 'stocks' not in data or not isinstance(data['stocks'], list):
-                        logger.error(f"缓存数据结构异常，尝试恢复: {cache_file}")
-                        self._attempt_recovery(cache_file)
-                        return None
-            
-            # 加载到内存缓存
+            # 加载到内存缓存（读取期间有新的写入时不覆盖写入者放入的新数据）
+            # 记录读取前的文件状态：读取期间文件再被改写，下次访问会再次加载
             with self.memory_lock:
-                self.memory_cache[market] = data
-                # 保持内存缓存大小限制
-                while len(self.memory_cache) > self.max_memory_items:
-                    self.memory_cache.popitem(last=False)
+                if self.write_versions.get(market, 0) == version:
+                    self.memory_cache.put('market', market, data)
+                    self.file_stamps[market] = stamp
             
             logger.debug(f"成功加载缓存数据: {market}")
             return data
             
+        except FileNotFoundError:
+            # 检查存在后文件被并发删除（如强制刷新），视为无缓存
+            logger.debug(f"缓存文件不存在: {cache_file}")
+            return None
+            
         except Exception as e:
             logger.error(f"加载缓存数据失败: {cache_file}, 错误: {e}")
             self.metrics.error_count += 1
-            self._attempt_recovery(cache_file)
+            self._recover_with_lock(cache_file)
             return None
-            
+    
+    def _recover_with_lock(self, cache_file: Path):
+        """恢复会改写文件，需与其他写入者互斥"""
+        lock_fd = self.lock_manager.acquire_lock(str(cache_file))
+        if not lock_fd:
+            logger.warning(f"无法获取文件锁，跳过恢复: {cache_file}")
+            return
+        
+        try:
+            self._attempt_recovery(cache_file)
         finally:
             self.lock_manager.release_lock(lock_fd, str(cache_file))
     
@@ -544,8 +1195,7 @@ class OptimizedCacheManager:
             existing_data = None
             if cache_file.exists():
                 try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        existing_data = json.load(f)
+                    existing_data = self._read_cache_file(cache_file)
                 except Exception:
                     logger.warning(f"读取现有缓存失败，将进行全量保存: {cache_file}")
             
@@ -555,13 +1205,14 @@ class OptimizedCacheManager:
             else:
                 updated_data = data
             
-            # 保存数据
-            self._save_data_with_backup(cache_file, updated_data)
+            # 保存数据（与现有数据比较，只记录变化部分）
+            self._save_data_with_backup(cache_file, updated_data, existing_data)
             
-            # 更新内存缓存
+            # 更新内存缓存（仍持有文件锁，此时的文件状态就是本次写入的结果）
             with self.memory_lock:
-                self.memory_cache[market] = updated_data
-                self.memory_cache.move_to_end(market)
+                self.write_versions[market] = self.write_versions.get(market, 0) + 1
+                self.memory_cache.put('market', market, updated_data)
+                self.file_stamps[market] = self._file_stamp(cache_file)
             
             self.metrics.last_update_time = time.time()
             logger.debug(f"成功保存缓存数据: {market}")
@@ -621,31 +1272,70 @@ class OptimizedCacheManager:
         return updated_data
     
     def _attempt_recovery(self, cache_file: Path):
-        """尝试恢复损坏的缓存文件"""
+        """尝试恢复损坏的缓存文件：基准快照 + 逐条回放日志，遇到坏记录即停止"""
+        try:
+            data = read_cache_file(cache_file)
+            data.pop('_checksum', None)
+            
+            is_valid, _ = self.validator.validate_json_structure(data)
+            if is_valid:
+                records, _ = self.journal.read_records(cache_file, data.get('_base_id'))
+                replayed = 0
+                for record in records:
+                    try:
+                        candidate = self.journal.apply_record(data, record)
+                    except Exception as e:
+                        logger.warning(f"日志记录无法回放，停止于第 {replayed + 1} 条: {e}")
+                        break
+                    if not self.validator.validate_json_structure(candidate)[0]:
+                        logger.warning(f"日志回放后数据无效，停止于第 {replayed + 1} 条")
+                        break
+                    data = candidate
+                    replayed += 1
+                
+                # 将恢复结果压缩为新的基准快照，丢弃损坏的日志
+                self._write_snapshot(cache_file, data)
+                with self.memory_lock:
+                    self.memory_cache.pop('market', self._market_from_path(cache_file))
+                logger.info(f"成功通过日志恢复缓存文件: {cache_file}, 回放 {replayed}/{len(records)} 条记录")
+                return
+                
+        except Exception as e:
+            logger.error(f"从基准快照和日志恢复失败: {e}")
+        
+        # 兼容旧版本遗留的完整备份文件
         backup_file = cache_file.with_suffix('.json.backup')
         
         if backup_file.exists():
             try:
                 # 尝试从备份恢复
-                with open(backup_file, 'r', encoding='utf-8') as f:
-                    backup_data = json.load(f)
+                backup_data = read_cache_file(backup_file)
                 
                 is_valid, _ = self.validator.validate_json_structure(backup_data)
                 if is_valid:
                     shutil.copy2(backup_file, cache_file)
+                    self.journal.reset(cache_file)
+                    self._validate_and_index(cache_file)
                     logger.info(f"成功从备份恢复缓存文件: {cache_file}")
                     return
                     
             except Exception as e:
                 logger.error(f"从备份恢复失败: {e}")
         
-        # 备份恢复失败，删除损坏的文件
+        # 恢复失败，删除损坏的文件及其日志
         try:
             cache_file.unlink()
+            self.journal.reset(cache_file)
+            self.index.remove(cache_file)
             logger.warning(f"删除损坏的缓存文件: {cache_file}")
         except Exception as e:
             logger.error(f"删除损坏文件失败: {e}")
     
+    @staticmethod
+    def _market_from_path(cache_file: Path) -> str:
+        """从缓存文件名解析市场代码"""
+        return cache_file.name.replace('_stocks_cache.json', '')
+    
     def get_status(self) -> Dict[str, Any]:
         """获取缓存状态"""
         return {
@@ -654,7 +1344,10 @@ class OptimizedCacheManager:
             'error_messages': self.status.error_messages,
             'metrics': asdict(self.metrics),
             'memory_cache_size': len(self.memory_cache),
-            'cache_dir': str(self.cache_dir)
+            'memory_cache': self.memory_cache.stats(),
+            'cache_dir': str(self.cache_dir),
+            'serializer': self.serializer.name,
+            'index': self.index.summary()
         }
     
     def clear_cache(self, market: Optional[str] = None):
@@ -664,18 +1357,27 @@ class OptimizedCacheManager:
             cache_file = self.get_cache_file_path(market)
             if cache_file.exists():
                 cache_file.unlink()
+            self.journal.reset(cache_file)
+            self.index.remove(cache_file)
             
             with self.memory_lock:
-                self.memory_cache.pop(market, None)
+                self.write_versions[market] = self.write_versions.get(market, 0) + 1
+                self.memory_cache.pop('market', market)
                 
             logger.info(f"清理缓存: {market}")
         else:
             # 清理所有缓存
             for cache_file in self.cache_dir.glob('*.json'):
+                if cache_file.name == CacheIndex.INDEX_NAME:
+                    continue
                 cache_file.unlink()
+                self.journal.reset(cache_file)
+                self.index.remove(cache_file)
             
             with self.memory_lock:
-                self.memory_cache.clear()
+                for cached_market in self.memory_cache.keys('market'):
+                    self.write_versions[cached_market] = self.write_versions.get(cached_market, 0) + 1
+                self.memory_cache.clear('market')
                 
             logger.info("清理所有缓存")
     
@@ -686,7 +1388,7 @@ class OptimizedCacheManager:
         info = {
             'market': market,
             'file_exists': cache_file.exists(),
-            'in_memory': market in self.memory_cache,
+            'in_memory': self.memory_cache.contains('market', market),
             'file_path': str(cache_file)
         }
         
@@ -698,10 +1400,16 @@ class OptimizedCacheManager:
                 'last_modified_str': datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d %H:%M:%S')
             })
         
+        journal_file = self.journal.get_journal_path(cache_file)
+        info['journal_size'] = journal_file.stat().st_size if journal_file.exists() else 0
+        
         return info
     
     def save_intraday_data(self, stock_code: str, intraday_data: List[Dict[str, Any]]) -> bool:
         """保存分时图数据到缓存"""
+        if self.intraday_store is not None:
+            return self._save_intraday_columnar(stock_code, intraday_data)
+        
         cache_file = self.get_intraday_cache_file_path(stock_code)
         
         # 获取文件锁
@@ -733,23 +1441,65 @@ class OptimizedCacheManager:
         finally:
             self.lock_manager.release_lock(lock_fd, str(cache_file))
     
+    def _save_intraday_columnar(self, stock_code: str, intraday_data: List[Dict[str, Any]]) -> bool:
+        """写入当日列式分时文件中该股票的一行"""
+        return self.save_intraday_batch([(stock_code, intraday_data)]) == 1
+    
+    def save_intraday_batch(self, items: List[tuple]) -> int:
+        """
+        批量保存多只股票的分时图数据（列式存储只发布一次索引）
+        
+        Args:
+            items: [(股票代码, 分时数据点列表), ...]
+            
+        Returns:
+            保存成功的股票数
+        """
+        if not items:
+            return 0
+        
+        if self.intraday_store is None:
+            return sum(1 for stock_code, intraday_data in items
+                       if self.save_intraday_data(stock_code, intraday_data))
+        
+        # 同一交易日的所有股票共用一个文件，写入者之间的互斥由存储自身的文件锁保证
+        day_file = self.intraday_store.get_day_file_path()
+        try:
+            slot_counts = self.intraday_store.write_many(items)
+            self.index.update(day_file, date=CacheIndex.date_from_name(day_file), valid=True)
+            for stock_code, slot_count in slot_counts.items():
+                logger.info(f"成功保存分时图缓存: {stock_code}, 数据量: {slot_count}")
+            return len(slot_counts)
+            
+        except Exception as e:
+            logger.error(f"保存分时图数据失败: {day_file}, 错误: {e}")
+            return 0
+    
     def load_intraday_data(self, stock_code: str) -> Optional[List[Dict[str, Any]]]:
         """从缓存加载分时图数据"""
+        if self.intraday_store is not None:
+            try:
+                intraday_data = self.intraday_store.read(stock_code)
+                if intraday_data:
+                    logger.debug(f"成功加载分时图缓存: {stock_code}, 数据量: {len(intraday_data)}")
+                    return intraday_data
+            except Exception as e:
+                logger.error(f"读取列式分时缓存失败: {stock_code}, 错误: {e}")
+        
+        # 兼容升级前按股票保存的分时文件
+        return self._load_intraday_legacy(stock_code)
+    
+    def _load_intraday_legacy(self, stock_code: str) -> Optional[List[Dict[str, Any]]]:
+        """从按股票保存的分时文件加载数据"""
         cache_file = self.get_intraday_cache_file_path(stock_code)
         
         if not cache_file.exists():
             logger.debug(f"分时图缓存文件不存在: {cache_file}")
             return None
         
-        # 获取文件锁
-        lock_fd = self.lock_manager.acquire_lock(str(cache_file))
-        if not lock_fd:
-            logger.warning(f"无法获取文件锁，加载分时图数据失败: {cache_file}")
-            return None
-        
+        # 写入者原子替换文件，读取无需加锁
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            cache_data = read_cache_file(cache_file)
             
             # 验证缓存数据
             if not isinstance(cache_data, dict) or 'data' not in cache_data:
@@ -765,15 +1515,15 @@ class OptimizedCacheManager:
                 return None
             
             intraday_data = cache_data['data']
-            logger.info(f"成功加载分时图缓存: {stock_code}, 数据量: {len(intraday_data)}")
+            logger.debug(f"成功加载分时图缓存: {stock_code}, 数据量: {len(intraday_data)}")
             return intraday_data
             
+        except FileNotFoundError:
+            return None
+            
         except Exception as e:
             logger.error(f"加载分时图数据失败: {cache_file}, 错误: {e}")
             return None
-            
-        finally:
-            self.lock_manager.release_lock(lock_fd, str(cache_file))
     
     def cleanup_old_intraday_cache(self):
         """清理过期的分时图缓存"""
@@ -785,24 +1535,25 @@ class OptimizedCacheManager:
             today = datetime.now().strftime('%Y%m%d')
             cleaned_count = 0
             
-            for cache_file in intraday_dir.glob('*_intraday.json'):
+            # 按索引中记录的日期清理，不扫描分时目录
+            for cache_file, entry in self.index.items():
+                if entry.get('kind') != 'intraday' or not entry.get('date') or entry['date'] == today:
+                    continue
+                
                 try:
-                    # 从文件名提取日期
-                    filename = cache_file.name
-                    # 格式: {stock_code}_{date}_intraday.json
-                    parts = filename.replace('_intraday.json', '').split('_')
-                    if len(parts) >= 2:
-                        file_date = parts[-1]  # 最后一部分是日期
-                        
-                        # 如果不是今天的文件，删除
-                        if file_date != today:
-                            cache_file.unlink()
-                            cleaned_count += 1
-                            logger.debug(f"删除过期分时图缓存: {cache_file}")
+                    if self.intraday_store is not None and cache_file.suffix == '.col':
+                        self.intraday_store.remove(cache_file)
+                    cache_file.unlink(missing_ok=True)
+                    self.journal.reset(cache_file)
+                    self.index.remove(cache_file)
+                    cleaned_count += 1
+                    logger.debug(f"删除过期分时图缓存: {cache_file}")
                 
                 except Exception as e:
                     logger.error(f"清理分时图缓存文件失败 {cache_file}: {e}")
             
+            self.index.flush(force=True)
+            
             if cleaned_count > 0:
                 logger.info(f"清理过期分时图缓存完成，删除 {cleaned_count} 个文件")
             
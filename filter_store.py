@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+筛选结果存储
+每次筛选只保存 (股票代码, 信号值, 排名) 三元组，按类型和日期分文件:
+    cache/filter_results/{red|green}_{YYYYMMDD}.json
+读取时再与市场缓存中的股票数据关联，返回的行情总是最新的；
+单个文件只有几十KB，可以保留较长时间的历史筛选记录。
+"""
+
+import os
+import re
+import glob
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, List, Tuple
+
+from cache_manager import read_cache_file, write_cache_file
+
+logger = logging.getLogger(__name__)
+
+DATE_PATTERN = re.compile(r'^\d{4}-?\d{2}-?\d{2}$')
+
+
+def normalize_date(date: str) -> str:
+    """
+    把 YYYY-MM-DD / YYYYMMDD 统一为 YYYYMMDD
+
+    Raises:
+        ValueError: 不是有效的日期（日期会拼进文件路径，必须先校验）
+    """
+    compact = date.replace('-', '') if isinstance(date, str) and DATE_PATTERN.fullmatch(date) else None
+    try:
+        datetime.strptime(compact or '', '%Y%m%d')
+    except ValueError:
+        raise ValueError(f"无效的日期: {date}，格式应为 YYYY-MM-DD 或 YYYYMMDD")
+    return compact
+
+
+class FilterResultStore:
+    """按日期保存的筛选结果"""
+
+    # 旧版本保存完整股票数据的文件，首次保存新格式时删除
+    LEGACY_FILES = {
+        'red': 'red_filter_results.json',
+        'green': 'green_filter_results.json'
+    }
+
+    def __init__(self, cache_dir: str = 'cache', keep_days: int = 90):
+        self.cache_dir = cache_dir
+        self.results_dir = os.path.join(cache_dir, 'filter_results')
+        self.keep_days = keep_days
+
+    def _result_file(self, kind: str, date: str) -> str:
+        return os.path.join(self.results_dir, f"{kind}_{normalize_date(date)}.json")
+
+    def save(self, kind: str, rows: List[Tuple[str, int]], when: Optional[datetime] = None) -> str:
+        """
+        保存一次筛选结果
+
+        Args:
+            kind: 筛选类型（red/green）
+            rows: 已排序的 (股票代码, 信号值) 列表，排名按列表顺序从1开始
+            when: 筛选时间，默认当前时间
+
+        Returns:
+            str: 结果文件路径
+        """
+        when = when or datetime.now()
+        os.makedirs(self.results_dir, exist_ok=True)
+
+        result_file = self._result_file(kind, when.strftime('%Y%m%d'))
+        write_cache_file(result_file, {
+            'kind': kind,
+            'filter_time': when.isoformat(),
+            'filter_date': when.strftime('%Y-%m-%d'),
+            'total': len(rows),
+            'columns': ['ts_code', 'signal', 'rank'],
+            'rows': [[ts_code, signal, rank] for rank, (ts_code, signal) in enumerate(rows, 1)]
+        })
+
+        legacy_file = os.path.join(self.cache_dir, self.LEGACY_FILES.get(kind, ''))
+        if kind in self.LEGACY_FILES and os.path.exists(legacy_file):
+            os.remove(legacy_file)
+
+        self._cleanup(kind, when)
+        return result_file
+
+    def load(self, kind: str, date: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        读取某一天（YYYY-MM-DD或YYYYMMDD，默认今天）的筛选结果，不存在时返回None
+
+        Raises:
+            ValueError: 日期格式无效
+        """
+        date = date or datetime.now().strftime('%Y%m%d')
+        result_file = self._result_file(kind, date)
+        if not os.path.exists(result_file):
+            return None
+        try:
+            return read_cache_file(result_file)
+        except Exception as e:
+            logger.error(f"读取筛选结果失败 {result_file}: {e}")
+            return None
+
+    def list_dates(self, kind: str) -> List[str]:
+        """列出已保存结果的日期（YYYY-MM-DD，从新到旧）"""
+        dates = []
+        for result_file in glob.glob(os.path.join(self.results_dir, f'{kind}_*.json')):
+            date = os.path.basename(result_file)[len(kind) + 1:-len('.json')]
+            if len(date) == 8 and date.isdigit():
+                dates.append(f"{date[:4]}-{date[4:6]}-{date[6:]}")
+        return sorted(dates, reverse=True)
+
+    def _cleanup(self, kind: str, now: datetime):
+        """删除超过保留天数的结果"""
+        cutoff = (now - timedelta(days=self.keep_days)).strftime('%Y-%m-%d')
+        for date in self.list_dates(kind):
+            if date < cutoff:
+                try:
+                    os.remove(self._result_file(kind, date))
+                except (OSError, ValueError) as e:
+                    logger.warning(f"删除过期筛选结果失败: {e}")
+
+    @staticmethod
+    def join(result: Dict[str, Any], stock_index: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """把筛选结果与当前的股票数据关联，已不在市场缓存中的股票跳过"""
+        filter_date = result.get('filter_date')
+        filter_time = result.get('filter_time', '')[11:19]
+
+        stocks = []
+        for ts_code, signal, rank in result.get('rows', []):
+            stock = stock_index.get(ts_code)
+            if stock is None:
+                continue
+            row = dict(stock)
+            row.update({
+                'filter_date': filter_date,
+                'filter_time': filter_time,
+                'filter_signal': signal,
+                'filter_rank': rank
+            })
+            stocks.append(row)
+        return stocks
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+"""
+gunicorn 配置（gunicorn -c gunicorn.conf.py wsgi:app）
+通过环境变量调整: HOST, PORT, WEB_WORKERS, WEB_THREADS, WEB_TIMEOUT, WEB_MAX_REQUESTS
+定时任务由 scheduler_lock 选出的一个worker运行，其余worker只处理请求。
+"""
+
+import os
+import multiprocessing
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', 8080)}"
+
+# 默认 CPU核数+1 个worker，最多8个（每个worker各自加载市场缓存）
+workers = int(os.environ.get('WEB_WORKERS', min(multiprocessing.cpu_count() + 1, 8)))
+# 接口多为IO等待（Tushare/文件），每个worker开多个线程
+worker_class = 'gthread'
+threads = int(os.environ.get('WEB_THREADS', 4))
+
+# 全市场同步、回测等接口耗时较长
+timeout = int(os.environ.get('WEB_TIMEOUT', 120))
+graceful_timeout = 30
+keepalive = 5
+
+# 定期回收worker防止内存增长；主节点worker被回收后由其他worker接管定时任务
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# 不预加载：每个worker独立执行 create_app，定时任务线程不会在fork前启动
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
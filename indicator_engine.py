@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+技术指标计算引擎
+一次取出K线的OHLC数组，按需计算九转序列、BOLL、EMA15、MACD、KDJ、RSI，
+所有结果列在最后一次性并入输出DataFrame，不再逐个指标复制整张表、也不保留中间列。
+股票详情、历史日线和 /api/kline/indicators 共用这里的实现。
+
+IndicatorCache 按 (股票代码, K线区间和最后一根K线, 指标, 参数) 缓存每个指标的结果列，
+有新K线（或当天K线的价格变化）时键随之变化，旧结果由内存预算自然淘汰。
+"""
+
+import os
+from typing import Dict, Any, Optional, Iterable, List
+
+import numpy as np
+import pandas as pd
+
+from memory_cache import TieredMemoryCache
+
+# 指标名称 -> 输出列
+INDICATOR_COLUMNS = {
+    'nine_turn': ['nine_turn_up', 'nine_turn_down', 'countdown_up', 'countdown_down'],
+    'boll': ['boll_mid', 'boll_std', 'boll_upper', 'boll_lower'],
+    'ema15': ['ema15'],
+    'macd': ['macd_dif', 'macd_dea', 'macd_histogram'],
+    'kdj': ['kdj_k', 'kdj_d', 'kdj_j'],
+    'rsi': ['rsi']
+}
+INDICATORS = list(INDICATOR_COLUMNS)
+
+DEFAULT_PARAMS = {
+    'boll': {'period': 20, 'std_dev': 2},
+    'ema15': {'period': 15},
+    'macd': {'fast_period': 12, 'slow_period': 26, 'signal_period': 9},
+    'kdj': {'k_period': 9, 'd_period': 3, 'j_period': 3},
+    'rsi': {'period': 14}
+}
+
+
+def clean_precision(values, decimal_places: int = 4) -> np.ndarray:
+    """
+    清理一列数值的浮点精度问题，与 app.clean_float_precision 逐个处理的结果相同：
+    缺失、无法解析和无穷值为0；字符串表示中含"999"且与四舍五入值相差不到0.01时取四舍五入值，
+    其余保持原值。整列一次完成，不逐个元素调用Python函数。
+    """
+    array = pd.to_numeric(pd.Series(values), errors='coerce').to_numpy(dtype=np.float64)
+    array = np.where(np.isfinite(array), array, 0.0)
+    rounded = np.round(array, decimal_places)
+
+    # 只有四舍五入后会变化的值才需要检查字符串表示（小数位不超过decimal_places的价格直接跳过）
+    candidates = np.flatnonzero((rounded != array) & (np.abs(array - rounded) < 0.01))
+    if len(candidates):
+        # float64转字符串与Python的str(float)一样使用最短表示
+        suspect = np.char.find(array[candidates].astype(str), '999') >= 0
+        array[candidates[suspect]] = rounded[candidates[suspect]]
+    return array
+
+
+def _run_lengths(hits: np.ndarray) -> np.ndarray:
+    """每个位置上以该位置结尾的连续命中次数（未命中为0）"""
+    total = np.cumsum(hits)
+    return total - np.maximum.accumulate(np.where(hits, 0, total))
+
+
+def _setup_labels(hits: np.ndarray):
+    """
+    Setup序列号：连续命中按1-9循环编号，满9个的完整序列保留；
+    未满9个就中断的本轮全部清除，最后一轮尚未中断且已达到3个时显示
+
+    Returns:
+        tuple: (序列号数组, 最后一次Setup完成的位置，没有为-1)
+    """
+    n = len(hits)
+    runs = _run_lengths(hits)
+    labels = np.zeros(n, dtype=np.int64)
+    if not hits.any():
+        return labels, -1
+
+    # 每个命中位置所在连续段的长度（取段尾的连续次数）
+    ends = np.flatnonzero(hits & ~np.append(hits[1:], False))
+    positions = np.flatnonzero(hits)
+    run_end = ends[np.searchsorted(ends, positions)]
+    length = runs[run_end]
+    step = runs[positions]
+
+    in_complete_block = (step - 1) // 9 < length // 9
+    ongoing = (run_end == n - 1) & (length % 9 >= 3)
+    keep = in_complete_block | ongoing
+    labels[positions[keep]] = (step[keep] - 1) % 9 + 1
+
+    completed = positions[step % 9 == 0]
+    return labels, (int(completed[-1]) if len(completed) else -1)
+
+
+def _countdown_labels(hits: np.ndarray, opposite: np.ndarray, start: int) -> np.ndarray:
+    """
+    Countdown计数：从start开始累计命中次数，遇到相反方向的Setup序列号时清零，
+    只标记前13次
+    """
+    labels = np.zeros(len(hits), dtype=np.int64)
+    if start >= len(hits):
+        return labels
+    reset = opposite[start:] > 0
+    eligible = hits[start:] & ~reset
+    total = np.cumsum(eligible)
+    count = total - np.maximum.accumulate(np.where(reset, total, 0))
+    labels[start:] = np.where(eligible & (count <= 13), count, 0)
+    return labels
+
+
+def _setup_hits(close: np.ndarray, compare) -> np.ndarray:
+    hits = np.zeros(len(close), dtype=bool)
+    if len(close) > 4:
+        hits[4:] = compare(close[4:], close[:-4])
+    return hits
+
+
+def nine_turn_arrays(close: np.ndarray, high: np.ndarray, low: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    计算九转序列和Countdown（规则见 app.calculate_nine_turn），全部为数组运算
+
+    Returns:
+        dict: nine_turn_up / nine_turn_down / countdown_up / countdown_down 四个int64数组
+    """
+    n = len(close)
+    result = {}
+    complete_pos = {}
+
+    # Setup阶段：上涨（收盘价 > 4个交易日前收盘价）和下跌（收盘价 < 4个交易日前收盘价）
+    for column, compare in (('nine_turn_up', np.greater), ('nine_turn_down', np.less)):
+        result[column], complete_pos[column] = _setup_labels(_setup_hits(close, compare))
+
+    # Countdown阶段：Setup完成后开始计数，被相反方向的Setup打断时重置
+    countdowns = (
+        ('countdown_up', 'nine_turn_up', 'nine_turn_down', np.greater_equal, high),
+        ('countdown_down', 'nine_turn_down', 'nine_turn_up', np.less_equal, low)
+    )
+    for column, setup_column, opposite_column, compare, reference in countdowns:
+        if complete_pos[setup_column] < 0:
+            result[column] = np.zeros(n, dtype=np.int64)
+            continue
+        hits = np.zeros(n, dtype=bool)
+        if n > 2:
+            hits[2:] = compare(close[2:], reference[:-2])
+        result[column] = _countdown_labels(hits, result[opposite_column],
+                                           max(complete_pos[setup_column] + 1, 2))
+
+    return result
+
+
+def nine_turn_records(df: pd.DataFrame, freq: str = 'daily') -> List[Dict[str, Any]]:
+    """
+    生成 /api/stock/<code>/nine_turn 的逐K线记录，与缓存中的九转列使用同一套计算
+
+    sell_signal / buy_signal 为上涨 / 下跌Setup序列号，第9个标记 '+9' / '-9'；
+    up_count / down_count 为处理完该K线后的连续计数（满9个后归零）。
+
+    Args:
+        df: 按交易日期升序的K线，包含ts_code, trade_date, open, high, low, close, vol, amount
+    """
+    close = pd.to_numeric(df['close'], errors='coerce').to_numpy(dtype=np.float64)
+    high = pd.to_numeric(df['high'], errors='coerce').to_numpy(dtype=np.float64)
+    low = pd.to_numeric(df['low'], errors='coerce').to_numpy(dtype=np.float64)
+    signals = nine_turn_arrays(close, high, low)
+    up_count = _run_lengths(_setup_hits(close, np.greater)) % 9
+    down_count = _run_lengths(_setup_hits(close, np.less)) % 9
+
+    n = len(df)
+    columns = {
+        'ts_code': df['ts_code'].tolist(),
+        'trade_date': df['trade_date'].tolist(),
+        'freq': [freq] * n
+    }
+    for column in ('open', 'high', 'low', 'close', 'vol', 'amount'):
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+        columns[column] = np.where(np.isnan(values), None, values).tolist()
+    columns['buy_signal'] = signals['nine_turn_down'].tolist()
+    columns['sell_signal'] = signals['nine_turn_up'].tolist()
+    columns['nine_up_turn'] = np.where(signals['nine_turn_up'] == 9, '+9', None).tolist()
+    columns['nine_down_turn'] = np.where(signals['nine_turn_down'] == 9, '-9', None).tolist()
+    columns['up_count'] = up_count.astype(np.float64).tolist()
+    columns['down_count'] = down_count.astype(np.float64).tolist()
+
+    keys = list(columns)
+    return [dict(zip(keys, row)) for row in zip(*columns.values())]
+
+
+def _boll(close: pd.Series, period: int, std_dev: float) -> Dict[str, np.ndarray]:
+    # 中轨和标准差从第一根K线开始计算
+    mid = close.rolling(window=period, min_periods=1).mean()
+    std = close.rolling(window=period, min_periods=1).std()
+    return {
+        'boll_mid': clean_precision(mid),
+        'boll_std': std.to_numpy(),
+        'boll_upper': clean_precision(mid + std * std_dev),
+        'boll_lower': clean_precision(mid - std * std_dev)
+    }
+
+
+def _ema15(close: pd.Series, period: int) -> Dict[str, np.ndarray]:
+    if close.notna().sum() == 0:
+        return {'ema15': np.full(len(close), None, dtype=object)}
+    return {'ema15': clean_precision(close.ewm(span=period, min_periods=1).mean())}
+
+
+def _macd(close: pd.Series, fast_period: int, slow_period: int, signal_period: int) -> Dict[str, np.ndarray]:
+    dif = close.ewm(span=fast_period, min_periods=1).mean() - close.ewm(span=slow_period, min_periods=1).mean()
+    dea = dif.ewm(span=signal_period, min_periods=1).mean()
+    return {
+        'macd_dif': clean_precision(dif),
+        'macd_dea': clean_precision(dea),
+        'macd_histogram': clean_precision((dif - dea) * 2)
+    }
+
+
+def _kdj(close: pd.Series, high: pd.Series, low: pd.Series,
+         k_period: int, d_period: int, j_period: int) -> Dict[str, np.ndarray]:
+    highest_high = high.rolling(window=k_period, min_periods=1).max()
+    lowest_low = low.rolling(window=k_period, min_periods=1).min()
+    rsv = ((close - lowest_low) / (highest_high - lowest_low) * 100).fillna(50)
+    # K、D使用简单移动平均
+    k = rsv.rolling(window=d_period, min_periods=1).mean()
+    d = k.rolling(window=d_period, min_periods=1).mean()
+    return {
+        'kdj_k': clean_precision(k),
+        'kdj_d': clean_precision(d),
+        'kdj_j': clean_precision(3 * k - 2 * d)
+    }
+
+
+def _rsi(close: pd.Series, period: int) -> Dict[str, np.ndarray]:
+    change = close.diff()
+    gain = change.where(change > 0, 0)
+    loss = -change.where(change < 0, 0)
+    avg_gain = gain.rolling(window=period, min_periods=1).mean()
+    avg_loss = loss.rolling(window=period, min_periods=1).mean()
+    rsi = (100 - (100 / (1 + avg_gain / (avg_loss + 1e-10)))).fillna(50)
+    return {'rsi': clean_precision(rsi)}
+
+
+def compute_indicators(df: pd.DataFrame, indicators: Optional[Iterable[str]] = None,
+                       params: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
+    """
+    计算一组技术指标
+
+    Args:
+        df: 按日期升序的K线数据，至少包含 close，KDJ和九转还需要 high/low
+        indicators: 指标名称（见 INDICATORS），默认全部
+        params: 覆盖默认参数，如 {'boll': {'period': 26}}
+
+    Returns:
+        pd.DataFrame: 原数据加上指标列的新DataFrame（原df不变）
+    """
+    indicators = INDICATORS if indicators is None else list(dict.fromkeys(indicators))
+    unknown = [name for name in indicators if name not in INDICATOR_COLUMNS]
+    if unknown:
+        raise ValueError(f"不支持的指标: {', '.join(unknown)}")
+
+    # 每个价格序列只取一次，各指标共用
+    close = pd.Series(pd.to_numeric(df['close'], errors='coerce').to_numpy(dtype=np.float64))
+    high = low = None
+    if 'high' in df.columns and 'low' in df.columns:
+        high = pd.Series(pd.to_numeric(df['high'], errors='coerce').to_numpy(dtype=np.float64))
+        low = pd.Series(pd.to_numeric(df['low'], errors='coerce').to_numpy(dtype=np.float64))
+
+    if high is None and ('nine_turn' in indicators or 'kdj' in indicators):
+        raise ValueError("计算九转序列和KDJ需要 high/low 列")
+
+    columns: Dict[str, np.ndarray] = {}
+    for name in indicators:
+        options = dict(DEFAULT_PARAMS.get(name, {}), **((params or {}).get(name) or {}))
+        if name == 'nine_turn':
+            columns.update(nine_turn_arrays(close.to_numpy(), high.to_numpy(), low.to_numpy()))
+        elif name == 'boll':
+            columns.update(_boll(close, **options))
+        elif name == 'ema15':
+            columns.update(_ema15(close, **options))
+        elif name == 'macd':
+            columns.update(_macd(close, **options))
+        elif name == 'kdj':
+            columns.update(_kdj(close, high, low, **options))
+        else:
+            columns.update(_rsi(close, **options))
+
+    return df.assign(**columns)
+
+
+def indicator_columns(indicators: Optional[Iterable[str]] = None) -> List[str]:
+    """一组指标对应的输出列"""
+    indicators = INDICATORS if indicators is None else indicators
+    return [column for name in indicators for column in INDICATOR_COLUMNS[name]]
+
+
+class IndicatorCache:
+    """按股票和最后一根K线缓存指标结果"""
+
+    NAMESPACE = 'indicators'
+
+    def __init__(self, max_bytes: Optional[int] = None, max_items: int = 5000):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('INDICATOR_CACHE_MB', 64)) * 1024 * 1024
+        self.memory_cache = TieredMemoryCache(max_bytes=max_bytes, max_items=max_items)
+
+    @staticmethod
+    def _fingerprint(df: pd.DataFrame) -> Optional[tuple]:
+        """K线区间指纹: (首日, 末日, K线数, 末日收盘/最高/最低)，缺少交易日期时返回None"""
+        if df.empty or 'trade_date' not in df.columns:
+            return None
+        last = df.iloc[-1]
+        return (
+            str(df['trade_date'].iloc[0]), str(last['trade_date']), len(df),
+            float(last['close']),
+            float(last['high']) if 'high' in df.columns else None,
+            float(last['low']) if 'low' in df.columns else None
+        )
+
+    def compute(self, df: pd.DataFrame, ts_code: Optional[str], indicators: Optional[Iterable[str]] = None,
+                params: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
+        """
+        与 compute_indicators 相同，已缓存的指标直接复用
+
+        Args:
+            ts_code: 股票代码，为None时不使用缓存
+        """
+        indicators = INDICATORS if indicators is None else list(dict.fromkeys(indicators))
+        fingerprint = self._fingerprint(df) if ts_code else None
+        if fingerprint is None:
+            return compute_indicators(df, indicators, params)
+
+        columns = {}
+        missing = []
+        keys = {}
+        for name in indicators:
+            options = dict(DEFAULT_PARAMS.get(name, {}), **((params or {}).get(name) or {}))
+            keys[name] = (ts_code, fingerprint, name, tuple(sorted(options.items())))
+            cached = self.memory_cache.get(self.NAMESPACE, keys[name])
+            if cached is None:
+                missing.append(name)
+            else:
+                columns.update(cached)
+
+        if missing:
+            computed = compute_indicators(df, missing, params)
+            for name in missing:
+                result = {column: computed[column].to_numpy() for column in INDICATOR_COLUMNS[name]}
+                self.memory_cache.put(self.NAMESPACE, keys[name], result,
+                                      size=sum(values.nbytes for values in result.values()))
+                columns.update(result)
+
+        # 返回副本，调用方修改结果不会影响缓存
+        return df.assign(**{column: values.copy() for column, values in columns.items()})
+
+    def clear(self):
+        self.memory_cache.clear(self.NAMESPACE)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.memory_cache.stats()
+
+
+indicator_cache = IndicatorCache()
+
+
+def compute_indicators_cached(df: pd.DataFrame, ts_code: Optional[str], indicators: Optional[Iterable[str]] = None,
+                              params: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
+    """使用全局指标缓存计算指标"""
+    return indicator_cache.compute(df, ts_code, indicators, params)
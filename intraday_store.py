@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按交易日存储的列式分时数据
+每个交易日一个数据文件 cache/intraday/{YYYYMMDD}_intraday.col 和一个索引文件 {YYYYMMDD}_intraday.idx，
+所有股票共用固定的241个分钟槽位（09:30-11:30共121个，13:01-15:00共120个），
+每只股票占一行，每个数值字段是一段连续的float32数组。
+13:00 的数据点（午间开盘的第一笔）并入 13:01 槽位：成交量/成交额累加，最高/最低取极值，开盘价取13:00的。
+
+数据文件布局:
+    [0:8)    文件标识 b'TDINTRA2'
+    [8:12)   每行字节数（uint32）
+    [16:24)  正在被改写的索引代数（uint64，见下）
+    [4096:...) 数据区，第r行偏移 = 4096 + r * row_bytes
+
+索引文件为JSON: {date, fields, slots, rows: {代码: 行号}, row_count, save_time: {代码: 时间}, generation}
+
+每只股票分配相邻的两行，改写时写入当前未发布的那一行，然后以"写临时文件再改名"的方式发布索引，
+读者看到的要么是旧索引+旧行，要么是新索引+新行，不会读到写了一半的索引。
+一批股票（write_many）只发布一次索引；跨进程的写入者通过 fcntl 文件锁互斥。
+读取时通过 mmap + numpy.frombuffer 直接切片，不需要解析JSON数据。
+
+读者复制一行期间，同一只股票可能被连续改写两次，第二次正好写到读者正在复制的行。
+因此每次发布索引代数加1，写入者在写数据行之前把所基于的索引代数写入文件头：
+基于第n代索引的写入只会改写第n代未指向的行。读者复制完后检查文件头中的代数
+不大于自己所用索引的代数，否则说明该行可能已被改写，重新加载索引后重试。
+"""
+
+import os
+import json
+import mmap
+import struct
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+
+# 处理fcntl库的兼容性问题（Windows系统不支持fcntl）
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'TDINTRA2'
+PREAMBLE = struct.Struct('<8sI')
+DATA_OFFSET = 4096
+GENERATION = struct.Struct('<Q')
+GENERATION_OFFSET = 16
+# 复制一行时被并发改写后的最多重试次数
+READ_RETRIES = 5
+
+# 数值字段（time/timestamp由槽位推导，不单独存储）
+FIELDS = [
+    'price', 'open', 'high', 'low', 'volume', 'amount', 'vwap', 'avg_price',
+    'cumulative_volume', 'cumulative_amount', 'total_shares', 'total_turnover'
+]
+
+# 并入下一个槽位时累加的字段，其余字段（价格、累计值）取后一个数据点
+_ADDITIVE_FIELDS = {'volume', 'amount'}
+
+
+def _build_slot_times() -> List[str]:
+    """生成241个分钟槽位对应的时间"""
+    minutes = list(range(9 * 60 + 30, 11 * 60 + 31)) + list(range(13 * 60 + 1, 15 * 60 + 1))
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in minutes]
+
+
+SLOT_TIMES = _build_slot_times()
+SLOT_INDEX = {t: i for i, t in enumerate(SLOT_TIMES)}
+SLOTS = len(SLOT_TIMES)  # 241
+
+# 没有独立槽位、并入后一个槽位的时间
+FOLDED_TIMES = {'13:00': SLOT_INDEX['13:01']}
+
+
+class ColumnarIntradayStore:
+    """列式分时数据存储"""
+
+    def __init__(self, intraday_dir: Path, initial_rows: int = 1024):
+        self.intraday_dir = Path(intraday_dir)
+        self.initial_rows = initial_rows
+        self.row_bytes = len(FIELDS) * SLOTS * 4
+
+        # 读取端的映射缓存: 数据文件路径 -> (索引文件标识, 索引, mmap)
+        self._readers = {}
+        self._reader_lock = threading.Lock()
+        # 进程内写入互斥（flock按打开的文件描述互斥，同进程的线程也需要先排队）
+        self._write_lock = threading.Lock()
+
+    def get_day_file_path(self, date: Optional[str] = None) -> Path:
+        """获取某个交易日的列式文件路径"""
+        date = date or datetime.now().strftime('%Y%m%d')
+        return self.intraday_dir / f'{date}_intraday.col'
+
+    @staticmethod
+    def get_index_path(path: Path) -> Path:
+        """数据文件对应的索引文件路径"""
+        return path.with_suffix('.idx')
+
+    def index_stamp(self, path: Path) -> Optional[tuple]:
+        """当前发布的索引的文件标识，每次发布都会变化；没有索引时为None"""
+        try:
+            stat = self.get_index_path(path).stat()
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @contextmanager
+    def _file_lock(self, path: Path):
+        """跨进程写入锁（锁文件保留不删除，避免等待旧锁文件的写入者与新锁文件的写入者同时进入）"""
+        if not FCNTL_AVAILABLE:
+            # 不支持fcntl的系统上只有单进程写入
+            yield
+            return
+        fd = os.open(path.with_name(path.name + '.lock'), os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def _new_index(date: str) -> Dict[str, Any]:
+        return {'date': date, 'fields': FIELDS, 'slots': SLOTS, 'rows': {}, 'row_count': 0, 'save_time': {},
+                'generation': 0}
+
+    def _read_index(self, path: Path) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.get_index_path(path), 'rb') as f:
+                return json.loads(f.read().decode('utf-8'))
+        except FileNotFoundError:
+            return None
+
+    def _data_file_valid(self, path: Path) -> bool:
+        try:
+            with open(path, 'rb') as f:
+                return PREAMBLE.unpack(f.read(PREAMBLE.size)) == (MAGIC, self.row_bytes)
+        except (FileNotFoundError, struct.error):
+            return False
+
+    def _create_data_file(self, path: Path):
+        """新建当日数据文件（格式不符的旧文件同样重建），原子替换"""
+        temp_path = path.with_name(path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(PREAMBLE.pack(MAGIC, self.row_bytes))
+            f.truncate(DATA_OFFSET + self.initial_rows * self.row_bytes)
+        temp_path.replace(path)
+
+    def _publish_index(self, path: Path, index: Dict[str, Any]):
+        """写临时文件再改名，读者只会看到完整的索引"""
+        index_path = self.get_index_path(path)
+        temp_path = index_path.with_name(index_path.name + '.tmp')
+        with open(temp_path, 'wb') as f:
+            f.write(json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+        temp_path.replace(index_path)
+
+    def _encode_row(self, intraday_data: List[Dict[str, Any]]) -> Tuple[bytes, int]:
+        """将分时数据点列表编码为一行float32数组，缺失的槽位为NaN；返回(行数据, 写入的槽位数)"""
+        row = np.full((len(FIELDS), SLOTS), np.nan, dtype=np.float32)
+        folded = {}
+        for point in intraday_data:
+            time_str = str(point.get('time', ''))[:5]
+            slot = SLOT_INDEX.get(time_str)
+            if slot is None:
+                if time_str in FOLDED_TIMES:
+                    folded[FOLDED_TIMES[time_str]] = point
+                continue
+            for i, field in enumerate(FIELDS):
+                value = point.get(field)
+                if value is not None:
+                    row[i, slot] = value
+
+        for slot, point in folded.items():
+            for i, field in enumerate(FIELDS):
+                value = point.get(field)
+                if value is None:
+                    continue
+                current = row[i, slot]
+                if np.isnan(current):
+                    row[i, slot] = value
+                elif field in _ADDITIVE_FIELDS:
+                    row[i, slot] = current + value
+                elif field == 'high':
+                    row[i, slot] = max(current, value)
+                elif field == 'low':
+                    row[i, slot] = min(current, value)
+                elif field == 'open':
+                    row[i, slot] = value
+
+        return row.tobytes(), int(np.count_nonzero(~np.isnan(row[0])))
+
+    def write(self, stock_code: str, intraday_data: List[Dict[str, Any]], date: Optional[str] = None) -> int:
+        """写入一只股票的当日分时数据，返回写入的槽位数"""
+        return self.write_many([(stock_code, intraday_data)], date).get(stock_code, 0)
+
+    def write_many(self, items: Iterable[Tuple[str, List[Dict[str, Any]]]],
+                   date: Optional[str] = None) -> Dict[str, int]:
+        """
+        写入一批股票的当日分时数据，所有数据行写完后只发布一次索引
+
+        Args:
+            items: [(股票代码, 分时数据点列表), ...]，同一代码出现多次时以最后一次为准
+
+        Returns:
+            {股票代码: 写入的槽位数}
+        """
+        date = date or datetime.now().strftime('%Y%m%d')
+        path = self.get_day_file_path(date)
+        encoded = {stock_code: self._encode_row(intraday_data) for stock_code, intraday_data in items}
+        if not encoded:
+            return {}
+
+        self.intraday_dir.mkdir(parents=True, exist_ok=True)
+        with self._write_lock, self._file_lock(path):
+            # 持锁后重新读取索引，包含其他进程刚发布的写入
+            index = self._read_index(path) if self._data_file_valid(path) else None
+            if index is None:
+                self._create_data_file(path)
+                index = self._new_index(date)
+
+            rows = index['rows']
+            targets = {}
+            for stock_code in encoded:
+                published = rows.get(stock_code)
+                if published is None:
+                    # 新股票分配相邻的两行
+                    targets[stock_code] = index['row_count']
+                    index['row_count'] += 2
+                else:
+                    targets[stock_code] = published ^ 1
+
+            generation = index.get('generation', 0)
+            with open(path, 'r+b') as f:
+                capacity = (os.fstat(f.fileno()).st_size - DATA_OFFSET) // self.row_bytes
+                if index['row_count'] > capacity:
+                    # 数据区在文件末尾，扩容只需延长文件
+                    capacity = max(index['row_count'], capacity * 2)
+                    f.truncate(DATA_OFFSET + capacity * self.row_bytes)
+
+                # 先在文件头记下本次改写所基于的索引代数，使用更早索引的读者据此重试
+                f.seek(GENERATION_OFFSET)
+                f.write(GENERATION.pack(generation))
+                # 再写所有数据行（都是当前索引未指向的行），最后发布索引
+                for stock_code, (row_data, _) in encoded.items():
+                    f.seek(DATA_OFFSET + targets[stock_code] * self.row_bytes)
+                    f.write(row_data)
+                f.flush()
+
+            save_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            for stock_code, row in targets.items():
+                rows[stock_code] = row
+                index['save_time'][stock_code] = save_time
+            index['generation'] = generation + 1
+            self._publish_index(path, index)
+
+        return {stock_code: slot_count for stock_code, (_, slot_count) in encoded.items()}
+
+    def _get_reader(self, path: Path):
+        """获取（索引发布后重新映射）某个文件的只读映射"""
+        file_id = self.index_stamp(path)
+        if file_id is None:
+            return None
+
+        with self._reader_lock:
+            cached = self._readers.get(path)
+            if cached and cached[0] == file_id:
+                return cached
+
+            # 先读索引再映射数据文件：索引引用的行在发布前已经写入，映射一定覆盖这些行
+            index = self._read_index(path)
+            if index is None:
+                return None
+            with open(path, 'rb') as f:
+                if PREAMBLE.unpack(f.read(PREAMBLE.size)) != (MAGIC, self.row_bytes):
+                    raise ValueError(f"不是列式分时文件: {path}")
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+            # 旧映射可能仍被其他线程使用，不主动close，由引用计数回收
+            reader = (file_id, index, mapped)
+            self._readers[path] = reader
+            return reader
+
+    def _copy_row(self, mapped, offset: int):
+        """从映射中复制出一行（该行在同一只股票再被写入两次后会被复用）"""
+        return np.frombuffer(mapped, dtype=np.float32, count=len(FIELDS) * SLOTS,
+                             offset=offset).reshape(len(FIELDS), SLOTS).copy()
+
+    def read_arrays(self, stock_code: str, date: Optional[str] = None):
+        """以 (字段数, 241) 的float32数组返回一只股票的分时数据，不存在时返回None"""
+        path = self.get_day_file_path(date)
+        for _ in range(READ_RETRIES):
+            reader = self._get_reader(path)
+            if reader is None:
+                return None
+            _, index, mapped = reader
+
+            row = index['rows'].get(stock_code)
+            if row is None:
+                return None
+
+            offset = DATA_OFFSET + row * self.row_bytes
+            if offset + self.row_bytes > len(mapped):
+                return None
+            arrays = self._copy_row(mapped, offset)
+
+            # 复制期间没有写入者开始改写本索引指向的行
+            if GENERATION.unpack_from(mapped, GENERATION_OFFSET)[0] <= index.get('generation', 0):
+                return arrays
+
+        logger.warning(f"读取分时数据时连续被改写，放弃: {stock_code} {path.name}")
+        return None
+
+    def read(self, stock_code: str, date: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+        """读取一只股票的分时数据，转换为接口使用的数据点列表"""
+        date = date or datetime.now().strftime('%Y%m%d')
+        arrays = self.read_arrays(stock_code, date)
+        if arrays is None:
+            return None
+
+        present = np.flatnonzero(~np.isnan(arrays[0]))
+        if len(present) == 0:
+            return None
+
+        # float32还原为float64后保留4位小数，避免出现12.340000152587891这类值
+        values = arrays[:, present].astype(np.float64).round(4).T.tolist()
+        date_str = f"{date[:4]}-{date[4:6]}-{date[6:]}"
+
+        result = []
+        for slot, row_values in zip(present.tolist(), values):
+            point = {'time': SLOT_TIMES[slot], 'timestamp': f"{date_str} {SLOT_TIMES[slot]}:00"}
+            point.update(zip(FIELDS, row_values))
+            result.append(point)
+        return result
+
+    def list_day_files(self) -> List[Path]:
+        """列出所有列式文件"""
+        if not self.intraday_dir.exists():
+            return []
+        return sorted(self.intraday_dir.glob('*_intraday.col'))
+
+    def release(self, path: Path):
+        """释放某个文件的读取映射（删除文件前调用）"""
+        with self._reader_lock:
+            self._readers.pop(path, None)
+
+    def remove(self, path: Path):
+        """删除某个交易日的数据文件、索引文件和锁文件"""
+        self.release(path)
+        for file_path in (path, self.get_index_path(path), path.with_name(path.name + '.lock')):
+            file_path.unlink(missing_ok=True)
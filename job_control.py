@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+定时任务控制通道
+Web进程和独立任务进程（worker.py）通过 cache/jobs/ 目录通信:
+1. 命令: 每次手动触发写一个命令文件 commands/{时间}_{id}_{任务名}.json（原子替换写入），
+   任务进程按文件名顺序取出执行，取出即删除
+2. 状态: 任务进程定期写 status.json，包含心跳（pid、启动时间、最近心跳）、
+   调度器下次运行时间、各任务最近一次的运行情况和需要对外展示的运行状态
+"""
+
+import os
+import uuid
+import time
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+
+from cache_manager import read_cache_file, write_cache_file
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.path.join('cache', 'jobs')
+# 心跳超过该时间未更新视为任务进程不在运行
+HEARTBEAT_TIMEOUT = 30
+
+
+class JobControl:
+    """命令队列 + 任务进程状态"""
+
+    def __init__(self, jobs_dir: str = JOBS_DIR, heartbeat_timeout: float = HEARTBEAT_TIMEOUT):
+        self.jobs_dir = jobs_dir
+        self.commands_dir = os.path.join(jobs_dir, 'commands')
+        self.status_file = os.path.join(jobs_dir, 'status.json')
+        self.heartbeat_timeout = heartbeat_timeout
+
+        # 任务进程一侧的状态
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {'jobs': {}}
+
+    # ---- Web进程一侧 ----
+
+    def submit(self, job: str, source: str = 'api') -> str:
+        """提交一个手动触发命令，返回命令ID"""
+        os.makedirs(self.commands_dir, exist_ok=True)
+        command_id = uuid.uuid4().hex[:12]
+        now = datetime.now()
+        path = os.path.join(self.commands_dir, f"{now.strftime('%Y%m%d%H%M%S%f')}_{command_id}_{job}.json")
+        write_cache_file(path, {
+            'id': command_id,
+            'job': job,
+            'source': source,
+            'submitted': now.isoformat(timespec='seconds')
+        })
+        return command_id
+
+    def pending(self) -> List[str]:
+        """排队中的任务名"""
+        return [command['job'] for _, command in self._list_commands()]
+
+    def worker_state(self) -> Dict[str, Any]:
+        """任务进程最近写出的状态，附加 worker_alive"""
+        try:
+            state = read_cache_file(self.status_file)
+        except FileNotFoundError:
+            state = {}
+        except Exception as e:
+            logger.warning(f"读取任务进程状态失败: {e}")
+            state = {}
+
+        heartbeat = state.get('heartbeat')
+        state['worker_alive'] = bool(heartbeat) and time.time() - heartbeat < self.heartbeat_timeout
+        return state
+
+    def worker_alive(self) -> bool:
+        return self.worker_state()['worker_alive']
+
+    # ---- 任务进程一侧 ----
+
+    def _list_commands(self) -> List[Tuple[str, Dict[str, Any]]]:
+        try:
+            names = sorted(name for name in os.listdir(self.commands_dir) if name.endswith('.json'))
+        except FileNotFoundError:
+            return []
+
+        commands = []
+        for name in names:
+            path = os.path.join(self.commands_dir, name)
+            try:
+                commands.append((path, read_cache_file(path)))
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error(f"无法解析任务命令 {path}: {e}")
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+        return commands
+
+    def take(self) -> List[Dict[str, Any]]:
+        """取出所有排队的命令（按提交顺序）"""
+        commands = []
+        for path, command in self._list_commands():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # 已被其他进程取走
+                continue
+            commands.append(command)
+        return commands
+
+    def record(self, job: str, state: str, **fields):
+        """记录某个任务的运行情况（running/success/failed）并写出状态"""
+        with self._lock:
+            entry = self._state['jobs'].setdefault(job, {})
+            entry['state'] = state
+            entry.update(fields)
+        self.publish()
+
+    def publish(self, **fields):
+        """更新心跳和附加状态并写出状态文件"""
+        with self._lock:
+            self._state.update(fields)
+            self._state['pid'] = os.getpid()
+            self._state['heartbeat'] = time.time()
+            self._state['heartbeat_time'] = datetime.now().isoformat(timespec='seconds')
+            # 多个任务线程共用同一个临时文件，写出也在锁内
+            try:
+                os.makedirs(self.jobs_dir, exist_ok=True)
+                write_cache_file(self.status_file, self._state)
+            except Exception as e:
+                logger.error(f"写出任务进程状态失败: {e}")
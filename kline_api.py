@@ -11,10 +11,14 @@ import logging
 import traceback
 import os
 import sys
+import numpy as np
+import pandas as pd
 
 # 添加项目根目录到路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from stock_data_service import data_service, normalize_ts_code
+
 # TODO: KlineDataManager需要实现或从其他模块导入
 # from kline_refactor import KlineDataManager
 
@@ -73,69 +77,19 @@ def get_technical_indicators(symbol):
         
         logger.info(f"获取技术指标: symbol={symbol}, days={days}, indicators={indicators}")
         
-        # 导入app.py中的函数
-        import sys
-        import os
-        sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-        
-        # 获取股票历史数据 - 调用现有的API
-        import requests
-        import json
-        
-        # 构建内部API调用URL
-        base_url = 'http://127.0.0.1:8080'
-        history_url = f"{base_url}/api/stock/{symbol}/daily_history?days={max(days, limit)}"
-        
-        try:
-            response = requests.get(history_url, timeout=30)
-            if response.status_code != 200:
-                raise Exception(f"获取历史数据失败: HTTP {response.status_code}")
-            
-            history_data = response.json()
-            if not history_data.get('success'):
-                raise Exception(f"获取历史数据失败: {history_data.get('message', '未知错误')}")
-            
-            kline_data = history_data['data']
-            if not kline_data:
-                raise Exception("历史数据为空")
-            
-        except requests.exceptions.RequestException as e:
-            logger.error(f"内部API调用失败: {e}")
-            raise Exception(f"获取历史数据失败: {str(e)}")
-        
-        # 转换为DataFrame进行技术指标计算
-        import pandas as pd
-        df = pd.DataFrame(kline_data)
-        
-        # 确保数据类型正确
-        df['close'] = pd.to_numeric(df['close'], errors='coerce')
-        df['high'] = pd.to_numeric(df['high'], errors='coerce')
-        df['low'] = pd.to_numeric(df['low'], errors='coerce')
-        df['open'] = pd.to_numeric(df['open'], errors='coerce')
-        df['vol'] = pd.to_numeric(df['vol'], errors='coerce')
-        
-        # 按日期排序
-        df = df.sort_values('trade_date').reset_index(drop=True)
-        
-        # 计算技术指标 - 使用app.py中的函数
-        from app import calculate_macd, calculate_kdj, calculate_rsi, calculate_ema15
-        
-        # 计算各项技术指标
-        if 'macd' in [i.strip().lower() for i in indicators]:
-            df = calculate_macd(df)
-        if 'kdj' in [i.strip().lower() for i in indicators]:
-            df = calculate_kdj(df)
-        if 'rsi' in [i.strip().lower() for i in indicators]:
-            df = calculate_rsi(df)
-        if 'ema15' in [i.strip().lower() for i in indicators]:
-            df = calculate_ema15(df)
+        # 通过进程内数据访问层获取历史日线并计算指标（与 /api/stock/<code>/daily_history 共用缓存）
+        # 历史日线接口一直带有BOLL和EMA15，这里保持相同的字段
+        requested = [i.strip().lower() for i in indicators]
+        ts_code = normalize_ts_code(symbol)
+        df = data_service.daily_with_indicators(ts_code, ['boll', 'ema15'] + requested, days=max(days, limit))
+        if 'boll' not in requested:
+            df = df.drop(columns=['boll_std'])
         
         # 限制返回的数据量
         if len(df) > limit:
             df = df.tail(limit)
         
         # 处理NaN值，避免JSON序列化问题
-        import numpy as np
         df = df.replace({np.nan: None})
         df = df.where(pd.notna(df), None)
         
@@ -152,6 +106,12 @@ def get_technical_indicators(symbol):
             }
         })
         
+    except LookupError as e:
+        return jsonify({
+            'success': False,
+            'message': f'获取技术指标失败: {str(e)}'
+        }), 404
+        
     except Exception as e:
         logger.error(f"获取技术指标失败: {symbol}, 错误: {e}")
         return jsonify({
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+延迟导入
+tushare、akshare 等数据源库导入耗时数秒，而大多数请求只读缓存用不到它们。
+这里只用 importlib.util.find_spec 判断库是否安装（不执行导入），
+第一次访问模块属性时才真正导入；Tushare客户端等重量级对象同样在第一次使用时创建。
+
+    ak = lazy_import('akshare')          # 未安装时为None
+    AKSHARE_AVAILABLE = ak is not None
+    ak.stock_zh_a_spot_em               # 此时才导入akshare
+"""
+
+import importlib
+import importlib.util
+import threading
+import logging
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def module_installed(name: str) -> bool:
+    """库是否已安装（只查找，不导入）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyObject:
+    """第一次访问属性时调用factory创建真实对象，之后直接转发"""
+
+    def __init__(self, factory: Callable[[], Any], name: str = ''):
+        object.__setattr__(self, '_factory', factory)
+        object.__setattr__(self, '_name', name or getattr(factory, '__name__', 'object'))
+        object.__setattr__(self, '_target', None)
+        object.__setattr__(self, '_lock', threading.Lock())
+
+    def _resolve(self) -> Any:
+        target = object.__getattribute__(self, '_target')
+        if target is not None:
+            return target
+        with object.__getattribute__(self, '_lock'):
+            target = object.__getattribute__(self, '_target')
+            if target is None:
+                target = object.__getattribute__(self, '_factory')()
+                object.__setattr__(self, '_target', target)
+        return target
+
+    @property
+    def loaded(self) -> bool:
+        return object.__getattribute__(self, '_target') is not None
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._resolve(), item)
+
+    def __setattr__(self, key: str, value: Any):
+        setattr(self._resolve(), key, value)
+
+    def __repr__(self) -> str:
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy {object.__getattribute__(self, '_name')} ({state})>"
+
+
+def lazy_import(name: str) -> Optional[LazyObject]:
+    """
+    延迟导入模块
+
+    Returns:
+        模块代理，未安装时为None
+    """
+    if not module_installed(name):
+        return None
+
+    def load():
+        logger.info(f"导入 {name}")
+        return importlib.import_module(name)
+
+    return LazyObject(load, name)
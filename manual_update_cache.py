@@ -7,12 +7,13 @@
 
 import sys
 import os
-import json
 from datetime import datetime
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from cache_manager import read_cache_file, write_cache_file
+
 try:
     import akshare as ak
     AKSHARE_AVAILABLE = True
@@ -120,8 +121,7 @@ def update_300101_cache_data():
         
         # 读取现有缓存
         cache_file = 'cache/realtime_trading_data_cache.json'
-        with open(cache_file, 'r', encoding='utf-8') as f:
-            cache_data = json.load(f)
+        cache_data = read_cache_file(cache_file)
         
         # 查找300101数据
         stocks = cache_data.get('data', [])
@@ -174,8 +174,7 @@ def update_300101_cache_data():
             cache_data['cache_time'] = datetime.now().strftime('%H:%M:%S')
             
             # 保存更新后的缓存
-            with open(cache_file, 'w', encoding='utf-8') as f:
-                json.dump(cache_data, f, ensure_ascii=False, indent=2)
+            write_cache_file(cache_file, cache_data)
             
             print(f"\n✅ 成功更新300101缓存数据")
             return True
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+市场列表预排序索引
+/api/stocks/<market> 的服务端排序、筛选和游标分页。
+
+每个市场的缓存数据对象变化后（本进程保存或其他进程改写后重新加载），在下一次查询时构建一次索引，
+不在保存缓存的路径上构建（独立任务进程从不查询，也不需要）：
+列式DataFrame加上每个排序字段升序/降序的行号排列（同值按 ts_code 升序，顺序稳定），
+任意排序的一页只是排列数组上的一个切片。筛选条件与 /api/screen 的语法相同，
+筛选后的排列按 (排序, 条件) 缓存，翻页时不再重复计算。
+
+游标记录上一页最后一行的排序值和 ts_code，下一页从排列中二分定位，
+两次翻页之间缓存被更新也不会重复或跳过未变化的股票。
+"""
+
+import json
+import base64
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Callable, Iterable, Tuple
+
+import numpy as np
+
+from stock_screener import NUMERIC_FIELDS, build_stock_frame, condition_mask, parse_condition
+
+logger = logging.getLogger(__name__)
+
+# 可排序字段（'-' 前缀为降序），不指定排序时保持缓存中的顺序
+SORT_FIELDS = NUMERIC_FIELDS
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 1000
+# 每个市场缓存的筛选结果排列数
+MAX_FILTERED_ORDERS = 64
+
+
+def parse_market_sort(sort: Optional[str]) -> Optional[Tuple[str, bool]]:
+    """
+    解析排序参数 'pct_chg' / '-pct_chg'
+
+    Returns:
+        (字段, 是否降序)，未指定时为None
+
+    Raises:
+        ValueError: 不支持的排序字段
+    """
+    if not sort or not sort.strip():
+        return None
+    sort = sort.strip()
+    descending = sort.startswith('-')
+    field = sort.lstrip('-+')
+    if field not in SORT_FIELDS:
+        raise ValueError(f"不支持的排序字段: {field}，可选 {', '.join(SORT_FIELDS)}")
+    return field, descending
+
+
+def encode_cursor(payload: Dict[str, Any]) -> str:
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Dict[str, Any]:
+    """
+    Raises:
+        ValueError: 游标无法解析
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+    except Exception:
+        raise ValueError('无效的分页游标')
+    if not isinstance(payload, dict):
+        raise ValueError('无效的分页游标')
+    return payload
+
+
+class _Ordering:
+    """一种排列: 行号和对应的 (排序键, ts_code)，排序键已按方向取号，始终升序"""
+
+    __slots__ = ('positions', 'keys', 'codes')
+
+    def __init__(self, positions: np.ndarray, keys: Optional[np.ndarray], codes: np.ndarray):
+        self.positions = positions
+        self.keys = keys
+        self.codes = codes
+
+    def subset(self, mask: np.ndarray) -> '_Ordering':
+        keep = mask[self.positions]
+        return _Ordering(self.positions[keep], None if self.keys is None else self.keys[keep], self.codes[keep])
+
+
+class _MarketSnapshot:
+    """某个市场一个缓存版本的索引"""
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self.records: List[Dict[str, Any]] = data.get('stocks') or []
+        self.frame = build_stock_frame(self.records, [''] * len(self.records))
+        codes = self.frame['ts_code'].to_numpy()
+        self.code_positions = {code: position for position, code in enumerate(codes.tolist())}
+
+        # 缓存顺序 + 每个字段的升序/降序排列
+        self.orderings: Dict[Optional[Tuple[str, bool]], _Ordering] = {
+            None: _Ordering(np.arange(len(self.records)), None, codes)
+        }
+        for field in SORT_FIELDS:
+            values = self.frame[field].to_numpy()
+            for descending in (False, True):
+                keys = -values if descending else values
+                positions = np.lexsort((codes, keys))
+                self.orderings[(field, descending)] = _Ordering(positions, keys[positions], codes[positions])
+
+        self.filtered: 'OrderedDict[tuple, _Ordering]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def ordering(self, sort: Optional[Tuple[str, bool]], filters: Tuple[str, ...]) -> _Ordering:
+        base = self.orderings[sort]
+        if not filters:
+            return base
+
+        key = (sort, filters)
+        with self.lock:
+            cached = self.filtered.get(key)
+            if cached is not None:
+                self.filtered.move_to_end(key)
+                return cached
+
+        mask = np.ones(len(self.records), dtype=bool)
+        for text in filters:
+            mask &= condition_mask(self.frame, parse_condition(text))
+        ordering = base.subset(mask)
+
+        with self.lock:
+            self.filtered[key] = ordering
+            while len(self.filtered) > MAX_FILTERED_ORDERS:
+                self.filtered.popitem(last=False)
+        return ordering
+
+    def seek(self, ordering: _Ordering, cursor: Dict[str, Any]) -> int:
+        """游标之后第一行在排列中的下标"""
+        code = cursor.get('c')
+        if ordering.keys is None:
+            # 缓存顺序: 按上一页最后一只股票在当前缓存中的位置定位，已不存在时退回偏移量
+            position = self.code_positions.get(code)
+            if position is None:
+                return int(cursor.get('o', 0))
+            return int(np.searchsorted(ordering.positions, position, side='right'))
+
+        key = float(cursor.get('k', 0))
+        left = int(np.searchsorted(ordering.keys, key, side='left'))
+        right = int(np.searchsorted(ordering.keys, key, side='right'))
+        return left + int(np.searchsorted(ordering.codes[left:right], str(code or ''), side='right'))
+
+
+class MarketStockIndex:
+    """各市场的预排序索引，缓存数据对象变化后在下一次查询时重建"""
+
+    def __init__(self, load_market_data: Callable[[str], Optional[Dict[str, Any]]]):
+        self.load_market_data = load_market_data
+        self._snapshots: Dict[str, _MarketSnapshot] = {}
+        self._build_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def _current(self, market: str, data: Dict[str, Any]) -> Optional[_MarketSnapshot]:
+        with self._lock:
+            snapshot = self._snapshots.get(market)
+            return snapshot if snapshot is not None and snapshot.data is data else None
+
+    def snapshot(self, market: str) -> Optional[_MarketSnapshot]:
+        data = self.load_market_data(market)
+        if not data or 'stocks' not in data:
+            return None
+        snapshot = self._current(market, data)
+        if snapshot is not None:
+            return snapshot
+
+        with self._lock:
+            build_lock = self._build_locks.setdefault(market, threading.Lock())
+        # 同一市场同时只构建一次，并发的请求等待后直接复用
+        with build_lock:
+            snapshot = self._current(market, data)
+            if snapshot is None:
+                snapshot = _MarketSnapshot(data)
+                with self._lock:
+                    self._snapshots[market] = snapshot
+        return snapshot
+
+    @staticmethod
+    def _filters_digest(sort: Optional[Tuple[str, bool]], filters: Tuple[str, ...]) -> str:
+        text = json.dumps([list(sort) if sort else None, list(filters)], ensure_ascii=False)
+        return hashlib.md5(text.encode('utf-8')).hexdigest()[:12]
+
+    def query(self, market: str, sort: Optional[str] = None, filters: Iterable[str] = (),
+              page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+              cursor: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        排序、筛选并取一页
+
+        Args:
+            sort: 排序字段，'-' 前缀为降序
+            filters: 筛选条件（与 /api/screen 的 filter 参数语法相同），之间为"且"
+            page: 页码（未指定游标时使用）
+            cursor: 上一页返回的 next_cursor
+
+        Returns:
+            {'stocks', 'total', 'page_size', 'offset', 'next_cursor'}，市场无缓存时为None
+
+        Raises:
+            ValueError: 参数无效
+        """
+        sort_spec = parse_market_sort(sort)
+        filters = tuple(text.strip() for text in filters if text and text.strip())
+        page_size = min(max(int(page_size), 1), MAX_PAGE_SIZE)
+        digest = self._filters_digest(sort_spec, filters)
+
+        snapshot = self.snapshot(market)
+        if snapshot is None:
+            return None
+        ordering = snapshot.ordering(sort_spec, filters)
+        total = len(ordering.positions)
+
+        if cursor:
+            state = decode_cursor(cursor)
+            if state.get('q') != digest:
+                raise ValueError('分页游标与当前的排序或筛选条件不一致')
+            offset = min(snapshot.seek(ordering, state), total)
+        else:
+            offset = min((max(int(page), 1) - 1) * page_size, total)
+
+        end = min(offset + page_size, total)
+        positions = ordering.positions[offset:end]
+        stocks = [snapshot.records[position] for position in positions.tolist()]
+
+        next_cursor = None
+        if end < total:
+            last = end - 1
+            state = {'q': digest, 'c': str(ordering.codes[last]), 'o': end}
+            if ordering.keys is not None:
+                state['k'] = float(ordering.keys[last])
+            next_cursor = encode_cursor(state)
+
+        return {
+            'stocks': stocks,
+            'total': total,
+            'page_size': page_size,
+            'offset': offset,
+            'next_cursor': next_cursor
+        }
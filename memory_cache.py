@@ -0,0 +1,420 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按字节预算的分层内存缓存
+1. 内存层：按估算字节数限额的LRU，可选同时限制条目数
+2. 准入策略：TinyLFU（Count-Min Sketch记录访问频率），新条目只有比被淘汰者更常用才会进入，
+   一次性访问的键不会把热点行情数据挤出内存
+3. 溢出层：可选，被淘汰/未准入的条目以 pickle+zlib 压缩写入磁盘目录，再次访问时提升回内存
+4. 统计：按命名空间记录命中、未命中、淘汰、拒绝准入等指标
+"""
+
+import os
+import sys
+import time
+import zlib
+import pickle
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Hashable, List
+
+logger = logging.getLogger(__name__)
+
+# 估算容器大小时最多抽样的元素数
+_SAMPLE_SIZE = 16
+
+
+def estimate_size(obj: Any, _depth: int = 0) -> int:
+    """估算对象占用的内存字节数
+
+    大列表/字典只抽样前若干个元素再按长度放大，避免为一个几十万对象的
+    行情列表完整遍历一遍。
+    """
+    size = sys.getsizeof(obj)
+    if _depth > 6:
+        return size
+
+    if isinstance(obj, dict):
+        count = len(obj)
+        if count == 0:
+            return size
+        sampled = 0
+        for i, (key, value) in enumerate(obj.items()):
+            if i >= _SAMPLE_SIZE:
+                break
+            sampled += estimate_size(key, _depth + 1) + estimate_size(value, _depth + 1)
+        return size + sampled * count // min(count, _SAMPLE_SIZE)
+
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        count = len(obj)
+        if count == 0:
+            return size
+        sampled = 0
+        for i, item in enumerate(obj):
+            if i >= _SAMPLE_SIZE:
+                break
+            sampled += estimate_size(item, _depth + 1)
+        return size + sampled * count // min(count, _SAMPLE_SIZE)
+
+    # pandas/numpy对象自带准确的内存统计
+    memory_usage = getattr(obj, 'memory_usage', None)
+    if callable(memory_usage):
+        try:
+            usage = memory_usage(deep=True)
+            return size + int(usage.sum() if hasattr(usage, 'sum') else usage)
+        except TypeError:
+            pass
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return size + nbytes
+
+    return size
+
+
+class FrequencySketch:
+    """TinyLFU使用的Count-Min Sketch（4行、4位饱和计数器）
+
+    计数总数达到 sample_size 后所有计数器减半，让历史热度随时间衰减。
+    """
+
+    MAX_COUNT = 15
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = 1 << max(4, (width - 1).bit_length())
+        self.mask = self.width - 1
+        self.depth = depth
+        self.table = [bytearray(self.width) for _ in range(depth)]
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def _indexes(self, key: Hashable) -> List[int]:
+        h = hash(key)
+        return [hash((h, seed)) & self.mask for seed in range(self.depth)]
+
+    def increment(self, key: Hashable):
+        added = False
+        for row, index in zip(self.table, self._indexes(key)):
+            if row[index] < self.MAX_COUNT:
+                row[index] += 1
+                added = True
+
+        if added:
+            self.additions += 1
+            if self.additions >= self.sample_size:
+                self._reset()
+
+    def frequency(self, key: Hashable) -> int:
+        return min(row[index] for row, index in zip(self.table, self._indexes(key)))
+
+    def _reset(self):
+        """所有计数器减半"""
+        for row in self.table:
+            for i in range(self.width):
+                row[i] >>= 1
+        self.additions //= 2
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expire_at')
+
+    def __init__(self, value: Any, size: int, expire_at: Optional[float]):
+        self.value = value
+        self.size = size
+        self.expire_at = expire_at
+
+
+class TieredMemoryCache:
+    """按字节预算的分层缓存（线程安全）
+
+    键为 (命名空间, 键)，命名空间只用于统计和批量清理。
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_items: Optional[int] = None,
+                 spill_dir: Optional[str] = None, max_spill_bytes: int = 1024 * 1024 * 1024,
+                 compress_level: int = 1):
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.used_bytes = 0
+
+        self._entries: 'OrderedDict[tuple, _Entry]' = OrderedDict()
+        self._sketch = FrequencySketch()
+        self._lock = threading.RLock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+        # 磁盘溢出层: (命名空间, 键) -> (文件路径, 文件大小, 过期时间)
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.max_spill_bytes = max_spill_bytes
+        self.compress_level = compress_level
+        self.spill_bytes = 0
+        self._spilled: 'OrderedDict[tuple, tuple]' = OrderedDict()
+        if self.spill_dir:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # 溢出文件只在本进程内有效，启动时清掉上次遗留的文件
+            for stale in self.spill_dir.glob('*.spill'):
+                stale.unlink(missing_ok=True)
+
+    def _stat(self, namespace: str) -> Dict[str, int]:
+        stats = self._stats.get(namespace)
+        if stats is None:
+            stats = self._stats[namespace] = {
+                'hits': 0, 'misses': 0, 'spill_hits': 0, 'puts': 0,
+                'evictions': 0, 'rejections': 0, 'expirations': 0
+            }
+        return stats
+
+    def get(self, namespace: str, key: Hashable, default: Any = None) -> Any:
+        """读取缓存，内存未命中时查找溢出层并尝试提升回内存"""
+        full_key = (namespace, key)
+        now = time.time()
+
+        with self._lock:
+            self._sketch.increment(full_key)
+            stats = self._stat(namespace)
+
+            entry = self._entries.get(full_key)
+            if entry is not None:
+                if entry.expire_at is None or entry.expire_at > now:
+                    self._entries.move_to_end(full_key)
+                    stats['hits'] += 1
+                    return entry.value
+                self._remove_entry(full_key)
+                stats['expirations'] += 1
+
+            spilled = self._spilled.pop(full_key, None) if self.spill_dir else None
+            if spilled is not None:
+                self.spill_bytes -= spilled[1]
+
+        if spilled is not None:
+            path, _, expire_at = spilled
+            value = self._read_spill(path)
+            if value is not None and (expire_at is None or expire_at > now):
+                with self._lock:
+                    stats['spill_hits'] += 1
+                ttl = expire_at - now if expire_at is not None else None
+                self._put(full_key, value, None, ttl, count_put=False)
+                return value
+
+        with self._lock:
+            stats['misses'] += 1
+        return default
+
+    def put(self, namespace: str, key: Hashable, value: Any,
+            size: Optional[int] = None, ttl: Optional[float] = None) -> bool:
+        """写入缓存，返回是否进入内存层
+
+        已存在的键总是直接更新；新键只有在需要淘汰时才经过TinyLFU准入判断。
+        """
+        return self._put((namespace, key), value, size, ttl)
+
+    def _put(self, full_key: tuple, value: Any, size: Optional[int], ttl: Optional[float],
+             count_put: bool = True) -> bool:
+        if size is None:
+            size = estimate_size(value)
+        expire_at = time.time() + ttl if ttl else None
+        to_spill = []
+
+        with self._lock:
+            stats = self._stat(full_key[0])
+            if count_put:
+                stats['puts'] += 1
+                self._sketch.increment(full_key)
+
+            # 旧值（内存或溢出层）作废
+            if full_key in self._entries:
+                self._remove_entry(full_key)
+                admitted = size <= self.max_bytes and self.max_items != 0
+            else:
+                admitted = self._admit(full_key, size)
+            self._drop_spilled(full_key)
+
+            if admitted:
+                for victim_key in self._victims(size):
+                    victim = self._remove_entry(victim_key)
+                    self._stat(victim_key[0])['evictions'] += 1
+                    to_spill.append((victim_key, victim))
+
+                self._entries[full_key] = _Entry(value, size, expire_at)
+                self.used_bytes += size
+            else:
+                stats['rejections'] += 1
+                to_spill.append((full_key, _Entry(value, size, expire_at)))
+
+        for spill_key, entry in to_spill:
+            self._spill(spill_key, entry)
+
+        return admitted
+
+    def _over_budget(self, extra_bytes: int, extra_items: int) -> bool:
+        if self.used_bytes + extra_bytes > self.max_bytes:
+            return True
+        return self.max_items is not None and len(self._entries) + extra_items > self.max_items
+
+    def _victims(self, size: int) -> List[tuple]:
+        """按LRU顺序列出为容纳新条目需要淘汰的键"""
+        victims = []
+        freed_bytes = 0
+        for victim_key, entry in self._entries.items():
+            if not self._over_budget(size - freed_bytes, 1 - len(victims)):
+                break
+            victims.append(victim_key)
+            freed_bytes += entry.size
+        return victims
+
+    def _admit(self, full_key: tuple, size: int) -> bool:
+        """TinyLFU准入：新条目的访问频率必须高于所有将被淘汰的条目"""
+        if size > self.max_bytes or self.max_items == 0:
+            return False
+        if not self._over_budget(size, 1):
+            return True
+
+        candidate_frequency = self._sketch.frequency(full_key)
+        return all(candidate_frequency > self._sketch.frequency(victim_key)
+                   for victim_key in self._victims(size))
+
+    def _remove_entry(self, full_key: tuple) -> _Entry:
+        entry = self._entries.pop(full_key)
+        self.used_bytes -= entry.size
+        return entry
+
+    def _drop_spilled(self, full_key: tuple):
+        spilled = self._spilled.pop(full_key, None)
+        if spilled is not None:
+            self.spill_bytes -= spilled[1]
+            Path(spilled[0]).unlink(missing_ok=True)
+
+    def _spill_path(self, full_key: tuple) -> Path:
+        digest = hashlib.sha1(repr(full_key).encode('utf-8')).hexdigest()
+        return self.spill_dir / f'{digest}.spill'
+
+    def _spill(self, full_key: tuple, entry: _Entry):
+        """把条目压缩写入溢出层（在锁外执行磁盘IO）"""
+        if self.spill_dir is None:
+            return
+        if entry.expire_at is not None and entry.expire_at <= time.time():
+            return
+
+        try:
+            content = zlib.compress(pickle.dumps(entry.value, protocol=pickle.HIGHEST_PROTOCOL),
+                                    self.compress_level)
+        except Exception as e:
+            logger.debug(f"条目无法写入溢出层 {full_key}: {e}")
+            return
+        if len(content) > self.max_spill_bytes:
+            return
+
+        path = self._spill_path(full_key)
+        temp_path = path.with_name(f'{path.name}.{threading.get_ident()}.tmp')
+        try:
+            temp_path.write_bytes(content)
+            os.replace(temp_path, path)
+        except OSError as e:
+            logger.warning(f"写入溢出文件失败 {path}: {e}")
+            temp_path.unlink(missing_ok=True)
+            return
+
+        stale = []
+        with self._lock:
+            # 写盘期间同一个键被重新写入内存时，溢出的旧值作废
+            if full_key in self._entries:
+                stale.append(path)
+            else:
+                previous = self._spilled.pop(full_key, None)
+                if previous is not None:
+                    self.spill_bytes -= previous[1]
+                self._spilled[full_key] = (path, len(content), entry.expire_at)
+                self.spill_bytes += len(content)
+
+                while self.spill_bytes > self.max_spill_bytes and self._spilled:
+                    _, (old_path, old_size, _) = self._spilled.popitem(last=False)
+                    self.spill_bytes -= old_size
+                    stale.append(old_path)
+
+        for old_path in stale:
+            Path(old_path).unlink(missing_ok=True)
+
+    @staticmethod
+    def _read_spill(path: Path) -> Any:
+        try:
+            content = path.read_bytes()
+            path.unlink(missing_ok=True)
+            return pickle.loads(zlib.decompress(content))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"读取溢出文件失败 {path}: {e}")
+            return None
+
+    def pop(self, namespace: str, key: Hashable):
+        """删除一个键（内存层和溢出层）"""
+        full_key = (namespace, key)
+        with self._lock:
+            if full_key in self._entries:
+                self._remove_entry(full_key)
+            self._drop_spilled(full_key)
+
+    def contains(self, namespace: str, key: Hashable) -> bool:
+        """键是否在内存层（不计入访问频率）"""
+        with self._lock:
+            return (namespace, key) in self._entries
+
+    def keys(self, namespace: str) -> List[Hashable]:
+        """列出某个命名空间在内存层和溢出层中的键"""
+        with self._lock:
+            return [key for ns, key in list(self._entries) + list(self._spilled) if ns == namespace]
+
+    def clear(self, namespace: Optional[str] = None):
+        """清空全部或某个命名空间"""
+        with self._lock:
+            for full_key in [k for k in self._entries if namespace is None or k[0] == namespace]:
+                self._remove_entry(full_key)
+            for full_key in [k for k in self._spilled if namespace is None or k[0] == namespace]:
+                self._drop_spilled(full_key)
+
+    def purge_expired(self) -> int:
+        """清理过期条目，返回清理数量"""
+        now = time.time()
+        with self._lock:
+            expired = [k for k, entry in self._entries.items()
+                       if entry.expire_at is not None and entry.expire_at <= now]
+            for full_key in expired:
+                self._remove_entry(full_key)
+                self._stat(full_key[0])['expirations'] += 1
+
+            expired_spill = [k for k, (_, _, expire_at) in self._spilled.items()
+                             if expire_at is not None and expire_at <= now]
+            for full_key in expired_spill:
+                self._drop_spilled(full_key)
+
+        return len(expired) + len(expired_spill)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        """返回整体及各命名空间的统计信息"""
+        with self._lock:
+            namespaces = {}
+            for namespace, counters in self._stats.items():
+                lookups = counters['hits'] + counters['spill_hits'] + counters['misses']
+                namespaces[namespace] = dict(
+                    counters,
+                    items=0,
+                    bytes=0,
+                    hit_rate=round((counters['hits'] + counters['spill_hits']) / lookups * 100, 2) if lookups else 0.0
+                )
+            for (namespace, _), entry in self._entries.items():
+                ns_stats = namespaces.setdefault(namespace, {'items': 0, 'bytes': 0})
+                ns_stats['items'] += 1
+                ns_stats['bytes'] += entry.size
+
+            return {
+                'max_bytes': self.max_bytes,
+                'used_bytes': self.used_bytes,
+                'items': len(self._entries),
+                'spill_items': len(self._spilled),
+                'spill_bytes': self.spill_bytes,
+                'namespaces': namespaces
+            }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+定时任务主节点锁
+多个gunicorn worker（或多个进程）共享同一个锁文件，只有拿到 fcntl 排他锁的进程运行定时任务。
+锁随进程退出由内核自动释放，其他进程在后台定期重试，主节点进程被回收后自动接管。
+"""
+
+import os
+import socket
+import threading
+import time
+import logging
+from datetime import datetime
+from typing import Callable, Optional
+
+# 处理fcntl库的兼容性问题（Windows系统不支持fcntl）
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LOCK_FILE = os.path.join('cache', 'scheduler.lock')
+
+
+class LeaderLock:
+    """基于文件锁的主节点选举"""
+
+    def __init__(self, lock_file: str = DEFAULT_LOCK_FILE):
+        self.lock_file = lock_file
+        self._fd = None
+        self._lock = threading.Lock()
+        self._waiter = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """尝试成为主节点，不阻塞"""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            if not FCNTL_AVAILABLE:
+                # 不支持fcntl的系统上只有单进程部署，直接视为主节点
+                self._fd = -1
+                return True
+
+            os.makedirs(os.path.dirname(self.lock_file) or '.', exist_ok=True)
+            fd = os.open(self.lock_file, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+
+            # 记录主节点信息，便于排查
+            os.ftruncate(fd, 0)
+            os.write(fd, f"{socket.gethostname()} {os.getpid()} {datetime.now().isoformat(timespec='seconds')}\n".encode())
+            self._fd = fd
+            logger.info(f"成为定时任务主节点: pid={os.getpid()}")
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._fd is None:
+                return
+            if self._fd >= 0:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+            self._fd = None
+
+    def holder(self) -> Optional[str]:
+        """当前主节点信息（主机 进程号 获得时间）"""
+        try:
+            with open(self.lock_file, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def run_when_leader(self, callback: Callable[[], None], retry_interval: float = 30) -> bool:
+        """
+        成为主节点后执行callback（只执行一次）
+
+        当前拿不到锁时启动后台线程每retry_interval秒重试一次。
+
+        Returns:
+            bool: 是否已立即成为主节点
+        """
+        if self.try_acquire():
+            callback()
+            return True
+
+        with self._lock:
+            if self._waiter is not None:
+                return False
+
+            def wait_for_leadership():
+                while not self.try_acquire():
+                    time.sleep(retry_interval)
+                callback()
+
+            self._waiter = threading.Thread(target=wait_for_leadership, daemon=True)
+            self._waiter.start()
+        return False
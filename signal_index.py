@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+九转信号倒排索引
+按信号字段和信号值分桶: nine_turn_up=3 -> [股票代码, ...]（按代码排序），
+并记录每只股票进入当前桶的时间和最近的进桶历史，持久化到 cache/signal_index.json。
+
+九转序列更新任务更新完一个市场后调用 update_market；
+其他路径写入的市场缓存在读取时通过 refresh 按缓存对象是否变化增量同步。
+
+索引文件只由写入市场数据的进程（定时任务主节点或任务进程，persist=True）保存，
+其他进程只读：索引文件被更新后重新加载，自己同步到的变化只保留在内存中。
+某个市场第一次建立索引时（没有索引文件或新启用的市场），已在桶中的股票
+不知道何时进入，不记录进桶时间和历史。
+"""
+
+import os
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Iterable, Tuple
+
+from cache_manager import read_cache_file, write_cache_file
+
+logger = logging.getLogger(__name__)
+
+MARKETS = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
+SIGNAL_FIELDS = ('nine_turn_up', 'nine_turn_down', 'countdown_up', 'countdown_down')
+
+
+def _signal_value(value: Any) -> int:
+    """信号值统一为非负整数，无法解析时为0"""
+    try:
+        value = int(float(value or 0))
+    except (TypeError, ValueError):
+        return 0
+    return value if value > 0 else 0
+
+
+class SignalIndex:
+    """信号值 -> 股票代码 的倒排索引"""
+
+    def __init__(self, load_market_data: Optional[Callable[[str], Optional[Dict[str, Any]]]] = None,
+                 index_file: str = os.path.join('cache', 'signal_index.json'),
+                 markets: Optional[List[str]] = None, max_history: int = 20000,
+                 persist: bool = True):
+        self.load_market_data = load_market_data
+        self.index_file = index_file
+        self.markets = markets or MARKETS
+        self.max_history = max_history
+        # 是否由本进程保存索引文件（refresh 同步到变化时写回）；否则索引文件变化后重新加载
+        self.persist = persist
+
+        self._lock = threading.RLock()
+        self._loaded = False
+        # ts_code -> {'market': ..., 信号字段: 值}
+        self._values: Dict[str, Dict[str, Any]] = {}
+        # ts_code -> {信号字段: 进入当前桶的时间}
+        self._entered: Dict[str, Dict[str, str]] = {}
+        # 字段 -> 值 -> 代码集合（值为0的不建桶）
+        self._buckets: Dict[str, Dict[int, set]] = {field: {} for field in SIGNAL_FIELDS}
+        # 字段 -> 值 -> 已排序的代码列表（桶变化时失效）
+        self._sorted: Dict[Tuple[str, int], List[str]] = {}
+        # 进桶历史: [时间, 代码, 字段, 新值, 旧值]
+        self._history: List[list] = []
+        # 各市场上次同步时的缓存数据对象
+        self._synced: Dict[str, Any] = {}
+        # 已加载或最近保存的索引文件状态 (mtime_ns, size)
+        self._file_stamp: Optional[Tuple[int, int]] = None
+
+    def _stamp(self) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(self.index_file)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _ensure_loaded(self):
+        """第一次使用时加载索引文件；只读的进程在文件被写入方更新后重新加载"""
+        if self._loaded and self.persist:
+            return
+        stamp = self._stamp()
+        if self._loaded and stamp == self._file_stamp:
+            return
+        self._loaded = True
+        if stamp is None:
+            return
+        try:
+            data = read_cache_file(self.index_file)
+        except Exception as e:
+            logger.error(f"读取信号索引失败 {self.index_file}: {e}")
+            return
+
+        self._file_stamp = stamp
+        self._values = data.get('values', {})
+        self._entered = data.get('entered', {})
+        self._history = data.get('history', [])
+        self._buckets = {field: {} for field in SIGNAL_FIELDS}
+        self._sorted.clear()
+        # 市场缓存相对新加载的索引重新同步
+        self._synced.clear()
+        for ts_code, values in self._values.items():
+            for field in SIGNAL_FIELDS:
+                value = values.get(field, 0)
+                if value:
+                    self._buckets[field].setdefault(value, set()).add(ts_code)
+
+    def _save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_file) or '.', exist_ok=True)
+            write_cache_file(self.index_file, {
+                'update_time': datetime.now().isoformat(),
+                'values': self._values,
+                'entered': self._entered,
+                'history': self._history
+            })
+            self._file_stamp = self._stamp()
+        except Exception as e:
+            logger.error(f"保存信号索引失败 {self.index_file}: {e}")
+
+    def _move(self, ts_code: str, field: str, old: int, new: int, when: Optional[str]):
+        """把股票从旧桶移到新桶（when为None时不记录进桶时间和历史）"""
+        buckets = self._buckets[field]
+        if old:
+            bucket = buckets.get(old)
+            if bucket is not None:
+                bucket.discard(ts_code)
+                if not bucket:
+                    del buckets[old]
+            self._sorted.pop((field, old), None)
+        if new:
+            buckets.setdefault(new, set()).add(ts_code)
+            self._sorted.pop((field, new), None)
+            if when is not None:
+                self._entered.setdefault(ts_code, {})[field] = when
+                self._history.append([when, ts_code, field, new, old])
+            elif ts_code in self._entered:
+                self._entered[ts_code].pop(field, None)
+                if not self._entered[ts_code]:
+                    del self._entered[ts_code]
+        elif ts_code in self._entered:
+            self._entered[ts_code].pop(field, None)
+            if not self._entered[ts_code]:
+                del self._entered[ts_code]
+
+    def update_market(self, market: str, stocks: Iterable[Dict[str, Any]],
+                      when: Optional[datetime] = None, save: bool = True) -> int:
+        """
+        用一个市场的最新股票数据更新索引
+
+        save=True 时写回索引文件（由写入市场数据的任务调用）。
+        该市场第一次建立索引时，已有信号的股票不记录进桶时间和历史。
+
+        Returns:
+            int: 信号值发生变化的股票数
+        """
+        when = (when or datetime.now()).isoformat(timespec='seconds')
+        changed = 0
+        with self._lock:
+            self._ensure_loaded()
+            initial = not any(values.get('market') == market for values in self._values.values())
+            move_time = None if initial else when
+
+            seen = set()
+            for stock in stocks:
+                ts_code = stock.get('ts_code')
+                if not ts_code:
+                    continue
+                seen.add(ts_code)
+                current = self._values.get(ts_code, {})
+                values = {'market': market}
+                stock_changed = current.get('market') != market
+                for field in SIGNAL_FIELDS:
+                    new = _signal_value(stock.get(field))
+                    old = current.get(field, 0)
+                    values[field] = new
+                    if new != old:
+                        self._move(ts_code, field, old, new, move_time)
+                        stock_changed = True
+                if stock_changed:
+                    self._values[ts_code] = values
+                    changed += 1
+
+            # 已不在该市场中的股票移出索引
+            removed = [ts_code for ts_code, values in self._values.items()
+                       if values.get('market') == market and ts_code not in seen]
+            for ts_code in removed:
+                for field in SIGNAL_FIELDS:
+                    old = self._values[ts_code].get(field, 0)
+                    if old:
+                        self._move(ts_code, field, old, 0, when)
+                del self._values[ts_code]
+            changed += len(removed)
+
+            if len(self._history) > self.max_history:
+                self._history = self._history[-self.max_history:]
+            if changed and save:
+                self._save()
+        return changed
+
+    def refresh(self):
+        """市场缓存对象变化时（其他路径写入了新数据）增量同步，只有 persist=True 时写回索引文件"""
+        if self.load_market_data is None:
+            return
+        with self._lock:
+            self._ensure_loaded()
+        updated = False
+        for market in self.markets:
+            try:
+                market_data = self.load_market_data(market)
+            except Exception as e:
+                logger.warning(f"获取市场 {market} 数据失败: {e}")
+                continue
+            if not market_data or 'stocks' not in market_data:
+                continue
+            with self._lock:
+                if self._synced.get(market) is market_data:
+                    continue
+                if self.update_market(market, market_data['stocks'], save=False):
+                    updated = True
+                self._synced[market] = market_data
+        if updated and self.persist:
+            with self._lock:
+                self._save()
+
+    def _codes(self, field: str, value: int) -> List[str]:
+        """某个信号值桶内的股票代码（已排序），调用方负责先 refresh"""
+        if field not in SIGNAL_FIELDS:
+            raise ValueError(f"不支持的信号字段: {field}")
+        with self._lock:
+            self._ensure_loaded()
+            key = (field, int(value))
+            if key not in self._sorted:
+                self._sorted[key] = sorted(self._buckets[field].get(int(value), ()))
+            return self._sorted[key]
+
+    def codes(self, field: str, value: int) -> List[str]:
+        """某个信号值桶内的股票代码（已排序）"""
+        self.refresh()
+        return self._codes(field, value)
+
+    def bucket(self, field: str, value: int) -> List[Dict[str, Any]]:
+        """某个信号值桶内的股票及其进桶时间"""
+        codes = self.codes(field, value)
+        with self._lock:
+            return [{'ts_code': ts_code, 'entered': self._entered.get(ts_code, {}).get(field)}
+                    for ts_code in codes]
+
+    def codes_between(self, field: str, low: int, high: int) -> List[Tuple[str, int]]:
+        """信号值在 [low, high] 区间内的 (代码, 信号值)，按信号值从大到小、代码升序"""
+        self.refresh()
+        rows = []
+        for value in range(int(high), int(low) - 1, -1):
+            rows.extend((ts_code, value) for ts_code in self._codes(field, value))
+        return rows
+
+    def signals_many(self, ts_codes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """多只股票当前的信号值及进入各桶的时间（只同步一次市场缓存）"""
+        self.refresh()
+        with self._lock:
+            self._ensure_loaded()
+            result = {}
+            for ts_code in ts_codes:
+                values = self._values.get(ts_code, {})
+                signals = {field: values.get(field, 0) for field in SIGNAL_FIELDS}
+                signals['entered'] = dict(self._entered.get(ts_code, {}))
+                result[ts_code] = signals
+            return result
+
+    def signals(self, ts_code: str) -> Dict[str, Any]:
+        """一只股票当前的信号值及进入各桶的时间"""
+        return self.signals_many([ts_code])[ts_code]
+
+    def history(self, ts_code: Optional[str] = None, field: Optional[str] = None,
+                limit: int = 100) -> List[Dict[str, Any]]:
+        """最近的进桶记录（从新到旧）"""
+        with self._lock:
+            self._ensure_loaded()
+            events = []
+            for when, code, event_field, value, previous in reversed(self._history):
+                if (ts_code and code != ts_code) or (field and event_field != field):
+                    continue
+                events.append({'time': when, 'ts_code': code, 'field': event_field,
+                               'value': value, 'previous': previous})
+                if len(events) >= limit:
+                    break
+            return events
+
+    def summary(self) -> Dict[str, Dict[int, int]]:
+        """各字段每个桶的股票数"""
+        self.refresh()
+        with self._lock:
+            self._ensure_loaded()
+            return {field: {value: len(codes) for value, codes in sorted(buckets.items())}
+                    for field, buckets in self._buckets.items()}
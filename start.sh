@@ -49,6 +49,11 @@ echo "- 调试模式: $FLASK_DEBUG"
 echo "- 监听地址: $HOST:$PORT"
 echo "- 工作目录: $SCRIPT_DIR"
 
-# 启动应用
+# 启动应用：生产环境使用gunicorn（多worker，定时任务只在主节点worker中运行）
+if [[ "$FLASK_ENV" == "production" ]] && command -v gunicorn >/dev/null 2>&1; then
+    echo -e "${GREEN}启动gunicorn (workers=${WEB_WORKERS:-auto})...${NC}"
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
+
 echo -e "${GREEN}启动Flask应用...${NC}"
 python app.py
\ No newline at end of file
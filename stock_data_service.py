@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+进程内股票数据访问层
+历史日线存储（按参数缓存在内存中，5分钟过期）加指标引擎，
+app.py 的接口和 kline_api 蓝图都直接调用这里，不再通过回环HTTP请求
+/api/stock/<code>/daily_history 取数据。
+
+app.py 初始化Tushare后调用 data_service.configure(pro, safe_tushare_call)。
+"""
+
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Iterable, Callable
+
+import pandas as pd
+
+from memory_cache import TieredMemoryCache
+from indicator_engine import INDICATORS, compute_indicators_cached
+
+logger = logging.getLogger(__name__)
+
+HISTORY_TTL = 300
+
+# Tushare daily 接口的输出字段
+DAILY_COLUMNS = [
+    'ts_code', 'trade_date', 'open', 'high', 'low', 'close',
+    'pre_close', 'change', 'pct_chg', 'vol', 'amount'
+]
+NUMERIC_COLUMNS = DAILY_COLUMNS[2:]
+
+
+def normalize_ts_code(stock_code: str) -> str:
+    """6位股票代码补全交易所后缀，已带后缀的原样返回"""
+    if len(stock_code) == 6:
+        if stock_code.startswith(('60', '68')):
+            return f"{stock_code}.SH"
+        if stock_code.startswith(('43', '83', '87')):
+            return f"{stock_code}.BJ"
+        return f"{stock_code}.SZ"
+    return stock_code
+
+
+class StockDataService:
+    """历史日线 + 技术指标"""
+
+    NAMESPACE = 'daily_history'
+
+    def __init__(self, pro_api=None, api_call: Optional[Callable] = None,
+                 ttl: float = HISTORY_TTL, max_bytes: Optional[int] = None):
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('HISTORY_CACHE_MB', 64)) * 1024 * 1024
+        self.pro = pro_api
+        self.api_call = api_call
+        self.ttl = ttl
+        self.memory_cache = TieredMemoryCache(max_bytes=max_bytes, max_items=2000)
+
+    def configure(self, pro_api, api_call: Optional[Callable] = None):
+        """设置Tushare接口和调用包装（频率限制），已缓存的数据清空"""
+        self.pro = pro_api
+        self.api_call = api_call
+        self.memory_cache.clear(self.NAMESPACE)
+
+    @property
+    def available(self) -> bool:
+        return self.pro is not None
+
+    def _call(self, func, **kwargs):
+        if self.pro is None:
+            raise RuntimeError('Tushare接口未初始化')
+        if self.api_call is not None:
+            return self.api_call(func, **kwargs)
+        return func(**kwargs)
+
+    def _cached(self, key: tuple, loader: Callable[[], Any]) -> Any:
+        value = self.memory_cache.get(self.NAMESPACE, key)
+        if value is None:
+            value = loader()
+            size = int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else None
+            self.memory_cache.put(self.NAMESPACE, key, value, size=size, ttl=self.ttl)
+        return value
+
+    def stock_basic(self, ts_code: str) -> Dict[str, Any]:
+        """
+        股票基本信息
+
+        Raises:
+            LookupError: 股票代码不存在
+        """
+        def load():
+            basic_info = self._call(self.pro.stock_basic, ts_code=ts_code)
+            return basic_info.iloc[0].to_dict() if not basic_info.empty else {}
+
+        info = self._cached(('basic', ts_code), load)
+        if not info:
+            raise LookupError('股票代码不存在')
+        return info
+
+    def daily_history(self, ts_code: str, days: Optional[int] = None,
+                      start_date: Optional[str] = None, end_date: Optional[str] = None) -> pd.DataFrame:
+        """
+        历史日线，按交易日期升序，字段与Tushare daily 接口一致
+
+        Args:
+            days: 最近N个交易日（指定时忽略start_date和end_date）
+            start_date / end_date: 日期范围 YYYYMMDD
+
+        Returns:
+            pd.DataFrame: 无数据时为空表
+        """
+        if days:
+            return self._daily_window(ts_code, int(days))
+        key = ('daily', ts_code, None, start_date, end_date)
+        return self._cached(key, lambda: self._load_daily(ts_code, None, start_date, end_date)).copy()
+
+    def _daily_window(self, ts_code: str, days: int) -> pd.DataFrame:
+        """
+        最近N个交易日：每只股票只保留取过的最大窗口，较小的请求直接从中切片，
+        不同周期、不同天数的请求不会重复调用接口
+        """
+        key = ('daily_window', ts_code)
+        cached = self.memory_cache.get(self.NAMESPACE, key)
+        if cached is None or cached[0] < days:
+            window = max(days, cached[0] if cached is not None else 0)
+            df = self._load_daily(ts_code, window, None, None)
+            cached = (window, df)
+            self.memory_cache.put(self.NAMESPACE, key, cached,
+                                  size=int(df.memory_usage(deep=True).sum()), ttl=self.ttl)
+        df = cached[1]
+        return df.tail(days).reset_index(drop=True) if len(df) > days else df.copy()
+
+    def _load_daily(self, ts_code: str, days: Optional[int],
+                    start_date: Optional[str], end_date: Optional[str]) -> pd.DataFrame:
+        if days:
+            now = datetime.now()
+            end_date = now.strftime('%Y%m%d')
+            start_date = (now - timedelta(days=days * 2)).strftime('%Y%m%d')  # 乘以2确保有足够的交易日
+
+        df = self._call(self.pro.daily, ts_code=ts_code, start_date=start_date, end_date=end_date)
+        if df is None or df.empty:
+            logger.warning(f"未获取到股票 {ts_code} 的日线数据")
+            return pd.DataFrame(columns=DAILY_COLUMNS)
+
+        missing_columns = [column for column in DAILY_COLUMNS if column not in df.columns]
+        if missing_columns:
+            logger.error(f"日线数据缺少必要字段: {missing_columns}")
+            return pd.DataFrame(columns=DAILY_COLUMNS)
+
+        df = df.sort_values('trade_date').reset_index(drop=True)
+        if days and len(df) > days:
+            df = df.tail(days).reset_index(drop=True)
+        for column in NUMERIC_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+        return df
+
+    def daily_with_indicators(self, ts_code: str, indicators: Optional[Iterable[str]] = None,
+                              days: Optional[int] = None, start_date: Optional[str] = None,
+                              end_date: Optional[str] = None,
+                              params: Optional[Dict[str, Dict[str, Any]]] = None) -> pd.DataFrame:
+        """
+        历史日线并附加指标列（指标结果走 indicator_engine 的缓存）
+
+        Raises:
+            LookupError: 没有日线数据
+        """
+        df = self.daily_history(ts_code, days, start_date, end_date)
+        if df.empty:
+            raise LookupError('无法获取历史日线数据')
+        indicators = INDICATORS if indicators is None else [name for name in INDICATORS if name in set(indicators)]
+        return compute_indicators_cached(df, ts_code, indicators, params)
+
+    def clear(self):
+        self.memory_cache.clear(self.NAMESPACE)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.memory_cache.stats()
+
+
+data_service = StockDataService()
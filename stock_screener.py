@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量化选股引擎
+把五个市场的缓存合并成一张列式DataFrame，按声明式条件一次性计算布尔掩码，
+支持排序和分页。红 3-6、绿 9 等固定筛选也是这里的预设条件。
+
+条件格式（JSON）:
+    {"field": "turnover_rate", "op": ">", "value": 1}
+    {"field": "nine_turn_up", "op": "between", "value": [3, 6]}
+    {"field": "market", "op": "in", "value": ["cyb", "kcb"]}
+    {"any": [条件, 条件, ...]}     任一满足
+    {"all": [条件, 条件, ...]}     全部满足
+条件列表之间为"且"。
+
+查询字符串格式（GET /api/screen?filter=...）:
+    turnover_rate>1   nine_turn_up=3..6   market=cyb,kcb   volume_ratio<=0|volume_ratio>0.8
+排序: sort=-turnover_rate,nine_turn_up（负号表示降序）
+"""
+
+import re
+import time
+import threading
+import logging
+from typing import Dict, Any, Optional, List, Callable, Iterable, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MARKETS = ['cyb', 'hu', 'zxb', 'kcb', 'bj']
+
+# 可用于筛选和排序的数值字段（缺失或无法解析时按0处理，与原筛选逻辑一致）
+NUMERIC_FIELDS = [
+    'latest_price', 'pct_chg', 'turnover_rate', 'volume_ratio', 'amount',
+    'market_cap', 'pe_ttm', 'net_mf_amount',
+    'nine_turn_up', 'nine_turn_down', 'countdown_up', 'countdown_down'
+]
+# 可用于筛选和排序的文本字段
+TEXT_FIELDS = ['ts_code', 'name', 'industry', 'market']
+
+OPERATORS = ('>', '>=', '<', '<=', '==', '!=', 'between', 'in')
+
+# 预设筛选
+PRESETS = {
+    # 红 3-6：换手率>1，九转买入红色3-6；量比数据可能为0，量比>0时才要求量比>0.8
+    'red': {
+        'conditions': [
+            {'field': 'turnover_rate', 'op': '>', 'value': 1},
+            {'any': [
+                {'field': 'volume_ratio', 'op': '<=', 'value': 0},
+                {'field': 'volume_ratio', 'op': '>', 'value': 0.8}
+            ]},
+            {'field': 'nine_turn_up', 'op': 'between', 'value': [3, 6]}
+        ],
+        'sort': ['-nine_turn_up', '-turnover_rate'],
+        'signal': 'nine_turn_up'
+    },
+    # 绿 9：九转买入绿色=9
+    'green': {
+        'conditions': [
+            {'field': 'nine_turn_down', 'op': '==', 'value': 9}
+        ],
+        'sort': ['-nine_turn_down'],
+        'signal': 'nine_turn_down'
+    }
+}
+
+_CONDITION_PATTERN = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|==|>|<|=)\s*(.+?)\s*$')
+
+
+def parse_condition(text: str) -> Dict[str, Any]:
+    """把查询字符串中的一个条件解析为条件字典，'|' 分隔的多个条件为"或" """
+    if '|' in text:
+        return {'any': [parse_condition(part) for part in text.split('|')]}
+
+    match = _CONDITION_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"无法解析筛选条件: {text}")
+    field, op, value = match.groups()
+
+    if op == '=':
+        if '..' in value:
+            low, high = value.split('..', 1)
+            return {'field': field, 'op': 'between', 'value': [low, high]}
+        if ',' in value:
+            return {'field': field, 'op': 'in', 'value': value.split(',')}
+        op = '=='
+    return {'field': field, 'op': op, 'value': value}
+
+
+def parse_sort(sort: Any) -> List[str]:
+    """排序参数: 'a,-b' 或 ['a', '-b']"""
+    if not sort:
+        return []
+    if isinstance(sort, str):
+        sort = sort.split(',')
+    return [item.strip() for item in sort if item and item.strip()]
+
+
+def build_stock_frame(records: List[Dict[str, Any]], markets: List[str]) -> pd.DataFrame:
+    """把股票记录转换为列式DataFrame（行号与records下标一致）"""
+    columns = {}
+    for field in NUMERIC_FIELDS:
+        values = pd.to_numeric(pd.Series([stock.get(field) for stock in records], dtype=object),
+                               errors='coerce')
+        columns[field] = values.fillna(0).to_numpy(dtype=np.float64)
+    for field in ('ts_code', 'name', 'industry'):
+        columns[field] = np.array([str(stock.get(field) or '') for stock in records], dtype=object)
+    columns['market'] = np.array(markets, dtype=object)
+    return pd.DataFrame(columns)
+
+
+def field_column(frame: pd.DataFrame, field: str) -> np.ndarray:
+    if field not in NUMERIC_FIELDS and field not in TEXT_FIELDS:
+        raise ValueError(f"不支持的筛选字段: {field}")
+    return frame[field].to_numpy()
+
+
+def _cast(field: str, value: Any) -> Any:
+    if field in NUMERIC_FIELDS:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"字段 {field} 的条件值必须是数字: {value}")
+    return str(value)
+
+
+def condition_mask(frame: pd.DataFrame, condition: Dict[str, Any]) -> np.ndarray:
+    """计算单个条件（或条件组）的布尔掩码"""
+    if 'any' in condition or 'all' in condition:
+        group = condition.get('any') or condition.get('all') or []
+        if not group:
+            raise ValueError("条件组不能为空")
+        masks = [condition_mask(frame, item) for item in group]
+        return np.logical_or.reduce(masks) if 'any' in condition else np.logical_and.reduce(masks)
+
+    field = condition.get('field')
+    op = condition.get('op', '==')
+    value = condition.get('value')
+    if op not in OPERATORS:
+        raise ValueError(f"不支持的比较运算: {op}")
+    column = field_column(frame, field)
+
+    if op == 'between':
+        if not isinstance(value, (list, tuple)) or len(value) != 2:
+            raise ValueError(f"between 需要两个值: {field}")
+        low, high = _cast(field, value[0]), _cast(field, value[1])
+        return (column >= low) & (column <= high)
+    if op == 'in':
+        values = value if isinstance(value, (list, tuple)) else [value]
+        return np.isin(column, [_cast(field, item) for item in values])
+
+    value = _cast(field, value)
+    if op == '>':
+        return column > value
+    if op == '>=':
+        return column >= value
+    if op == '<':
+        return column < value
+    if op == '<=':
+        return column <= value
+    if op == '==':
+        return column == value
+    return column != value
+
+
+class StockScreener:
+    """全市场向量化选股"""
+
+    def __init__(self, load_market_data: Callable[[str], Optional[Dict[str, Any]]],
+                 markets: Optional[List[str]] = None):
+        self.load_market_data = load_market_data
+        self.markets = markets or MARKETS
+
+        # (各市场缓存数据对象, 股票记录列表, DataFrame)
+        self._snapshot = (None, [], pd.DataFrame())
+        self._lock = threading.Lock()
+
+    def _build_frame(self, market_datas: List[Optional[Dict[str, Any]]]) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
+        # 同一代码出现在多个市场时以后出现的为准
+        entries = {}
+        for market, market_data in zip(self.markets, market_datas):
+            if market_data and 'stocks' in market_data:
+                for stock in market_data['stocks']:
+                    if stock.get('ts_code'):
+                        entries[stock['ts_code']] = (stock, market)
+        records = [stock for stock, _ in entries.values()]
+        markets = [market for _, market in entries.values()]
+        return records, build_stock_frame(records, markets)
+
+    def snapshot(self) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
+        """返回 (股票记录列表, 列式DataFrame)，市场缓存未变化时复用上次构建的结果"""
+        market_datas = []
+        for market in self.markets:
+            try:
+                market_datas.append(self.load_market_data(market))
+            except Exception as e:
+                logger.warning(f"获取市场 {market} 数据失败: {e}")
+                market_datas.append(None)
+
+        with self._lock:
+            cached_datas, records, frame = self._snapshot
+            if cached_datas is not None and all(a is b for a, b in zip(cached_datas, market_datas)):
+                return records, frame
+
+            records, frame = self._build_frame(market_datas)
+            self._snapshot = (market_datas, records, frame)
+            return records, frame
+
+    def select(self, conditions: Iterable[Dict[str, Any]], sort: Any = None,
+               candidates: Optional[Iterable[str]] = None) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
+        """返回满足全部条件、已排序的DataFrame（index为记录位置），指定candidates时只在这些代码中筛选"""
+        records, frame = self.snapshot()
+        if candidates is None:
+            mask = np.ones(len(frame), dtype=bool)
+        else:
+            mask = np.isin(frame['ts_code'].to_numpy(), list(candidates))
+        for condition in conditions or []:
+            mask &= condition_mask(frame, condition)
+
+        selected = frame[mask]
+        sort_fields = parse_sort(sort)
+        if sort_fields and len(selected):
+            by = [field.lstrip('-') for field in sort_fields]
+            for field in by:
+                field_column(frame, field)
+            ascending = [not field.startswith('-') for field in sort_fields]
+            selected = selected.sort_values(by=by, ascending=ascending, kind='mergesort')
+        return records, selected
+
+    def screen(self, conditions: Iterable[Dict[str, Any]], sort: Any = None,
+               page: int = 1, page_size: int = 50) -> Dict[str, Any]:
+        """执行筛选并分页，返回原始股票记录"""
+        start_time = time.perf_counter()
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), 1000)
+
+        records, selected = self.select(conditions, sort)
+        positions = selected.index[(page - 1) * page_size:page * page_size]
+
+        return {
+            'data': [{'market': selected.at[position, 'market'], **records[position]} for position in positions],
+            'total': len(selected),
+            'page': page,
+            'page_size': page_size,
+            'elapsed_ms': round((time.perf_counter() - start_time) * 1000, 2)
+        }
+
+    def preset_signals(self, preset: str, candidates: Optional[Iterable[str]] = None) -> List[Tuple[str, int]]:
+        """执行预设筛选，返回已排序的 (ts_code, 信号值)；candidates 为预先缩小的候选代码"""
+        config = PRESETS[preset]
+        _, selected = self.select(config['conditions'], config['sort'], candidates)
+        return list(zip(selected['ts_code'].tolist(), selected[config['signal']].astype(int).tolist()))
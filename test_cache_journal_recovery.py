@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+缓存预写日志崩溃恢复测试
+连续保存几次增量变更，把日志截断在最后一条记录中间（模拟追加过程中断电），
+检查重新加载和 _attempt_recovery 都恢复到最后一条完整记录对应的状态，
+以及下一次追加前会截掉未写完的半行。
+
+用法: python test_cache_journal_recovery.py
+"""
+
+import sys
+import os
+import copy
+import shutil
+import tempfile
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_manager import OptimizedCacheManager
+
+MARKET = 'cyb'
+
+
+def make_data(version, stock_count=200):
+    """第version个版本: 前version只股票的价格被修改"""
+    stocks = []
+    for i in range(stock_count):
+        stocks.append({
+            'ts_code': f'{300000 + i:06d}.SZ',
+            'name': f'股票{i}',
+            'latest_price': 10.0 + i + (version if i < version else 0),
+            'pct_chg': float(version if i < version else 0)
+        })
+    return {'stocks': stocks, 'last_update_date': '20250801', 'total': stock_count, 'version': version}
+
+
+def strip_meta(data):
+    return {k: v for k, v in data.items() if not k.startswith('_')}
+
+
+def new_manager(cache_dir):
+    manager = OptimizedCacheManager(cache_dir=str(cache_dir))
+    # 只测日志回放，不让按体积或条数触发的压缩改写基准快照
+    manager.journal.max_records = 1000
+    manager.journal.max_size_ratio = 100
+    return manager
+
+
+def save_versions(manager, versions):
+    for version in versions:
+        assert manager.save_cache_data(MARKET, make_data(version)), f"保存版本{version}失败"
+
+
+def truncate_last_record(journal_path, inside_character=False):
+    """把日志截断在最后一条记录的中间（inside_character=True 时断在一个中文字符的字节中间）"""
+    content = journal_path.read_bytes()
+    last_start = content.rstrip(b'\n').rfind(b'\n') + 1
+    cut = last_start + (len(content) - last_start) // 2
+    if inside_character:
+        cut = content.index('股'.encode('utf-8'), last_start) + 1
+    journal_path.write_bytes(content[:cut])
+    return content[:last_start]
+
+
+def test_reload_ignores_torn_tail():
+    """重新加载时忽略未写完的最后一条记录"""
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        manager = new_manager(cache_dir)
+        save_versions(manager, range(0, 6))
+        cache_file = manager.get_cache_file_path(MARKET)
+        journal_path = manager.journal.get_journal_path(cache_file)
+        assert journal_path.exists() and len(journal_path.read_bytes().splitlines()) == 5, "版本1-5应追加为5条日志"
+
+        truncate_last_record(journal_path)
+        data = new_manager(cache_dir).load_cache_data(MARKET)
+        assert strip_meta(data) == make_data(4), "应恢复到最后一条完整记录（版本4）"
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_reload_ignores_tail_cut_inside_character():
+    """半行记录断在多字节字符中间时同样只忽略这一条，不会判为整个文件损坏"""
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        manager = new_manager(cache_dir)
+        save_versions(manager, range(0, 4))
+        cache_file = manager.get_cache_file_path(MARKET)
+        truncate_last_record(manager.journal.get_journal_path(cache_file), inside_character=True)
+
+        data = new_manager(cache_dir).load_cache_data(MARKET)
+        assert data is not None and strip_meta(data) == make_data(2), "应恢复到最后一条完整记录（版本2）"
+        assert cache_file.exists(), "基准快照不应被当作损坏文件删除"
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_attempt_recovery_compacts_last_complete_state():
+    """_attempt_recovery 回放完整记录并压缩为新的基准快照，删除损坏的日志"""
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        manager = new_manager(cache_dir)
+        save_versions(manager, range(0, 4))
+        cache_file = manager.get_cache_file_path(MARKET)
+        journal_path = manager.journal.get_journal_path(cache_file)
+        truncate_last_record(journal_path)
+
+        recovering = new_manager(cache_dir)
+        recovering._attempt_recovery(cache_file)
+        assert not journal_path.exists() or journal_path.stat().st_size == 0, "恢复后日志应被清空"
+
+        data = new_manager(cache_dir).load_cache_data(MARKET)
+        assert strip_meta(data) == make_data(2), "应恢复到最后一条完整记录（版本2）"
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_append_truncates_torn_tail():
+    """中断后的下一次保存先截掉半行，新记录不会拼接在其后"""
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        manager = new_manager(cache_dir)
+        save_versions(manager, range(0, 4))
+        cache_file = manager.get_cache_file_path(MARKET)
+        journal_path = manager.journal.get_journal_path(cache_file)
+        complete = truncate_last_record(journal_path)
+
+        restarted = new_manager(cache_dir)
+        assert strip_meta(restarted.load_cache_data(MARKET)) == make_data(2)
+        save_versions(restarted, [7])
+        content = journal_path.read_bytes()
+        assert content.startswith(complete) and content.endswith(b'\n'), "半行记录应在追加前被截掉"
+        assert len(content.splitlines()) == len(complete.splitlines()) + 1
+
+        data = new_manager(cache_dir).load_cache_data(MARKET)
+        assert strip_meta(data) == make_data(7), "截断后追加的记录应能正常回放"
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def test_compaction_keeps_state():
+    """日志达到条数上限时压缩为新快照，回放结果不变"""
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        manager = new_manager(cache_dir)
+        manager.journal.max_records = 3
+        save_versions(manager, range(0, 6))
+        cache_file = manager.get_cache_file_path(MARKET)
+        journal_path = manager.journal.get_journal_path(cache_file)
+        assert len(journal_path.read_bytes().splitlines()) < 3, "超过条数上限后应压缩"
+
+        expected = copy.deepcopy(make_data(5))
+        assert strip_meta(new_manager(cache_dir).load_cache_data(MARKET)) == expected
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    """主函数"""
+    print("=== 缓存日志崩溃恢复测试 ===")
+    tests = [
+        test_reload_ignores_torn_tail,
+        test_reload_ignores_tail_cut_inside_character,
+        test_attempt_recovery_compacts_last_complete_state,
+        test_append_truncates_torn_tail,
+        test_compaction_keeps_state
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n=== 测试完成: {len(tests) - failed}/{len(tests)} 通过 ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,10 +5,16 @@
 测试数据获取和显示修复
 """
 
+import sys
+import os
 import requests
-import json
 from datetime import datetime
 
+# 添加当前目录到Python路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from cache_manager import read_cache_file
+
 def test_api_data():
     """测试API数据"""
     try:
@@ -84,8 +90,8 @@ def check_cache_file():
         cache_file = 'cache/realtime_trading_data_cache.json'
         
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            # 缓存文件可能是带格式头的orjson/msgpack格式，统一由cache_manager解析
+            cache_data = read_cache_file(cache_file)
             
             print(f"✅ 缓存文件存在")
             print(f"缓存时间: {cache_data.get('fetch_time')}")
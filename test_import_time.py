@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动耗时测试
+在独立子进程中执行 import app（和 create_app()），检查耗时不超过预算，
+并且导入后没有加载 tushare/akshare 等应延迟导入的数据源库。
+预算默认1秒，可用环境变量 IMPORT_TIME_BUDGET 调整（较慢的机器上）。
+
+用法: python test_import_time.py
+"""
+
+import sys
+import os
+import statistics
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_import_time import run_probe, LAZY_MODULES
+
+BUDGET = float(os.environ.get('IMPORT_TIME_BUDGET', 1.0))
+REPEAT = 3
+
+_samples = []
+
+
+def probe_samples():
+    """各测试共用同一组子进程测量结果"""
+    if not _samples:
+        _samples.extend(run_probe()[0] for _ in range(REPEAT))
+    return _samples
+
+
+def test_import_within_budget():
+    """import app 的耗时中位数不超过预算"""
+    import_time = statistics.median(sample['import'] for sample in probe_samples())
+    assert import_time <= BUDGET, f"import app 耗时 {import_time:.2f}s 超过预算 {BUDGET:.2f}s"
+
+
+def test_create_app_within_budget():
+    """import app + create_app() 的耗时中位数不超过预算（预热在后台进行，不计入）"""
+    create_time = statistics.median(sample['create_app'] for sample in probe_samples())
+    assert create_time <= BUDGET, f"启动耗时 {create_time:.2f}s 超过预算 {BUDGET:.2f}s"
+
+
+def test_data_sources_not_imported():
+    """导入app后 tushare/akshare 不在 sys.modules 中"""
+    for sample in probe_samples():
+        assert not sample['loaded'], f"导入app时加载了应延迟导入的模块: {', '.join(sample['loaded'])}"
+    assert {'tushare', 'akshare'} <= set(LAZY_MODULES)
+
+
+def main():
+    """主函数"""
+    print("=== 启动耗时测试 ===")
+    tests = [
+        test_import_within_budget,
+        test_create_app_within_budget,
+        test_data_sources_not_imported
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n=== 测试完成: {len(tests) - failed}/{len(tests)} 通过 ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+技术指标引擎测试
+九转序列与原逐K线循环版本（下面冻结的 reference_nine_turn）逐值比较，并覆盖几条规则:
+未满9个就中断的Setup全部清除、相反方向的Setup出现时Countdown清零、Countdown只标记前13次。
+另外检查 clean_precision 与逐个处理的结果一致、compute_indicators 与各指标原公式一致，
+以及 IndicatorCache 的命中、失效和返回副本。
+
+用法: python test_indicator_engine.py
+"""
+
+import sys
+import os
+import math
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pandas as pd
+
+from indicator_engine import (nine_turn_arrays, nine_turn_records, clean_precision,
+                              compute_indicators, IndicatorCache, INDICATOR_COLUMNS)
+
+NINE_TURN_COLUMNS = INDICATOR_COLUMNS['nine_turn']
+
+
+def reference_nine_turn(close, high, low):
+    """原 calculate_nine_turn 的逐K线循环实现（冻结，用作对照）"""
+    n = len(close)
+    labels = {column: [0] * n for column in NINE_TURN_COLUMNS}
+    complete_pos = {}
+
+    for column, compare in (('nine_turn_up', lambda a, b: a > b), ('nine_turn_down', lambda a, b: a < b)):
+        count = 0
+        positions = []
+        complete_pos[column] = -1
+        for i in range(4, n):
+            if compare(close[i], close[i - 4]):
+                count += 1
+                positions.append(i)
+                if count >= 3:
+                    for j, pos in enumerate(positions[:9]):
+                        labels[column][pos] = j + 1
+                if count >= 9:
+                    complete_pos[column] = i
+                    count = 0
+                    positions = []
+            else:
+                for pos in positions:
+                    labels[column][pos] = 0
+                count = 0
+                positions = []
+
+    countdowns = (
+        ('countdown_up', 'nine_turn_up', 'nine_turn_down', lambda i: close[i] >= high[i - 2]),
+        ('countdown_down', 'nine_turn_down', 'nine_turn_up', lambda i: close[i] <= low[i - 2])
+    )
+    for column, setup_column, opposite_column, hit in countdowns:
+        if complete_pos[setup_column] < 0:
+            continue
+        count = 0
+        completed = False
+        for i in range(max(complete_pos[setup_column] + 1, 2), n):
+            if labels[opposite_column][i] > 0:
+                count = 0
+                completed = False
+                continue
+            if completed:
+                continue
+            if hit(i):
+                count += 1
+                if count <= 13:
+                    labels[column][i] = count
+                if count >= 13:
+                    completed = True
+    return labels
+
+
+def reference_clean(value, decimal_places=4):
+    """原 clean_float_precision 的逐个处理版本（冻结，用作对照）"""
+    try:
+        if value is None or pd.isna(value):
+            return 0.0
+        float_value = float(value)
+        if not np.isfinite(float_value):
+            return 0.0
+        rounded_value = round(float_value, decimal_places)
+        if '999' in str(float_value) and abs(float_value - rounded_value) < 0.01:
+            return rounded_value
+        return float_value
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def make_kline(close, spread=0.5):
+    close = np.asarray(close, dtype=np.float64)
+    return pd.DataFrame({
+        'ts_code': '300001.SZ',
+        'trade_date': [f'2025{i // 28 + 1:02d}{i % 28 + 1:02d}' for i in range(len(close))],
+        'open': close, 'high': close + spread, 'low': close - spread, 'close': close,
+        'vol': 1000.0, 'amount': close * 1000
+    })
+
+
+def nine_turn(close, spread=0.5):
+    df = make_kline(close, spread)
+    return nine_turn_arrays(df['close'].to_numpy(), df['high'].to_numpy(), df['low'].to_numpy())
+
+
+def test_matches_reference_on_random_series():
+    """随机序列（含相等收盘价和缺失值）与原循环版本逐值一致"""
+    rng = np.random.default_rng(42)
+    for _ in range(800):
+        n = int(rng.integers(0, 120))
+        close = np.round(10 + np.cumsum(rng.choice([-1.0, 0.0, 1.0], size=n, p=[0.4, 0.1, 0.5])), 2)
+        high = close + rng.random(n)
+        low = close - rng.random(n)
+        if n and rng.random() < 0.3:
+            close[rng.integers(0, n, size=max(1, n // 20))] = np.nan
+        expected = reference_nine_turn(close, high, low)
+        actual = nine_turn_arrays(close, high, low)
+        for column in NINE_TURN_COLUMNS:
+            assert actual[column].tolist() == expected[column], f"{column} 与原实现不一致: {close.tolist()}"
+
+
+def test_setup_cleared_on_break():
+    """未满9个就中断的Setup全部清除，满9个的保留1-9"""
+    # 前4根持平，之后连续上涨5根再下跌：5个命中被清除
+    result = nine_turn([10, 10, 10, 10, 11, 12, 13, 14, 15, 9])
+    assert result['nine_turn_up'].tolist() == [0] * 10
+
+    # 连续上涨9根后下跌：1-9保留
+    result = nine_turn([10, 10, 10, 10] + list(range(11, 20)) + [5])
+    assert result['nine_turn_up'].tolist() == [0] * 4 + list(range(1, 10)) + [0]
+
+
+def test_ongoing_setup_shown_from_third():
+    """最后一轮尚未中断时，满3个才显示序列号"""
+    assert nine_turn([10, 10, 10, 10, 11, 12])['nine_turn_up'].tolist() == [0] * 6
+    assert nine_turn([10, 10, 10, 10, 11, 12, 13])['nine_turn_up'].tolist() == [0] * 4 + [1, 2, 3]
+
+
+def test_countdown_capped_at_13():
+    """Countdown只标记前13次，之后不再计数"""
+    # 上涨Setup在第13根（下标12）完成，之后横盘：每根收盘价都不低于2天前的最高价，也不再形成新的Setup
+    close = [10.0] * 4 + [10.0 + i for i in range(1, 10)] + [19.0] * 20
+    result = nine_turn(close, spread=0.0)
+    countdown = result['countdown_up']
+    assert countdown[:13].tolist() == [0] * 13
+    assert countdown[13:26].tolist() == list(range(1, 14))
+    assert not countdown[26:].any()
+    assert result['countdown_down'].tolist() == [0] * len(close)
+
+
+def test_countdown_reset_by_opposite_setup():
+    """相反方向的Setup序列号出现时Countdown清零，之后从1重新计数"""
+    up = [10.0] * 4 + [10.0 + i for i in range(1, 10)] + [19.0] * 3   # 上涨Setup完成，卖出Countdown计到3
+    down = [19.0 - i for i in range(1, 15)]                            # 下跌Setup（满9个）打断Countdown
+    flat = [5.0] * 6                                                   # 横盘，Countdown重新计数
+    close = up + down + flat
+    result = nine_turn(close, spread=0.0)
+    expected = reference_nine_turn(np.array(close), np.array(close), np.array(close))
+    assert result['countdown_up'].tolist() == expected['countdown_up']
+
+    countdown = result['countdown_up'].tolist()
+    down_labels = result['nine_turn_down'].tolist()
+    reset_at = down_labels.index(1)
+    assert max(countdown[:reset_at]) > 1, "打断前应已开始计数"
+    assert all(countdown[i] == 0 for i in range(len(close)) if down_labels[i] > 0)
+    after = [value for value in countdown[reset_at:] if value]
+    assert after and after[0] == 1, f"被打断后应从1重新计数: {countdown}"
+
+
+def test_nine_turn_records():
+    """/nine_turn 逐K线记录与九转列一致，第9个标记 +9/-9，up_count为满9归零的连续计数"""
+    df = make_kline([10, 10, 10, 10] + list(range(11, 20)) + [5])
+    records = nine_turn_records(df)
+    assert len(records) == len(df)
+    assert [r['sell_signal'] for r in records] == [0] * 4 + list(range(1, 10)) + [0]
+    assert records[12]['nine_up_turn'] == '+9' and records[11]['nine_up_turn'] is None
+    assert [r['up_count'] for r in records][4:13] == [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 0.0]
+    assert records[0]['freq'] == 'daily' and records[0]['close'] == 10.0
+
+
+def test_clean_precision_matches_scalar():
+    """clean_precision 与逐个处理的结果一致（缺失、无穷、字符串、含999的值）"""
+    values = [None, np.nan, np.inf, -np.inf, 'abc', '12.5', 0.1 + 0.2, 1.9999999, 2.0000001,
+              12.349999999, 7.123456, -3.99999, 123456.78999, 0.0]
+    rng = np.random.default_rng(7)
+    values += (rng.random(500) * 100).tolist() + np.round(rng.random(200) * 100, 6).tolist()
+    expected = [reference_clean(value) for value in values]
+    actual = clean_precision(values).tolist()
+    for value, want, got in zip(values, expected, actual):
+        assert want == got or (math.isnan(want) and math.isnan(got)), f"{value!r}: {got} != {want}"
+
+
+def test_compute_indicators_match_formulas():
+    """一次计算的各指标与原公式逐列一致"""
+    rng = np.random.default_rng(3)
+    df = make_kline(np.round(20 + np.cumsum(rng.normal(0, 0.5, 120)), 2))
+    result = compute_indicators(df)
+    close, high, low = df['close'], df['high'], df['low']
+
+    def cleaned(series):
+        return [reference_clean(value) for value in series]
+
+    mid = close.rolling(20, min_periods=1).mean()
+    std = close.rolling(20, min_periods=1).std()
+    dif = close.ewm(span=12, min_periods=1).mean() - close.ewm(span=26, min_periods=1).mean()
+    dea = dif.ewm(span=9, min_periods=1).mean()
+    rsv = ((close - low.rolling(9, min_periods=1).min()) /
+           (high.rolling(9, min_periods=1).max() - low.rolling(9, min_periods=1).min()) * 100).fillna(50)
+    k = rsv.rolling(3, min_periods=1).mean()
+    d = k.rolling(3, min_periods=1).mean()
+    change = close.diff()
+    avg_gain = change.where(change > 0, 0).rolling(14, min_periods=1).mean()
+    avg_loss = (-change.where(change < 0, 0)).rolling(14, min_periods=1).mean()
+    rsi = (100 - (100 / (1 + avg_gain / (avg_loss + 1e-10)))).fillna(50)
+
+    expected = {
+        'boll_mid': cleaned(mid), 'boll_upper': cleaned(mid + std * 2), 'boll_lower': cleaned(mid - std * 2),
+        'ema15': cleaned(close.ewm(span=15, min_periods=1).mean()),
+        'macd_dif': cleaned(dif), 'macd_dea': cleaned(dea), 'macd_histogram': cleaned((dif - dea) * 2),
+        'kdj_k': cleaned(k), 'kdj_d': cleaned(d), 'kdj_j': cleaned(3 * k - 2 * d),
+        'rsi': cleaned(rsi)
+    }
+    for column, values in expected.items():
+        assert result[column].tolist() == values, f"{column} 与原公式不一致"
+
+    reference = reference_nine_turn(close.to_numpy(), high.to_numpy(), low.to_numpy())
+    for column in NINE_TURN_COLUMNS:
+        assert result[column].tolist() == reference[column]
+    assert 'boll_mid' not in df.columns, "不应修改传入的DataFrame"
+
+
+def test_indicator_cache():
+    """同一区间命中缓存；修改返回值不影响缓存；新K线或价格变化后重新计算"""
+    rng = np.random.default_rng(5)
+    df = make_kline(np.round(20 + np.cumsum(rng.normal(0, 0.5, 60)), 2))
+    cache = IndicatorCache(max_bytes=16 * 1024 * 1024)
+
+    first = cache.compute(df, '300001.SZ', ['macd', 'nine_turn'])
+    assert first.equals(compute_indicators(df, ['macd', 'nine_turn']))
+    first['macd_dif'] = 0.0
+    first['nine_turn_up'] = 99
+    second = cache.compute(df, '300001.SZ', ['macd', 'nine_turn'])
+    assert second.equals(compute_indicators(df, ['macd', 'nine_turn'])), "修改返回值不应影响缓存"
+
+    items = cache.stats()['items']
+    changed = df.copy()
+    changed.loc[changed.index[-1], ['close', 'high']] = [changed['close'].iloc[-1] + 1, changed['high'].iloc[-1] + 1]
+    assert cache.compute(changed, '300001.SZ', ['macd']).equals(compute_indicators(changed, ['macd']))
+    longer = make_kline(np.append(df['close'].to_numpy(), 25.0))
+    assert cache.compute(longer, '300001.SZ', ['macd']).equals(compute_indicators(longer, ['macd']))
+    assert cache.stats()['items'] == items + 2, "价格变化和新K线应各产生一个新的缓存项"
+
+    assert cache.compute(df, None, ['rsi']).equals(compute_indicators(df, ['rsi']))
+
+
+def main():
+    """主函数"""
+    print("=== 技术指标引擎测试 ===")
+    tests = [
+        test_matches_reference_on_random_series,
+        test_setup_cleared_on_break,
+        test_ongoing_setup_shown_from_third,
+        test_countdown_capped_at_13,
+        test_countdown_reset_by_opposite_setup,
+        test_nine_turn_records,
+        test_clean_precision_matches_scalar,
+        test_compute_indicators_match_formulas,
+        test_indicator_cache
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n=== 测试完成: {len(tests) - failed}/{len(tests)} 通过 ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+列式分时存储测试
+覆盖写入读出、13:00 并入 13:01 槽位、每只股票两行交替改写、一批只发布一次索引，
+以及读者复制一行期间该行被连续改写两次时检测到并重试（不会返回半新半旧的行）。
+
+用法: python test_intraday_store.py
+"""
+
+import sys
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from intraday_store import ColumnarIntradayStore, FIELDS, SLOTS, SLOT_INDEX
+
+DATE = '20250801'
+
+
+def make_points(price, times=('09:30', '09:31', '13:01', '15:00')):
+    return [{'time': t, 'price': price, 'open': price, 'high': price + 1, 'low': price - 1,
+             'volume': 100.0, 'amount': price * 100} for t in times]
+
+
+def make_store():
+    return ColumnarIntradayStore(Path(tempfile.mkdtemp()) / 'intraday', initial_rows=4)
+
+
+def cleanup(store):
+    shutil.rmtree(store.intraday_dir.parent, ignore_errors=True)
+
+
+def test_write_read_roundtrip():
+    """写入后按槽位读出，缺失的槽位不返回"""
+    store = make_store()
+    try:
+        assert store.write('000001', make_points(10.5), DATE) == 4
+        points = store.read('000001', DATE)
+        assert [p['time'] for p in points] == ['09:30', '09:31', '13:01', '15:00']
+        assert points[0]['price'] == 10.5 and points[0]['high'] == 11.5
+        assert points[0]['timestamp'] == '2025-08-01 09:30:00'
+        assert store.read('000002', DATE) is None
+        assert store.read_arrays('000001', '20250802') is None
+    finally:
+        cleanup(store)
+
+
+def test_noon_point_folded():
+    """13:00 的数据点并入 13:01：成交量累加，最高/最低取极值，开盘价取13:00的"""
+    store = make_store()
+    try:
+        points = [
+            {'time': '13:00', 'price': 10.0, 'open': 9.8, 'high': 10.4, 'low': 9.7, 'volume': 50.0, 'amount': 500.0},
+            {'time': '13:01', 'price': 10.1, 'open': 10.0, 'high': 10.2, 'low': 9.9, 'volume': 20.0, 'amount': 202.0}
+        ]
+        store.write('000001', points, DATE)
+        arrays = store.read_arrays('000001', DATE)
+        slot = SLOT_INDEX['13:01']
+        column = dict(zip(FIELDS, arrays[:, slot].tolist()))
+        assert column['volume'] == 70.0 and column['amount'] == 702.0
+        assert abs(column['high'] - 10.4) < 1e-5 and abs(column['low'] - 9.7) < 1e-5
+        assert abs(column['open'] - 9.8) < 1e-5 and abs(column['price'] - 10.1) < 1e-5
+    finally:
+        cleanup(store)
+
+
+def test_rewrites_alternate_rows():
+    """同一只股票改写时在相邻两行之间交替，扩容后旧数据仍可读"""
+    store = make_store()
+    try:
+        path = store.get_day_file_path(DATE)
+        store.write('000001', make_points(10.0), DATE)
+        first_row = store._read_index(path)['rows']['000001']
+        store.write('000001', make_points(11.0), DATE)
+        second_row = store._read_index(path)['rows']['000001']
+        assert second_row == first_row ^ 1
+
+        # 超过初始容量（4行 = 2只股票）后扩容
+        store.write_many([(f'00000{i}', make_points(float(i))) for i in range(2, 6)], DATE)
+        assert store.read('000001', DATE)[0]['price'] == 11.0
+        assert store.read('000005', DATE)[0]['price'] == 5.0
+    finally:
+        cleanup(store)
+
+
+def test_write_many_publishes_once():
+    """一批写入只发布一次索引，索引代数加1"""
+    store = make_store()
+    try:
+        path = store.get_day_file_path(DATE)
+        result = store.write_many([('000001', make_points(10.0)), ('000002', make_points(20.0))], DATE)
+        assert result == {'000001': 4, '000002': 4}
+        index = store._read_index(path)
+        assert index['generation'] == 1 and set(index['rows']) == {'000001', '000002'}
+    finally:
+        cleanup(store)
+
+
+class RacingStore(ColumnarIntradayStore):
+    """第一次复制一行时，在复制到一半后让写入者把这只股票连续改写两次"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.copies = 0
+
+    def _copy_row(self, mapped, offset):
+        self.copies += 1
+        if self.copies > 1:
+            return super()._copy_row(mapped, offset)
+        half = self.row_bytes // 2
+        first = bytes(mapped[offset:offset + half])
+        self.write('000001', make_points(30.0), DATE)
+        self.write('000001', make_points(40.0), DATE)
+        second = bytes(mapped[offset + half:offset + self.row_bytes])
+        return np.frombuffer(first + second, dtype=np.float32).reshape(len(FIELDS), SLOTS).copy()
+
+
+def test_torn_row_retried():
+    """复制期间该行被连续改写两次时检测到并重试，返回完整的新数据"""
+    store = RacingStore(Path(tempfile.mkdtemp()) / 'intraday', initial_rows=4)
+    try:
+        store.write('000001', make_points(10.0), DATE)
+        store.write('000001', make_points(20.0), DATE)
+        arrays = store.read_arrays('000001', DATE)
+        assert store.copies == 2, "被改写后应重试一次"
+        prices = arrays[0][~np.isnan(arrays[0])]
+        assert len(prices) == 4 and (prices == 40.0).all(), prices
+    finally:
+        cleanup(store)
+
+
+def test_concurrent_reads_never_torn():
+    """写入线程不断改写时，读者读到的每一行都来自同一次写入"""
+    store = make_store()
+    try:
+        store.write('000001', make_points(1.0, times=tuple(SLOT_INDEX)), DATE)
+        stop = threading.Event()
+
+        def writer():
+            price = 1.0
+            while not stop.is_set():
+                price += 1.0
+                store.write('000001', make_points(price, times=tuple(SLOT_INDEX)), DATE)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        try:
+            for _ in range(300):
+                arrays = store.read_arrays('000001', DATE)
+                if arrays is None:
+                    continue
+                assert len(set(arrays[0].tolist())) == 1, "读到了半新半旧的行"
+        finally:
+            stop.set()
+            thread.join()
+    finally:
+        cleanup(store)
+
+
+def main():
+    """主函数"""
+    print("=== 列式分时存储测试 ===")
+    tests = [
+        test_write_read_roundtrip,
+        test_noon_point_folded,
+        test_rewrites_alternate_rows,
+        test_write_many_publishes_once,
+        test_torn_row_retried,
+        test_concurrent_reads_never_torn
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n=== 测试完成: {len(tests) - failed}/{len(tests)} 通过 ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
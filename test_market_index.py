@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+市场列表排序索引测试
+覆盖游标分页的细节: 同值按 ts_code 排序、无法解析的排序值、降序、
+两次翻页之间缓存被更新，以及游标与排序/筛选条件不一致时报错（接口返回400）。
+
+用法: python test_market_index.py
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from market_index import MarketStockIndex, decode_cursor, encode_cursor
+
+MARKET = 'cyb'
+
+
+def make_stock(code, pct_chg, turnover_rate=1.0):
+    return {'ts_code': f'{code}.SZ', 'name': f'股票{code}', 'pct_chg': pct_chg, 'turnover_rate': turnover_rate}
+
+
+class FakeCache:
+    """模拟 cache_manager.load_cache_data：每次写入换一个新的数据对象"""
+
+    def __init__(self, stocks):
+        self.data = {'stocks': stocks}
+
+    def replace(self, stocks):
+        self.data = {'stocks': stocks}
+
+    def load(self, market):
+        return self.data if market == MARKET else None
+
+
+def collect_pages(index, sort=None, filters=(), page_size=3, between_pages=None):
+    """用游标依次取完所有页，返回代码列表；between_pages(页号) 在每次翻页前调用"""
+    codes = []
+    result = index.query(MARKET, sort=sort, filters=filters, page_size=page_size)
+    page = 1
+    while True:
+        codes.extend(stock['ts_code'] for stock in result['stocks'])
+        if not result['next_cursor']:
+            return codes
+        if between_pages:
+            between_pages(page)
+        page += 1
+        result = index.query(MARKET, sort=sort, filters=filters, page_size=page_size, cursor=result['next_cursor'])
+
+
+def test_ties_ordered_by_code():
+    """排序值相同时按 ts_code 升序，游标跨页不重复不遗漏"""
+    stocks = [make_stock(code, 1.5) for code in ('300005', '300001', '300004', '300002', '300003')]
+    stocks.append(make_stock('300000', 0.5))
+    index = MarketStockIndex(FakeCache(stocks).load)
+
+    codes = collect_pages(index, sort='pct_chg', page_size=2)
+    assert codes == ['300000.SZ', '300001.SZ', '300002.SZ', '300003.SZ', '300004.SZ', '300005.SZ'], codes
+
+    codes = collect_pages(index, sort='-pct_chg', page_size=2)
+    # 降序时同值仍按 ts_code 升序
+    assert codes == ['300001.SZ', '300002.SZ', '300003.SZ', '300004.SZ', '300005.SZ', '300000.SZ'], codes
+
+
+def test_descending_order():
+    """降序排序和游标翻页"""
+    stocks = [make_stock(f'3000{i:02d}', float(i)) for i in range(10)]
+    index = MarketStockIndex(FakeCache(stocks).load)
+
+    codes = collect_pages(index, sort='-pct_chg', page_size=4)
+    assert codes == [f'3000{i:02d}.SZ' for i in range(9, -1, -1)], codes
+
+    first = index.query(MARKET, sort='-pct_chg', page_size=4)
+    assert first['total'] == 10 and first['offset'] == 0
+    assert decode_cursor(first['next_cursor'])['k'] == -6.0, "降序游标记录取负后的排序键"
+
+
+def test_unparsable_values_sort_as_zero():
+    """缺失或无法解析的排序值（None、NaN、字符串）按0参与排序，翻页覆盖全部股票"""
+    stocks = [
+        make_stock('300001', None),
+        make_stock('300002', float('nan')),
+        make_stock('300003', 'abc'),
+        make_stock('300004', -1.0),
+        make_stock('300005', 2.0),
+        make_stock('300006', 0.0)
+    ]
+    index = MarketStockIndex(FakeCache(stocks).load)
+
+    codes = collect_pages(index, sort='pct_chg', page_size=2)
+    assert codes == ['300004.SZ', '300001.SZ', '300002.SZ', '300003.SZ', '300006.SZ', '300005.SZ'], codes
+
+    codes = collect_pages(index, sort='-pct_chg', page_size=4)
+    assert codes == ['300005.SZ', '300001.SZ', '300002.SZ', '300003.SZ', '300006.SZ', '300004.SZ'], codes
+
+
+def test_cursor_after_cache_change():
+    """两次翻页之间缓存被更新：游标按排序值和代码定位，未变化的股票不重复也不遗漏"""
+    stocks = [make_stock(f'3000{i:02d}', float(i)) for i in range(10)]
+    cache = FakeCache(stocks)
+    index = MarketStockIndex(cache.load)
+
+    def update_cache(page):
+        if page != 1:
+            return
+        # 第一页（0-3）之后：删除已返回的300001，在已返回区间插入新股票，
+        # 在未返回区间插入300099，并修改一只未返回股票的值使其仍在后面
+        changed = [stock for stock in stocks if stock['ts_code'] != '300001.SZ']
+        changed.append(make_stock('300050', 1.5))
+        changed.append(make_stock('300099', 6.5))
+        changed = [make_stock('300008', 8.5) if stock['ts_code'] == '300008.SZ' else stock for stock in changed]
+        cache.replace(changed)
+
+    codes = collect_pages(index, sort='pct_chg', page_size=4, between_pages=update_cache)
+    expected = ['300000.SZ', '300001.SZ', '300002.SZ', '300003.SZ',
+                '300004.SZ', '300005.SZ', '300006.SZ', '300099.SZ', '300007.SZ', '300008.SZ', '300009.SZ']
+    assert codes == expected, codes
+    assert len(set(codes)) == len(codes), "翻页结果不应重复"
+
+
+def test_cursor_after_cache_change_in_cache_order():
+    """不排序时按上一页最后一只股票在新缓存中的位置继续"""
+    stocks = [make_stock(f'3000{i:02d}', float(i)) for i in range(8)]
+    cache = FakeCache(stocks)
+    index = MarketStockIndex(cache.load)
+
+    first = index.query(MARKET, page_size=3)
+    cache.replace([make_stock('300100', 0.0)] + stocks)
+    second = index.query(MARKET, page_size=3, cursor=first['next_cursor'])
+    assert [stock['ts_code'] for stock in second['stocks']] == ['300003.SZ', '300004.SZ', '300005.SZ']
+
+
+def test_index_rebuilt_lazily():
+    """缓存数据对象不变时复用索引，变化后在下一次查询时重建"""
+    cache = FakeCache([make_stock('300001', 1.0)])
+    index = MarketStockIndex(cache.load)
+
+    first = index.snapshot(MARKET)
+    assert index.snapshot(MARKET) is first
+    cache.replace([make_stock('300001', 1.0), make_stock('300002', 2.0)])
+    second = index.snapshot(MARKET)
+    assert second is not first and len(second.records) == 2
+
+
+def test_filtered_pages():
+    """筛选条件下的游标翻页"""
+    stocks = [make_stock(f'3000{i:02d}', float(i), turnover_rate=float(i % 3)) for i in range(12)]
+    index = MarketStockIndex(FakeCache(stocks).load)
+
+    codes = collect_pages(index, sort='-pct_chg', filters=['turnover_rate>1'], page_size=2)
+    assert codes == ['300011.SZ', '300008.SZ', '300005.SZ', '300002.SZ'], codes
+
+
+def test_cursor_digest_mismatch():
+    """游标与当前的排序或筛选条件不一致时抛出ValueError"""
+    stocks = [make_stock(f'3000{i:02d}', float(i)) for i in range(10)]
+    index = MarketStockIndex(FakeCache(stocks).load)
+    cursor = index.query(MARKET, sort='pct_chg', page_size=3)['next_cursor']
+
+    for kwargs in ({'sort': '-pct_chg'}, {'sort': 'pct_chg', 'filters': ['pct_chg>1']}):
+        try:
+            index.query(MARKET, page_size=3, cursor=cursor, **kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"条件变化后游标应失效: {kwargs}")
+
+    forged = encode_cursor(dict(decode_cursor(cursor), q='0' * 12))
+    try:
+        index.query(MARKET, sort='pct_chg', page_size=3, cursor=forged)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("摘要不一致的游标应被拒绝")
+
+    try:
+        index.query(MARKET, sort='pct_chg', cursor='不是游标')
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("无法解析的游标应被拒绝")
+
+
+def test_route_rejects_mismatched_cursor():
+    """/api/stocks/<market> 对条件不一致的游标返回400"""
+    import app
+
+    cache = FakeCache([make_stock(f'3000{i:02d}', float(i)) for i in range(10)])
+    original = (app.load_cache_data, app.get_latest_cache_date, app.market_sort_index)
+    app.load_cache_data = cache.load
+    app.get_latest_cache_date = lambda market: '20250801'
+    app.market_sort_index = MarketStockIndex(cache.load)
+    try:
+        client = app.app.test_client()
+        first = client.get(f'/api/stocks/{MARKET}?sort=pct_chg&page_size=3')
+        assert first.status_code == 200, first.status_code
+        cursor = first.get_json()['next_cursor']
+        assert [stock['ts_code'] for stock in first.get_json()['stocks']] == ['300000.SZ', '300001.SZ', '300002.SZ']
+
+        second = client.get(f'/api/stocks/{MARKET}?sort=pct_chg&page_size=3&cursor={cursor}')
+        assert second.status_code == 200
+        assert second.get_json()['stocks'][0]['ts_code'] == '300003.SZ'
+
+        mismatched = client.get(f'/api/stocks/{MARKET}?sort=-pct_chg&page_size=3&cursor={cursor}')
+        assert mismatched.status_code == 400, mismatched.status_code
+    finally:
+        app.load_cache_data, app.get_latest_cache_date, app.market_sort_index = original
+
+
+def main():
+    """主函数"""
+    print("=== 市场列表排序索引测试 ===")
+    tests = [
+        test_ties_ordered_by_code,
+        test_descending_order,
+        test_unparsable_values_sort_as_zero,
+        test_cursor_after_cache_change,
+        test_cursor_after_cache_change_in_cache_order,
+        test_index_rebuilt_lazily,
+        test_filtered_pages,
+        test_cursor_digest_mismatch,
+        test_route_rejects_mismatched_cursor
+    ]
+    failed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"✅ {test.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {test.__doc__}: {e}")
+    print(f"\n=== 测试完成: {len(tests) - failed}/{len(tests)} 通过 ===")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,12 @@
 import time
 import functools
 import threading
+import hashlib
+import heapq
+import pickle
+import struct
+import zlib
+from contextlib import contextmanager
 from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime, timedelta
 from dataclasses import dataclass, field
@@ -13,6 +19,8 @@ from collections import defaultdict, deque
 import json
 import os
 
+from memory_cache import TieredMemoryCache
+
 @dataclass
 class PerformanceMetrics:
     """性能指标"""
@@ -123,181 +131,324 @@ def performance_monitor(api_name: str):
     return decorator
 
 class CacheManager:
-    """缓存管理器"""
+    """缓存管理器
+
+    通用的函数结果缓存（记忆化）层:
+    1. 内存LRU前端（按字节预算，TinyLFU准入），命中时不读文件
+    2. 文件层按键的sha1分片存放: {cache_dir}/{sha1前2位}/{sha1}.cache，
+       文件头记录过期时间，读取时先看文件头，过期的文件不会被反序列化
+    3. pickle序列化（DataFrame/ndarray按protocol 5整块写入），大对象zlib压缩
+    4. 后台线程按过期时间堆清理文件，不遍历整个目录
+    5. 所有方法线程安全，get_or_set 对同一个键只计算一次
+    6. 内存层保存pickle后的字节，每次读取都反序列化出新对象，调用方修改返回值不会影响缓存
+    """
+    
+    FILE_HEADER = struct.Struct('<7sdB')
+    FILE_MAGIC = b'TDMEMO1'
+    FLAG_ZLIB = 1
+    COMPRESS_THRESHOLD = 64 * 1024
     
-    def __init__(self, cache_dir: str = "cache", default_ttl: int = 3600):
+    def __init__(self, cache_dir: str = os.path.join("cache", "memo"), default_ttl: int = 3600,
+                 max_memory_bytes: int = 64 * 1024 * 1024, max_memory_items: int = 1000,
+                 sweep_interval: int = 300):
         self.cache_dir = cache_dir
         self.default_ttl = default_ttl
-        self.memory_cache: Dict[str, Dict[str, Any]] = {}
-        self.lock = threading.Lock()
+        self.memory_cache = TieredMemoryCache(max_bytes=max_memory_bytes, max_items=max_memory_items)
+        self.lock = threading.RLock()
+        
+        # 文件层元数据: 路径 -> (过期时间, 大小)，以及按过期时间排序的堆
+        self._files: Dict[str, tuple] = {}
+        self._expiry_heap: List[tuple] = []
+        # 正在计算中的键 -> [锁, 引用数]
+        self._key_locks: Dict[str, list] = {}
         
         # 确保缓存目录存在
         os.makedirs(cache_dir, exist_ok=True)
+        
+        self.sweep_interval = sweep_interval
+        self._sweeper_started = False
+        if sweep_interval > 0:
+            self._start_sweeper()
+    
+    @staticmethod
+    def _namespace(key: str) -> str:
+        """键的命名空间（用于分项统计），cached装饰器生成的键以函数名开头"""
+        return key.split(':', 1)[0] if ':' in key else 'default'
     
     def _get_cache_file_path(self, key: str) -> str:
-        """获取缓存文件路径"""
-        safe_key = key.replace('/', '_').replace('\\', '_').replace(':', '_')
-        return os.path.join(self.cache_dir, f"{safe_key}.json")
+        """获取缓存文件路径（按sha1前两位分片）"""
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.cache")
+    
+    def _encode(self, payload: bytes, expire_at: float) -> bytes:
+        flags = 0
+        if len(payload) > self.COMPRESS_THRESHOLD:
+            payload = zlib.compress(payload, 1)
+            flags |= self.FLAG_ZLIB
+        return self.FILE_HEADER.pack(self.FILE_MAGIC, expire_at, flags) + payload
+    
+    def _read_header(self, cache_file: str) -> Optional[float]:
+        """只读取文件头中的过期时间，文件无效时返回None"""
+        try:
+            with open(cache_file, 'rb') as f:
+                header = f.read(self.FILE_HEADER.size)
+            magic, expire_at, _ = self.FILE_HEADER.unpack(header)
+            return expire_at if magic == self.FILE_MAGIC else None
+        except (OSError, struct.error):
+            return None
+    
+    def _track_file(self, cache_file: str, expire_at: float, size: int):
+        with self.lock:
+            self._files[cache_file] = (expire_at, size)
+            heapq.heappush(self._expiry_heap, (expire_at, cache_file))
+    
+    def _untrack_file(self, cache_file: str):
+        with self.lock:
+            self._files.pop(cache_file, None)
     
     def set(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
         """设置缓存"""
         ttl = ttl or self.default_ttl
-        expire_time = datetime.now() + timedelta(seconds=ttl)
+        expire_at = time.time() + ttl
         
-        cache_data = {
-            'value': value,
-            'expire_time': expire_time.isoformat(),
-            'created_time': datetime.now().isoformat()
-        }
+        try:
+            payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"警告: 无法序列化缓存值 {key}: {e}")
+            return
         
-        with self.lock:
-            # 内存缓存
-            self.memory_cache[key] = cache_data
-            
-            # 文件缓存
-            try:
-                cache_file = self._get_cache_file_path(key)
-                with open(cache_file, 'w', encoding='utf-8') as f:
-                    json.dump(cache_data, f, ensure_ascii=False, indent=2)
-            except Exception as e:
-                print(f"警告: 无法写入缓存文件 {key}: {e}")
+        # 内存缓存（保存序列化后的字节，读取时得到副本）
+        self.memory_cache.put(self._namespace(key), key, payload, ttl=ttl)
+        
+        # 文件缓存（临时文件+替换，读者不会看到写了一半的文件）
+        cache_file = self._get_cache_file_path(key)
+        try:
+            content = self._encode(payload, expire_at)
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            temp_file = f"{cache_file}.{threading.get_ident()}.tmp"
+            with open(temp_file, 'wb') as f:
+                f.write(content)
+            os.replace(temp_file, cache_file)
+            self._track_file(cache_file, expire_at, len(content))
+        except Exception as e:
+            print(f"警告: 无法写入缓存文件 {key}: {e}")
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存"""
-        with self.lock:
-            # 先检查内存缓存
-            if key in self.memory_cache:
-                cache_data = self.memory_cache[key]
-                expire_time = datetime.fromisoformat(cache_data['expire_time'])
-                
-                if datetime.now() < expire_time:
-                    return cache_data['value']
-                else:
-                    # 过期，删除内存缓存
-                    del self.memory_cache[key]
+        namespace = self._namespace(key)
+        
+        # 先检查内存缓存
+        payload = self.memory_cache.get(namespace, key)
+        if payload is not None:
+            return pickle.loads(payload)
+        
+        # 检查文件缓存
+        cache_file = self._get_cache_file_path(key)
+        try:
+            with open(cache_file, 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print(f"警告: 无法读取缓存文件 {key}: {e}")
+            return None
+        
+        try:
+            magic, expire_at, flags = self.FILE_HEADER.unpack_from(content)
+            if magic != self.FILE_MAGIC:
+                raise ValueError("文件头无效")
             
-            # 检查文件缓存
-            cache_file = self._get_cache_file_path(key)
-            if os.path.exists(cache_file):
-                try:
-                    with open(cache_file, 'r', encoding='utf-8') as f:
-                        cache_data = json.load(f)
-                    
-                    expire_time = datetime.fromisoformat(cache_data['expire_time'])
-                    
-                    if datetime.now() < expire_time:
-                        # 重新加载到内存缓存
-                        self.memory_cache[key] = cache_data
-                        return cache_data['value']
-                    else:
-                        # 过期，删除文件
-                        os.remove(cache_file)
-                except Exception as e:
-                    print(f"警告: 无法读取缓存文件 {key}: {e}")
+            remaining = expire_at - time.time()
+            if remaining <= 0:
+                # 过期，删除文件
+                self._remove_file(cache_file)
+                return None
+            
+            payload = content[self.FILE_HEADER.size:]
+            if flags & self.FLAG_ZLIB:
+                payload = zlib.decompress(payload)
+            value = pickle.loads(payload)
+        except Exception as e:
+            print(f"警告: 无法读取缓存文件 {key}: {e}")
+            self._remove_file(cache_file)
+            return None
         
-        return None
+        # 重新加载到内存缓存
+        self.memory_cache.put(namespace, key, payload, ttl=remaining)
+        return value
     
-    def delete(self, key: str) -> None:
-        """删除缓存"""
+    @contextmanager
+    def _key_lock(self, key: str):
+        """同一个键的计算互斥，避免缓存失效时多个线程重复计算"""
         with self.lock:
-            # 删除内存缓存
-            if key in self.memory_cache:
-                del self.memory_cache[key]
+            holder = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            with self.lock:
+                holder[1] -= 1
+                if holder[1] == 0:
+                    self._key_locks.pop(key, None)
+    
+    def get_or_set(self, key: str, compute: Callable[[], Any], ttl: Optional[int] = None,
+                   cache_if: Optional[Callable[[Any], bool]] = None) -> Any:
+        """缓存未命中时调用compute计算并写入（结果为None或cache_if返回False时不缓存）"""
+        value = self.get(key)
+        if value is not None:
+            return value
+        
+        with self._key_lock(key):
+            # 等锁期间其他线程可能已经算好
+            value = self.get(key)
+            if value is not None:
+                return value
             
-            # 删除文件缓存
-            cache_file = self._get_cache_file_path(key)
-            if os.path.exists(cache_file):
-                try:
-                    os.remove(cache_file)
-                except Exception as e:
-                    print(f"警告: 无法删除缓存文件 {key}: {e}")
+            value = compute()
+            if value is not None and (cache_if is None or cache_if(value)):
+                self.set(key, value, ttl)
+            return value
+    
+    def _remove_file(self, cache_file: str):
+        try:
+            os.remove(cache_file)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"警告: 无法删除缓存文件 {cache_file}: {e}")
+        self._untrack_file(cache_file)
+    
+    def delete(self, key: str) -> None:
+        """删除缓存"""
+        # 删除内存缓存
+        self.memory_cache.pop(self._namespace(key), key)
+        
+        # 删除文件缓存
+        self._remove_file(self._get_cache_file_path(key))
     
     def clear_expired(self) -> int:
-        """清理过期缓存"""
-        cleared_count = 0
-        current_time = datetime.now()
+        """清理过期缓存
+
+        只弹出过期时间堆中已到期的文件，再用文件头确认没有被重新写入过。
+        """
+        cleared_count = self.memory_cache.purge_expired()
+        current_time = time.time()
         
+        due_files = []
         with self.lock:
-            # 清理内存缓存
-            expired_keys = []
-            for key, cache_data in self.memory_cache.items():
-                expire_time = datetime.fromisoformat(cache_data['expire_time'])
-                if current_time >= expire_time:
-                    expired_keys.append(key)
-            
-            for key in expired_keys:
-                del self.memory_cache[key]
-                cleared_count += 1
-            
-            # 清理文件缓存
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    cache_file = os.path.join(self.cache_dir, filename)
+            while self._expiry_heap and self._expiry_heap[0][0] <= current_time:
+                expire_at, cache_file = heapq.heappop(self._expiry_heap)
+                tracked = self._files.get(cache_file)
+                # 堆中的旧记录（文件已被重新写入或删除）直接丢弃
+                if tracked and tracked[0] == expire_at:
+                    due_files.append(cache_file)
+        
+        for cache_file in due_files:
+            expire_at = self._read_header(cache_file)
+            if expire_at is not None and expire_at > current_time:
+                # 其他进程已重新写入
+                self._track_file(cache_file, expire_at, os.path.getsize(cache_file))
+                continue
+            self._remove_file(cache_file)
+            cleared_count += 1
+        
+        return cleared_count
+    
+    def _scan_existing_files(self):
+        """启动时读取已有文件的文件头，建立过期时间堆（只执行一次）"""
+        for shard in os.listdir(self.cache_dir):
+            shard_dir = os.path.join(self.cache_dir, shard)
+            if not os.path.isdir(shard_dir):
+                continue
+            for filename in os.listdir(shard_dir):
+                cache_file = os.path.join(shard_dir, filename)
+                if filename.endswith('.tmp'):
+                    # 写入中断遗留的临时文件（跳过可能正在写入的）
                     try:
-                        with open(cache_file, 'r', encoding='utf-8') as f:
-                            cache_data = json.load(f)
-                        
-                        expire_time = datetime.fromisoformat(cache_data['expire_time'])
-                        if current_time >= expire_time:
-                            os.remove(cache_file)
-                            cleared_count += 1
-                    except Exception:
-                        # 如果文件损坏，也删除它
-                        try:
+                        if time.time() - os.path.getmtime(cache_file) > 60:
                             os.remove(cache_file)
-                            cleared_count += 1
-                        except Exception:
-                            pass
+                    except OSError:
+                        pass
+                    continue
+                expire_at = self._read_header(cache_file)
+                if expire_at is None:
+                    # 文件损坏也删除
+                    self._remove_file(cache_file)
+                    continue
+                with self.lock:
+                    if cache_file in self._files:
+                        continue
+                try:
+                    self._track_file(cache_file, expire_at, os.path.getsize(cache_file))
+                except OSError:
+                    continue
+    
+    def _start_sweeper(self):
+        """启动后台过期清理线程"""
+        if self._sweeper_started:
+            return
+        self._sweeper_started = True
         
-        return cleared_count
+        def sweep_loop():
+            try:
+                self._scan_existing_files()
+            except Exception as e:
+                print(f"警告: 扫描缓存目录失败: {e}")
+            while True:
+                time.sleep(self.sweep_interval)
+                try:
+                    self.clear_expired()
+                except Exception as e:
+                    print(f"警告: 清理过期缓存失败: {e}")
+        
+        threading.Thread(target=sweep_loop, daemon=True, name='cache-sweeper').start()
     
     def get_cache_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
+        memory_stats = self.memory_cache.stats()
         with self.lock:
-            memory_count = len(self.memory_cache)
-            file_count = len([f for f in os.listdir(self.cache_dir) if f.endswith('.json')])
-            
-            total_size = 0
-            for filename in os.listdir(self.cache_dir):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(self.cache_dir, filename)
-                    try:
-                        total_size += os.path.getsize(file_path)
-                    except Exception:
-                        pass
-            
-            return {
-                'memory_cache_count': memory_count,
-                'file_cache_count': file_count,
-                'total_cache_size_bytes': total_size,
-                'total_cache_size_mb': round(total_size / (1024 * 1024), 2),
-                'cache_directory': self.cache_dir
-            }
+            file_count = len(self._files)
+            total_size = sum(size for _, size in self._files.values())
+        
+        return {
+            'memory_cache_count': memory_stats['items'],
+            'memory_cache_bytes': memory_stats['used_bytes'],
+            'file_cache_count': file_count,
+            'total_cache_size_bytes': total_size,
+            'total_cache_size_mb': round(total_size / (1024 * 1024), 2),
+            'cache_directory': self.cache_dir,
+            'namespaces': memory_stats['namespaces']
+        }
+
+def _make_cache_key(func: Callable, args: tuple, kwargs: dict) -> str:
+    """生成稳定的缓存键（内置hash()每个进程随机，不能用于文件缓存）"""
+    raw = repr(args) + repr(sorted(kwargs.items()))
+    return f"{func.__module__}.{func.__qualname__}:{hashlib.sha1(raw.encode('utf-8')).hexdigest()}"
+
+def cached(ttl: int = 3600, cache_manager: Optional[CacheManager] = None,
+           key_func: Optional[Callable[..., str]] = None,
+           cache_if: Optional[Callable[[Any], bool]] = None):
+    """缓存装饰器
 
-def cached(ttl: int = 3600, cache_manager: Optional[CacheManager] = None):
-    """缓存装饰器"""
+    Args:
+        ttl: 过期时间（秒）
+        cache_manager: 使用的缓存管理器，默认为全局实例
+        key_func: 自定义缓存键（参数与被装饰函数相同），默认按参数repr生成
+        cache_if: 判断结果是否写入缓存（如空结果不缓存），默认只跳过None
+    """
     def decorator(func: Callable) -> Callable:
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # 生成缓存键
-            cache_key = f"{func.__name__}_{hash(str(args) + str(sorted(kwargs.items())))}"
+            if key_func:
+                cache_key = f"{func.__module__}.{func.__qualname__}:{key_func(*args, **kwargs)}"
+            else:
+                cache_key = _make_cache_key(func, args, kwargs)
             
             # 使用提供的缓存管理器或默认的
-            cm = cache_manager or getattr(wrapper, '_cache_manager', None)
-            if not cm:
-                cm = CacheManager()
-                wrapper._cache_manager = cm
-            
-            # 尝试从缓存获取
-            cached_result = cm.get(cache_key)
-            if cached_result is not None:
-                return cached_result
-            
-            # 执行函数并缓存结果
-            result = func(*args, **kwargs)
-            cm.set(cache_key, result, ttl)
-            
-            return result
+            cm = cache_manager or get_global_cache_manager()
+            return cm.get_or_set(cache_key, lambda: func(*args, **kwargs), ttl, cache_if=cache_if)
         
         return wrapper
     return decorator
@@ -338,7 +489,18 @@ class RateLimiter:
 
 # 全局实例
 global_performance_monitor = PerformanceMonitor()
-global_cache_manager = CacheManager()
+# 全局缓存管理器在第一次使用时创建（导入本模块不创建缓存目录，也不启动清理线程）
+_global_cache_manager: Optional[CacheManager] = None
+_global_cache_lock = threading.Lock()
+
+def get_global_cache_manager() -> CacheManager:
+    """获取全局缓存管理器（第一次调用时创建）"""
+    global _global_cache_manager
+    if _global_cache_manager is None:
+        with _global_cache_lock:
+            if _global_cache_manager is None:
+                _global_cache_manager = CacheManager()
+    return _global_cache_manager
 
 # 便捷函数
 def get_performance_summary() -> Dict[str, Any]:
@@ -347,8 +509,8 @@ def get_performance_summary() -> Dict[str, Any]:
 
 def get_cache_stats() -> Dict[str, Any]:
     """获取缓存统计"""
-    return global_cache_manager.get_cache_stats()
+    return get_global_cache_manager().get_cache_stats()
 
 def clear_expired_cache() -> int:
     """清理过期缓存"""
-    return global_cache_manager.clear_expired()
\ No newline at end of file
+    return get_global_cache_manager().clear_expired()
\ No newline at end of file
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+启动预热
+进程启动后在后台依次把市场缓存、全市场股票索引、指数缓存和自选股加载到内存，
+/readyz 在预热完成前返回503，负载均衡或systemd据此在进程预热完成后再导入流量。
+单个步骤失败不会阻塞就绪（该数据在第一次请求时照常按需加载），失败信息在 /readyz 中展示。
+"""
+
+import time
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class StartupWarmer:
+    """按注册顺序执行预热步骤并记录进度"""
+
+    def __init__(self):
+        self._steps: 'OrderedDict[str, Callable[[], Any]]' = OrderedDict()
+        self._progress: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._done = threading.Event()
+
+    def add(self, name: str, func: Callable[[], Any]):
+        """注册一个预热步骤"""
+        with self._lock:
+            self._steps[name] = func
+            self._progress[name] = {'status': 'pending'}
+
+    def _run(self):
+        for name, func in list(self._steps.items()):
+            with self._lock:
+                self._progress[name] = {'status': 'running'}
+            start = time.perf_counter()
+            try:
+                func()
+                entry = {'status': 'done'}
+            except Exception as e:
+                logger.warning(f"预热步骤 {name} 失败: {e}")
+                entry = {'status': 'failed', 'error': str(e)}
+            entry['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 1)
+            with self._lock:
+                self._progress[name] = entry
+
+        self._finished_at = time.time()
+        self._done.set()
+        logger.info(f"启动预热完成，耗时 {self._finished_at - self._started_at:.2f}s")
+
+    def start(self, background: bool = True):
+        """开始预热（只执行一次）"""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = time.time()
+        if background:
+            self._thread = threading.Thread(target=self._run, name='startup-warmup', daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+
+    def skip(self):
+        """不预热，直接视为就绪"""
+        with self._lock:
+            if self._started_at is not None:
+                return
+            self._started_at = self._finished_at = time.time()
+            for entry in self._progress.values():
+                entry['status'] = 'skipped'
+        self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self._done.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """等待预热完成，返回是否已完成"""
+        return self._done.wait(timeout)
+
+    def progress(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = {name: dict(entry) for name, entry in self._progress.items()}
+        finished = sum(1 for entry in steps.values() if entry['status'] in ('done', 'failed', 'skipped'))
+        started_at, finished_at = self._started_at, self._finished_at
+        return {
+            'ready': self.ready,
+            'started': started_at is not None,
+            'started_at': datetime.fromtimestamp(started_at).isoformat(timespec='seconds') if started_at else None,
+            'elapsed_seconds': round((finished_at or time.time()) - started_at, 2) if started_at else None,
+            'completed_steps': finished,
+            'total_steps': len(steps),
+            'failed_steps': [name for name, entry in steps.items() if entry['status'] == 'failed'],
+            'steps': steps
+        }
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自选股服务
+自选股列表常驻内存（按股票代码建立索引），修改后由后台定时器合并写盘：
+一段时间内的多次增删改只触发一次原子写入（临时文件+替换），
+文件格式与原来的 cache/watchlist.json 相同。
+多worker部署时每个进程各有一份内存列表，写盘在跨进程文件锁内进行：
+文件被其他进程改写过时先重新读取，再重放本进程尚未写盘的操作，不会互相覆盖。
+"""
+
+import os
+import json
+import atexit
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, Optional, List
+
+# 处理fcntl库的兼容性问题（Windows系统不支持fcntl）
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 有效的优先级
+VALID_PRIORITIES = ['purple', 'red', 'green', 'holding', 'sold']
+# 批量接口中允许修改的字段
+UPDATABLE_FIELDS = ('priority', 'note')
+
+
+def build_watchlist_entry(data: Dict[str, Any]) -> Dict[str, Any]:
+    """根据请求数据生成一条自选股记录"""
+    return {
+        'ts_code': data['ts_code'],
+        'name': data.get('name', ''),
+        'latest_price': data.get('latest_price', 0),
+        'pct_chg': data.get('pct_chg', 0),
+        'industry': data.get('industry', '-'),
+        'volume_ratio': data.get('volume_ratio', 0),
+        'pe': data.get('pe', 0),
+        'amount': data.get('amount', 0),
+        'total_mv': data.get('total_mv', 0),
+        'nine_turn_up': data.get('nine_turn_up', 0),
+        'nine_turn_down': data.get('nine_turn_down', 0),
+        'priority': data.get('priority', 'green'),  # 默认绿色优先级
+        'note': data.get('note', ''),  # 默认备注为空
+        'add_time': data.get('add_time', datetime.now().isoformat())
+    }
+
+
+class WatchlistService:
+    """内存中的自选股列表，带防抖的原子写盘"""
+
+    def __init__(self, file_path: str, flush_delay: float = 0.5):
+        self.file_path = file_path
+        self.flush_delay = flush_delay
+
+        self._lock = threading.RLock()
+        self._items: List[Dict[str, Any]] = []
+        self._index: Dict[str, Dict[str, Any]] = {}
+        self._loaded = False
+        self._file_stamp = None
+        # 尚未写盘的操作，重新加载文件后在新内容上重放
+        self._pending: List[tuple] = []
+        self._dirty = False
+        self._timer: Optional[threading.Timer] = None
+
+        # 进程退出前写出未保存的修改
+        atexit.register(self.flush)
+
+    def _stat_file(self):
+        """文件标识（原子替换后inode会变化），文件不存在时为None"""
+        try:
+            stat = os.stat(self.file_path)
+        except OSError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    @contextmanager
+    def _file_lock(self):
+        """跨进程写盘锁（多个worker共用同一个自选股文件）"""
+        if not FCNTL_AVAILABLE:
+            # 不支持fcntl的系统上只有单进程部署
+            yield
+            return
+        fd = os.open(f"{self.file_path}.lock", os.O_CREAT | os.O_RDWR)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _ensure_loaded(self):
+        """首次访问时加载；文件被其他进程改写后重新加载，并重放本进程尚未写盘的操作"""
+        stamp = self._stat_file()
+        if self._loaded and stamp == self._file_stamp:
+            return
+
+        items = []
+        if stamp is not None:
+            try:
+                with open(self.file_path, 'r', encoding='utf-8') as f:
+                    items = json.load(f)
+            except Exception as e:
+                logger.error(f"加载自选股文件失败 {self.file_path}: {e}")
+                items = []
+
+        self._items = [item for item in items if isinstance(item, dict) and item.get('ts_code')]
+        self._index = {item['ts_code']: item for item in self._items}
+        for operation in self._pending:
+            self._apply(operation)
+        self._file_stamp = stamp
+        self._loaded = True
+
+    def _apply(self, operation: tuple):
+        """在内存列表上执行一个操作"""
+        action = operation[0]
+        if action == 'add':
+            item = dict(operation[1])
+            if item['ts_code'] not in self._index:
+                self._items.append(item)
+                self._index[item['ts_code']] = item
+        elif action == 'remove':
+            item = self._index.pop(operation[1], None)
+            if item is not None:
+                self._items = [stock for stock in self._items if stock is not item]
+        elif action == 'update':
+            item = self._index.get(operation[1])
+            if item is not None:
+                item.update(operation[2])
+        elif action == 'replace':
+            self._items = [dict(item) for item in operation[1]]
+            self._index = {item['ts_code']: item for item in self._items}
+
+    def _record(self, operation: tuple):
+        """执行一个修改操作，记入待写盘列表，并在 flush_delay 秒后统一写盘"""
+        self._apply(operation)
+        self._pending.append(operation)
+        self._dirty = True
+        if self._timer is None:
+            self._timer = threading.Timer(self.flush_delay, self.flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def flush(self) -> bool:
+        """立即写出未保存的修改
+
+        持有跨进程文件锁期间，若文件已被其他进程改写，先重新读取并重放本进程的操作再写入，
+        不会覆盖其他worker刚保存的修改。
+        """
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return True
+
+            temp_path = f"{self.file_path}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.file_path) or '.', exist_ok=True)
+                with self._file_lock():
+                    self._ensure_loaded()
+                    with open(temp_path, 'w', encoding='utf-8') as f:
+                        json.dump(self._items, f, ensure_ascii=False, indent=2)
+                    os.replace(temp_path, self.file_path)
+                    self._file_stamp = self._stat_file()
+                self._pending = []
+                self._dirty = False
+                return True
+            except Exception as e:
+                logger.error(f"保存自选股文件失败 {self.file_path}: {e}")
+                # 保持dirty状态，下次修改时重试
+                return False
+
+    def list(self) -> List[Dict[str, Any]]:
+        """返回自选股列表（副本）"""
+        with self._lock:
+            self._ensure_loaded()
+            return [dict(item) for item in self._items]
+
+    def get(self, ts_code: str) -> Optional[Dict[str, Any]]:
+        """返回一只股票的记录（副本），不存在时返回None"""
+        with self._lock:
+            self._ensure_loaded()
+            item = self._index.get(ts_code)
+            return dict(item) if item is not None else None
+
+    def contains(self, ts_code: str) -> bool:
+        with self._lock:
+            self._ensure_loaded()
+            return ts_code in self._index
+
+    def add(self, entry: Dict[str, Any]) -> bool:
+        """添加一只股票，已存在时返回False"""
+        with self._lock:
+            self._ensure_loaded()
+            if entry['ts_code'] in self._index:
+                return False
+            self._record(('add', dict(entry)))
+            return True
+
+    def remove(self, ts_code: str) -> bool:
+        """移除一只股票，不存在时返回False"""
+        with self._lock:
+            self._ensure_loaded()
+            if ts_code not in self._index:
+                return False
+            self._record(('remove', ts_code))
+            return True
+
+    def update(self, ts_code: str, fields: Dict[str, Any]) -> bool:
+        """更新一只股票的字段，不存在时返回False"""
+        with self._lock:
+            self._ensure_loaded()
+            if ts_code not in self._index:
+                return False
+            self._record(('update', ts_code, dict(fields)))
+            return True
+
+    def update_many(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """批量更新多只股票的字段，只更新仍在列表中的股票，返回更新数量
+
+        用于行情补充/刷新：调用方在锁外拿副本慢慢计算，最后一次性合并，
+        期间被删除的股票不会被写回。
+        """
+        with self._lock:
+            self._ensure_loaded()
+            updated = 0
+            for ts_code, fields in updates.items():
+                if ts_code in self._index and fields:
+                    self._record(('update', ts_code, dict(fields)))
+                    updated += 1
+            return updated
+
+    def merge_changes(self, snapshot: List[Dict[str, Any]], updated: List[Dict[str, Any]]) -> int:
+        """把 updated 相对 snapshot 改动过的字段合并回列表，返回更新数量
+
+        只写回变化的字段，期间用户修改的优先级、备注不会被旧副本覆盖；
+        没有任何变化时不触发写盘。
+        """
+        before = {item['ts_code']: item for item in snapshot}
+        changes = {}
+        for item in updated:
+            original = before.get(item['ts_code'], {})
+            fields = {key: value for key, value in item.items() if original.get(key) != value}
+            if fields:
+                changes[item['ts_code']] = fields
+        return self.update_many(changes)
+
+    def clear(self):
+        """清空自选股"""
+        with self._lock:
+            self._ensure_loaded()
+            self._record(('replace', []))
+
+    def replace_all(self, items: List[Dict[str, Any]]):
+        """用新的列表整体替换"""
+        with self._lock:
+            self._ensure_loaded()
+            self._record(('replace', [dict(item) for item in items if item.get('ts_code')]))
+
+    def apply_bulk(self, operations: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """在一次加锁内执行多个增删改操作，返回每个操作的结果
+
+        每个操作: {'action': 'add'|'remove'|'update', 'ts_code': ..., 其他字段}
+        update 可修改 priority、note；修改 note 时记录 note_update_time。
+        """
+        results = []
+        with self._lock:
+            self._ensure_loaded()
+            for operation in operations:
+                action = operation.get('action')
+                ts_code = operation.get('ts_code')
+                result = {'action': action, 'ts_code': ts_code, 'success': False}
+
+                if not ts_code or action not in ('add', 'remove', 'update'):
+                    result['message'] = '缺少必要参数'
+                elif action == 'add':
+                    if 'priority' in operation and operation['priority'] not in VALID_PRIORITIES:
+                        result['message'] = '无效的优先级值'
+                    elif self.add(build_watchlist_entry(operation)):
+                        result['success'] = True
+                    else:
+                        result['message'] = '该股票已在自选股中'
+                elif action == 'remove':
+                    if self.remove(ts_code):
+                        result['success'] = True
+                    else:
+                        result['message'] = '股票不在自选股中'
+                else:
+                    fields = {key: operation[key] for key in UPDATABLE_FIELDS if key in operation}
+                    if not fields:
+                        result['message'] = '缺少必要参数'
+                    elif 'priority' in fields and fields['priority'] not in VALID_PRIORITIES:
+                        result['message'] = '无效的优先级值'
+                    else:
+                        if 'note' in fields:
+                            fields['note'] = str(fields['note']).strip()
+                            fields['note_update_time'] = datetime.now().isoformat()
+                        if self.update(ts_code, fields):
+                            result['success'] = True
+                        else:
+                            result['message'] = '股票不在自选股中'
+
+                results.append(result)
+        return results
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+独立定时任务进程
+    SCHEDULER_MODE=worker gunicorn -c gunicorn.conf.py wsgi:app   # Web进程不运行定时任务
+    python worker.py                                              # 定时任务、实时数据循环和手动触发的任务
+
+数据同步、九转更新、资金流向、分时缓存和每10秒的实时数据循环都在本进程中运行，
+不再和Web请求争用同一个进程的GIL。两者通过缓存文件共享数据（Web进程发现文件被改写后重新加载），
+/api/scheduler/trigger* 的手动触发经 job_control 的命令目录传给本进程，
+本进程定期写出心跳和任务状态供 /api/scheduler/status 展示。
+同一时间只有拿到定时任务主节点锁的一个任务进程在运行。
+"""
+
+import os
+import signal
+import threading
+import time
+from datetime import datetime
+
+# 本进程就是任务进程，导入app时不需要再按worker模式处理
+os.environ['SCHEDULER_MODE'] = 'local'
+
+import schedule
+
+import app as web
+
+HEARTBEAT_INTERVAL = 5
+POLL_INTERVAL = 1
+
+_running_jobs = set()
+_running_lock = threading.Lock()
+
+
+def run_job(job, command_id=None):
+    """执行一个手动触发的任务并记录结果，同名任务正在运行时跳过"""
+    control = web.job_control
+    with _running_lock:
+        if job in _running_jobs:
+            print(f"[任务进程] 任务 {job} 正在运行，跳过本次触发")
+            control.record(job, 'running', skipped=command_id)
+            return
+        _running_jobs.add(job)
+
+    print(f"[任务进程] 开始执行任务: {job}")
+    control.record(job, 'running', command_id=command_id, error=None, finished=None,
+                   started=datetime.now().isoformat(timespec='seconds'))
+    try:
+        web.SCHEDULER_JOBS[job]()
+        control.record(job, 'success', finished=datetime.now().isoformat(timespec='seconds'))
+        print(f"[任务进程] 任务完成: {job}")
+    except Exception as e:
+        control.record(job, 'failed', error=str(e), finished=datetime.now().isoformat(timespec='seconds'))
+        print(f"[任务进程] 任务失败: {job}, 错误: {e}")
+    finally:
+        with _running_lock:
+            _running_jobs.discard(job)
+
+
+def publish_heartbeat():
+    """写出心跳、调度器状态和实时数据任务状态"""
+    next_runs = [job.next_run for job in schedule.jobs if job.next_run]
+    web.job_control.publish(
+        next_run=min(next_runs).strftime('%Y-%m-%d %H:%M:%S') if next_runs else None,
+        total_jobs=len(schedule.jobs),
+        realtime_task_status=dict(web.realtime_task_status)
+    )
+
+
+def main():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+
+    lock = web.scheduler_lock
+    if not lock.try_acquire():
+        print(f"[任务进程] 主节点锁被 {lock.holder()} 持有，等待其退出...")
+        while not lock.try_acquire():
+            if stop.wait(5):
+                return
+
+    web.cache_manager.start_background_tasks()
+    web.start_scheduler()
+    web.job_control.publish(started=datetime.now().isoformat(timespec='seconds'), mode='worker')
+    print(f"[任务进程] 已启动 pid={os.getpid()}，等待手动触发命令")
+
+    last_heartbeat = 0.0
+    try:
+        while not stop.is_set():
+            for command in web.job_control.take():
+                job = command.get('job')
+                if job not in web.SCHEDULER_JOBS:
+                    print(f"[任务进程] 未知任务: {job}")
+                    continue
+                threading.Thread(target=run_job, args=(job, command.get('id')), daemon=True).start()
+
+            if time.time() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                publish_heartbeat()
+                last_heartbeat = time.time()
+            stop.wait(POLL_INTERVAL)
+    finally:
+        lock.release()
+        print("[任务进程] 已退出")
+
+
+if __name__ == '__main__':
+    main()